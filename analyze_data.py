@@ -5,11 +5,12 @@ Victoria II 存档数据分析工具
 基于解析后的JSON数据进行深度分析
 """
 
-import json
 import os
 from collections import defaultdict, Counter
 from datetime import datetime
 
+from snapshot import SNAPSHOT_SUFFIX, load_document
+
 
 class Victoria2Analyzer:
     """Victoria II存档数据分析器"""
@@ -19,14 +20,13 @@ class Victoria2Analyzer:
         self.load_json(json_file)
     
     def load_json(self, json_file: str):
-        """加载JSON数据"""
+        """加载JSON数据；优先打开旁边的快照 (.v2snap)，只读取分析用到的列"""
         if not os.path.exists(json_file):
             print(f"错误: 找不到文件 {json_file}")
             return False
         
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+            self.data = load_document(json_file)
             print(f"成功加载数据文件: {json_file}")
             return True
         except Exception as e:
@@ -288,8 +288,10 @@ def main():
     print("Victoria II 存档数据分析工具")
     print("="*50)
     
-    # 查找JSON文件
+    # 查找JSON文件 (以及没有对应JSON的快照文件)
     json_files = [f for f in os.listdir('.') if f.endswith('.json')]
+    json_files += [f for f in os.listdir('.') if f.endswith(SNAPSHOT_SUFFIX)
+                   and f[:-len(SNAPSHOT_SUFFIX)] + '.json' not in json_files]
     
     if not json_files:
         print("错误: 当前目录下没有找到JSON文件")
@@ -326,7 +328,7 @@ def main():
         # 询问是否保存报告
         save_report = input("\n是否保存分析报告到文件? (y/n): ").lower()
         if save_report in ['y', 'yes', '是']:
-            report_file = selected_file.replace('.json', '_analysis_report.txt')
+            report_file = os.path.splitext(selected_file)[0] + '_analysis_report.txt'
             analyzer.save_analysis_report(report_file)
 
 
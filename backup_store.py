@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档备份仓库 (内容寻址 + 压缩)
+===================================
+替代每次操作前 shutil.copy2 整份复制存档的做法：
+
+- 按内容切分：在块结束行 (`}` 行) 处依据局部内容哈希确定切分点，
+  插入或删除内容只影响附近的分块
+- 去重：分块按哈希存放，多个备份之间共享相同分块
+- 压缩：分块用 zlib 或 lzma (标准库) 压缩存放
+- 恢复：按清单 (manifest) 拼接分块，校验整体哈希后原子替换目标文件
+- 后台备份：start_background_backup 在后台线程中备份，覆盖原文件前用
+  wait_for_pending_backup 等待其完成
+
+仓库目录默认位于存档所在目录下的 .v2_backup_store/：
+    chunks/<前两位>/<哈希>     压缩后的分块
+    manifests/<备份ID>.json    备份清单
+"""
+
+import hashlib
+import json
+import lzma
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STORE_DIRNAME = ".v2_backup_store"
+
+# 分块参数：最小/最大分块大小与切分概率 (每 CUT_DIVISOR 个候选点约切分一次)
+MIN_CHUNK_SIZE = 8 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+CUT_DIVISOR = 64
+CUT_WINDOW = 48
+
+# 垃圾回收不删除最近这段时间内写入或复用的分块：其他进程的备份先写分块、后写清单
+GC_GRACE_SECONDS = 3600
+
+_CANDIDATE_PATTERN = re.compile(rb'}[ \t\r]*\n')
+
+_COMPRESSORS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+
+def split_chunks(data: bytes, min_size: int = MIN_CHUNK_SIZE, max_size: int = MAX_CHUNK_SIZE,
+                 divisor: int = CUT_DIVISOR) -> List[bytes]:
+    """按内容切分数据
+
+    候选切分点为块结束行之后的位置；当距上一个切分点不少于min_size，
+    且切分点前 CUT_WINDOW 字节的CRC能被divisor整除时切分。
+    切分点只由附近内容决定，因此相近的存档会得到大量相同的分块。
+    """
+    chunks = []
+    length = len(data)
+    last_cut = 0
+
+    while last_cut < length:
+        search_from = last_cut + min_size
+        if search_from >= length:
+            break
+
+        limit = min(length, last_cut + max_size)
+        cut = -1
+        for match in _CANDIDATE_PATTERN.finditer(data, search_from, limit):
+            pos = match.end()
+            if zlib.crc32(data[pos - CUT_WINDOW:pos]) % divisor == 0:
+                cut = pos
+                break
+
+        if cut == -1:
+            if limit >= length:
+                break
+            # 超过最大分块仍未找到切分点：在最大长度之前的最后一个换行处切分
+            newline = data.rfind(b'\n', search_from, limit)
+            cut = newline + 1 if newline != -1 else limit
+
+        chunks.append(data[last_cut:cut])
+        last_cut = cut
+
+    if last_cut < length:
+        chunks.append(data[last_cut:])
+    return chunks
+
+
+def default_store_root(save_path: str) -> str:
+    """存档对应的默认备份仓库目录"""
+    return os.path.join(os.path.dirname(os.path.abspath(save_path)), STORE_DIRNAME)
+
+
+def atomic_write_chunks(path: str, chunks: Iterable[bytes]):
+    """分块写入同目录下的临时文件并fsync，再原子替换目标文件
+
+    写入中途被打断时目标文件保持原样，不会出现写了一半的存档。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp_", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # 同步目录项，保证重命名本身落盘（Windows不支持对目录fsync）
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    """原子写入整段数据"""
+    atomic_write_chunks(path, (data,))
+
+
+class BackgroundBackup(threading.Thread):
+    """在后台线程中创建备份，与内存中的修改并行进行"""
+
+    def __init__(self, source_file: str, operation: str):
+        super().__init__(name=f"backup-{os.path.basename(source_file)}", daemon=True)
+        self.source_file = source_file
+        self.operation = operation
+        self.backup_id: Optional[str] = None
+        self.error: Optional[Exception] = None
+
+    def run(self):
+        try:
+            self.backup_id = BackupStore.for_save(self.source_file).create_backup(self.source_file, self.operation)
+        except Exception as e:
+            self.error = e
+
+    def wait(self) -> Optional[str]:
+        """等待备份完成，返回备份ID（失败时返回None）"""
+        self.join()
+        return self.backup_id
+
+
+_pending_backups: Dict[str, BackgroundBackup] = {}
+_pending_lock = threading.Lock()
+
+
+def start_background_backup(source_file: str, operation: str = "backup") -> BackgroundBackup:
+    """启动后台备份，并登记为该文件的待完成备份"""
+    job = BackgroundBackup(source_file, operation)
+    with _pending_lock:
+        _pending_backups[os.path.abspath(source_file)] = job
+    job.start()
+    return job
+
+
+def wait_for_pending_backup(source_file: str) -> Optional[BackgroundBackup]:
+    """若该文件有尚未完成的后台备份则等待其完成（覆盖原文件之前调用）"""
+    with _pending_lock:
+        job = _pending_backups.pop(os.path.abspath(source_file), None)
+    if job is not None:
+        job.join()
+    return job
+
+
+class BackupStore:
+    """内容寻址的压缩备份仓库"""
+
+    def __init__(self, root: str, compression: str = 'zlib'):
+        if compression not in _COMPRESSORS:
+            raise ValueError(f"不支持的压缩方式: {compression}")
+        self.root = root
+        self.compression = compression
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.manifests_dir = os.path.join(root, "manifests")
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    @classmethod
+    def for_save(cls, save_path: str, compression: str = 'zlib') -> 'BackupStore':
+        """获取存档所在目录的备份仓库"""
+        return cls(default_store_root(save_path), compression)
+
+    # ========================================
+    # 分块读写
+    # ========================================
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def _put_chunk(self, chunk: bytes) -> Tuple[str, int]:
+        """写入分块（已存在则跳过），返回 (哈希, 新写入的压缩字节数)"""
+        digest = hashlib.blake2b(chunk, digest_size=20).hexdigest()
+        path = self._chunk_path(digest)
+        try:
+            # 复用已有分块时刷新修改时间，使其处于垃圾回收的保护期内
+            os.utime(path)
+            return digest, 0
+        except FileNotFoundError:
+            pass
+
+        compress, _ = _COMPRESSORS[self.compression]
+        compressed = compress(chunk)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write_bytes(path, compressed)
+        return digest, len(compressed)
+
+    def _get_chunk(self, digest: str, compression: str) -> bytes:
+        _, decompress = _COMPRESSORS[compression]
+        with open(self._chunk_path(digest), 'rb') as f:
+            return decompress(f.read())
+
+    # ========================================
+    # 备份
+    # ========================================
+
+    def _new_backup_id(self, source_file: str, operation: str) -> str:
+        stem = os.path.basename(source_file)
+        if stem.endswith('.v2'):
+            stem = stem[:-3]
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_id = f"{stem}_{operation}_backup_{timestamp}"
+        suffix = 1
+        while os.path.exists(self._manifest_path(backup_id)):
+            suffix += 1
+            backup_id = f"{stem}_{operation}_backup_{timestamp}_{suffix}"
+        return backup_id
+
+    def _manifest_path(self, backup_id: str) -> str:
+        return os.path.join(self.manifests_dir, f"{backup_id}.json")
+
+    def backup_bytes(self, data: bytes, source_file: str, operation: str = "backup") -> str:
+        """将数据存为一个备份，返回备份ID"""
+        chunk_digests = []
+        new_chunks = 0
+        stored_bytes = 0
+        for chunk in split_chunks(data):
+            digest, written = self._put_chunk(chunk)
+            chunk_digests.append(digest)
+            if written:
+                new_chunks += 1
+                stored_bytes += written
+
+        backup_id = self._new_backup_id(source_file, operation)
+        manifest = {
+            'id': backup_id,
+            'source': os.path.abspath(source_file),
+            'operation': operation,
+            'created': datetime.now().isoformat(),
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'compression': self.compression,
+            'chunks': chunk_digests,
+            'new_chunks': new_chunks,
+            'stored_bytes': stored_bytes,
+        }
+        atomic_write_bytes(self._manifest_path(backup_id),
+                           json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+        return backup_id
+
+    def create_backup(self, source_file: str, operation: str = "backup") -> str:
+        """备份存档文件，返回备份ID"""
+        with open(source_file, 'rb') as f:
+            data = f.read()
+        return self.backup_bytes(data, source_file, operation)
+
+    # ========================================
+    # 查询与恢复
+    # ========================================
+
+    def load_manifest(self, backup_id: str) -> Optional[Dict]:
+        """读取备份清单"""
+        path = self._manifest_path(backup_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def list_backups(self, source_file: str = None) -> List[Dict]:
+        """列出备份（按创建时间排序），可按源文件过滤"""
+        source = os.path.abspath(source_file) if source_file else None
+        backups = []
+        for name in os.listdir(self.manifests_dir):
+            if not name.endswith('.json'):
+                continue
+            manifest = self.load_manifest(name[:-5])
+            if manifest and (source is None or manifest['source'] == source):
+                backups.append(manifest)
+        backups.sort(key=lambda m: m['created'])
+        return backups
+
+    def latest_backup(self, source_file: str = None) -> Optional[Dict]:
+        """获取最近一次备份的清单"""
+        backups = self.list_backups(source_file)
+        return backups[-1] if backups else None
+
+    def read_backup(self, backup_id: str) -> bytes:
+        """按清单拼接并校验备份内容"""
+        manifest = self.load_manifest(backup_id)
+        if manifest is None:
+            raise FileNotFoundError(f"备份不存在: {backup_id}")
+
+        data = b''.join(self._get_chunk(digest, manifest['compression']) for digest in manifest['chunks'])
+        if hashlib.sha256(data).hexdigest() != manifest['sha256']:
+            raise ValueError(f"备份校验失败: {backup_id}")
+        return data
+
+    def restore(self, backup_id: str, target_file: str = None) -> str:
+        """恢复备份到目标文件（默认恢复到原始位置），返回目标文件路径"""
+        manifest = self.load_manifest(backup_id)
+        if manifest is None:
+            raise FileNotFoundError(f"备份不存在: {backup_id}")
+        target = target_file or manifest['source']
+        atomic_write_bytes(target, self.read_backup(backup_id))
+        return target
+
+    # ========================================
+    # 维护
+    # ========================================
+
+    def delete_backup(self, backup_id: str) -> bool:
+        """删除备份清单（分块由 garbage_collect 回收）"""
+        path = self._manifest_path(backup_id)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True
+
+    def garbage_collect(self, grace_seconds: float = GC_GRACE_SECONDS) -> int:
+        """删除不再被任何清单引用的分块，返回删除数量
+
+        最近 grace_seconds 秒内写入或复用的分块不删除，它们可能属于其他进程中
+        尚未写入清单的备份。
+        """
+        referenced = set()
+        for manifest in self.list_backups():
+            referenced.update(manifest['chunks'])
+
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for prefix in os.listdir(self.chunks_dir):
+            prefix_dir = os.path.join(self.chunks_dir, prefix)
+            for digest in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, digest)
+                if digest not in referenced and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+    def disk_usage(self) -> Dict[str, int]:
+        """统计仓库占用与备份原始总大小"""
+        chunk_bytes = 0
+        chunk_count = 0
+        for prefix in os.listdir(self.chunks_dir):
+            prefix_dir = os.path.join(self.chunks_dir, prefix)
+            for digest in os.listdir(prefix_dir):
+                chunk_bytes += os.path.getsize(os.path.join(prefix_dir, digest))
+                chunk_count += 1
+        backups = self.list_backups()
+        return {
+            'backups': len(backups),
+            'chunks': chunk_count,
+            'stored_bytes': chunk_bytes,
+            'logical_bytes': sum(m['size'] for m in backups),
+        }
+
+
+def backup_save(source_file: str, operation: str = "backup") -> Optional[str]:
+    """备份存档到其所在目录的仓库，失败时返回None"""
+    try:
+        store = BackupStore.for_save(source_file)
+        backup_id = store.create_backup(source_file, operation)
+        manifest = store.load_manifest(backup_id)
+        print(f"备份创建成功: {backup_id} "
+              f"(新分块 {manifest['new_chunks']}/{len(manifest['chunks'])}, "
+              f"新增占用 {manifest['stored_bytes']:,} 字节)")
+        return backup_id
+    except Exception as e:
+        print(f"备份创建失败: {e}")
+        return None
+
+
+def main():
+    """命令行入口
+
+    python backup_store.py list [存档]                 列出备份
+    python backup_store.py backup <存档> [操作名]       创建备份
+    python backup_store.py restore <备份ID> [目标文件]   恢复备份
+    python backup_store.py import <旧备份文件...>        将旧的整份备份文件导入仓库
+    python backup_store.py gc [存档]                   回收无引用分块 (保留一小时内写入的)
+
+    备份仓库默认为存档 (restore 时为目标文件) 所在目录下的 .v2_backup_store，
+    没有给出文件时为当前目录下的；--store <目录> 指定其他仓库。
+    """
+    args = sys.argv[1:]
+    store_root = None
+    if '--store' in args:
+        position = args.index('--store')
+        if position + 1 >= len(args):
+            print(main.__doc__)
+            return
+        store_root = args[position + 1]
+        del args[position:position + 2]
+    if not args:
+        print(main.__doc__)
+        return
+
+    command = args[0].lower()
+    args = args[1:]
+
+    def open_store(save_path: str = None) -> BackupStore:
+        if store_root is not None:
+            return BackupStore(store_root)
+        if save_path is not None:
+            return BackupStore.for_save(save_path)
+        return BackupStore(os.path.join(os.getcwd(), STORE_DIRNAME))
+
+    if command == 'list':
+        store = open_store(args[0] if args else None)
+        for manifest in store.list_backups(args[0] if args else None):
+            print(f"{manifest['id']:<60} {manifest['size']:>12,} 字节  {manifest['created']}")
+        usage = store.disk_usage()
+        print(f"\n📦 {usage['backups']} 个备份, 原始 {usage['logical_bytes']:,} 字节, "
+              f"实际占用 {usage['stored_bytes']:,} 字节 ({usage['chunks']} 个分块)")
+    elif command == 'backup' and args:
+        operation = args[1] if len(args) > 1 else "manual"
+        if store_root is None:
+            backup_save(args[0], operation)
+        else:
+            backup_id = open_store().create_backup(args[0], operation)
+            print(f"备份创建成功: {backup_id}")
+    elif command == 'restore' and args:
+        target_file = args[1] if len(args) > 1 else None
+        target = open_store(target_file).restore(args[0], target_file)
+        print(f"✅ 已恢复: {args[0]} → {target}")
+    elif command == 'import' and args:
+        for legacy_file in args:
+            backup_id = open_store(legacy_file).create_backup(legacy_file, "imported")
+            print(f"📥 {legacy_file} → {backup_id}")
+    elif command == 'gc':
+        print(f"🧹 删除了 {open_store(args[0] if args else None).garbage_collect()} 个无引用分块")
+    else:
+        print(main.__doc__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 工具性能基准测试
+===================================
+在 save_generator.py 生成的不同规模存档上测量各项操作：
+墙钟时间、峰值内存 (RSS) 与吞吐量 (MB/s)，结果保存为JSON，
+并与保存的基准结果比较，慢于基准超过阈值时返回失败。
+
+每项操作在独立的子进程中运行，互不影响内存测量；
+准备工作（读取文件、构建修改器）不计入耗时。
+
+使用方法：
+    python benchmark.py                              测量1倍和5倍规模
+    python benchmark.py 1,5,20                       指定规模
+    python benchmark.py 1 --ops load_file,modify_militancy --repeat 3
+    python benchmark.py 1,5 --update-baseline        将本次结果保存为基准
+    python benchmark.py 1,5 --threshold 0.3          慢于基准30%以上视为退化（默认20%）
+"""
+
+import copy
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from bracket_parser import Victoria2BracketParser
+from comprehensive_population_analyzer import ComprehensivePopulationAnalyzer
+from country_extractor import Victoria2CountryExtractor
+from edit_journal import EditJournal, journal_path
+from save_generator import GeneratorConfig, write_save
+from victoria2_main_modifier import Victoria2Modifier
+
+SAVE_CACHE_DIR = ".bench_saves"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.20
+DEFAULT_SCALES = [1, 5]
+DEFAULT_SEED = 1836
+
+
+class _NullWriter(io.TextIOBase):
+    """丢弃被测代码的输出"""
+
+    def write(self, text):
+        return len(text)
+
+
+@dataclass
+class BenchmarkCase:
+    """一项被测操作：setup 准备状态（不计时），run 执行被测操作"""
+    name: str
+    setup: Callable[[str], object]
+    run: Callable[[object], object]
+
+
+# ========================================
+# 被测操作
+# ========================================
+
+_base_modifiers: Dict[str, Victoria2Modifier] = {}
+
+
+def _fresh_modifier(save_path: str) -> Victoria2Modifier:
+    """返回一个已加载存档的新修改器；每个子进程只解析一次，之后复制花括号结构"""
+    base = _base_modifiers.get(save_path)
+    if base is None:
+        base = Victoria2Modifier()
+        base.load_file(save_path)
+        _base_modifiers[save_path] = base
+
+    modifier = Victoria2Modifier()
+    modifier.file_path = save_path
+    modifier.content = base.content
+    modifier.structure = copy.deepcopy(base.structure)
+    modifier.parser.load_content(base.content)
+    modifier.parser.blocks = modifier.structure.children
+    modifier.journal = EditJournal(journal_path(save_path))
+    modifier.journal.attach(base.content)
+    return modifier
+
+
+def _read_save(save_path: str) -> str:
+    with open(save_path, 'r', encoding='utf-8-sig', errors='ignore') as f:
+        return f.read()
+
+
+def _parse_all_blocks(content: str):
+    parser = Victoria2BracketParser()
+    parser.load_content(content)
+    return parser.parse_all_blocks()
+
+
+def _load_extractor(save_path: str) -> Victoria2CountryExtractor:
+    extractor = Victoria2CountryExtractor(save_path)
+    extractor.load_file()
+    return extractor
+
+
+def _modify_case(method: str) -> BenchmarkCase:
+    return BenchmarkCase(method, _fresh_modifier, lambda modifier: getattr(modifier, method)())
+
+
+MODIFY_OPERATIONS = [
+    'modify_militancy', 'modify_china_culture', 'modify_china_infamy', 'modify_game_date',
+    'modify_game_date_selective', 'modify_chinese_population', 'modify_chinese_population_money',
+    'modify_all_countries_civilized', 'modify_china_civilized',
+]
+
+CASES: Dict[str, BenchmarkCase] = {case.name: case for case in [
+    BenchmarkCase('parse_all_blocks', _read_save, _parse_all_blocks),
+    BenchmarkCase('load_file', lambda save_path: save_path, lambda save_path: Victoria2Modifier().load_file(save_path)),
+    *[_modify_case(method) for method in MODIFY_OPERATIONS],
+    BenchmarkCase('find_dead_countries', _fresh_modifier, lambda modifier: modifier.find_dead_countries()),
+    BenchmarkCase('extract_country_data', _load_extractor, lambda extractor: extractor.extract_country_data()),
+    BenchmarkCase('analyze_all_populations', ComprehensivePopulationAnalyzer,
+                  lambda analyzer: analyzer.analyze_all_populations()),
+]}
+
+
+# ========================================
+# 测量
+# ========================================
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存 (MB)；无法获取时返回None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) / 1024 / 1024
+
+
+def _run_case(name: str, save_path: str, repeat: int) -> Dict:
+    """在子进程中执行一项操作，返回测量结果"""
+    case = CASES[name]
+    times = []
+    setup_rss = None
+    with redirect_stdout(_NullWriter()):
+        for _ in range(repeat):
+            state = case.setup(save_path)
+            if setup_rss is None:
+                setup_rss = peak_rss_mb()
+            start = time.perf_counter()
+            case.run(state)
+            times.append(time.perf_counter() - start)
+            del state
+
+    peak = peak_rss_mb()
+    return {
+        'times': times,
+        'peak_rss_mb': peak,
+        'rss_growth_mb': peak - setup_rss if peak is not None and setup_rss is not None else None,
+    }
+
+
+def ensure_save(scale: float, seed: int = DEFAULT_SEED, directory: str = SAVE_CACHE_DIR) -> str:
+    """返回指定规模的合成存档路径（不存在时生成）"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic_{scale:g}x_s{seed}.v2")
+    if not os.path.exists(path):
+        print(f"🏭 生成 {scale:g} 倍规模存档: {path}")
+        write_save(path, GeneratorConfig.for_scale(scale, seed=seed))
+    return path
+
+
+def result_key(result: Dict) -> str:
+    return f"{result['operation']}@{result['scale']:g}x"
+
+
+def run_benchmarks(scales: List[float], operations: List[str] = None, repeat: int = 1,
+                   seed: int = DEFAULT_SEED) -> Dict:
+    """运行基准测试，返回结果报告"""
+    operations = operations or list(CASES)
+    unknown = [name for name in operations if name not in CASES]
+    if unknown:
+        raise ValueError(f"未知操作: {', '.join(unknown)} (可用: {', '.join(CASES)})")
+
+    results = []
+    context = multiprocessing.get_context()
+    for scale in scales:
+        save_path = ensure_save(scale, seed)
+        size_mb = os.path.getsize(save_path) / 1024 / 1024
+        print(f"\n📦 {scale:g} 倍规模: {save_path} ({size_mb:.1f} MB)")
+
+        for name in operations:
+            with context.Pool(1) as pool:
+                measured = pool.apply(_run_case, (name, save_path, repeat))
+            best = min(measured['times'])
+            result = {
+                'operation': name,
+                'scale': scale,
+                'size_mb': round(size_mb, 3),
+                'wall_time': round(best, 4),
+                'mean_time': round(sum(measured['times']) / len(measured['times']), 4),
+                'runs': len(measured['times']),
+                'peak_rss_mb': round(measured['peak_rss_mb'], 1) if measured['peak_rss_mb'] is not None else None,
+                'rss_growth_mb': round(measured['rss_growth_mb'], 1) if measured['rss_growth_mb'] is not None else None,
+                'throughput_mb_s': round(size_mb / best, 2) if best > 0 else None,
+            }
+            results.append(result)
+            rss = f"{result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] is not None else "N/A"
+            print(f"  {name:<34} {best:>9.3f} 秒  {result['throughput_mb_s'] or 0:>8.2f} MB/s  峰值内存 {rss}")
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+# ========================================
+# 基准比较
+# ========================================
+
+def compare_with_baseline(report: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """与基准结果比较，返回耗时超过 基准×(1+阈值) 的退化项"""
+    baseline_times = {result_key(result): result['wall_time'] for result in baseline.get('results', [])}
+    regressions = []
+    for result in report['results']:
+        key = result_key(result)
+        expected = baseline_times.get(key)
+        if expected is None or expected <= 0:
+            continue
+        ratio = result['wall_time'] / expected
+        if ratio > 1 + threshold:
+            regressions.append({'key': key, 'baseline': expected, 'current': result['wall_time'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def save_json(path: str, data: Dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    scales = DEFAULT_SCALES
+    operations = None
+    repeat = 1
+    threshold = DEFAULT_THRESHOLD
+    baseline_path = DEFAULT_BASELINE
+    update_baseline = False
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '--ops':
+            operations = args[i + 1].split(',')
+            i += 1
+        elif arg == '--repeat':
+            repeat = int(args[i + 1])
+            i += 1
+        elif arg == '--threshold':
+            threshold = float(args[i + 1])
+            i += 1
+        elif arg == '--baseline':
+            baseline_path = args[i + 1]
+            i += 1
+        elif arg == '--update-baseline':
+            update_baseline = True
+        else:
+            scales = [float(scale) for scale in arg.split(',')]
+        i += 1
+
+    report = run_benchmarks(scales, operations, repeat)
+    report_path = f"benchmark_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    save_json(report_path, report)
+    print(f"\n📋 结果已保存: {report_path}")
+
+    if update_baseline:
+        save_json(baseline_path, report)
+        print(f"📌 基准已更新: {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"ℹ️ 没有基准文件 {baseline_path}，使用 --update-baseline 创建")
+        return 0
+
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(report, baseline, threshold)
+    if regressions:
+        print(f"\n❌ 性能退化 (阈值 {threshold:.0%}):")
+        for item in regressions:
+            print(f"  {item['key']}: {item['baseline']:.3f} → {item['current']:.3f} 秒 ({item['ratio']:.2f}x)")
+        return 1
+
+    print(f"\n✅ 与基准相比没有超过 {threshold:.0%} 的退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 分类值编码
+===================================
+文化、宗教、人口类型与国家标签在存档中反复出现。
+Categories 把每个不同的字符串驻留为唯一对象并分配小整数编码，
+CategoricalColumn 把一列分类值存为 array('H') 编码，
+分组统计、筛选和比较都在整数上进行。
+
+    CULTURES.encode('beifaren')            # → 编码 (未知值自动追加)
+    column = CategoricalColumn(CULTURES)
+    column.extend(['beifaren', 'manchu', 'beifaren'])
+    column.value_counts()                  # Counter({'beifaren': 2, 'manchu': 1})
+    column.value_counts(weights=sizes)     # 按人口数加权
+"""
+
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from population_enums import Culture, PopType, Religion
+
+try:
+    import numpy
+except ImportError:  # numpy 为可选依赖
+    numpy = None
+
+CODE_TYPECODE = 'H'  # 每列最多 65536 个不同的值
+MAX_CATEGORIES = 1 << 16
+
+
+class Categories:
+    """字符串 ↔ 小整数编码 的驻留字典；遇到未知值时自动扩展"""
+
+    def __init__(self, name: str, seed: Iterable[str] = ()):
+        self.name = name
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in seed:
+            self.encode(value)
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            if code >= MAX_CATEGORIES:
+                raise OverflowError(f"分类 {self.name} 超过 {MAX_CATEGORIES} 个不同的值")
+            value = sys.intern(value)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def intern(self, value: str) -> str:
+        """返回该值的唯一字符串对象"""
+        return self.values[self.encode(value)]
+
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+    def code_of(self, value: str) -> Optional[int]:
+        """已知值的编码；未知值返回None且不扩展字典"""
+        return self.codes.get(value)
+
+    def __contains__(self, value: str) -> bool:
+        return value in self.codes
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __repr__(self) -> str:
+        return f"Categories({self.name!r}, {len(self.values)} 个值)"
+
+
+# 共享的分类字典，以 population_enums 中的已知值为种子
+POP_TYPES = Categories('pop_type', (pop_type.value for pop_type in PopType))
+CULTURES = Categories('culture', (culture.value for culture in Culture))
+RELIGIONS = Categories('religion', (religion.value for religion in Religion))
+TAGS = Categories('tag')
+
+
+class CategoricalColumn:
+    """以编码数组存储的一列分类值"""
+
+    def __init__(self, categories: Categories, values: Iterable[str] = ()):
+        self.categories = categories
+        self.codes = array(CODE_TYPECODE)
+        self.extend(values)
+
+    def append(self, value: str):
+        self.codes.append(self.categories.encode(value))
+
+    def extend(self, values: Iterable[str]):
+        encode = self.categories.encode
+        self.codes.extend(encode(value) for value in values)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> str:
+        return self.categories.values[self.codes[index]]
+
+    def __iter__(self) -> Iterator[str]:
+        values = self.categories.values
+        return (values[code] for code in self.codes)
+
+    def where(self, value: str) -> List[int]:
+        """等于 value 的行号"""
+        code = self.categories.code_of(value)
+        if code is None:
+            return []
+        return [index for index, item in enumerate(self.codes) if item == code]
+
+    def value_counts(self, weights: Optional[Sequence[Union[int, float]]] = None) -> Counter:
+        """各值出现的次数 (或 weights 之和)；顺序为首次出现的顺序"""
+        if weights is None:
+            code_counts = Counter(self.codes)
+        else:
+            code_counts = Counter()
+            for code, weight in zip(self.codes, weights):
+                code_counts[code] += weight
+        values = self.categories.values
+        return Counter({values[code]: count for code, count in code_counts.items()})
+
+    def to_numpy(self):
+        """编码数组的 numpy 视图 (需要安装 numpy)"""
+        if numpy is None:
+            raise ImportError("to_numpy 需要 numpy: pip install numpy")
+        return numpy.frombuffer(self.codes, dtype=numpy.uint16)
@@ -10,6 +10,10 @@ import re
 import json
 from datetime import datetime
 
+from backup_store import backup_save
+from edit_plan import EditPlan
+from pop_compaction import plan_pop_id_compaction, print_compaction_report
+
 def load_file_simple(filename):
     """简单文件加载"""
     encodings = ['latin1', 'utf-8', 'utf-8-sig']
@@ -343,11 +347,33 @@ def plan_population_cleanup(content, china_provinces, primary_culture, accepted_
                 'pops_to_remove': province_modifications
             })
     
+    # 生成编辑计划，执行时直接使用
+    cleanup_plan['edit_plan'] = build_cleanup_edit_plan(content, cleanup_plan)
+    
     print(f"规划完成: {cleanup_plan['provinces_affected']} 个省份需要清理")
     print(f"将删除 {cleanup_plan['total_pops_removed']} 个人口单位")
     print(f"保护 {cleanup_plan['total_pops_protected']} 个被引用的人口单位")
     return cleanup_plan
 
+def build_cleanup_edit_plan(content, cleanup_plan):
+    """根据清理方案生成编辑计划（每个待删除人口一处删除）"""
+    edit_plan = EditPlan('population_cleanup', content)
+    
+    for province_mod in cleanup_plan['modifications']:
+        province_start = province_mod['province_start']
+        province_label = f"{province_mod['province_id']} {province_mod['province_name']}"
+        
+        for pop_mod in province_mod['pops_to_remove']:
+            # 计算全局位置，执行时验证删除区域包含该人口类型
+            edit_plan.add(province_start + pop_mod['line_start'],
+                          province_start + pop_mod['line_end'],
+                          '',
+                          reason=f"删除人口: {pop_mod['culture']}",
+                          block=province_label,
+                          expect=pop_mod['pop_type'])
+    
+    return edit_plan
+
 def display_cleanup_plan(cleanup_plan, primary_culture, accepted_cultures):
     """显示清理计划"""
     print("\n" + "=" * 60)
@@ -385,61 +411,37 @@ def display_cleanup_plan(cleanup_plan, primary_culture, accepted_cultures):
     if len(cleanup_plan['modifications']) > 10:
         print(f"  ... 还有 {len(cleanup_plan['modifications']) - 10} 个省份")
     
+    edit_plan = cleanup_plan.get('edit_plan')
+    if edit_plan is not None:
+        print(f"\n文件大小: {edit_plan.source_length:,} → {edit_plan.resulting_size:,} 字符 "
+              f"(减少 {-edit_plan.size_delta:,})")
+    
     if cleanup_plan['total_pops_protected'] > 0:
         print(f"\n✅ 安全保护: {cleanup_plan['total_pops_protected']} 个被引用的人口将被保留，避免游戏崩溃")
 
 def execute_population_cleanup(content, cleanup_plan):
-    """执行人口清理 - 修复版"""
+    """执行人口清理 - 直接应用规划时生成的编辑计划，一次拼接完成"""
     print("\n开始执行人口清理...")
     
-    modified_content = content
-    total_removed = 0
+    edit_plan = cleanup_plan.get('edit_plan')
+    if edit_plan is None or not edit_plan.matches(content):
+        edit_plan = build_cleanup_edit_plan(content, cleanup_plan)
     
-    # 收集所有删除操作并按全局位置排序
-    all_removals = []
+    print(f"准备删除 {len(edit_plan)} 个人口单位...")
     
-    for province_mod in cleanup_plan['modifications']:
-        province_start = province_mod['province_start']
-        
-        for pop_mod in province_mod['pops_to_remove']:
-            # 计算全局位置 - 修正错误的位置计算
-            global_line_start = province_start + pop_mod['line_start']
-            global_line_end = province_start + pop_mod['line_end']
-            
-            all_removals.append({
-                'global_start': global_line_start,
-                'global_end': global_line_end,
-                'pop_type': pop_mod['pop_type'],
-                'culture': pop_mod['culture']
-            })
-    
-    # 按全局位置从后往前排序，避免位置偏移
-    all_removals.sort(key=lambda x: x['global_start'], reverse=True)
-    
-    print(f"准备删除 {len(all_removals)} 个人口单位...")
-    
-    for i, removal in enumerate(all_removals):
-        start_pos = removal['global_start']
-        end_pos = removal['global_end']
-        
-        # 验证删除内容
-        to_delete = modified_content[start_pos:end_pos]
-        expected_type = removal['pop_type']
-        
-        if expected_type not in to_delete:
-            print(f"警告: 删除位置不匹配 {expected_type} at {start_pos}-{end_pos}")
-            continue
-        
-        # 执行删除
-        modified_content = modified_content[:start_pos] + modified_content[end_pos:]
-        total_removed += 1
-        
-        if (i + 1) % 100 == 0:
-            print(f"  进度: {i + 1}/{len(all_removals)}")
+    # 编辑计划按位置一次拼接，删除区域验证失败的会被跳过
+    modified_content = edit_plan.apply(content)
+    total_removed = edit_plan.applied_count
     
     print(f"完成! 删除了 {total_removed} 个人口单位")
     return modified_content
 
+def compact_population_ids(content):
+    """删除人口后重新连续编号人口ID，同时改写军队中的人口引用与 start_pop_index"""
+    result = plan_pop_id_compaction(content)
+    print_compaction_report(result['report'])
+    return result['edit_plan'].apply(content)
+
 def check_bracket_balance(content):
     """检查花括号平衡"""
     open_count = content.count('{')
@@ -450,18 +452,8 @@ def check_bracket_balance(content):
     return difference == -1  # Victoria II 通常期望 -1
 
 def create_backup(filename):
-    """创建备份文件"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f"{filename}.backup_{timestamp}"
-    
-    try:
-        import shutil
-        shutil.copy2(filename, backup_filename)
-        print(f"备份创建成功: {backup_filename}")
-        return backup_filename
-    except Exception as e:
-        print(f"备份创建失败: {e}")
-        return None
+    """创建备份（存入去重压缩的备份仓库），返回备份ID"""
+    return backup_save(filename, "population_cleanup")
 
 def save_modified_file(filename, content, cleanup_plan):
     """保存修改后的文件"""
@@ -562,6 +554,7 @@ def execute_with_confirmation(filename, content, cleanup_plan, primary_culture,
     # 执行清理
     print("\n开始执行人口清理...")
     modified_content = execute_population_cleanup(content, cleanup_plan)
+    modified_content = compact_population_ids(modified_content)
     
     # 保存文件
     if save_modified_file(filename, modified_content, cleanup_plan):
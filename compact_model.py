@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑数据模型工具
+===================================
+slotted_dataclass: 生成带 __slots__ 的 dataclass，实例不再携带 __dict__，
+属性访问方式不变；解析出几十万个人口/省份对象时可显著减少内存。
+(Python 3.10 起等价于 dataclass(slots=True)，这里兼容更早的版本。)
+
+to_json_data: 按 dataclasses.fields 递归转换为可JSON序列化的数据，不经过 __dict__。
+
+    @slotted_dataclass
+    class PopulationData(JsonRecord):
+        size: int = 0
+
+    PopulationData(size=5).to_json()      # {'size': 5}
+"""
+
+import dataclasses
+from enum import Enum
+from typing import Any, Callable
+
+
+class JsonRecord:
+    """为数据类提供 to_json()；本身不带实例属性，不影响子类的 __slots__"""
+    __slots__ = ()
+
+    def to_json(self) -> Any:
+        return to_json_data(self)
+
+
+def _add_slots(cls: type) -> type:
+    """按字段重建类并加上 __slots__ (与 dataclasses 在 3.10 中的做法相同)"""
+    field_names = tuple(f.name for f in dataclasses.fields(cls))
+    cls_dict = dict(cls.__dict__)
+    cls_dict['__slots__'] = field_names
+    for name in field_names:
+        # 默认值已保存在生成的 __init__ 中，类属性会与 slot 描述符冲突
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    qualname = getattr(cls, '__qualname__', None)
+    cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    if qualname is not None:
+        cls.__qualname__ = qualname
+    return cls
+
+
+def slotted_dataclass(cls: type = None, **options) -> Any:
+    """@dataclass 的带 __slots__ 版本；支持 @slotted_dataclass 与 @slotted_dataclass(...) 两种写法"""
+    def wrap(cls: type) -> type:
+        return _add_slots(dataclasses.dataclass(cls, **options))
+
+    if cls is None:
+        return wrap
+    return wrap(cls)
+
+
+def to_json_data(obj: Any, default: Callable[[Any], Any] = str) -> Any:
+    """递归转换为 JSON 兼容的数据；无法识别的对象交给 default 处理"""
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: to_json_data(getattr(obj, f.name), default) for f in dataclasses.fields(obj)}
+    if isinstance(obj, dict):
+        return {key: to_json_data(value, default) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [to_json_data(item, default) for item in obj]
+    if isinstance(obj, Enum):
+        return obj.value
+    return default(obj)
@@ -3,15 +3,23 @@ Victoria II 存档人口属性详细分析器
 全面分析存档文件中人口块的各种属性，包括它们的含义、取值范围和分布情况
 """
 
+import itertools
+import random
 import re
-import json
 from collections import defaultdict, Counter
-from typing import Dict, List, Tuple, Any
+from typing import Dict, Iterator, List, Tuple, Any
 import statistics
 
+from categorical import CULTURES, RELIGIONS, CategoricalColumn
+from sampling import SaveSampler, plain_result, print_sample_report
+from stream_export import NDJSONWriter, save_json_stream
+
+# 以分类编码列统计的文本属性
+CATEGORICAL_ATTRIBUTES = {'cultures': CULTURES, 'religions': RELIGIONS}
+
 class ComprehensivePopulationAnalyzer:
-    def __init__(self, save_file: str):
-        """初始化分析器"""
+    def __init__(self, save_file: str, load: bool = True):
+        """初始化分析器 (load=False 时不读取文件，由调用方提供人口块)"""
         self.save_file = save_file
         self.content = ""
         self.pop_attributes = defaultdict(list)
@@ -44,7 +52,8 @@ class ComprehensivePopulationAnalyzer:
             'life_needs': '生存需求 - 基本生存需求满足度（0-1）'
         }
         
-        self.load_file()
+        if load:
+            self.load_file()
     
     def load_file(self):
         """加载存档文件"""
@@ -63,8 +72,12 @@ class ComprehensivePopulationAnalyzer:
         Returns:
             List[Tuple[str, str, str]]: [(人口类型, 人口块内容, 省份ID), ...]
         """
-        population_blocks = []
-        
+        population_blocks = list(self.iter_population_blocks())
+        print(f"✅ 总计找到 {len(population_blocks)} 个人口块")
+        return population_blocks
+    
+    def iter_population_blocks(self) -> Iterator[Tuple[str, str, str]]:
+        """逐个产生人口块 (人口类型, 人口块内容, 省份ID)，不保留已产生的块"""
         # 查找所有省份
         province_pattern = re.compile(r'^(\d+)=\s*{', re.MULTILINE)
         province_matches = list(province_pattern.finditer(self.content))
@@ -96,14 +109,11 @@ class ComprehensivePopulationAnalyzer:
                 
                 for match in matches:
                     pop_block = match.group(1)
-                    population_blocks.append((pop_type, pop_block, province_id))
+                    yield pop_type, pop_block, province_id
             
             # 进度显示
             if (i + 1) % 500 == 0:
                 print(f"已处理 {i + 1}/{len(province_matches)} 个省份...")
-        
-        print(f"✅ 总计找到 {len(population_blocks)} 个人口块")
-        return population_blocks
     
     def extract_attributes_from_block(self, pop_block: str) -> Dict[str, Any]:
         """从人口块中提取所有属性
@@ -193,7 +203,26 @@ class ComprehensivePopulationAnalyzer:
         
         # 获取所有人口块
         population_blocks = self.find_all_population_blocks()
-        
+        return self.analyze_population_blocks(population_blocks)
+    
+    def analyze_sampled_populations(self, sample_size: int = None, time_budget: float = None,
+                                    seed: int = None) -> Dict[str, Any]:
+        """抽样近似分析: 按省份所有者分层随机抽取人口块 (样本量/时间预算)，
+        对样本做同样的属性分析，并在 'sampling' 中附带总量、均值和占比的置信区间"""
+        # 未指定种子时在此确定一个，估计与属性分析的两次抽样顺序才相同
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        sampler = SaveSampler(self.save_file, self.content)
+        estimates = sampler.estimate('pop', 'stratified', sample_size, time_budget, seed=seed)
+        # 同一种子的抽样顺序相同，属性分析使用与估计相同的样本
+        sampled = itertools.islice(sampler.iter_sampled_pops('stratified', seed), estimates['sample_size'])
+        analysis_result = self.analyze_population_blocks(list(sampled))
+        if analysis_result:
+            analysis_result['sampling'] = dict(estimates, seed=seed)
+        return analysis_result
+    
+    def analyze_population_blocks(self, population_blocks: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+        """分析给定的人口块 [(人口类型, 人口块内容, 省份ID), ...]"""
         if not population_blocks:
             print("❌ 未找到任何人口块")
             return {}
@@ -219,6 +248,13 @@ class ComprehensivePopulationAnalyzer:
                 if isinstance(attr_value, (int, float)):
                     pop_type_stats[pop_type]['attributes'][attr_name].append(attr_value)
                     global_stats[attr_name].append(attr_value)
+                elif attr_name in CATEGORICAL_ATTRIBUTES:
+                    # 文化/宗教按编码列存储
+                    for stats in (pop_type_stats[pop_type]['attributes'], global_stats):
+                        column = stats.get(attr_name)
+                        if column is None:
+                            column = stats[attr_name] = CategoricalColumn(CATEGORICAL_ATTRIBUTES[attr_name])
+                        column.extend(attr_value)
                 elif isinstance(attr_value, list):
                     pop_type_stats[pop_type]['attributes'][attr_name].extend(attr_value)
                     global_stats[attr_name].extend(attr_value)
@@ -248,7 +284,16 @@ class ComprehensivePopulationAnalyzer:
             if not values:
                 continue
                 
-            if all(isinstance(v, (int, float)) for v in values):
+            if isinstance(values, CategoricalColumn):
+                value_counts = values.value_counts()
+                analysis_result['attribute_analysis'][attr_name] = {
+                    'type': 'categorical',
+                    'count': len(values),
+                    'unique_values': len(value_counts),
+                    'most_common': value_counts.most_common(10)
+                }
+            
+            elif all(isinstance(v, (int, float)) for v in values):
                 # 数值属性分析
                 analysis_result['attribute_analysis'][attr_name] = {
                     'type': 'numeric',
@@ -327,33 +372,61 @@ class ComprehensivePopulationAnalyzer:
     def save_analysis_to_file(self, analysis_result: Dict[str, Any], output_file: str = "population_analysis.json"):
         """保存分析结果到文件"""
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(analysis_result, f, indent=2, ensure_ascii=False)
+            save_json_stream(analysis_result, output_file)
             print(f"\n💾 分析结果已保存到: {output_file}")
         except Exception as e:
             print(f"❌ 保存失败: {e}")
+    
+    def export_population_ndjson(self, output_file: str) -> int:
+        """边查找边导出每个人口块的属性，每行一条记录，返回记录数"""
+        with NDJSONWriter(output_file) as writer:
+            for pop_type, pop_block, province_id in self.iter_population_blocks():
+                record = {'province_id': int(province_id), 'pop_type': pop_type}
+                record.update(self.extract_attributes_from_block(pop_block))
+                writer.write(record)
+        print(f"💾 已导出 {writer.count} 个人口块到: {output_file}")
+        return writer.count
 
 def main():
     """主函数"""
     import sys
     
-    if len(sys.argv) != 2:
-        print("用法: python comprehensive_population_analyzer.py <存档文件.v2>")
+    args = [arg for arg in sys.argv[1:] if arg != '--pops-ndjson']
+    approximate = {}
+    for option, name, convert in (('--sample', 'sample_size', int), ('--time', 'time_budget', float)):
+        if option in args:
+            position = args.index(option)
+            approximate[name] = convert(args[position + 1])
+            del args[position:position + 2]
+    if len(args) != 1:
+        print("用法: python comprehensive_population_analyzer.py <存档文件.v2> [--pops-ndjson] [--sample N] [--time 秒]")
         print("示例: python comprehensive_population_analyzer.py ChinaUseIt.v2")
+        print("  --pops-ndjson  同时将每个人口块导出为 <存档>_pops.ndjson")
+        print("  --sample N     近似模式: 分层随机抽取 N 个人口块分析，附带置信区间")
+        print("  --time 秒      近似模式: 在给定时间内尽量多地抽样")
         return
     
-    save_file = sys.argv[1]
+    save_file = args[0]
     
     try:
         # 创建分析器
         analyzer = ComprehensivePopulationAnalyzer(save_file)
         
+        if '--pops-ndjson' in sys.argv:
+            analyzer.export_population_ndjson(f"{save_file}_pops.ndjson")
+        
         # 执行分析
-        result = analyzer.analyze_all_populations()
+        if approximate:
+            result = analyzer.analyze_sampled_populations(**approximate)
+        else:
+            result = analyzer.analyze_all_populations()
         
         if result:
             # 打印报告
             analyzer.print_analysis_report(result)
+            if 'sampling' in result:
+                print_sample_report(result['sampling'])
+                result['sampling'] = plain_result(result['sampling'])
             
             # 保存结果
             output_file = f"{save_file}_comprehensive_analysis.json"
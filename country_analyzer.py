@@ -10,12 +10,14 @@ import json
 from typing import Dict, List, Optional, Tuple, Any
 from collections import defaultdict, Counter
 from bracket_parser import Victoria2BracketParser, BracketBlock
+from field_schema import DEFAULT_SCHEMA, FieldSchema
 
 class Victoria2CountryAnalyzer:
     """Victoria II 国家块分析器"""
     
-    def __init__(self, file_path: str = None, debug_mode: bool = False):
+    def __init__(self, file_path: str = None, debug_mode: bool = False, schema: FieldSchema = DEFAULT_SCHEMA):
         self.content = ""
+        self.schema = schema
         self.file_path = file_path
         self.parser = Victoria2BracketParser()
         self.structure = None
@@ -301,15 +303,13 @@ class Victoria2CountryAnalyzer:
                     if len(stats['value_examples']) < 10:
                         stats['value_examples'].append(f"{country_tag}={value}")
                     
-                    # 按类型分类
-                    if self._is_numeric_value(value):
-                        try:
-                            numeric_val = float(value)
-                            stats['numeric_values'].append(numeric_val)
-                        except:
-                            pass
-                    elif self._is_block_value(value):
+                    # 按字段类型表分类
+                    if self._is_block_value(value):
                         stats['block_values'].append(value)
+                        continue
+                    decoded = self.schema.decode(field_name, value)
+                    if isinstance(decoded, (int, float)) and not isinstance(decoded, bool):
+                        stats['numeric_values'].append(float(decoded))
                     else:
                         stats['string_values'].append(value)
             
@@ -392,14 +392,6 @@ class Victoria2CountryAnalyzer:
         
         return f"{lines[0]} | ... | {lines[-1]} ({len(lines)} items)"
     
-    def _is_numeric_value(self, value: str) -> bool:
-        """判断值是否为数值"""
-        try:
-            float(value)
-            return True
-        except:
-            return False
-    
     def _is_block_value(self, value: str) -> bool:
         """判断值是否为块值"""
         return value.startswith('{')
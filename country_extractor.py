@@ -7,12 +7,13 @@ Based on the country-finding code from victoria2_main_modifier.py
 """
 
 import re
-import json
 import os
 import glob
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from stream_export import save_json_stream
+
 class Victoria2CountryExtractor:
     def __init__(self, file_path: str):
         """初始化国家提取器"""
@@ -306,8 +307,7 @@ class Victoria2CountryExtractor:
             output_file = f"countries_{base_name}_{timestamp}.json"
         
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            save_json_stream(data, output_file)
             print(f"💾 数据已保存到: {output_file}")
             return output_file
         except Exception as e:
@@ -12,11 +12,12 @@ Victoria II Country Query Tool
 4. python country_query.py codes - 显示所有国家代码
 """
 
-import json
 import sys
 import os
 from typing import Dict, List, Optional
 
+from snapshot import load_document
+
 class CountryQuery:
     def __init__(self):
         self.data = None
@@ -32,8 +33,8 @@ class CountryQuery:
         latest_file = max(json_files, key=lambda x: os.path.getmtime(x))
         print(f"📁 使用数据文件: {latest_file}")
         
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            self.data = json.load(f)
+        # 旁边有最新的快照时直接打开，否则读取JSON并生成快照
+        self.data = load_document(latest_file)
     
     def query_country(self, tag: str) -> Optional[Dict]:
         """查询特定国家"""
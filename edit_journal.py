@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档编辑日志
+===================================
+记录每一次应用到存档内容上的编辑（位置、旧文本、新文本、操作名称），
+保存在存档旁的日志文件 (<存档>.journal) 中，每个操作一行。
+
+- undo(operation): 撤销最近一次该操作的全部编辑，并记录一个补偿操作
+- revert_to(step): 回退到第step个操作完成时的状态，并截断之后的日志
+
+撤销只需回放逆向编辑，开销与编辑量相当，不需要整份备份文件。
+同一操作内的编辑若按位置单调（修改器中"从后往前处理"的写法即是如此），
+可一次拼接完成全部逆向编辑。
+"""
+
+import difflib
+import functools
+import hashlib
+import json
+import os
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from backup_store import atomic_write_bytes
+
+JOURNAL_SUFFIX = ".journal"
+
+# 编辑区域超过该长度（或跨行）时按行拆分为更小的编辑
+SPLIT_THRESHOLD = 512
+
+LAYOUT_DESCENDING = "descending"    # 编辑位置从后往前，互不重叠
+LAYOUT_ASCENDING = "ascending"      # 编辑位置从前往后，互不重叠
+LAYOUT_SEQUENTIAL = "sequential"    # 其他情况，只能逐条回放
+
+Edit = Tuple[int, str, str]  # (起始位置, 旧文本, 新文本)，位置为应用该编辑时的内容坐标
+
+
+def journal_path(save_path: str) -> str:
+    """获取存档对应的日志文件路径"""
+    return save_path + JOURNAL_SUFFIX
+
+
+def content_digest(content: str) -> str:
+    """计算存档内容的哈希"""
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_length(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def minimal_edits(start: int, old: str, new: str) -> List[Edit]:
+    """将一次区域替换拆分为最小的编辑列表（按位置从后往前排列）
+
+    先去掉公共前后缀；剩余区域较大或跨行时再按行比较，只保留变化的行。
+    """
+    prefix = _common_prefix_length(old, new)
+    suffix = _common_suffix_length(old, new, min(len(old), len(new)) - prefix)
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+    base = start + prefix
+
+    if old_mid == new_mid:
+        return []
+    if len(old_mid) <= SPLIT_THRESHOLD and len(new_mid) <= SPLIT_THRESHOLD and \
+            '\n' not in old_mid and '\n' not in new_mid:
+        return [(base, old_mid, new_mid)]
+
+    old_lines = old_mid.splitlines(keepends=True)
+    new_lines = new_mid.splitlines(keepends=True)
+    if len(old_lines) == len(new_lines):
+        opcodes = []
+        i = 0
+        while i < len(old_lines):
+            if old_lines[i] == new_lines[i]:
+                i += 1
+                continue
+            j = i
+            while j < len(old_lines) and old_lines[j] != new_lines[j]:
+                j += 1
+            opcodes.append((i, j, i, j))
+            i = j
+    else:
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        opcodes = [(i1, i2, j1, j2) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+    edits = []
+    offsets = [0]
+    for line in old_lines:
+        offsets.append(offsets[-1] + len(line))
+    for i1, i2, j1, j2 in opcodes:
+        edits.append((base + offsets[i1], ''.join(old_lines[i1:i2]), ''.join(new_lines[j1:j2])))
+    edits.reverse()
+    return edits
+
+
+def apply_spans(content: str, spans: List[Edit]) -> str:
+    """一次拼接应用一组按位置升序、互不重叠的替换 (位置, 期望的现有文本, 替换文本)"""
+    pieces = []
+    pos = 0
+    for start, current, replacement in spans:
+        if content[start:start + len(current)] != current:
+            raise ValueError(f"日志与内容不一致: 位置 {start}")
+        pieces.append(content[pos:start])
+        pieces.append(replacement)
+        pos = start + len(current)
+    pieces.append(content[pos:])
+    return ''.join(pieces)
+
+
+@dataclass
+class EditGroup:
+    """一个操作产生的全部编辑"""
+    step: int
+    operation: str
+    before_digest: str
+    after_digest: str = ""
+    created: str = ""
+    layout: str = LAYOUT_DESCENDING
+    undone: bool = False
+    edits: List[Edit] = field(default_factory=list)
+    undoes: Optional[int] = None    # 补偿操作 (undo:<操作>) 所撤销的操作序号
+
+    def classify_layout(self) -> str:
+        """判断编辑的排列方式"""
+        edits = self.edits
+        if all(edits[i][0] + len(edits[i][1]) <= edits[i - 1][0] for i in range(1, len(edits))):
+            return LAYOUT_DESCENDING
+        if all(edits[i][0] >= edits[i - 1][0] + len(edits[i - 1][2]) for i in range(1, len(edits))):
+            return LAYOUT_ASCENDING
+        return LAYOUT_SEQUENTIAL
+
+    def final_spans(self) -> Optional[List[Edit]]:
+        """操作完成后坐标下的编辑区域 (位置, 旧文本, 新文本)，按位置升序；无法归一时返回None"""
+        if self.layout == LAYOUT_ASCENDING:
+            return list(self.edits)
+        if self.layout == LAYOUT_DESCENDING:
+            spans = []
+            shift = 0
+            for start, old, new in reversed(self.edits):
+                spans.append((start + shift, old, new))
+                shift += len(new) - len(old)
+            return spans
+        return None
+
+    def invert(self, content: str) -> str:
+        """在操作完成后的内容上撤销本操作"""
+        spans = self.final_spans()
+        if spans is not None:
+            return apply_spans(content, [(start, new, old) for start, old, new in spans])
+
+        for start, old, new in reversed(self.edits):
+            if content[start:start + len(new)] != new:
+                raise ValueError(f"日志与内容不一致: 位置 {start}")
+            content = content[:start] + old + content[start + len(new):]
+        return content
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'step': self.step, 'op': self.operation, 'before': self.before_digest,
+            'after': self.after_digest, 'created': self.created, 'layout': self.layout,
+            'undone': self.undone, 'undoes': self.undoes, 'edits': self.edits,
+        }, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, line: str) -> 'EditGroup':
+        data = json.loads(line)
+        return cls(data['step'], data['op'], data['before'], data['after'], data['created'],
+                   data['layout'], data['undone'], [tuple(edit) for edit in data['edits']],
+                   data.get('undoes'))
+
+
+def _build_shift_table(group: EditGroup) -> Tuple[List[int], List[int], List[int]]:
+    """为操作建立坐标映射表：各编辑在操作前坐标下的起止位置及累计长度变化"""
+    spans = group.final_spans()
+    if spans is None:
+        raise ValueError(f"操作 #{group.step} ({group.operation}) 的编辑无法归一，请使用 revert_to")
+
+    before_starts = []
+    before_ends = []
+    shifts = [0]
+    for final_start, old, new in spans:
+        before_start = final_start - shifts[-1]
+        before_starts.append(before_start)
+        before_ends.append(before_start + len(old))
+        shifts.append(shifts[-1] + len(new) - len(old))
+    return before_starts, before_ends, shifts
+
+
+def _map_through(group: EditGroup, table: Tuple[List[int], List[int], List[int]],
+                 start: int, end: int) -> Tuple[int, int]:
+    """将操作前坐标的区域映射到操作后坐标；区域与该操作的编辑重叠时抛出ValueError"""
+    before_starts, before_ends, shifts = table
+    index = bisect_right(before_starts, start)
+    if (index > 0 and before_ends[index - 1] > start) or \
+            (index < len(before_starts) and before_starts[index] < end):
+        raise ValueError(f"之后的操作 #{group.step} ({group.operation}) 修改了相同区域，无法单独撤销")
+    return start + shifts[index], end + shifts[index]
+
+
+class EditJournal:
+    """存档编辑日志"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.groups: List[EditGroup] = []
+        self.current: Optional[EditGroup] = None
+        self._written = 0
+        self._needs_rewrite = False
+
+    @classmethod
+    def for_save(cls, save_path: str) -> 'EditJournal':
+        """读取存档旁的日志文件（不存在时为空日志）"""
+        journal = cls(journal_path(save_path))
+        if os.path.exists(journal.path):
+            with open(journal.path, 'r', encoding='utf-8') as f:
+                journal.groups = [EditGroup.from_json(line) for line in f if line.strip()]
+            journal._written = len(journal.groups)
+        return journal
+
+    @property
+    def in_operation(self) -> bool:
+        return self.current is not None
+
+    def attach(self, content: str):
+        """绑定当前内容；若日志记录的最终状态与内容不符（存档已被游戏或其他工具改写），清空日志"""
+        if self.groups and self.groups[-1].after_digest != content_digest(content):
+            print("⚠️ 编辑日志与存档内容不一致，重新开始记录")
+            self._reset()
+
+    def _reset(self):
+        self.groups = []
+        self._written = 0
+        self._needs_rewrite = True
+
+    # ========================================
+    # 记录
+    # ========================================
+
+    def begin(self, operation: str, content: str):
+        """开始记录一个操作"""
+        digest = content_digest(content)
+        if self.groups and self.groups[-1].after_digest != digest:
+            print("⚠️ 内容在日志之外被修改，重新开始记录")
+            self._reset()
+        step = self.groups[-1].step + 1 if self.groups else 1
+        self.current = EditGroup(step, operation, digest, created=datetime.now().isoformat())
+
+    def record(self, start: int, old: str, new: str):
+        """记录一次区域替换（自动拆分为最小编辑）"""
+        if self.current is not None:
+            self.current.edits.extend(minimal_edits(start, old, new))
+
+    def commit(self, content: str) -> Optional[EditGroup]:
+        """结束当前操作；没有任何编辑的操作不记录"""
+        group = self.current
+        self.current = None
+        if group is None or not group.edits:
+            return None
+        group.after_digest = content_digest(content)
+        group.layout = group.classify_layout()
+        self.groups.append(group)
+        return group
+
+    # ========================================
+    # 撤销与回退
+    # ========================================
+
+    def _check_head(self, content: str):
+        if self.current is not None:
+            raise ValueError("操作进行中，无法撤销")
+        if not self.groups or content_digest(content) != self.groups[-1].after_digest:
+            raise ValueError("编辑日志与当前内容不一致")
+
+    def undo(self, content: str, operation: str) -> str:
+        """撤销最近一次指定操作，返回新内容
+
+        撤销的编辑经过之后各操作的坐标映射后一次拼接完成，
+        并作为名为 undo:<操作> 的补偿操作记录到日志中。
+        """
+        self._check_head(content)
+        target = next((g for g in reversed(self.groups) if g.operation == operation and not g.undone), None)
+        if target is None:
+            raise ValueError(f"日志中没有可撤销的操作: {operation}")
+
+        spans = target.final_spans()
+        later_groups = [g for g in self.groups if g.step > target.step]
+        if spans is None and later_groups:
+            raise ValueError(f"操作 #{target.step} ({operation}) 的编辑无法归一，请使用 revert_to")
+
+        if spans is None:
+            new_content = target.invert(content)
+            inverse = [(start, new, old) for start, old, new in reversed(target.edits)]
+        else:
+            tables = [(group, _build_shift_table(group)) for group in later_groups]
+            inverse = []
+            for start, old, new in spans:
+                mapped_start, mapped_end = start, start + len(new)
+                for group, table in tables:
+                    mapped_start, mapped_end = _map_through(group, table, mapped_start, mapped_end)
+                inverse.append((mapped_start, new, old))
+            inverse.sort(key=lambda edit: edit[0])
+            new_content = apply_spans(content, inverse)
+            inverse.reverse()
+
+        step = self.groups[-1].step + 1
+        compensation = EditGroup(step, f"undo:{operation}", self.groups[-1].after_digest,
+                                 content_digest(new_content), datetime.now().isoformat(), edits=inverse,
+                                 undoes=target.step)
+        compensation.layout = compensation.classify_layout()
+        target.undone = True
+        self.groups.append(compensation)
+        self._needs_rewrite = True
+        return new_content
+
+    def revert_to(self, content: str, step: int) -> str:
+        """回退到第step个操作完成时的状态（step=0 表示回到日志开始前），返回新内容"""
+        self._check_head(content)
+        reverted = [g for g in self.groups if g.step > step]
+        if not reverted:
+            return content
+
+        for group in reversed(reverted):
+            content = group.invert(content)
+
+        # 被移除的补偿操作所撤销的操作恢复为未撤销
+        kept = [g for g in self.groups if g.step <= step]
+        for compensation in reversed(reverted):
+            target = self._compensated_group(compensation, kept)
+            if target is not None:
+                target.undone = False
+
+        self.groups = kept
+        self._needs_rewrite = True
+        return content
+
+    @staticmethod
+    def _compensated_group(compensation: EditGroup, groups: List[EditGroup]) -> Optional[EditGroup]:
+        """补偿操作所撤销的操作；旧日志没有 undoes 时取之前最近一次已撤销的同名操作"""
+        if not compensation.operation.startswith('undo:'):
+            return None
+        if compensation.undoes is not None:
+            return next((g for g in groups if g.step == compensation.undoes), None)
+        operation = compensation.operation[len('undo:'):]
+        return next((g for g in reversed(groups)
+                     if g.step < compensation.step and g.operation == operation and g.undone), None)
+
+    # ========================================
+    # 持久化
+    # ========================================
+
+    def flush(self, path: str = None):
+        """写入日志文件；路径变化或历史被改写时整体重写，否则只追加新操作"""
+        if path is not None and path != self.path:
+            self.path = path
+            self._needs_rewrite = True
+
+        if self._needs_rewrite:
+            data = ''.join(group.to_json() + '\n' for group in self.groups)
+            atomic_write_bytes(self.path, data.encode('utf-8'))
+            self._needs_rewrite = False
+        elif self._written < len(self.groups):
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for group in self.groups[self._written:]:
+                    f.write(group.to_json() + '\n')
+        self._written = len(self.groups)
+
+    def summary(self) -> List[str]:
+        """日志中各操作的摘要"""
+        lines = []
+        for group in self.groups:
+            changed = sum(len(new) for _, _, new in group.edits)
+            status = " (已撤销)" if group.undone else ""
+            lines.append(f"#{group.step:<3} {group.operation:<20} {len(group.edits):>7} 处编辑, "
+                         f"{changed:>10,} 字符  {group.created}{status}")
+        return lines
+
+
+def journaled(operation: str) -> Callable:
+    """装饰器：将修改方法执行期间的所有编辑记录为日志中的一个操作
+
+    被装饰对象需要有 journal (EditJournal 或 None) 与 content 属性；
+    嵌套调用时只有最外层方法开启记录。
+    """
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            journal = getattr(self, 'journal', None)
+            if journal is None or journal.in_operation:
+                return method(self, *args, **kwargs)
+            journal.begin(operation, self.content)
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                journal.commit(self.content)
+        return wrapper
+    return decorator
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档编辑计划
+===================================
+修改操作先生成编辑计划（区域替换列表，每处附带原因与所属块），
+预览时显示数量、受影响的块以及精确的结果大小，不复制也不修改内容；
+执行时直接应用同一份计划，一次拼接完成，不再重新分析。
+
+    plan = EditPlan("dead_countries", content)
+    plan.add(start, end, "", reason="删除国家块", block="ABC")
+    plan.preview()                  # 预览
+    content = plan.apply(content)   # 执行
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from edit_journal import content_digest, minimal_edits
+
+
+@dataclass
+class PlannedEdit:
+    """计划中的一处替换：content[start:end] → new_text"""
+    start: int
+    end: int
+    new_text: str
+    reason: str
+    block: str = ""
+    expect: str = ""  # 执行时要求原区域包含的文本，不包含则跳过该编辑
+
+    @property
+    def delta(self) -> int:
+        return len(self.new_text) - (self.end - self.start)
+
+
+class EditPlan:
+    """一个操作的编辑计划"""
+
+    def __init__(self, operation: str, content: str):
+        self.operation = operation
+        self.source_length = len(content)
+        self.source_digest = content_digest(content)
+        self.edits: List[PlannedEdit] = []
+        self.skipped: List[PlannedEdit] = []
+        self._sorted = True
+
+    def __len__(self) -> int:
+        return len(self.edits)
+
+    def matches(self, content: str) -> bool:
+        """计划是否基于该内容生成"""
+        return len(content) == self.source_length and content_digest(content) == self.source_digest
+
+    def add(self, start: int, end: int, new_text: str, reason: str, block: str = "", expect: str = ""):
+        """添加一处替换（位置均为计划所基于的原内容坐标）"""
+        if not 0 <= start <= end <= self.source_length:
+            raise ValueError(f"编辑区域越界: {start}-{end}")
+        if self.edits and start < self.edits[-1].start:
+            self._sorted = False
+        self.edits.append(PlannedEdit(start, end, new_text, reason, block, expect))
+
+    def add_replacement(self, start: int, old_text: str, new_text: str, reason: str, block: str = ""):
+        """添加一次区域改写，只保留实际变化的部分（按行拆分）"""
+        for edit_start, old, new in reversed(minimal_edits(start, old_text, new_text)):
+            self.add(edit_start, edit_start + len(old), new, reason, block)
+
+    # ========================================
+    # 预览
+    # ========================================
+
+    def sorted_edits(self) -> List[PlannedEdit]:
+        """按位置升序排列的编辑；区域重叠时抛出ValueError"""
+        if not self._sorted:
+            self.edits.sort(key=lambda edit: (edit.start, edit.end))
+            self._sorted = True
+        for previous, edit in zip(self.edits, self.edits[1:]):
+            if edit.start < previous.end:
+                raise ValueError(f"编辑区域重叠: {previous.start}-{previous.end} 与 {edit.start}-{edit.end}")
+        return self.edits
+
+    @property
+    def size_delta(self) -> int:
+        return sum(edit.delta for edit in self.edits)
+
+    @property
+    def resulting_size(self) -> int:
+        """执行后内容的精确大小（字符数）"""
+        return self.source_length + self.size_delta
+
+    def counts_by_reason(self) -> Dict[str, int]:
+        return dict(Counter(edit.reason for edit in self.edits))
+
+    def affected_blocks(self) -> List[str]:
+        """受影响的块（按首次出现顺序）"""
+        return list(dict.fromkeys(edit.block for edit in self.edits if edit.block))
+
+    def summary(self) -> Dict:
+        """计划摘要（可直接写入JSON报告）"""
+        blocks = self.affected_blocks()
+        return {
+            'operation': self.operation,
+            'edit_count': len(self.edits),
+            'by_reason': self.counts_by_reason(),
+            'affected_blocks': len(blocks),
+            'affected_block_names': blocks,
+            'source_size': self.source_length,
+            'resulting_size': self.resulting_size,
+            'size_delta': self.size_delta,
+        }
+
+    def preview(self, limit: int = 10):
+        """显示计划预览"""
+        blocks = self.affected_blocks()
+        print(f"📋 编辑计划 ({self.operation}): {len(self.edits)} 处编辑, 涉及 {len(blocks)} 个块")
+        for reason, count in sorted(self.counts_by_reason().items(), key=lambda x: x[1], reverse=True):
+            print(f"   • {reason}: {count} 处")
+        if blocks:
+            shown = ', '.join(blocks[:limit])
+            more = f" ... 还有 {len(blocks) - limit} 个" if len(blocks) > limit else ""
+            print(f"   受影响的块: {shown}{more}")
+        print(f"   大小: {self.source_length:,} → {self.resulting_size:,} 字符 ({self.size_delta:+,})")
+
+    # ========================================
+    # 执行
+    # ========================================
+
+    def apply(self, content: str) -> str:
+        """在计划所基于的内容上一次性应用全部编辑，返回新内容
+
+        设置了 expect 的编辑若原区域不包含该文本则跳过（记录在 skipped 中）。
+        """
+        if not self.matches(content):
+            raise ValueError("内容已变化，与编辑计划不一致，请重新规划")
+
+        self.skipped = []
+        pieces = []
+        pos = 0
+        for edit in self.sorted_edits():
+            if edit.expect and edit.expect not in content[edit.start:edit.end]:
+                print(f"⚠️ 编辑位置不匹配 {edit.expect} at {edit.start}-{edit.end}，跳过")
+                self.skipped.append(edit)
+                continue
+            pieces.append(content[pos:edit.start])
+            pieces.append(edit.new_text)
+            pos = edit.end
+        pieces.append(content[pos:])
+        return ''.join(pieces)
+
+    @property
+    def applied_count(self) -> int:
+        return len(self.edits) - len(self.skipped)
+
+
+def json_default(obj):
+    """json.dump 的 default 参数：编辑计划写为摘要"""
+    if isinstance(obj, EditPlan):
+        return obj.summary()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def reusable_preview(preview: Optional[Dict], content: str) -> Optional[Dict]:
+    """preview (之前 dry_run=True 的返回值) 含有与当前内容一致的编辑计划时返回它，否则返回 None"""
+    if not preview:
+        return None
+    edit_plan = preview.get('edit_plan')
+    if edit_plan is None or not edit_plan.matches(content):
+        return None
+    return preview
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档字段类型表
+===================================
+记录 键 → 类型 (int、float、date、yes/no、tag、string)，
+分词后按键直接解码，不再对每个值做 "是否数字 / 是否日期" 的猜测。
+
+内置类型表来自 population_enums (文化=宗教 行)、国家字段分析
+(country_fields_summary / country_analyzer) 以及已知的省份与人口字段；
+未登记的键仍按文本猜测类型。类型表可以从样本存档推断并更新:
+
+    python field_schema.py save1.v2 save2.v2 [--output field_schema.json] [--override]
+
+    schema = FieldSchema.load('field_schema.json')   # 在内置类型表基础上合并
+    schema.decode('money', '12.5')                   # → 12.5
+"""
+
+import json
+import re
+import sys
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Union
+
+from population_enums import Culture
+
+INT = 'int'
+FLOAT = 'float'
+DATE = 'date'
+BOOL = 'yes/no'
+TAG = 'tag'
+STRING = 'string'
+FIELD_TYPES = (INT, FLOAT, DATE, BOOL, TAG, STRING)
+
+DATE_PATTERN = re.compile(r'^\d{3,4}\.\d{1,2}\.\d{1,2}$')
+TAG_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+_INT_PATTERN = re.compile(r'-?\d+$')
+_FLOAT_PATTERN = re.compile(r'-?\d*\.\d+$')
+
+Scalar = Union[bool, int, float, str]
+
+# 顶级键
+TOP_LEVEL_FIELD_TYPES = {
+    'date': DATE, 'player': TAG, 'government': INT, 'automate_trade': BOOL,
+    'automate_sliders': INT, 'rebel': INT, 'unit': INT, 'state': INT,
+    'start_date': DATE, 'start_pop_index': INT,
+}
+
+# 国家块字段 (government 在国家块中是政体名称，与顶级键冲突，登记为 int 时解码失败会回退为字符串)
+COUNTRY_FIELD_TYPES = {
+    'tag': TAG, 'primary_culture': STRING, 'religion': STRING, 'nationalvalue': STRING,
+    'civilized': BOOL, 'human': BOOL, 'capital': INT, 'original_capital': INT,
+    'ruling_party': INT, 'active_party': INT, 'last_election': DATE,
+    'prestige': FLOAT, 'money': FLOAT, 'bank': FLOAT, 'debt': FLOAT, 'badboy': FLOAT,
+    'plurality': FLOAT, 'consciousness': FLOAT, 'nonstate_consciousness': FLOAT,
+    'literacy': FLOAT, 'non_state_culture_literacy': FLOAT, 'tax_eff': FLOAT, 'tax_base': FLOAT,
+    'leadership': FLOAT, 'research_points': FLOAT, 'diplomatic_points': FLOAT,
+    'colonial_points': FLOAT, 'war_exhaustion': FLOAT, 'suppression': FLOAT,
+    'school_reforms': STRING, 'health_care': STRING, 'safety_regulations': STRING,
+    'pensions': STRING, 'unemployment_subsidies': STRING, 'work_hours': STRING,
+}
+
+# 省份字段
+PROVINCE_FIELD_TYPES = {
+    'name': STRING, 'owner': TAG, 'controller': TAG, 'core': TAG,
+    'garrison': FLOAT, 'life_rating': INT, 'colonial': INT, 'crime': INT,
+}
+
+# 人口字段；"文化=宗教" 行以文化名为键
+POP_FIELD_TYPES = {
+    'id': INT, 'size': INT, 'money': FLOAT, 'bank': FLOAT, 'con': FLOAT, 'mil': FLOAT,
+    'literacy': FLOAT, 'life_needs': FLOAT, 'everyday_needs': FLOAT, 'luxury_needs': FLOAT,
+    **{culture.value: STRING for culture in Culture},
+}
+
+
+def guess_scalar(token: str) -> Scalar:
+    """未登记键的回退：按文本猜测类型；带引号的值保持字符串"""
+    if token[:1] == '"':
+        return token[1:-1]
+    if token == 'yes':
+        return True
+    if token == 'no':
+        return False
+    if _INT_PATTERN.match(token):
+        return int(token)
+    if _FLOAT_PATTERN.match(token):
+        return float(token)
+    return token
+
+
+def _decode_bool(text: str) -> bool:
+    if text == 'yes':
+        return True
+    if text == 'no':
+        return False
+    raise ValueError(text)
+
+
+def _decode_text(text: str) -> str:
+    return text
+
+
+DECODERS: Dict[str, Callable[[str], Scalar]] = {
+    INT: int,
+    FLOAT: float,
+    DATE: _decode_text,
+    BOOL: _decode_bool,
+    TAG: _decode_text,
+    STRING: _decode_text,
+}
+
+
+def scalar_type(value: Scalar) -> str:
+    """已解码值对应的字段类型"""
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return INT
+    if isinstance(value, float):
+        return FLOAT
+    if DATE_PATTERN.match(value):
+        return DATE
+    if TAG_PATTERN.match(value):
+        return TAG
+    return STRING
+
+
+class FieldSchema:
+    """键 → 类型 的登记表"""
+
+    def __init__(self, types: Optional[Dict[str, str]] = None):
+        self.types: Dict[str, str] = {}
+        self._decoders: Dict[str, Callable[[str], Scalar]] = {}
+        if types:
+            self.update(types, override=True)
+
+    @classmethod
+    def default(cls) -> 'FieldSchema':
+        """内置类型表"""
+        types = {}
+        for table in (POP_FIELD_TYPES, PROVINCE_FIELD_TYPES, COUNTRY_FIELD_TYPES, TOP_LEVEL_FIELD_TYPES):
+            types.update(table)
+        return cls(types)
+
+    @classmethod
+    def load(cls, path: str, base: Optional['FieldSchema'] = None) -> 'FieldSchema':
+        """读取JSON类型表，合并到 base (默认为内置类型表) 之上"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        schema = cls(dict((base or cls.default()).types))
+        schema.update(data.get('fields', data), override=True)
+        return schema
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'created': datetime.now().isoformat(), 'fields': dict(sorted(self.types.items()))},
+                      f, ensure_ascii=False, indent=2)
+
+    def update(self, types: Dict[str, str], override: bool = False) -> Dict[str, str]:
+        """登记字段类型；override=False 时只添加未登记的键。返回实际变更的字段"""
+        changed = {}
+        for key, field_type in types.items():
+            if field_type not in DECODERS:
+                raise ValueError(f"未知字段类型: {key}={field_type} (可用: {', '.join(FIELD_TYPES)})")
+            if key in self.types and (not override or self.types[key] == field_type):
+                continue
+            self.types[key] = field_type
+            self._decoders[key] = DECODERS[field_type]
+            changed[key] = field_type
+        return changed
+
+    def type_of(self, key: str) -> Optional[str]:
+        return self.types.get(key)
+
+    def decode(self, key: str, token: str) -> Scalar:
+        """按登记的类型解码一个值 (token 可以带引号)；未登记或与类型不符时回退为猜测"""
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            return guess_scalar(token)
+        text = token[1:-1] if token[:1] == '"' else token
+        try:
+            return decoder(text)
+        except ValueError:
+            return guess_scalar(token)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.types
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+
+DEFAULT_SCHEMA = FieldSchema.default()
+
+
+# ========================================
+# 从样本存档推断
+# ========================================
+
+def observe_types(save_paths: Iterable[str]) -> Dict[str, Counter]:
+    """统计样本存档中每个键出现的值类型"""
+    from save_events import VALUE, iter_events
+
+    observed: Dict[str, Counter] = defaultdict(Counter)
+    untyped = FieldSchema()
+    for path in save_paths:
+        for event in iter_events(path, schema=untyped):
+            if event.kind == VALUE:
+                observed[event.key][scalar_type(event.value)] += 1
+    return observed
+
+
+def resolve_type(counts: Counter) -> str:
+    """由观察到的类型决定字段类型：整数与小数混合视为小数，其余取最常见的类型"""
+    if set(counts) <= {INT, FLOAT}:
+        return FLOAT if FLOAT in counts else INT
+    return counts.most_common(1)[0][0]
+
+
+def infer_schema(save_paths: Iterable[str]) -> Dict[str, str]:
+    """从样本存档推断 键 → 类型"""
+    return {key: resolve_type(counts) for key, counts in observe_types(save_paths).items()}
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print("用法: python field_schema.py <存档1.v2> [存档2.v2 ...] [--output field_schema.json] [--override]")
+        return
+
+    output = 'field_schema.json'
+    override = False
+    save_paths = []
+    i = 0
+    while i < len(args):
+        if args[i] == '--output':
+            output = args[i + 1]
+            i += 1
+        elif args[i] == '--override':
+            override = True
+        else:
+            save_paths.append(args[i])
+        i += 1
+
+    try:
+        schema = FieldSchema.load(output)
+        print(f"📂 已读取类型表: {output} ({len(schema)} 个字段)")
+    except FileNotFoundError:
+        schema = FieldSchema.default()
+        print(f"📂 使用内置类型表 ({len(schema)} 个字段)")
+
+    print(f"🔍 从 {len(save_paths)} 个存档推断字段类型...")
+    inferred = infer_schema(save_paths)
+    conflicts = {key: (schema.types[key], field_type) for key, field_type in inferred.items()
+                 if key in schema and schema.types[key] != field_type}
+    changed = schema.update(inferred, override=override)
+
+    print(f"   观察到 {len(inferred)} 个字段，更新 {len(changed)} 个")
+    for key, field_type in sorted(changed.items()):
+        print(f"   + {key}: {field_type}")
+    if conflicts and not override:
+        print(f"⚠️ {len(conflicts)} 个字段与已登记类型不同（使用 --override 覆盖）:")
+        for key, (registered, observed) in sorted(conflicts.items()):
+            print(f"   {key}: 已登记 {registered}，样本中多为 {observed}")
+
+    schema.save(output)
+    print(f"💾 类型表已保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,9 @@ import re
 import json
 from datetime import datetime
 
+from backup_store import backup_save
+from edit_plan import EditPlan, json_default
+
 def load_file_simple(filename):
     """简单文件加载"""
     encodings = ['latin1', 'utf-8', 'utf-8-sig']
@@ -64,7 +67,9 @@ def analyze_provinces_and_capitals(content):
         
         provinces_data[province_id] = {
             'name': province_name,
-            'owner': owner
+            'owner': owner,
+            'start': match.start(),
+            'end': end_pos
         }
         
         # 按国家分组
@@ -104,8 +109,8 @@ def analyze_provinces_and_capitals(content):
     print(f"分析完成: {len(countries_data)} 个国家, {len(provinces_data)} 个省份")
     return countries_data, provinces_data
 
-def plan_capital_protected_redistribution(countries_data, provinces_data):
-    """规划首都保护的重分配方案"""
+def plan_capital_protected_redistribution(countries_data, provinces_data, content=None):
+    """规划首都保护的重分配方案；提供 content 时同时生成编辑计划 (plan['edit_plan'])"""
     print("规划首都保护重分配方案...")
     
     plan = {
@@ -159,6 +164,9 @@ def plan_capital_protected_redistribution(countries_data, provinces_data):
                     })
                     plan['china_gains'] += 1
     
+    if content is not None:
+        plan['edit_plan'] = build_redistribution_edit_plan(content, plan, provinces_data)
+    
     return plan
 
 def display_redistribution_plan(plan, countries_data):
@@ -197,115 +205,97 @@ def display_redistribution_plan(plan, countries_data):
     if len(plan['transferred_provinces']) > 20:
         print(f"  ... 还有 {len(plan['transferred_provinces']) - 20} 个省份")
     
+    edit_plan = plan.get('edit_plan')
+    if edit_plan is not None:
+        print()
+        edit_plan.preview()
+    
     print(f"\n预览完成! 这将创建一个中国统一世界的格局。")
 
-def execute_redistribution(content, plan, provinces_data):
-    """执行实际的省份重分配"""
-    print("\n开始执行省份重分配...")
-    
-    modified_content = content
-    modifications_made = 0
-    
-    # 按照从后往前的顺序处理，避免位置偏移
-    transfers_by_position = []
-    
-    for transfer_info in plan['transferred_provinces']:
-        province_id = transfer_info['province_id']
-        
-        # 查找省份在文件中的位置
-        province_pattern = re.compile(rf'^{province_id}=\s*{{', re.MULTILINE)
-        match = province_pattern.search(content)
-        
-        if match:
-            start_pos = match.end()
-            
-            # 找到省份块的结束位置
-            next_province = re.search(r'\n\d+=\s*{', content[start_pos:start_pos+20000])
-            if next_province:
-                end_pos = start_pos + next_province.start()
-            else:
-                next_section = re.search(r'\n[a-z_]+=\s*{', content[start_pos:start_pos+20000])
-                if next_section:
-                    end_pos = start_pos + next_section.start()
-                else:
-                    end_pos = start_pos + 10000
-            
-            transfers_by_position.append({
-                'start': match.start(),
-                'end': end_pos,
-                'province_id': province_id,
-                'original_owner': transfer_info['original_owner']
-            })
-    
-    # 按位置从后往前排序
-    transfers_by_position.sort(key=lambda x: x['start'], reverse=True)
-    
-    print(f"找到 {len(transfers_by_position)} 个需要修改的省份")
-    
-    for i, transfer in enumerate(transfers_by_position):
-        province_id = transfer['province_id']
-        start_pos = transfer['start']
-        end_pos = transfer['end']
-        
-        province_content = modified_content[start_pos:end_pos]
-        original_owner = transfer['original_owner']
-        
-        # 修改拥有者
-        if re.search(r'owner="?[A-Z]{2,3}"?', province_content):
-            province_content = re.sub(
-                r'owner="?[A-Z]{2,3}"?',
-                'owner="CHI"',
-                province_content
-            )
-        else:
-            # 如果没有owner字段，在name后添加
-            province_content = re.sub(
-                r'(name="[^"]*")',
-                r'\1\n\towner="CHI"',
-                province_content
-            )
-        
-        # 修改控制者
-        if re.search(r'controller="?[A-Z]{2,3}"?', province_content):
+def transfer_province_content(province_content):
+    """生成转移给中国后的省份内容（修改拥有者、控制者并添加核心）"""
+    # 修改拥有者
+    if re.search(r'owner="?[A-Z]{2,3}"?', province_content):
+        province_content = re.sub(
+            r'owner="?[A-Z]{2,3}"?',
+            'owner="CHI"',
+            province_content
+        )
+    else:
+        # 如果没有owner字段，在name后添加
+        province_content = re.sub(
+            r'(name="[^"]*")',
+            r'\1\n\towner="CHI"',
+            province_content
+        )
+    
+    # 修改控制者
+    if re.search(r'controller="?[A-Z]{2,3}"?', province_content):
+        province_content = re.sub(
+            r'controller="?[A-Z]{2,3}"?',
+            'controller="CHI"',
+            province_content
+        )
+    else:
+        # 如果没有controller字段，在owner后添加
+        province_content = re.sub(
+            r'(owner="CHI")',
+            r'\1\n\tcontroller="CHI"',
+            province_content
+        )
+    
+    # 添加中国核心（如果还没有）
+    if 'core="CHI"' not in province_content:
+        if re.search(r'core="[A-Z]{2,3}"', province_content):
+            # 在最后一个core后面添加
             province_content = re.sub(
-                r'controller="?[A-Z]{2,3}"?',
-                'controller="CHI"',
-                province_content
+                r'(core="[A-Z]{2,3}"[^\n]*)',
+                r'\1\n\tcore="CHI"',
+                province_content,
+                count=1
             )
         else:
-            # 如果没有controller字段，在owner后添加
+            # 在controller后面添加
             province_content = re.sub(
-                r'(owner="CHI")',
-                r'\1\n\tcontroller="CHI"',
+                r'(controller="CHI")',
+                r'\1\n\tcore="CHI"',
                 province_content
             )
+    
+    return province_content
+
+def build_redistribution_edit_plan(content, plan, provinces_data):
+    """根据重分配方案生成编辑计划（不修改内容）"""
+    edit_plan = EditPlan('redistribution', content)
+    
+    for transfer_info in plan['transferred_provinces']:
+        province_id = transfer_info['province_id']
+        province = provinces_data.get(province_id)
+        if province is None or 'start' not in province:
+            continue
         
-        # 添加中国核心（如果还没有）
-        if 'core="CHI"' not in province_content:
-            if re.search(r'core="[A-Z]{2,3}"', province_content):
-                # 在最后一个core后面添加
-                province_content = re.sub(
-                    r'(core="[A-Z]{2,3}"[^\n]*)',
-                    r'\1\n\tcore="CHI"',
-                    province_content,
-                    count=1
-                )
-            else:
-                # 在controller后面添加
-                province_content = re.sub(
-                    r'(controller="CHI")',
-                    r'\1\n\tcore="CHI"',
-                    province_content
-                )
-        
-        # 更新内容
-        modified_content = modified_content[:start_pos] + province_content + modified_content[end_pos:]
-        modifications_made += 1
-        
-        if (i + 1) % 100 == 0:
-            print(f"  进度: {i + 1}/{len(transfers_by_position)}")
+        province_content = content[province['start']:province['end']]
+        new_content = transfer_province_content(province_content)
+        edit_plan.add_replacement(province['start'], province_content, new_content,
+                                  reason=f"转移给CHI <- {transfer_info['original_owner']}",
+                                  block=f"{province_id} {province['name']}")
     
-    print(f"完成! 修改了 {modifications_made} 个省份")
+    return edit_plan
+
+def execute_redistribution(content, plan, provinces_data):
+    """执行实际的省份重分配 - 直接应用规划时生成的编辑计划"""
+    print("\n开始执行省份重分配...")
+    
+    edit_plan = plan.get('edit_plan')
+    if edit_plan is None or not edit_plan.matches(content):
+        edit_plan = build_redistribution_edit_plan(content, plan, provinces_data)
+    
+    print(f"找到 {len(edit_plan.affected_blocks())} 个需要修改的省份")
+    
+    # 编辑计划按位置一次拼接
+    modified_content = edit_plan.apply(content)
+    
+    print(f"完成! 修改了 {len(edit_plan.affected_blocks())} 个省份")
     return modified_content
 
 def check_bracket_balance(content):
@@ -318,18 +308,8 @@ def check_bracket_balance(content):
     return difference == -1  # Victoria II 通常期望 -1
 
 def create_backup(filename):
-    """创建备份文件"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f"{filename}.backup_{timestamp}"
-    
-    try:
-        import shutil
-        shutil.copy2(filename, backup_filename)
-        print(f"备份创建成功: {backup_filename}")
-        return backup_filename
-    except Exception as e:
-        print(f"备份创建失败: {e}")
-        return None
+    """创建备份（存入去重压缩的备份仓库），返回备份ID"""
+    return backup_save(filename, "redistribution")
 
 def save_modified_file(filename, content, plan):
     """保存修改后的文件"""
@@ -365,7 +345,7 @@ def save_modified_file(filename, content, plan):
         }
         
         with open(report_filename, 'w', encoding='utf-8') as f:
-            json.dump(execution_report, f, ensure_ascii=False, indent=2)
+            json.dump(execution_report, f, ensure_ascii=False, indent=2, default=json_default)
         
         print(f"执行报告已保存: {report_filename}")
         return True
@@ -522,7 +502,7 @@ def save_redistribution_report(plan, filename_suffix=""):
     
     try:
         with open(report_filename, 'w', encoding='utf-8') as f:
-            json.dump(plan, f, ensure_ascii=False, indent=2)
+            json.dump(plan, f, ensure_ascii=False, indent=2, default=json_default)
         print(f"\n详细报告已保存: {report_filename}")
         return report_filename
     except Exception as e:
@@ -587,7 +567,7 @@ def main():
     countries_data, provinces_data = analyze_provinces_and_capitals(content)
     
     # 规划重分配
-    plan = plan_capital_protected_redistribution(countries_data, provinces_data)
+    plan = plan_capital_protected_redistribution(countries_data, provinces_data, content)
     
     if choice == 1:
         # 预览模式
@@ -9,6 +9,9 @@ import re
 import json
 from datetime import datetime
 
+from backup_store import backup_save
+from regiment_relink import plan_regiment_relink, print_relink_report
+
 def load_file_simple(filename):
     """加载文件"""
     try:
@@ -191,27 +194,23 @@ def fix_orphaned_army_references(content, orphaned_units, fix_method='remove'):
             else:
                 print(f"  警告: 无法验证删除内容 {unit['name']}")
     
-    elif fix_method == 'update':
-        # 方法2: 更新引用到有效的人口ID (这需要知道替代的ID)
-        print("更新方法暂未实现 - 需要确定替代的人口ID")
-        return content
+    elif fix_method in ('relink', 'update'):
+        # 方法2: 重新关联到同一国家仍然存在的士兵人口 (优先军队所在省份，不超额)
+        result = plan_regiment_relink(content, only_pop_ids=[unit['pop_id'] for unit in orphaned_units])
+        print_relink_report(result['report'])
+        modified_content = result['edit_plan'].apply(content)
+        total_fixed = result['edit_plan'].applied_count
+        for unit in result['relinked'][:10]:
+            print(f"  重新关联: {unit['name']} (人口ID: {unit['old_pop_id']} → {unit['new_pop_id']})")
+        if result['unassigned']:
+            print(f"  警告: {len(result['unassigned'])} 个单位没有可用的士兵人口，仍为孤立引用")
     
     print(f"修复完成! 处理了 {total_fixed} 个军队单位")
     return modified_content
 
 def create_backup(filename):
-    """创建备份文件"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f"{filename}.backup_army_fix_{timestamp}"
-    
-    try:
-        import shutil
-        shutil.copy2(filename, backup_filename)
-        print(f"备份创建成功: {backup_filename}")
-        return backup_filename
-    except Exception as e:
-        print(f"备份创建失败: {e}")
-        return None
+    """创建备份（存入去重压缩的备份仓库），返回备份ID"""
+    return backup_save(filename, "army_fix")
 
 def check_bracket_balance(content):
     """检查花括号平衡"""
@@ -257,9 +256,10 @@ def main():
     print(f"\n修复选项:")
     print("1. remove  - 删除包含孤立引用的军队单位")
     print("2. analyze - 仅分析，不修改文件")
+    print("3. relink  - 重新关联同一国家的士兵人口，保留军队")
     
     while True:
-        choice = input("\n请选择修复方法 (1/2 或 remove/analyze，默认: analyze): ").strip().lower()
+        choice = input("\n请选择修复方法 (1/2/3 或 remove/analyze/relink，默认: analyze): ").strip().lower()
         if not choice or choice in ['2', 'analyze']:
             print("仅进行分析，不修改文件")
             
@@ -282,13 +282,20 @@ def main():
             return
             
         elif choice in ['1', 'remove']:
+            fix_method = 'remove'
+            break
+        elif choice in ['3', 'relink']:
+            fix_method = 'relink'
             break
         else:
-            print("请输入 1、2、remove 或 analyze")
+            print("请输入 1、2、3、remove、analyze 或 relink")
     
     # 执行修复
-    print(f"\n警告: 即将删除 {len(orphaned_units)} 个军队单位")
-    print("这些单位引用了已删除的人口，保留它们会导致游戏崩溃")
+    if fix_method == 'remove':
+        print(f"\n警告: 即将删除 {len(orphaned_units)} 个军队单位")
+        print("这些单位引用了已删除的人口，保留它们会导致游戏崩溃")
+    else:
+        print(f"\n即将为 {len(orphaned_units)} 个军队单位重新关联士兵人口")
     
     confirm = input("\n确认执行修复? (yes/no): ").strip().lower()
     if confirm not in ['yes', 'y']:
@@ -301,7 +308,7 @@ def main():
         print("警告: 备份失败，但继续修复...")
     
     # 执行修复
-    modified_content = fix_orphaned_army_references(content, orphaned_units, 'remove')
+    modified_content = fix_orphaned_army_references(content, orphaned_units, fix_method)
     
     # 检查花括号平衡
     if not check_bracket_balance(modified_content):
@@ -319,7 +326,10 @@ def main():
         print(f"差异: {len(content) - len(modified_content):,} 字符")
         
         print(f"\n修复总结:")
-        print(f"- 删除了 {len(orphaned_units)} 个引用已删除人口的军队单位")
+        if fix_method == 'remove':
+            print(f"- 删除了 {len(orphaned_units)} 个引用已删除人口的军队单位")
+        else:
+            print(f"- 为引用已删除人口的军队单位重新关联了士兵人口，军队得以保留")
         print(f"- 花括号平衡正确")
         print(f"- 备份文件: {backup_file}")
         print(f"- 现在可以尝试在游戏中加载存档文件")
@@ -11,6 +11,8 @@ import json
 from datetime import datetime
 from typing import Dict, List
 
+from backup_store import BackupStore
+
 class CapitalConsistencyFixer:
     """首都一致性修复器"""
     
@@ -216,12 +218,11 @@ class CapitalConsistencyFixer:
         if backup_suffix is None:
             backup_suffix = f"before_capital_fix_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
-        # 创建备份
-        backup_filename = f"{self.filename}.{backup_suffix}.backup"
+        # 创建备份（存入去重压缩的备份仓库）
         try:
-            with open(backup_filename, 'w', encoding='latin1') as f:
-                f.write(self.original_content)
-            print(f"💾 备份创建: {backup_filename}")
+            store = BackupStore.for_save(self.filename)
+            backup_id = store.backup_bytes(self.original_content.encode('latin1'), self.filename, backup_suffix)
+            print(f"💾 备份创建: {backup_id}")
         except Exception as e:
             print(f"❌ 备份失败: {e}")
             return False
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 修改器性能度量
+===================================
+为修改器的各个阶段（加载、解析、索引、各项修改、验证、备份、保存）记录计时区间：
+耗时、峰值内存 (tracemalloc，可选)、区间内的计数器变化，
+以及可选的 cProfile 采样；结果可导出为JSON报告。
+
+进度通过限频的回调报告，代替逐省份打印。
+
+    metrics = Instrumentation(trace_memory=True)
+    metrics.profile('militancy')          # 对该操作采集 cProfile
+    with metrics.span('load'):
+        ...
+    metrics.progress('斗争性', done, total)
+    metrics.save_report()
+"""
+
+import cProfile
+import functools
+import io
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def print_progress(task: str, done: int, total: int):
+    """默认进度回调：在同一行刷新进度，完成时换行"""
+    percent = done / total * 100 if total else 100.0
+    end = "\n" if done >= total else ""
+    sys.stdout.write(f"\r  {task}: {done}/{total} ({percent:.1f}%)" + end)
+    sys.stdout.flush()
+
+
+class Instrumentation:
+    """计时区间、计数器与进度报告"""
+
+    def __init__(self, trace_memory: bool = False, progress_callback: Optional[ProgressCallback] = print_progress,
+                 progress_interval: float = 0.5, profile_top: int = 25):
+        self.trace_memory = trace_memory
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.profile_top = profile_top
+        self.created = datetime.now()
+        self.origin = time.perf_counter()
+        self.counters: Counter = Counter()
+        self.spans: List[Dict] = []
+        self.profiled: set = set()
+        self._stack: List[Dict] = []
+        self._profiling = False
+        self._owns_tracing = False
+        self._last_progress: Dict[str, float] = {}
+
+    # ========================================
+    # 计数器
+    # ========================================
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def set_counter(self, name: str, value: int):
+        self.counters[name] = value
+
+    # ========================================
+    # 计时区间
+    # ========================================
+
+    def profile(self, *names: str):
+        """对指定名称的区间采集 cProfile（下次进入时生效）"""
+        self.profiled.update(names)
+
+    @contextmanager
+    def span(self, name: str):
+        """记录一个计时区间；可嵌套，报告中以 "外层/内层" 表示路径"""
+        parent = self._stack[-1] if self._stack else None
+        path = f"{parent['path']}/{name}" if parent else name
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+        memory_start = 0
+        if tracemalloc.is_tracing():
+            memory_start, peak = tracemalloc.get_traced_memory()
+            # 重置前把当前峰值计入外层区间
+            if parent is not None:
+                parent['peak'] = max(parent['peak'], peak)
+            tracemalloc.reset_peak()
+
+        profiler = None
+        if name in self.profiled and not self._profiling:
+            profiler = cProfile.Profile()
+            self._profiling = True
+
+        frame = {'path': path, 'memory_start': memory_start, 'peak': 0, 'counters': Counter(self.counters)}
+        self._stack.append(frame)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield frame
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            duration = time.perf_counter() - start
+            self._stack.pop()
+
+            record = {
+                'name': name,
+                'path': path,
+                'start': round(start - self.origin, 6),
+                'duration': round(duration, 6),
+            }
+            if tracemalloc.is_tracing():
+                frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                record['peak_memory_mb'] = round((frame['peak'] - memory_start) / 1024 / 1024, 3)
+                if parent is not None:
+                    parent['peak'] = max(parent['peak'], frame['peak'])
+            changed = {key: value - frame['counters'].get(key, 0) for key, value in self.counters.items()
+                       if value != frame['counters'].get(key, 0)}
+            if changed:
+                record['counters'] = changed
+            if profiler is not None:
+                record['profile'] = self._format_profile(profiler)
+            self.spans.append(record)
+
+            if not self._stack and self._owns_tracing:
+                tracemalloc.stop()
+                self._owns_tracing = False
+
+    def _format_profile(self, profiler: cProfile.Profile) -> str:
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(self.profile_top)
+        return stream.getvalue()
+
+    # ========================================
+    # 进度
+    # ========================================
+
+    def progress(self, task: str, done: int, total: int):
+        """报告进度；同一任务每 progress_interval 秒最多回调一次，完成时总会回调"""
+        if self.progress_callback is None:
+            return
+        now = time.perf_counter()
+        if done < total and now - self._last_progress.get(task, 0.0) < self.progress_interval:
+            return
+        self._last_progress[task] = now
+        self.progress_callback(task, done, total)
+
+    # ========================================
+    # 报告
+    # ========================================
+
+    def totals(self) -> Dict[str, Dict]:
+        """按区间路径汇总次数与总耗时"""
+        totals: Dict[str, Dict] = {}
+        for record in sorted(self.spans, key=lambda record: record['start']):
+            entry = totals.setdefault(record['path'], {'count': 0, 'total_time': 0.0})
+            entry['count'] += 1
+            entry['total_time'] = round(entry['total_time'] + record['duration'], 6)
+        return totals
+
+    def report(self) -> Dict:
+        return {
+            'created': self.created.isoformat(),
+            'elapsed': round(time.perf_counter() - self.origin, 6),
+            'trace_memory': self.trace_memory,
+            'counters': dict(self.counters),
+            'totals': self.totals(),
+            'spans': sorted(self.spans, key=lambda record: record['start']),
+        }
+
+    def save_report(self, path: str = None) -> str:
+        """将报告写入JSON文件，返回文件路径"""
+        if path is None:
+            path = f"metrics_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def print_summary(self):
+        """显示各阶段耗时汇总"""
+        print("⏱️ 阶段耗时:")
+        for path, entry in self.totals().items():
+            print(f"   {path:<32} {entry['total_time']:>9.3f} 秒  ({entry['count']} 次)")
+
+
+def instrumented(name: str) -> Callable:
+    """装饰器：将方法的执行记录为一个计时区间
+
+    被装饰对象需要有 metrics 属性 (Instrumentation 或 None)。
+    """
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = getattr(self, 'metrics', None)
+            if metrics is None:
+                return method(self, *args, **kwargs)
+            with metrics.span(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def counter_property(name: str) -> property:
+    """将实例属性映射到 metrics 计数器，兼容原有的 self.xxx_changes += n 写法"""
+    def getter(self) -> int:
+        return self.metrics.counters[name]
+
+    def setter(self, value: int):
+        self.metrics.set_counter(name, value)
+
+    return property(getter, setter, doc=f"计数器 {name}")
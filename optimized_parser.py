@@ -5,11 +5,14 @@
 专注于性能和稳定性
 """
 
+import os
 import re
 import json
-from typing import Dict, List, Any, Union
+from typing import Dict, Iterable, List, Any
 from dataclasses import dataclass, field
 
+from save_events import BEGIN, END, VALUE, SaveEvent, iter_events
+
 
 @dataclass
 class GameData:
@@ -31,226 +34,126 @@ class GameData:
 
 
 class OptimizedVictoria2Parser:
-    """优化的Victoria II存档解析器"""
-    
+    """优化的Victoria II存档解析器
+
+    基于 save_events 的事件流单次遍历存档，不构建完整的树，
+    内存占用只与结果大小有关，因此可以提取全部国家与省份。
+    """
+
+    BASIC_INFO_FIELDS = ('date', 'player', 'government', 'automate_trade', 'automate_sliders',
+                         'rebel', 'unit', 'state', 'start_date', 'start_pop_index')
+    COUNTRY_FIELDS = ('tax_base', 'capital', 'research_points')
+    PROVINCE_FIELDS = ('name', 'owner', 'controller')
+    WORLDMARKET_POOLS = ('worldmarket_pool', 'price_pool', 'supply_pool')
+    WORLDMARKET_SAMPLE_SIZE = 5
+    PROVINCE_SAMPLE_SIZE = 10   # sample_provinces (quick_analysis / analyze_data 读取) 的省份数
+
     def __init__(self):
-        self.content = ""
-        # 预编译正则表达式以提高性能
-        self.date_pattern = re.compile(r'^\d{3,4}\.\d{1,2}\.\d{1,2}$')
-        self.number_pattern = re.compile(r'^-?\d+\.?\d*$')
-        self.country_pattern = re.compile(r'^([A-Z]{3})=\s*{', re.MULTILINE)
+        self.country_pattern = re.compile(r'^[A-Z][A-Z0-9]{2}$')
         
     def parse_file(self, filename: str) -> GameData:
         """解析存档文件"""
         print(f"开始解析文件: {filename}")
         
-        # 读取文件
         try:
-            with open(filename, 'r', encoding='utf-8-sig', errors='ignore') as f:
-                self.content = f.read()
-        except Exception as e:
+            print(f"文件大小: {os.path.getsize(filename):,} 字节")
+        except OSError as e:
             print(f"文件读取错误: {e}")
             return GameData()
         
-        print(f"文件大小: {len(self.content):,} 字符")
-        
         # 创建游戏数据对象
         game_data = GameData()
         
-        # 提取基本信息
-        print("提取基本信息...")
-        self._extract_basic_info(game_data)
-        
-        # 提取标志
-        print("提取游戏标志...")
-        self._extract_flags(game_data)
-        
-        # 提取国家信息（解析所有国家）
-        print("提取国家信息...")
-        self._extract_countries(game_data, limit=None)
-        
-        # 提取省份信息（样本）
-        print("提取省份样本...")
-        self._extract_provinces_sample(game_data, limit=10)
-        
-        # 提取世界市场信息
-        print("提取世界市场信息...")
-        self._extract_worldmarket(game_data)
+        print("遍历存档事件流（基本信息、标志、国家、省份、世界市场）...")
+        try:
+            self._consume_events(game_data, iter_events(filename))
+        except OSError as e:
+            print(f"文件读取错误: {e}")
+            return GameData()
         
+        print(f"找到 {len(game_data.countries)} 个国家, {game_data.provinces.get('total_provinces', 0)} 个省份")
         print("解析完成!")
         return game_data
     
-    def _extract_basic_info(self, game_data: GameData):
-        """提取基本游戏信息"""
-        patterns = {
-            'date': r'date="([^"]+)"',
-            'player': r'player="([^"]+)"',
-            'government': r'government=(\d+)',
-            'automate_trade': r'automate_trade=(\w+)',
-            'automate_sliders': r'automate_sliders=(\d+)',
-            'rebel': r'rebel=(\d+)',
-            'unit': r'unit=(\d+)',
-            'state': r'state=(\d+)',
-            'start_date': r'start_date="([^"]+)"',
-            'start_pop_index': r'start_pop_index=(\d+)'
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, self.content)
-            if match:
-                value = match.group(1)
-                
-                # 类型转换
-                if key in ['government', 'automate_sliders', 'rebel', 'unit', 'state', 'start_pop_index']:
-                    setattr(game_data, key, int(value))
-                elif key == 'automate_trade':
-                    setattr(game_data, key, value == 'yes')
-                else:
-                    setattr(game_data, key, value)
-    
-    def _extract_flags(self, game_data: GameData):
-        """提取游戏标志"""
-        # 查找第一个flags块
-        flag_match = re.search(r'flags=\s*\{([^}]+(?:\{[^}]*\}[^}]*)*)\}', self.content, re.DOTALL)
-        if flag_match:
-            flag_content = flag_match.group(1)
-            # 提取所有 name=yes 格式的标志
-            flags = re.findall(r'(\w+)=yes', flag_content)
-            game_data.flags = flags
-    
-    def _extract_countries(self, game_data: GameData, limit: int = None):
-        """提取国家信息"""
-        matches = list(self.country_pattern.finditer(self.content))
-        print(f"找到 {len(matches)} 个国家")
-        
-        # 如果没有限制，处理所有国家
-        if limit is None:
-            limit = len(matches)
-        
-        for i, match in enumerate(matches[:limit]):
-            if i >= limit:
-                break
-                
-            tag = match.group(1)
-            start_pos = match.end()
-            
-            # 找到对应的结束位置（简化版本，适用于大多数情况）
-            end_pos = self.content.find('\n}', start_pos)
-            if end_pos == -1:
+    def _consume_events(self, game_data: GameData, events: Iterable[SaveEvent]):
+        """单次遍历事件流，按顶层块的类型分派"""
+        provinces: List[Dict] = []
+        handler = None
+        flags_done = False
+        
+        for event in events:
+            if event.path:
+                if handler is not None:
+                    handler(event)
                 continue
-                
-            country_content = self.content[start_pos:end_pos]
-            country_info = self._parse_country_info(country_content)
-            if country_info:
-                game_data.countries[tag] = country_info
-            
-            # 显示进度
-            if (i + 1) % 50 == 0:
-                print(f"已处理 {i + 1}/{len(matches)} 个国家...")
-    
-    def _parse_country_info(self, content: str) -> Dict:
-        """解析国家信息"""
-        info = {}
-        
-        # 提取数值信息
-        patterns = {
-            'tax_base': r'tax_base=([\d.]+)',
-            'capital': r'capital=(\d+)',
-            'research_points': r'research_points=([\d.]+)'
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, content)
-            if match:
-                value = match.group(1)
-                try:
-                    if '.' in value:
-                        info[key] = float(value)
-                    else:
-                        info[key] = int(value)
-                except ValueError:
-                    pass
-        
-        # 计算科技和标志数量
-        info['technology_count'] = len(re.findall(r'\w+={1 0\.000}', content))
-        info['flag_count'] = len(re.findall(r'\w+=yes', content))
-        
-        return info
-    
-    def _extract_provinces_sample(self, game_data: GameData, limit: int = 10):
-        """提取省份样本"""
-        # 查找省份模式 (数字ID)
-        province_pattern = re.compile(r'^(\d+)=\s*\{', re.MULTILINE)
-        matches = list(province_pattern.finditer(self.content))
-        
-        provinces = {}
-        
-        for i, match in enumerate(matches[:limit]):
-            province_id = int(match.group(1))
-            start_pos = match.end()
             
-            # 找到下一个省份或结束位置
-            next_match = matches[i + 1] if i + 1 < len(matches) else None
-            if next_match:
-                end_pos = next_match.start()
-            else:
-                end_pos = start_pos + 10000  # 限制搜索范围
-                
-            province_content = self.content[start_pos:end_pos]
-            province_info = self._parse_province_info(province_content)
-            province_info['id'] = province_id
-            provinces[str(province_id)] = province_info
+            if event.kind == VALUE:
+                if event.key in self.BASIC_INFO_FIELDS:
+                    setattr(game_data, event.key, event.value)
+            elif event.kind == BEGIN:
+                key = event.key or ''
+                if self.country_pattern.match(key):
+                    handler = self._country_handler(game_data.countries.setdefault(key, {
+                        'technology_count': 0, 'flag_count': 0}))
+                elif key.isdigit():
+                    province_info = {'id': int(key)}
+                    provinces.append(province_info)
+                    handler = self._province_handler(province_info)
+                elif key == 'flags' and not flags_done:
+                    flags_done = True
+                    handler = self._flags_handler(game_data.flags)
+                elif key == 'worldmarket':
+                    handler = self._worldmarket_handler(game_data.worldmarket)
+                else:
+                    handler = None
+            elif event.kind == END:
+                handler = None
         
         game_data.provinces = {
-            'total_provinces': len(matches),
-            'sample_provinces': list(provinces.values())
+            'total_provinces': len(provinces),
+            'provinces': provinces,
+            'sample_provinces': provinces[:self.PROVINCE_SAMPLE_SIZE]
         }
     
-    def _parse_province_info(self, content: str) -> Dict:
-        """解析省份信息"""
-        info = {}
-        
-        # 提取基本信息
-        patterns = {
-            'name': r'name="([^"]+)"',
-            'owner': r'owner="([^"]+)"',
-            'controller': r'controller="([^"]+)"'
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, content)
-            if match:
-                info[key] = match.group(1)
-        
-        return info
+    def _flags_handler(self, flags: List[str]):
+        """收集 name=yes 格式的标志"""
+        def handle(event: SaveEvent):
+            if event.kind == VALUE and len(event.path) == 1 and event.value is True:
+                flags.append(event.key)
+        return handle
     
-    def _extract_worldmarket(self, game_data: GameData):
-        """提取世界市场信息"""
-        wm_match = re.search(r'worldmarket=\s*\{', self.content)
-        if not wm_match:
-            return
-        
-        start_pos = wm_match.end()
-        # 查找世界市场块的结束（简化处理）
-        end_pos = self.content.find('\noverseas_penalty=', start_pos)
-        if end_pos == -1:
-            end_pos = start_pos + 50000  # 限制搜索范围
-        
-        wm_content = self.content[start_pos:end_pos]
-        
-        # 提取各个池的商品数量
-        pools = ['worldmarket_pool', 'price_pool', 'supply_pool']
-        wm_info = {}
-        
-        for pool_name in pools:
-            pool_match = re.search(f'{pool_name}=\\s*\\{{([^}}]+)\\}}', wm_content)
-            if pool_match:
-                pool_content = pool_match.group(1)
-                commodities = re.findall(r'(\w+)=([\d.]+)', pool_content)
-                wm_info[f'{pool_name}_commodities'] = len(commodities)
-                wm_info[f'{pool_name}_sample'] = dict(commodities[:5])
-        
-        game_data.worldmarket = wm_info
+    def _country_handler(self, info: Dict):
+        """收集国家的数值信息，并统计科技和标志数量"""
+        def handle(event: SaveEvent):
+            depth = len(event.path)
+            if event.kind == VALUE:
+                if depth == 1 and event.key in self.COUNTRY_FIELDS and isinstance(event.value, (int, float)):
+                    info[event.key] = event.value
+                if event.value is True:
+                    info['flag_count'] += 1
+            elif event.kind == BEGIN and depth == 2 and event.path[1] == 'technology':
+                info['technology_count'] += 1
+        return handle
+    
+    def _province_handler(self, info: Dict):
+        """收集省份的名称、拥有者和控制者"""
+        def handle(event: SaveEvent):
+            if event.kind == VALUE and len(event.path) == 1 and event.key in self.PROVINCE_FIELDS:
+                info.setdefault(event.key, str(event.value))
+        return handle
+    
+    def _worldmarket_handler(self, wm_info: Dict):
+        """统计各个池的商品数量并保留少量样本"""
+        def handle(event: SaveEvent):
+            if event.kind != VALUE or len(event.path) != 2 or event.path[1] not in self.WORLDMARKET_POOLS:
+                return
+            pool_name = event.path[1]
+            count_key = f'{pool_name}_commodities'
+            wm_info[count_key] = wm_info.get(count_key, 0) + 1
+            sample = wm_info.setdefault(f'{pool_name}_sample', {})
+            if len(sample) < self.WORLDMARKET_SAMPLE_SIZE:
+                sample[event.key] = event.value
+        return handle
     
     def save_to_json(self, game_data: GameData, output_file: str):
         """保存到JSON文件"""
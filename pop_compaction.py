@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 人口ID重新编号 (压缩)
+===================================
+删除人口后人口ID不再连续。本模块在一次扫描中找出:
+- 省份中每个人口块的 id (人口类型块的第一个字段)
+- 所有引用人口的 pop={ id=N type=46 } (军队中的团等)
+- 顶级的 start_pop_index (游戏为新人口分配ID的起点，即 GameData.start_pop_index)
+
+然后按人口在存档中出现的顺序重新编号为 1..N，同时改写所有引用，
+start_pop_index 改为 N+1。引用了不存在人口的ID (孤立引用) 不会与新ID冲突:
+它们被依次编号到 N 之后，并计入报告，可再用 regiment_relink.py 重新关联。
+
+    result = plan_pop_id_compaction(content)
+    result['edit_plan'].preview()
+    content = result['edit_plan'].apply(content)
+    result['mapping']       # 旧ID → 新ID
+
+    python pop_compaction.py <存档文件.v2> [--apply]
+"""
+
+import re
+import sys
+from typing import Dict, List, Tuple
+
+from edit_plan import EditPlan
+from population_enums import PopType
+
+POP_TYPE_NAMES = tuple(pop_type.value for pop_type in PopType)
+FIRST_POP_ID = 1
+
+# 人口块的id | 人口引用的id | start_pop_index
+_POP_ID_SITES = re.compile(
+    r'^[ \t]*(?:(?P<pop_type>' + '|'.join(POP_TYPE_NAMES) + r')|(?P<reference>pop))'
+    r'[ \t]*=[ \t\r\n]*\{[ \t\r\n]*id[ \t]*=[ \t]*(?P<id>\d+)'
+    r'|^start_pop_index[ \t]*=[ \t]*(?P<start>\d+)',
+    re.MULTILINE)
+
+
+def scan_pop_ids(content: str) -> Tuple[List[Tuple[int, int, int]], List[Tuple[int, int, int]], List[Tuple[int, int, int]]]:
+    """一次扫描: 返回人口块ID、人口引用ID与 start_pop_index 的 [(起点, 终点, 值), ...]"""
+    definitions = []
+    references = []
+    start_indexes = []
+    for match in _POP_ID_SITES.finditer(content):
+        if match.group('start') is not None:
+            start_indexes.append((match.start('start'), match.end('start'), int(match.group('start'))))
+        elif match.group('reference') is not None:
+            references.append((match.start('id'), match.end('id'), int(match.group('id'))))
+        else:
+            definitions.append((match.start('id'), match.end('id'), int(match.group('id'))))
+    return definitions, references, start_indexes
+
+
+def plan_pop_id_compaction(content: str, first_id: int = FIRST_POP_ID) -> Dict:
+    """生成人口ID压缩的编辑计划，返回 {'edit_plan', 'mapping', 'report'}"""
+    definitions, references, start_indexes = scan_pop_ids(content)
+
+    # 人口按出现顺序编号；重复的旧ID各自得到新ID，引用指向第一个
+    mapping: Dict[int, int] = {}
+    new_ids: List[int] = []
+    duplicates = 0
+    next_id = first_id
+    for _, _, old_id in definitions:
+        if old_id in mapping:
+            duplicates += 1
+        else:
+            mapping[old_id] = next_id
+        new_ids.append(next_id)
+        next_id += 1
+    pop_count = next_id - first_id
+
+    # 孤立引用编号到所有人口之后，保持孤立但不与任何人口冲突
+    dangling: Dict[int, int] = {}
+    for _, _, old_id in references:
+        if old_id not in mapping and old_id not in dangling:
+            dangling[old_id] = next_id
+            next_id += 1
+
+    edit_plan = EditPlan('pop_ids', content)
+    for (start, end, old_id), new_id in zip(definitions, new_ids):
+        if new_id != old_id:
+            edit_plan.add(start, end, str(new_id), reason='人口ID', expect=str(old_id))
+    for start, end, old_id in references:
+        new_id = mapping.get(old_id, dangling.get(old_id))
+        if new_id != old_id:
+            edit_plan.add(start, end, str(new_id), reason='人口引用', expect=str(old_id))
+    for start, end, old_start in start_indexes:
+        if next_id != old_start:
+            edit_plan.add(start, end, str(next_id), reason='start_pop_index', expect=str(old_start))
+
+    old_ids = [old_id for _, _, old_id in definitions]
+    report = {
+        'pops': pop_count,
+        'references': len(references),
+        'dangling_references': sum(1 for _, _, old_id in references if old_id in dangling),
+        'dangling_ids': len(dangling),
+        'duplicate_ids': duplicates,
+        'old_id_range': [min(old_ids), max(old_ids)] if old_ids else None,
+        'new_id_range': [first_id, first_id + pop_count - 1] if pop_count else None,
+        'old_start_pop_index': start_indexes[0][2] if start_indexes else None,
+        'start_pop_index': next_id,
+        'changed_ids': sum(1 for old_id, new_id in mapping.items() if old_id != new_id),
+    }
+    return {'edit_plan': edit_plan, 'mapping': mapping, 'dangling': dangling, 'report': report}
+
+
+def print_compaction_report(report: Dict):
+    print(f"\n🔢 人口ID压缩: {report['pops']:,} 个人口, {report['references']:,} 处引用")
+    if report['old_id_range']:
+        print(f"   ID范围: {report['old_id_range'][0]}-{report['old_id_range'][1]} → "
+              f"{report['new_id_range'][0]}-{report['new_id_range'][1]} (改号 {report['changed_ids']:,} 个)")
+    print(f"   start_pop_index: {report['old_start_pop_index']} → {report['start_pop_index']}")
+    if report['duplicate_ids']:
+        print(f"⚠️ 重复的人口ID: {report['duplicate_ids']} 个 (已分别编号，引用指向第一个)")
+    if report['dangling_references']:
+        print(f"⚠️ 孤立引用: {report['dangling_references']} 处 ({report['dangling_ids']} 个ID)，"
+              f"已编号到人口之后，可用 regiment_relink.py 重新关联")
+
+
+def main():
+    arguments = [argument for argument in sys.argv[1:] if argument != '--apply']
+    if len(arguments) != 1:
+        print("用法: python pop_compaction.py <存档文件.v2> [--apply]")
+        print("  不加 --apply 时只预览")
+        return
+
+    from victoria2_main_modifier import Victoria2Modifier
+
+    modifier = Victoria2Modifier()
+    if not modifier.load_file(arguments[0]):
+        return
+    result = modifier.compact_pop_ids(dry_run='--apply' not in sys.argv)
+    if '--apply' in sys.argv and result.get('applied'):
+        modifier.save_file(arguments[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 人口查询引擎
+===================================
+单次遍历存档事件流，把所有人口建成列式表 (PopTable):
+分类列 (人口类型、文化、宗教、所属国家) 以 categorical 编码存储，
+省份ID与数值列 (size、money、mil ...) 存为 array。
+
+查询 (PopQuery) 先用二级索引 (分类列与省份 → 行号) 求出等值条件的候选行，
+从最小的候选集开始，再在候选行上检查其余条件与数值范围，最后用堆取前N名，
+不再逐个正则扫描人口块后才过滤。
+
+LoadedSave 在建表的同一次遍历中记录顶级信息、国家与省份的简单字段，
+供查询服务 (query_server.py) 与时间序列存储 (timeseries_store.py) 共用。
+
+    table = PopTable.from_save('China1836_01_01.v2')
+    table.query().where(culture='beifaren', pop_type='farmers').between('money', 1000).rows()
+    table.query().order_by('money').limit(100).rows()            # 最富有的100个人口
+    table.top_provinces('mil', 10)                                # 斗争性最高的10个省份
+
+    python pop_query.py <存档文件.v2> [culture=beifaren] [money>=1000] [--top money 100] [--provinces mil 10]
+"""
+
+import heapq
+import math
+import os
+import re
+import sys
+import time
+from array import array
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from categorical import CULTURES, POP_TYPES, RELIGIONS, TAGS, CategoricalColumn
+from population_enums import PopType
+from save_events import BEGIN, END, VALUE, SaveEvent, iter_events, iter_text_events
+
+NUMERIC_COLUMNS = ('size', 'money', 'bank', 'literacy', 'con', 'mil',
+                   'life_needs', 'everyday_needs', 'luxury_needs')
+CATEGORICAL_COLUMNS = {'pop_type': POP_TYPES, 'culture': CULTURES, 'religion': RELIGIONS, 'owner': TAGS}
+INDEXED_COLUMNS = tuple(CATEGORICAL_COLUMNS) + ('province',)
+MISSING = math.nan  # 人口块中没有该字段
+POP_TYPE_NAMES = frozenset(pop_type.value for pop_type in PopType)
+COUNTRY_TAG_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+
+
+class PopTable:
+    """所有人口的列式表"""
+
+    def __init__(self):
+        self.ids = array('q')
+        self.provinces = array('l')
+        self.categorical: Dict[str, CategoricalColumn] = {
+            name: CategoricalColumn(categories) for name, categories in CATEGORICAL_COLUMNS.items()}
+        self.numeric: Dict[str, array] = {name: array('d') for name in NUMERIC_COLUMNS}
+        self.province_owners: Dict[int, str] = {}
+        self._indexes: Dict[str, Dict[int, array]] = {}
+
+    # ---------- 构建 ----------
+
+    @classmethod
+    def from_save(cls, save_path: str) -> 'PopTable':
+        return cls.from_events(iter_events(save_path))
+
+    @classmethod
+    def from_text(cls, content: str) -> 'PopTable':
+        return cls.from_events(iter_text_events(content))
+
+    @classmethod
+    def from_events(cls, events: Iterable[SaveEvent]) -> 'PopTable':
+        """省份 (数字键顶级块) 中以人口类型命名的子块为人口；所属国家取省份的 owner"""
+        table = cls()
+        province_id = None
+        owner = ''
+        province_start = 0
+        pop: Optional[Dict[str, Any]] = None
+
+        for kind, path, key, value in events:
+            depth = len(path)
+            if kind == VALUE:
+                if depth == 2 and pop is not None:
+                    if key in pop:
+                        pop[key] = value
+                    elif pop['culture'] is None and isinstance(value, str):
+                        # "文化=宗教" 行
+                        pop['culture'], pop['religion'] = key, value
+                elif depth == 1 and province_id is not None and key == 'owner':
+                    owner = str(value)
+            elif kind == BEGIN:
+                if depth == 0 and key and key.isdigit():
+                    province_id = int(key)
+                    owner = ''
+                    province_start = len(table.ids)
+                elif depth == 1 and province_id is not None and key in POP_TYPE_NAMES:
+                    pop = dict.fromkeys(('id', 'culture', 'religion') + NUMERIC_COLUMNS)
+            elif kind == END:
+                if depth == 1 and pop is not None:
+                    if pop['id'] is not None:
+                        table._append(pop, key, province_id)
+                    pop = None
+                elif depth == 0 and province_id is not None:
+                    # owner 可能写在人口之后，省份结束时统一填入
+                    table.categorical['owner'].extend([owner] * (len(table.ids) - province_start))
+                    table.province_owners[province_id] = owner
+                    province_id = None
+        return table
+
+    def _append(self, pop: Dict[str, Any], pop_type: str, province_id: int):
+        self.ids.append(int(pop['id']))
+        self.provinces.append(province_id)
+        self.categorical['pop_type'].append(pop_type)
+        self.categorical['culture'].append(pop['culture'] or '')
+        self.categorical['religion'].append(pop['religion'] or '')
+        for name in NUMERIC_COLUMNS:
+            value = pop[name]
+            self.numeric[name].append(float(value) if isinstance(value, (int, float)) else MISSING)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ---------- 索引 ----------
+
+    def codes(self, column: str) -> Sequence[int]:
+        """索引列的编码序列 (省份列直接为省份ID)"""
+        if column == 'province':
+            return self.provinces
+        return self.categorical[column].codes
+
+    def code_of(self, column: str, value: Any) -> Optional[int]:
+        if column == 'province':
+            return int(value)
+        return self.categorical[column].categories.code_of(value)
+
+    def index(self, column: str) -> Dict[int, array]:
+        """二级索引: 编码 → 行号 (首次使用时建立)"""
+        index = self._indexes.get(column)
+        if index is None:
+            index = {}
+            for row, code in enumerate(self.codes(column)):
+                rows = index.get(code)
+                if rows is None:
+                    rows = index[code] = array('I')
+                rows.append(row)
+            self._indexes[column] = index
+        return index
+
+    def column(self, name: str) -> Sequence:
+        if name in self.numeric:
+            return self.numeric[name]
+        if name == 'province':
+            return self.provinces
+        if name == 'id':
+            return self.ids
+        if name in self.categorical:
+            return self.categorical[name]
+        raise KeyError(f"未知的人口列: {name}")
+
+    # ---------- 查询 ----------
+
+    def query(self) -> 'PopQuery':
+        return PopQuery(self)
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """一行人口的字典 (缺失的数值字段不出现)"""
+        record = {'id': self.ids[row], 'province_id': str(self.provinces[row])}
+        for name, column in self.categorical.items():
+            record[name] = column[row] or None
+        for name, column in self.numeric.items():
+            value = column[row]
+            if value == value:  # 非NaN
+                record[name] = value
+        return record
+
+    def top_provinces(self, column: str, n: int = 10, aggregate: str = 'mean',
+                      descending: bool = True, **conditions) -> List[Dict[str, Any]]:
+        """按省份汇总数值列后取前N名；mean 按人口数加权，sum 为合计"""
+        values = self.numeric[column]
+        sizes = self.numeric['size']
+        totals: Dict[int, float] = {}
+        weights: Dict[int, float] = {}
+        counts: Dict[int, int] = {}
+        for row in self.query().where(**conditions).between(column).row_ids():
+            province_id = self.provinces[row]
+            weight = sizes[row] if aggregate == 'mean' and sizes[row] == sizes[row] else 1.0
+            totals[province_id] = totals.get(province_id, 0.0) + values[row] * weight
+            weights[province_id] = weights.get(province_id, 0.0) + weight
+            counts[province_id] = counts.get(province_id, 0) + 1
+
+        def result(province_id: int) -> float:
+            if aggregate == 'mean':
+                return totals[province_id] / weights[province_id] if weights[province_id] else 0.0
+            return totals[province_id]
+
+        select = heapq.nlargest if descending else heapq.nsmallest
+        return [{'province_id': province_id, 'owner': self.province_owners.get(province_id) or None,
+                 column: result(province_id), 'pop_count': counts[province_id]}
+                for province_id in select(n, totals, key=result)]
+
+
+class PopQuery:
+    """可链式组合的人口查询；等值条件经索引下推，数值范围在候选行上检查"""
+
+    def __init__(self, table: PopTable):
+        self.table = table
+        self.equals: Dict[str, List[Any]] = {}
+        self.ranges: List[Tuple[str, Optional[float], Optional[float]]] = []
+        self.order: Optional[Tuple[str, bool]] = None
+        self.limit_count: Optional[int] = None
+
+    def where(self, **conditions) -> 'PopQuery':
+        """等值条件；值为列表/元组/集合时表示"属于其中之一"，值为None的条件忽略"""
+        for column, value in conditions.items():
+            if value is None:
+                continue
+            if column not in INDEXED_COLUMNS:
+                raise KeyError(f"不能按 {column} 做等值筛选，可用: {', '.join(INDEXED_COLUMNS)}")
+            values = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            self.equals[column] = values
+        return self
+
+    def between(self, column: str, minimum: Optional[float] = None, maximum: Optional[float] = None) -> 'PopQuery':
+        """数值范围 (含端点)；不给端点时只要求该字段存在"""
+        if column not in self.table.numeric:
+            raise KeyError(f"不是数值列: {column}")
+        self.ranges.append((column, minimum, maximum))
+        return self
+
+    def order_by(self, column: str, descending: bool = True) -> 'PopQuery':
+        if column not in self.table.numeric:
+            raise KeyError(f"不是数值列: {column}")
+        self.order = (column, descending)
+        return self
+
+    def limit(self, count: Optional[int]) -> 'PopQuery':
+        self.limit_count = count
+        return self
+
+    def _candidates(self) -> Iterable[int]:
+        """等值条件: 最小的索引结果作为候选行，其余条件在候选行上按编码检查"""
+        table = self.table
+        predicates = []
+        for column, values in self.equals.items():
+            index = table.index(column)
+            codes = {code for code in (table.code_of(column, value) for value in values) if code is not None}
+            size = sum(len(index.get(code, ())) for code in codes)
+            predicates.append((size, column, codes))
+        if not predicates:
+            return range(len(table))
+
+        predicates.sort(key=lambda predicate: predicate[0])
+        _, column, codes = predicates[0]
+        index = table.index(column)
+        if len(codes) == 1:
+            rows: Iterable[int] = index.get(next(iter(codes)), ())
+        else:
+            rows = sorted(row for code in codes for row in index.get(code, ()))
+        for _, column, codes in predicates[1:]:
+            column_codes = table.codes(column)
+            rows = [row for row in rows if column_codes[row] in codes]
+        return rows
+
+    def _filtered(self) -> Iterator[int]:
+        rows: Iterable[int] = self._candidates()
+        ranges = list(self.ranges)
+        if self.order is not None:
+            ranges.append((self.order[0], None, None))  # 排序列缺失的人口不参与排名
+        for column, minimum, maximum in ranges:
+            values = self.table.numeric[column]
+            low = -math.inf if minimum is None else minimum
+            high = math.inf if maximum is None else maximum
+            rows = (row for row in rows if low <= values[row] <= high)  # NaN 比较结果为False
+        return iter(rows)
+
+    def row_ids(self) -> List[int]:
+        rows = self._filtered()
+        if self.order is not None:
+            column, descending = self.order
+            values = self.table.numeric[column]
+            if self.limit_count is not None:
+                select = heapq.nlargest if descending else heapq.nsmallest
+                return select(self.limit_count, rows, key=values.__getitem__)
+            return sorted(rows, key=values.__getitem__, reverse=descending)
+        if self.limit_count is not None:
+            return list(islice(rows, self.limit_count))
+        return list(rows)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [self.table.record(row) for row in self.row_ids()]
+
+    def count(self) -> int:
+        return sum(1 for _ in self._filtered())
+
+    def sum(self, column: str) -> float:
+        values = self.table.numeric[column]
+        return sum(values[row] for row in self._filtered() if values[row] == values[row])
+
+
+class LoadedSave:
+    """一次加载的存档: 顶级信息、国家与省份的简单字段、人口列式表"""
+
+    def __init__(self, save_path: str):
+        self.save_path = save_path
+        stat = os.stat(save_path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.info: Dict[str, Any] = {}
+        self.countries: Dict[str, Dict[str, Any]] = {}
+        self.provinces: Dict[int, Dict[str, Any]] = {}
+
+        start = time.time()
+        self.pops = PopTable.from_events(self._collect(iter_events(save_path)))
+        self.load_seconds = time.time() - start
+
+    def _collect(self, events):
+        """记录顶级、国家与省份的简单键值，其余事件原样传给人口表"""
+        record = None
+        for event in events:
+            kind, path, key, value = event
+            depth = len(path)
+            if kind == VALUE:
+                if depth == 0:
+                    self.info[key] = value
+                elif depth == 1 and record is not None:
+                    if key == 'core':
+                        record.setdefault('cores', []).append(value)
+                    elif key not in record:
+                        record[key] = value
+            elif kind == BEGIN and depth == 0:
+                if key and key.isdigit():
+                    record = self.provinces[int(key)] = {}
+                elif key and COUNTRY_TAG_PATTERN.match(key):
+                    record = self.countries[key] = {}
+                else:
+                    record = None
+            elif kind == END and depth == 0:
+                record = None
+            yield event
+
+    def is_current(self) -> bool:
+        try:
+            stat = os.stat(self.save_path)
+        except OSError:
+            return True  # 文件暂时不可访问 (正在替换)，继续使用已加载的数据
+        return (stat.st_mtime_ns, stat.st_size) == self.signature
+
+
+def _parse_condition(query: PopQuery, argument: str):
+    """命令行条件: 列=值[,值]、列>=数值、列<=数值"""
+    for operator in ('>=', '<='):
+        if operator in argument:
+            column, value = argument.split(operator, 1)
+            bound = float(value)
+            if operator == '>=':
+                query.between(column, minimum=bound)
+            else:
+                query.between(column, maximum=bound)
+            return
+    column, value = argument.split('=', 1)
+    query.where(**{column: value.split(',')})
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python pop_query.py <存档文件.v2> [列=值[,值]] [列>=数值] [列<=数值] "
+              "[--top 列 N] [--provinces 列 N]")
+        print(f"等值列: {', '.join(INDEXED_COLUMNS)}")
+        print(f"数值列: {', '.join(NUMERIC_COLUMNS)}")
+        return
+
+    save_file = sys.argv[1]
+    start = time.time()
+    table = PopTable.from_save(save_file)
+    print(f"✅ 已加载 {len(table):,} 个人口 ({time.time() - start:.2f}秒)")
+
+    query = table.query()
+    arguments = sys.argv[2:]
+    province_metric = None
+    limit = 20
+    while arguments:
+        argument = arguments.pop(0)
+        if argument == '--top':
+            query.order_by(arguments.pop(0))
+            limit = int(arguments.pop(0))
+        elif argument == '--provinces':
+            province_metric = arguments.pop(0)
+            limit = int(arguments.pop(0))
+        else:
+            _parse_condition(query, argument)
+
+    start = time.time()
+    if province_metric:
+        provinces = table.top_provinces(province_metric, limit,
+                                        **{column: values for column, values in query.equals.items()})
+        elapsed = time.time() - start
+        print(f"\n📊 {province_metric} 最高的 {len(provinces)} 个省份 ({elapsed * 1000:.1f}毫秒):")
+        for province in provinces:
+            print(f"  省份{province['province_id']:>5} {province['owner'] or '-':<4} "
+                  f"{province_metric}={province[province_metric]:.3f}  人口组: {province['pop_count']}")
+        return
+
+    total = query.count()
+    results = query.limit(limit).rows()
+    elapsed = time.time() - start
+    print(f"\n📋 匹配 {total:,} 个人口，显示 {len(results)} 个 ({elapsed * 1000:.1f}毫秒):")
+    print("-" * 80)
+    for i, pop in enumerate(results, 1):
+        print(f"{i:3d}. 省份{pop['province_id']} {pop['owner'] or '-'} - {pop['pop_type']} "
+              f"({pop['culture']}-{pop['religion']})  人口: {pop.get('size', 0):,.0f}  "
+              f"金钱: {pop.get('money', 0):,.0f}  斗争性: {pop.get('mil', 0):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,19 @@ Victoria II 人口统计专用解析器
 """
 
 import re
-import json
 import time
+from array import array
 from typing import Dict, List, Any, Union
-from dataclasses import dataclass, field
+from dataclasses import field
 from collections import defaultdict
 
+from categorical import CULTURES, POP_TYPES, RELIGIONS, TAGS, CategoricalColumn
+from compact_model import JsonRecord, slotted_dataclass
+from stream_export import NDJSONWriter, StreamedObject, save_json_stream
 
-@dataclass
-class PopulationData:
+
+@slotted_dataclass
+class PopulationData(JsonRecord):
     """人口数据"""
     size: int = 0
     type: str = ""
@@ -26,8 +30,8 @@ class PopulationData:
     consciousness: float = 0.0
 
 
-@dataclass
-class ProvincePopulation:
+@slotted_dataclass
+class ProvincePopulation(JsonRecord):
     """省份人口数据"""
     id: int = 0
     name: str = ""
@@ -36,8 +40,8 @@ class ProvincePopulation:
     pop_groups: List[PopulationData] = field(default_factory=list)
 
 
-@dataclass
-class CountryPopulation:
+@slotted_dataclass
+class CountryPopulation(JsonRecord):
     """国家人口数据"""
     tag: str = ""
     name: str = ""
@@ -187,7 +191,7 @@ class PopulationParser:
         
         owner_match = re.search(r'owner="?([A-Z]{3})"?', content)
         if owner_match:
-            province_pop.owner = owner_match.group(1)
+            province_pop.owner = TAGS.intern(owner_match.group(1))
         
         # 查找所有职业人口群体（aristocrats, clergymen, craftsmen等）
         # 使用新的模式匹配真实的人口数据
@@ -209,9 +213,9 @@ class PopulationParser:
             
             pop_data = PopulationData()
             pop_data.size = size
-            pop_data.type = pop_type
-            pop_data.culture = culture
-            pop_data.religion = religion
+            pop_data.type = POP_TYPES.intern(pop_type)
+            pop_data.culture = CULTURES.intern(culture)
+            pop_data.religion = RELIGIONS.intern(religion)
             
             province_pop.pop_groups.append(pop_data)
             total_pop += size
@@ -229,6 +233,8 @@ class PopulationParser:
                                        province_owners: Dict[int, str]) -> Dict[str, CountryPopulation]:
         """按国家聚合人口数据"""
         countries_population = defaultdict(lambda: CountryPopulation())
+        # 每个国家的人口按列存储分类编码，最后一次性分组求和
+        country_columns = {}
         
         for province_id, province_pop in provinces_data.items():
             owner = province_owners.get(province_id, province_pop.owner)
@@ -240,22 +246,24 @@ class PopulationParser:
             country_pop.total_population += province_pop.total_population
             country_pop.provinces.append(province_pop)
             
-            # 统计文化、宗教、职业分布
+            columns = country_columns.get(owner)
+            if columns is None:
+                columns = country_columns[owner] = (
+                    CategoricalColumn(CULTURES), CategoricalColumn(RELIGIONS),
+                    CategoricalColumn(POP_TYPES), array('q'))
+            cultures, religions, pop_types, sizes = columns
             for pop_group in province_pop.pop_groups:
-                # 按文化统计
-                if pop_group.culture:
-                    country_pop.population_by_culture[pop_group.culture] = \
-                        country_pop.population_by_culture.get(pop_group.culture, 0) + pop_group.size
-                
-                # 按宗教统计
-                if pop_group.religion:
-                    country_pop.population_by_religion[pop_group.religion] = \
-                        country_pop.population_by_religion.get(pop_group.religion, 0) + pop_group.size
-                
-                # 按职业统计
-                if pop_group.type:
-                    country_pop.population_by_type[pop_group.type] = \
-                        country_pop.population_by_type.get(pop_group.type, 0) + pop_group.size
+                cultures.append(pop_group.culture)
+                religions.append(pop_group.religion)
+                pop_types.append(pop_group.type)
+                sizes.append(pop_group.size)
+        
+        # 统计文化、宗教、职业分布
+        for owner, (cultures, religions, pop_types, sizes) in country_columns.items():
+            country_pop = countries_population[owner]
+            country_pop.population_by_culture = self._group_sizes(cultures, sizes)
+            country_pop.population_by_religion = self._group_sizes(religions, sizes)
+            country_pop.population_by_type = self._group_sizes(pop_types, sizes)
         
         # 计算识字率
         for country_pop in countries_population.values():
@@ -270,6 +278,12 @@ class PopulationParser:
         
         return dict(countries_population)
     
+    def _group_sizes(self, column: CategoricalColumn, sizes: array) -> Dict[str, int]:
+        """按分类值对人口数求和 (忽略空值)"""
+        totals = column.value_counts(weights=sizes)
+        totals.pop('', None)
+        return dict(totals)
+    
     def _add_country_basic_info(self, countries_population: Dict[str, CountryPopulation]):
         """添加国家基本信息（研究点数、税收等）"""
         country_matches = list(self.country_pattern.finditer(self.content))
@@ -285,41 +299,57 @@ class PopulationParser:
                 continue
             
             country_content = self.content[start_pos:end_pos]
-            
-            # 提取研究点数
-            research_match = re.search(r'research_points=([\d.]+)', country_content)
-            if research_match:
-                countries_population[tag].research_points = float(research_match.group(1))
-            
-            # 提取税收基础
-            tax_match = re.search(r'tax_base=([\d.]+)', country_content)
-            if tax_match:
-                countries_population[tag].tax_base = float(tax_match.group(1))
+            self._parse_country_basic_info(countries_population[tag], country_content)
+    
+    def _parse_country_basic_info(self, country_pop: CountryPopulation, country_content: str):
+        """从国家块内容中提取研究点数和税收基础"""
+        # 提取研究点数
+        research_match = re.search(r'research_points=([\d.]+)', country_content)
+        if research_match:
+            country_pop.research_points = float(research_match.group(1))
+        
+        # 提取税收基础
+        tax_match = re.search(r'tax_base=([\d.]+)', country_content)
+        if tax_match:
+            country_pop.tax_base = float(tax_match.group(1))
     
     def save_population_data(self, countries_population: Dict[str, CountryPopulation], filename: str = "population_analysis.json"):
-        """保存人口数据到JSON文件"""
+        """保存人口数据到JSON文件（逐个国家写出）"""
         print(f"保存人口数据到 {filename}...")
         
-        # 转换为可序列化的格式
-        serializable_data = {}
-        for tag, country_pop in countries_population.items():
-            serializable_data[tag] = {
-                'tag': country_pop.tag,
-                'total_population': country_pop.total_population,
-                'province_count': len(country_pop.provinces),
-                'population_by_culture': country_pop.population_by_culture,
-                'population_by_religion': country_pop.population_by_religion,
-                'population_by_type': country_pop.population_by_type,
-                'literacy_rate': round(country_pop.literacy_rate * 100, 2),
-                'research_points': country_pop.research_points,
-                'tax_base': country_pop.tax_base
-            }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(serializable_data, f, indent=2, ensure_ascii=False)
+        save_json_stream(StreamedObject(
+            (tag, self._serialize_country(country_pop)) for tag, country_pop in countries_population.items()
+        ), filename)
         
         print(f"人口数据已保存到 {filename}")
     
+    def save_population_ndjson(self, countries_population: Dict[str, CountryPopulation],
+                               filename: str = "population_analysis.ndjson") -> int:
+        """每个国家一行写入NDJSON，返回记录数"""
+        print(f"保存人口数据到 {filename}...")
+        with NDJSONWriter(filename) as writer:
+            for country_pop in countries_population.values():
+                writer.write(self._serialize_country(country_pop))
+        print(f"人口数据已保存到 {filename} ({writer.count} 个国家)")
+        return writer.count
+    
+    def serialize_population_data(self, countries_population: Dict[str, CountryPopulation]) -> Dict[str, Dict]:
+        """转换为可序列化的格式"""
+        return {tag: self._serialize_country(country_pop) for tag, country_pop in countries_population.items()}
+    
+    def _serialize_country(self, country_pop: CountryPopulation) -> Dict:
+        return {
+            'tag': country_pop.tag,
+            'total_population': country_pop.total_population,
+            'province_count': len(country_pop.provinces),
+            'population_by_culture': country_pop.population_by_culture,
+            'population_by_religion': country_pop.population_by_religion,
+            'population_by_type': country_pop.population_by_type,
+            'literacy_rate': round(country_pop.literacy_rate * 100, 2),
+            'research_points': country_pop.research_points,
+            'tax_base': country_pop.tax_base
+        }
+    
     def print_population_summary(self, countries_population: Dict[str, CountryPopulation]):
         """打印人口统计摘要"""
         if not countries_population:
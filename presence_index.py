@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 省份人口存在索引
+===================================
+为每个省份记录三个位集 (Python 整数): 出现过的文化、宗教与人口类型，
+位号为 categorical 共享字典中的编码；另记录省份的 owner。
+
+按文化集合、宗教或人口类型选择省份只需对每个省份做一次按位与，
+不必复制省份文本做子串搜索，也不需要按省份ID范围猜测。
+
+    index = PresenceIndex.from_blocks(content, modifier.structure.children)
+    index.select(cultures=CHINESE_CULTURES)                 # 含有中国文化人口的省份ID
+    index.select(cultures=CHINESE_CULTURES, owners=['CHI'])
+    index.select(religions=['sunni'], pop_types=['soldiers'])
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from bracket_parser import BracketBlock
+from categorical import CULTURES, POP_TYPES, RELIGIONS, Categories
+from population_enums import PopType
+from save_events import BEGIN, END, VALUE, SaveEvent, iter_events
+
+POP_TYPE_NAMES = frozenset(pop_type.value for pop_type in PopType)
+
+# 视为"中国人口"的文化 (主文化与接受文化)
+CHINESE_CULTURES = ('beifaren', 'nanfaren', 'manchu', 'yankee', 'dixie', 'zhuang')
+
+_PROVINCE_NAME = re.compile(r'^\d+$')
+_OWNER_LINE = re.compile(r'^[ \t]*owner[ \t]*=[ \t]*"?(\w+)"?', re.MULTILINE)
+# 人口块中第一个 "文化=宗教" 行 (键和值都不是数字)
+_CULTURE_RELIGION_LINE = re.compile(r'^[ \t]*([A-Za-z_]\w*)[ \t]*=[ \t]*([A-Za-z_]\w*)[ \t]*\r?$', re.MULTILINE)
+_NON_CULTURE_VALUES = frozenset(('yes', 'no'))
+
+
+class ProvincePresence:
+    """一个省份中出现过的文化、宗教、人口类型位集"""
+    __slots__ = ('cultures', 'religions', 'pop_types', 'owner')
+
+    def __init__(self):
+        self.cultures = 0
+        self.religions = 0
+        self.pop_types = 0
+        self.owner: Optional[str] = None
+
+
+def _mask(categories: Categories, values: Iterable[str]) -> int:
+    """值集合对应的位掩码；字典中没有的值不会出现在任何省份中"""
+    mask = 0
+    for value in values:
+        code = categories.code_of(value)
+        if code is not None:
+            mask |= 1 << code
+    return mask
+
+
+def _names(categories: Categories, bits: int) -> List[str]:
+    names = []
+    code = 0
+    while bits:
+        if bits & 1:
+            names.append(categories.decode(code))
+        bits >>= 1
+        code += 1
+    return names
+
+
+class PresenceIndex:
+    """省份ID → ProvincePresence"""
+
+    def __init__(self):
+        self.provinces: Dict[int, ProvincePresence] = {}
+
+    def province(self, province_id: int) -> ProvincePresence:
+        presence = self.provinces.get(province_id)
+        if presence is None:
+            presence = self.provinces[province_id] = ProvincePresence()
+        return presence
+
+    def add_pop(self, province_id: int, pop_type: str, culture: Optional[str], religion: Optional[str]):
+        presence = self.province(province_id)
+        presence.pop_types |= 1 << POP_TYPES.encode(pop_type)
+        if culture:
+            presence.cultures |= 1 << CULTURES.encode(culture)
+        if religion:
+            presence.religions |= 1 << RELIGIONS.encode(religion)
+
+    # ---------- 构建 ----------
+
+    @classmethod
+    def from_blocks(cls, content: str, blocks: List[BracketBlock]) -> 'PresenceIndex':
+        """由花括号解析结果建立；只在原文上做有界的正则匹配，不复制省份文本"""
+        index = cls()
+        for block in blocks:
+            name = block.name.strip()
+            if not _PROVINCE_NAME.match(name):
+                continue
+            province_id = int(name)
+            presence = index.province(province_id)
+
+            # 省份自身字段在第一个子块之前
+            header_end = block.children[0].start_pos if block.children else block.end_pos
+            owner = _OWNER_LINE.search(content, block.start_pos + 1, header_end)
+            if owner:
+                presence.owner = owner.group(1)
+
+            for child in block.children:
+                pop_type = child.name.strip()
+                if pop_type not in POP_TYPE_NAMES:
+                    continue
+                fields_end = child.children[0].start_pos if child.children else child.end_pos
+                culture = religion = None
+                for match in _CULTURE_RELIGION_LINE.finditer(content, child.start_pos + 1, fields_end):
+                    if match.group(2) not in _NON_CULTURE_VALUES:
+                        culture, religion = match.groups()
+                        break
+                index.add_pop(province_id, pop_type, culture, religion)
+        return index
+
+    @classmethod
+    def from_events(cls, events: Iterable[SaveEvent]) -> 'PresenceIndex':
+        """由存档事件流建立"""
+        index = cls()
+        province_id = None
+        pop_type = culture = religion = None
+        for kind, path, key, value in events:
+            depth = len(path)
+            if kind == VALUE:
+                if depth == 2 and pop_type is not None:
+                    if culture is None and isinstance(value, str) and value not in _NON_CULTURE_VALUES:
+                        culture, religion = key, value
+                elif depth == 1 and province_id is not None and key == 'owner':
+                    index.province(province_id).owner = str(value)
+            elif kind == BEGIN:
+                if depth == 0 and key and key.isdigit():
+                    province_id = int(key)
+                    index.province(province_id)
+                elif depth == 1 and province_id is not None and key in POP_TYPE_NAMES:
+                    pop_type, culture, religion = key, None, None
+            elif kind == END:
+                if depth == 1 and pop_type is not None:
+                    index.add_pop(province_id, pop_type, culture, religion)
+                    pop_type = None
+                elif depth == 0:
+                    province_id = None
+        return index
+
+    @classmethod
+    def from_save(cls, save_path: str) -> 'PresenceIndex':
+        return cls.from_events(iter_events(save_path))
+
+    # ---------- 选择 ----------
+
+    def select(self, cultures: Optional[Iterable[str]] = None, religions: Optional[Iterable[str]] = None,
+               pop_types: Optional[Iterable[str]] = None, owners: Optional[Iterable[str]] = None) -> List[int]:
+        """满足全部给定条件的省份ID；每个条件为"出现其中任意一个值" """
+        masks = []
+        if cultures is not None:
+            masks.append(('cultures', _mask(CULTURES, cultures)))
+        if religions is not None:
+            masks.append(('religions', _mask(RELIGIONS, religions)))
+        if pop_types is not None:
+            masks.append(('pop_types', _mask(POP_TYPES, pop_types)))
+        owner_set: Optional[Set[str]] = set(owners) if owners is not None else None
+
+        selected = []
+        for province_id, presence in self.provinces.items():
+            if owner_set is not None and presence.owner not in owner_set:
+                continue
+            if all(getattr(presence, field) & mask for field, mask in masks):
+                selected.append(province_id)
+        return selected
+
+    def cultures_of(self, province_id: int) -> List[str]:
+        return _names(CULTURES, self.provinces[province_id].cultures)
+
+    def religions_of(self, province_id: int) -> List[str]:
+        return _names(RELIGIONS, self.provinces[province_id].religions)
+
+    def pop_types_of(self, province_id: int) -> List[str]:
+        return _names(POP_TYPES, self.provinces[province_id].pop_types)
+
+    def __len__(self) -> int:
+        return len(self.provinces)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档查询客户端
+===================================
+向 query_server.py 发送一行JSON请求并打印结果；只依赖标准库，启动即可查询。
+
+    python query_client.py info
+    python query_client.py country CHI
+    python query_client.py province 1612
+    python query_client.py pops culture=beifaren money>=1000 --top money 10
+    python query_client.py provinces mil 10 [owner=CHI]
+    python query_client.py aggregate culture size [owner=CHI]
+    python query_client.py modify militancy infamy
+    python query_client.py shutdown
+
+服务地址默认为本机端口 8736，可用环境变量 V2_QUERY_SERVER 指定 (端口号或 unix:套接字路径)。
+
+其他脚本中:
+    from query_client import QueryClient
+    QueryClient().request('country', tag='CHI')
+"""
+
+import json
+import os
+import socket
+import sys
+from typing import Any, Dict, List, Tuple
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_ADDRESS = os.environ.get('V2_QUERY_SERVER', '8736')
+
+
+class QueryError(Exception):
+    """服务端返回的错误"""
+
+
+class QueryClient:
+    """一个连接上可以连续发送多条请求"""
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, timeout: float = 600.0):
+        if address.startswith('unix:'):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address[len('unix:'):])
+        else:
+            self.sock = socket.create_connection((DEFAULT_HOST, int(address)), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+
+    def request(self, op: str, **params) -> Any:
+        """发送请求并返回 result；服务端报错时抛出 QueryError"""
+        message = dict(params, op=op)
+        self.sock.sendall(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise QueryError("服务端关闭了连接")
+        response = json.loads(line.decode('utf-8'))
+        if not response.get('ok'):
+            raise QueryError(response.get('error'))
+        return response['result']
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self) -> 'QueryClient':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _parse_conditions(arguments: List[str]) -> Tuple[Dict[str, Any], Dict[str, List]]:
+    """列=值[,值]、列>=数值、列<=数值"""
+    where: Dict[str, Any] = {}
+    ranges: Dict[str, List] = {}
+    for argument in arguments:
+        if '>=' in argument:
+            column, value = argument.split('>=', 1)
+            ranges.setdefault(column, [None, None])[0] = float(value)
+        elif '<=' in argument:
+            column, value = argument.split('<=', 1)
+            ranges.setdefault(column, [None, None])[1] = float(value)
+        else:
+            column, value = argument.split('=', 1)
+            values = value.split(',')
+            if column == 'province':
+                values = [int(item) for item in values]
+            where[column] = values if len(values) > 1 else values[0]
+    return where, ranges
+
+
+def build_request(arguments: List[str]) -> Dict[str, Any]:
+    """命令行参数 → 请求"""
+    command, arguments = arguments[0], arguments[1:]
+    if command == 'country':
+        return {'op': 'country', 'tag': arguments[0]}
+    if command == 'province':
+        return {'op': 'province', 'id': int(arguments[0])}
+    if command == 'pops':
+        request: Dict[str, Any] = {'op': 'pops'}
+        if '--top' in arguments:
+            position = arguments.index('--top')
+            request['order_by'] = arguments[position + 1]
+            request['limit'] = int(arguments[position + 2])
+            del arguments[position:position + 3]
+        request['where'], request['ranges'] = _parse_conditions(arguments)
+        return request
+    if command == 'provinces':
+        where, _ = _parse_conditions(arguments[2:])
+        return {'op': 'top_provinces', 'column': arguments[0], 'n': int(arguments[1]), 'where': where}
+    if command == 'aggregate':
+        where, ranges = _parse_conditions(arguments[2:])
+        return {'op': 'aggregate', 'group_by': arguments[0], 'value': arguments[1], 'where': where, 'ranges': ranges}
+    if command == 'modify':
+        return {'op': 'modify', 'jobs': arguments}
+    return {'op': command}
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    request = build_request(sys.argv[1:])
+    op = request.pop('op')
+    try:
+        with QueryClient() as client:
+            result = client.request(op, **request)
+    except OSError as e:
+        print(f"❌ 无法连接查询服务 ({DEFAULT_ADDRESS}): {e}")
+        print("请先运行: python query_server.py <存档文件.v2>")
+        sys.exit(1)
+    except QueryError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档查询服务
+===================================
+常驻进程: 存档只加载、索引一次，之后的国家/省份/人口查询与统计都在内存中完成，
+不必每次运行脚本都重新读取和解析整个存档。
+存档文件的修改时间或大小变化时 (游戏重新存档、修改器写回)，下一次请求前自动重新加载。
+
+协议: 每个请求与响应都是一行JSON (UTF-8)。
+
+    {"op": "country", "tag": "CHI"}
+    {"op": "pops", "where": {"culture": "beifaren"}, "ranges": {"money": [1000, null]},
+     "order_by": "money", "limit": 20}
+    {"op": "modify", "jobs": ["militancy", "infamy"]}
+
+响应为 {"ok": true, "result": ...} 或 {"ok": false, "error": "..."}。
+客户端见 query_client.py。
+
+    python query_server.py <存档文件.v2> [端口 | unix:/路径/到/套接字]
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from pop_query import NUMERIC_COLUMNS, LoadedSave
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8736
+
+# modify 请求可执行的修改项 (Victoria2Modifier.execute_selective_modifications 的选项)
+MODIFY_JOBS = ('militancy', 'culture', 'infamy', 'population', 'date', 'money', 'civilized', 'china_civilized')
+
+
+class QueryService:
+    """请求分发；存档变化时自动重新加载"""
+
+    def __init__(self, save_path: str):
+        self.save_path = save_path
+        self.lock = threading.RLock()
+        self.save: Optional[LoadedSave] = None
+        self.requests = 0
+        self.reload()
+        self.handlers: Dict[str, Callable[[Dict], Any]] = {
+            'ping': lambda request: 'pong',
+            'info': self.op_info,
+            'reload': lambda request: self.reload(),
+            'country': self.op_country,
+            'countries': self.op_countries,
+            'province': self.op_province,
+            'pops': self.op_pops,
+            'top_provinces': self.op_top_provinces,
+            'aggregate': self.op_aggregate,
+            'modify': self.op_modify,
+        }
+
+    def reload(self) -> Dict[str, Any]:
+        with self.lock:
+            print(f"📂 加载存档: {self.save_path}")
+            self.save = LoadedSave(self.save_path)
+            print(f"✅ 加载完成: {len(self.save.countries)} 个国家, {len(self.save.provinces)} 个省份, "
+                  f"{len(self.save.pops):,} 个人口 ({self.save.load_seconds:.2f}秒)")
+            return self.op_info({})
+
+    def current(self) -> LoadedSave:
+        with self.lock:
+            if not self.save.is_current():
+                print("🔄 存档已变化，重新加载")
+                self.reload()
+            return self.save
+
+    def handle(self, request: Dict) -> Dict:
+        self.requests += 1
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': f"请求必须是JSON对象，收到: {type(request).__name__}"}
+        handler = self.handlers.get(request.get('op'))
+        if handler is None:
+            return {'ok': False, 'error': f"未知操作: {request.get('op')} (可用: {', '.join(self.handlers)})"}
+        start = time.time()
+        try:
+            result = handler(request)
+        except Exception as e:
+            # 任何处理错误都作为错误响应返回，不中断连接
+            return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        return {'ok': True, 'result': result, 'elapsed_ms': round((time.time() - start) * 1000, 3)}
+
+    # ---------- 查询 ----------
+
+    def op_info(self, request: Dict) -> Dict[str, Any]:
+        save = self.current()
+        return {
+            'save_file': save.save_path,
+            'date': save.info.get('date'),
+            'player': save.info.get('player'),
+            'countries': len(save.countries),
+            'provinces': len(save.provinces),
+            'pops': len(save.pops),
+            'load_seconds': round(save.load_seconds, 3),
+            'requests': self.requests,
+        }
+
+    def op_country(self, request: Dict) -> Dict[str, Any]:
+        save = self.current()
+        tag = request['tag'].upper()
+        country = save.countries[tag]
+        owned = [province_id for province_id, province in save.provinces.items() if province.get('owner') == tag]
+        pops = save.pops.query().where(owner=tag)
+        return dict(country, tag=tag, owned_provinces=len(owned), population=pops.sum('size'),
+                    pop_count=pops.count())
+
+    def op_countries(self, request: Dict) -> Dict[str, Any]:
+        save = self.current()
+        fields = request.get('fields') or ['capital', 'primary_culture', 'civilized']
+        return {tag: {field: country.get(field) for field in fields} for tag, country in save.countries.items()}
+
+    def op_province(self, request: Dict) -> Dict[str, Any]:
+        save = self.current()
+        province_id = int(request['id'])
+        province = save.provinces[province_id]
+        pops = save.pops.query().where(province=province_id).rows()
+        return dict(province, id=province_id, pops=pops)
+
+    def _query(self, save: LoadedSave, request: Dict):
+        query = save.pops.query().where(**request.get('where', {}))
+        for column, (minimum, maximum) in request.get('ranges', {}).items():
+            query.between(column, minimum, maximum)
+        if request.get('order_by'):
+            query.order_by(request['order_by'], request.get('descending', True))
+        return query
+
+    def op_pops(self, request: Dict) -> Dict[str, Any]:
+        save = self.current()
+        query = self._query(save, request)
+        total = query.count()
+        return {'total': total, 'pops': query.limit(request.get('limit', 20)).rows()}
+
+    def op_top_provinces(self, request: Dict) -> List[Dict[str, Any]]:
+        save = self.current()
+        return save.pops.top_provinces(request['column'], request.get('n', 10), request.get('aggregate', 'mean'),
+                                       request.get('descending', True), **request.get('where', {}))
+
+    def op_aggregate(self, request: Dict) -> Dict[str, Any]:
+        """按分类列分组，对数值列求和 (默认按人口数)"""
+        save = self.current()
+        group_by = request.get('group_by', 'culture')
+        value = request.get('value', 'size')
+        if value not in NUMERIC_COLUMNS:
+            raise KeyError(f"不是数值列: {value}")
+        groups = save.pops.column(group_by)
+        values = save.pops.column(value)
+        totals: Dict[Any, float] = {}
+        for row in self._query(save, request).between(value).row_ids():
+            group = groups[row]
+            totals[group] = totals.get(group, 0.0) + values[row]
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+        return {'group_by': group_by, 'value': value, 'groups': ranked[:request.get('limit', len(ranked))]}
+
+    # ---------- 修改 ----------
+
+    def op_modify(self, request: Dict) -> Dict[str, Any]:
+        """在服务进程中执行修改器 (含备份与校验)；完成后重新加载存档"""
+        jobs = request['jobs']
+        unknown = [job for job in jobs if job not in MODIFY_JOBS]
+        if unknown:
+            raise ValueError(f"未知修改项: {', '.join(unknown)} (可用: {', '.join(MODIFY_JOBS)})")
+        from victoria2_main_modifier import Victoria2Modifier
+
+        with self.lock:
+            success = Victoria2Modifier().execute_selective_modifications(
+                self.save_path, {job: True for job in jobs})
+            return {'success': success, 'jobs': jobs, 'reloaded': self.reload()}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """一个连接上可以发送多条请求，每行一条"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                response = {'ok': False, 'error': f"请求不是有效的JSON: {e}"}
+            else:
+                if isinstance(request, dict) and request.get('op') == 'shutdown':
+                    self._send({'ok': True, 'result': 'bye'})
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                    return
+                response = self.server.service.handle(request)
+            self._send(response)
+
+    def _send(self, response: Dict):
+        self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socket, 'AF_UNIX'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def create_server(service: QueryService, address: str = str(DEFAULT_PORT)) -> socketserver.BaseServer:
+    """address 为端口号 (只监听本机) 或 unix:套接字路径"""
+    if address.startswith('unix:'):
+        path = address[len('unix:'):]
+        if os.path.lexists(path):
+            # 只清理上次遗留的套接字，不删除写错路径时指向的普通文件
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise FileExistsError(f"{path} 已存在且不是套接字")
+            os.remove(path)
+        server = _UnixServer(path, _RequestHandler)
+    else:
+        server = _TCPServer((DEFAULT_HOST, int(address)), _RequestHandler)
+    server.service = service
+    return server
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python query_server.py <存档文件.v2> [端口 | unix:/路径/到/套接字]")
+        print(f"默认端口: {DEFAULT_PORT}")
+        return
+
+    address = sys.argv[2] if len(sys.argv) > 2 else str(DEFAULT_PORT)
+    service = QueryService(sys.argv[1])
+    try:
+        server = create_server(service, address)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法启动查询服务: {e}")
+        return
+    print(f"🚀 查询服务已启动: {address if address.startswith('unix:') else f'{DEFAULT_HOST}:{address}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("👋 查询服务已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,14 @@ import json
 from collections import Counter
 from typing import Dict, List, Any, Optional
 
+from pop_query import NUMERIC_COLUMNS, PopTable
+
 class QuickPopulationLookup:
     def __init__(self, save_file: str):
         """初始化快速查询工具"""
         self.save_file = save_file
         self.content = ""
+        self._pop_table: Optional[PopTable] = None
         
         # 属性说明
         self.attribute_help = {
@@ -47,110 +50,30 @@ class QuickPopulationLookup:
             print(f"❌ 文件加载失败: {e}")
             raise
     
+    @property
+    def pop_table(self) -> PopTable:
+        """人口列式表与索引 (首次查询时建立)"""
+        if self._pop_table is None:
+            self._pop_table = PopTable.from_text(self.content)
+        return self._pop_table
+    
     def find_population_by_criteria(self, pop_type: Optional[str] = None, 
                                    culture: Optional[str] = None,
                                    religion: Optional[str] = None,
                                    province_id: Optional[str] = None,
                                    limit: int = 10) -> List[Dict[str, Any]]:
-        """根据条件查找人口"""
-        results = []
-        
-        # 确定搜索范围
+        """根据条件查找人口 (条件经索引下推，不再逐块扫描)"""
         if province_id:
-            # 搜索特定省份
-            province_pattern = f'^{province_id}=\\s*{{([^{{}}]*(?:{{[^{{}}]*}}[^{{}}]*)*)}}'
-            province_match = re.search(province_pattern, self.content, re.MULTILINE | re.DOTALL)
-            if not province_match:
+            if not str(province_id).isdigit() or int(province_id) not in self.pop_table.province_owners:
                 print(f"❌ 未找到省份 {province_id}")
-                return results
-            search_content = province_match.group(1)
+                return []
             print(f"🔍 在省份 {province_id} 中搜索...")
         else:
-            search_content = self.content
             print("🔍 在整个存档中搜索...")
         
-        # 搜索人口类型
-        search_pop_types = [pop_type] if pop_type else self.pop_types
-        
-        for search_pop_type in search_pop_types:
-            pattern = f'({search_pop_type}=\\s*{{[^{{}}]*(?:{{[^{{}}]*}}[^{{}}]*)*}})'
-            matches = re.finditer(pattern, search_content, re.DOTALL)
-            
-            for match in matches:
-                pop_block = match.group(1)
-                
-                # 提取基本信息
-                pop_info = self.extract_basic_info(pop_block)
-                pop_info['pop_type'] = search_pop_type
-                
-                # 如果指定了省份ID，添加到结果中
-                if province_id:
-                    pop_info['province_id'] = province_id
-                else:
-                    # 尝试找到省份ID
-                    pop_info['province_id'] = self.find_province_for_position(match.start())
-                
-                # 应用筛选条件
-                if culture and pop_info.get('culture') != culture:
-                    continue
-                if religion and pop_info.get('religion') != religion:
-                    continue
-                
-                results.append(pop_info)
-                
-                if len(results) >= limit:
-                    break
-            
-            if len(results) >= limit:
-                break
-        
-        return results
-    
-    def extract_basic_info(self, pop_block: str) -> Dict[str, Any]:
-        """提取人口块的基本信息"""
-        info = {}
-        
-        # 提取数值属性
-        numeric_patterns = {
-            'size': r'size\s*=\s*([\d.]+)',
-            'mil': r'mil\s*=\s*([\d.]+)',
-            'con': r'con\s*=\s*([\d.]+)',
-            'money': r'money\s*=\s*([\d.]+)',
-            'bank': r'bank\s*=\s*([\d.]+)',
-            'literacy': r'literacy\s*=\s*([\d.]+)',
-            'luxury_needs': r'luxury_needs\s*=\s*([\d.]+)',
-            'everyday_needs': r'everyday_needs\s*=\s*([\d.]+)',
-            'life_needs': r'life_needs\s*=\s*([\d.]+)'
-        }
-        
-        for attr_name, pattern in numeric_patterns.items():
-            match = re.search(pattern, pop_block)
-            if match:
-                try:
-                    info[attr_name] = float(match.group(1))
-                except ValueError:
-                    info[attr_name] = match.group(1)
-        
-        # 提取文化和宗教
-        culture_religion_matches = re.findall(r'(\w+)\s*=\s*(\w+)', pop_block)
-        for culture, religion in culture_religion_matches:
-            if culture not in numeric_patterns and not religion.replace('.', '').isdigit():
-                if 'culture' not in info:
-                    info['culture'] = culture
-                if 'religion' not in info:
-                    info['religion'] = religion
-                break
-        
-        return info
-    
-    def find_province_for_position(self, position: int) -> str:
-        """根据位置查找对应的省份ID"""
-        # 向前搜索最近的省份定义
-        before_content = self.content[:position]
-        province_matches = list(re.finditer(r'^(\d+)=\s*{', before_content, re.MULTILINE))
-        if province_matches:
-            return province_matches[-1].group(1)
-        return "unknown"
+        query = self.pop_table.query().where(pop_type=pop_type, culture=culture, religion=religion,
+                                             province=province_id)
+        return query.limit(limit).rows()
     
     def get_attribute_statistics(self, attribute: str, pop_type: Optional[str] = None) -> Dict[str, Any]:
         """获取特定属性的统计信息"""
@@ -232,49 +155,17 @@ class QuickPopulationLookup:
     
     def search_by_value(self, attribute: str, value: Any, pop_type: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
         """根据属性值搜索人口"""
-        results = []
-        search_pop_types = [pop_type] if pop_type else self.pop_types
-        
         print(f"🔍 搜索 {attribute}={value} 的人口...")
         
-        for search_pop_type in search_pop_types:
-            pattern = f'({search_pop_type}=\\s*{{[^{{}}]*(?:{{[^{{}}]*}}[^{{}}]*)*}})'
-            matches = re.finditer(pattern, self.content, re.DOTALL)
-            
-            for match in matches:
-                pop_block = match.group(1)
-                
-                # 检查是否包含指定的属性值
-                if attribute in ['culture', 'religion']:
-                    # 文本属性搜索
-                    if attribute == 'culture':
-                        culture_match = re.search(f'{value}\\s*=\\s*\\w+', pop_block)
-                        if not culture_match:
-                            continue
-                    elif attribute == 'religion':
-                        religion_match = re.search(f'\\w+\\s*=\\s*{value}', pop_block)
-                        if not religion_match:
-                            continue
-                else:
-                    # 数值属性搜索
-                    attr_match = re.search(f'{attribute}\\s*=\\s*{value}', pop_block)
-                    if not attr_match:
-                        continue
-                
-                # 提取信息
-                pop_info = self.extract_basic_info(pop_block)
-                pop_info['pop_type'] = search_pop_type
-                pop_info['province_id'] = self.find_province_for_position(match.start())
-                
-                results.append(pop_info)
-                
-                if len(results) >= limit:
-                    break
-            
-            if len(results) >= limit:
-                break
-        
-        return results
+        query = self.pop_table.query().where(pop_type=pop_type)
+        if attribute in ['culture', 'religion']:
+            query.where(**{attribute: value})
+        elif attribute in NUMERIC_COLUMNS:
+            query.between(attribute, float(value), float(value))
+        else:
+            print(f"❌ 不支持按 {attribute} 搜索")
+            return []
+        return query.limit(limit).rows()
 
 def print_population_info(populations: List[Dict[str, Any]]):
     """打印人口信息"""
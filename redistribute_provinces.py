@@ -22,6 +22,7 @@
 """
 
 from victoria2_main_modifier import Victoria2Modifier
+from edit_plan import EditPlan, reusable_preview
 import sys
 import os
 import re
@@ -222,6 +223,77 @@ class ProvinceRedistributor:
         
         return redistribution_plan
     
+    def _transfer_province_content(self, province_content: str, transfer_info: Dict) -> str:
+        """生成转移给中国后的省份内容（修改拥有者、控制者并添加核心）"""
+        # 修改拥有者
+        if re.search(r'owner="?[A-Z]{2,3}"?', province_content):
+            province_content = re.sub(
+                r'owner="?[A-Z]{2,3}"?',
+                'owner="CHI"',
+                province_content
+            )
+        else:
+            # 如果没有owner字段，添加一个
+            province_content = re.sub(
+                r'(name="[^"]*")',
+                r'\\1\\n\\towner="CHI"',
+                province_content
+            )
+        
+        # 修改控制者
+        if re.search(r'controller="?[A-Z]{2,3}"?', province_content):
+            province_content = re.sub(
+                r'controller="?[A-Z]{2,3}"?',
+                'controller="CHI"',
+                province_content
+            )
+        else:
+            # 如果没有controller字段，添加一个
+            province_content = re.sub(
+                r'(owner="CHI")',
+                r'\\1\\n\\tcontroller="CHI"',
+                province_content
+            )
+        
+        # 添加中国核心（如果还没有）
+        if 'CHI' not in transfer_info['cores']:
+            # 在适当位置添加核心
+            if re.search(r'core="[A-Z]{2,3}"', province_content):
+                # 在最后一个core后面添加
+                province_content = re.sub(
+                    r'(core="[A-Z]{2,3}"[\\s\\n]*)',
+                    r'\\1\\tcore="CHI"\\n',
+                    province_content,
+                    count=1
+                )
+            else:
+                # 在controller后面添加
+                province_content = re.sub(
+                    r'(controller="CHI")',
+                    r'\\1\\n\\tcore="CHI"',
+                    province_content
+                )
+        
+        return province_content
+    
+    def build_edit_plan(self, plan: Dict, provinces_data: Dict) -> EditPlan:
+        """根据重分配方案生成编辑计划（不修改内容）"""
+        edit_plan = EditPlan('redistribution', self.content)
+        
+        for transfer_info in plan['transferred_provinces']:
+            province_id = transfer_info['province_id']
+            
+            if province_id in provinces_data:
+                province_data = provinces_data[province_id]
+                province_start = province_data['start_pos']
+                province_content = self.content[province_start:province_data['end_pos']]
+                new_content = self._transfer_province_content(province_content, transfer_info)
+                edit_plan.add_replacement(province_start, province_content, new_content,
+                                          reason=f"转移给CHI <- {transfer_info['original_owner']}",
+                                          block=f"{province_id} {province_data['name']}")
+        
+        return edit_plan
+    
     def preview_redistribution(self) -> Dict:
         """预览重分配方案"""
         print("🔍 省份重分配预览模式")
@@ -270,20 +342,32 @@ class ProvinceRedistributor:
         if len(plan['transferred_provinces']) > 20:
             print(f"   ... 还有 {len(plan['transferred_provinces']) - 20} 个省份")
         
+        # 生成编辑计划
+        edit_plan = self.build_edit_plan(plan, provinces_data)
+        print()
+        edit_plan.preview()
+        
         return {
             'countries_data': countries_data,
             'provinces_data': provinces_data,
-            'redistribution_plan': plan
+            'redistribution_plan': plan,
+            'edit_plan': edit_plan
         }
     
-    def execute_redistribution(self, dry_run: bool = True) -> Dict:
-        """执行省份重分配"""
+    def execute_redistribution(self, dry_run: bool = True, preview: Dict = None) -> Dict:
+        """执行省份重分配
+        
+        preview 为 preview_redistribution() 的返回值时直接执行其中的编辑计划，不再重新分析。
+        """
         print("🔄 执行省份重分配...")
         
         # 获取重分配方案
-        analysis_result = self.preview_redistribution()
+        analysis_result = reusable_preview(preview, self.content)
+        if analysis_result is None:
+            analysis_result = self.preview_redistribution()
         plan = analysis_result['redistribution_plan']
         provinces_data = analysis_result['provinces_data']
+        edit_plan = analysis_result['edit_plan']
         
         if dry_run:
             print("\\n🔍 这是预览模式，未实际修改")
@@ -291,78 +375,16 @@ class ProvinceRedistributor:
         
         print("\\n⚠️ 开始实际修改操作...")
         
-        modifications_made = 0
-        content_modified = self.content
+        # 一次性应用编辑计划
+        self.modifier.apply_redistribution_plan(edit_plan)
+        self.content = self.modifier.content
         
-        # 修改转移给中国的省份
+        modifications_made = 0
         for transfer_info in plan['transferred_provinces']:
             province_id = transfer_info['province_id']
-            
             if province_id in provinces_data:
-                province_data = provinces_data[province_id]
-                
-                # 找到省份块并修改owner和controller
-                province_start = province_data['start_pos']
-                province_end = province_data['end_pos']
-                province_content = content_modified[province_start:province_end]
-                
-                # 修改拥有者
-                if re.search(r'owner="?[A-Z]{2,3}"?', province_content):
-                    province_content = re.sub(
-                        r'owner="?[A-Z]{2,3}"?',
-                        'owner="CHI"',
-                        province_content
-                    )
-                else:
-                    # 如果没有owner字段，添加一个
-                    province_content = re.sub(
-                        r'(name="[^"]*")',
-                        r'\\1\\n\\towner="CHI"',
-                        province_content
-                    )
-                
-                # 修改控制者
-                if re.search(r'controller="?[A-Z]{2,3}"?', province_content):
-                    province_content = re.sub(
-                        r'controller="?[A-Z]{2,3}"?',
-                        'controller="CHI"',
-                        province_content
-                    )
-                else:
-                    # 如果没有controller字段，添加一个
-                    province_content = re.sub(
-                        r'(owner="CHI")',
-                        r'\\1\\n\\tcontroller="CHI"',
-                        province_content
-                    )
-                
-                # 添加中国核心（如果还没有）
-                if 'CHI' not in transfer_info['cores']:
-                    # 在适当位置添加核心
-                    if re.search(r'core="[A-Z]{2,3}"', province_content):
-                        # 在最后一个core后面添加
-                        province_content = re.sub(
-                            r'(core="[A-Z]{2,3}"[\\s\\n]*)',
-                            r'\\1\\tcore="CHI"\\n',
-                            province_content,
-                            count=1
-                        )
-                    else:
-                        # 在controller后面添加
-                        province_content = re.sub(
-                            r'(controller="CHI")',
-                            r'\\1\\n\\tcore="CHI"',
-                            province_content
-                        )
-                
-                # 更新内容
-                content_modified = content_modified[:province_start] + province_content + content_modified[province_end:]
                 modifications_made += 1
-                
-                print(f"✅ 转移省份 {province_data['name']} ({province_id}) -> CHI")
-        
-        # 更新修改器内容
-        self.modifier.content = content_modified
+                print(f"✅ 转移省份 {provinces_data[province_id]['name']} ({province_id}) -> CHI")
         
         print(f"\\n✅ 重分配完成:")
         print(f"   修改省份: {modifications_made} 个")
@@ -406,15 +428,15 @@ class ProvinceRedistributor:
         
         # 执行实际重分配
         print("\\n2️⃣ 执行实际重分配...")
-        result = self.execute_redistribution(dry_run=False)
+        result = self.execute_redistribution(dry_run=False, preview=preview_result)
         
         # 检查花括号平衡
         print("\\n3️⃣ 检查文件完整性...")
         if self.modifier.check_bracket_balance():
             # 保存修改后的文件
             try:
-                with open(self.modifier.file_path, 'w', encoding='utf-8-sig') as f:
-                    f.write(self.modifier.content)
+                if not self.modifier.save_file(self.modifier.file_path):
+                    return None
                 
                 print(f"✅ 重分配完成并保存到原文件")
                 
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 孤立团重新关联
+===================================
+人口被删除后，引用它的团 (regiment 的 pop={ id=N type=46 }) 成为孤立引用。
+删除这些团会毁掉军队；本模块改为给每个孤立的团重新分配一个仍然存在的、
+同一国家的士兵人口，只改写引用中的人口ID。
+
+- 人口索引: 由块索引 (save_index) 中省份的 "soldiers:ID" 子块得到每个士兵人口的
+  省份、所属国家 (省份 owner) 与人数
+- 军队索引: 由国家块的 "army#k" 子块得到每个团引用的人口ID、位置与军队所在省份
+- 容量: 每个士兵人口按人数可支持的团数 (每 SOLDIERS_PER_REGIMENT 人一个团，
+  人数不少于 MIN_SOLDIERS_FOR_REGIMENT 时至少一个)，减去已经引用它的团
+- 分配: 按国家批量处理，优先军队所在省份的士兵人口，其次该国剩余容量最多的人口
+  (堆)，任何人口都不会超额
+
+    result = plan_regiment_relink(content)
+    content = result['edit_plan'].apply(content)
+
+    python regiment_relink.py <存档文件.v2> [--apply]
+"""
+
+import heapq
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from edit_plan import EditPlan
+from save_index import SECTION_COUNTRIES, SECTION_PROVINCES, SaveIndex
+
+SOLDIER_POP_TYPE = 'soldiers'
+SOLDIERS_PER_REGIMENT = 3000
+MIN_SOLDIERS_FOR_REGIMENT = 1000
+
+_OWNER_LINE = re.compile(r'^[ \t]*owner[ \t]*=[ \t]*"?(\w+)"?', re.MULTILINE)
+_SIZE_LINE = re.compile(r'^[ \t]*size[ \t]*=[ \t]*([\d.]+)', re.MULTILINE)
+_LOCATION_LINE = re.compile(r'^[ \t]*location[ \t]*=[ \t]*(\d+)', re.MULTILINE)
+_POP_REFERENCE = re.compile(r'\bpop[ \t]*=[ \t\r\n]*\{[ \t\r\n]*id[ \t]*=[ \t]*(\d+)')
+_NAME_LINE = re.compile(r'name[ \t]*=[ \t]*"([^"\n]*)"')
+
+
+@dataclass
+class SoldierPop:
+    pop_id: int
+    province_id: int
+    country: str
+    size: float
+    capacity: int
+    used: int = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.capacity - self.used
+
+
+@dataclass
+class RegimentReference:
+    country: str
+    army_location: Optional[int]
+    name: str
+    pop_id: int
+    id_start: int   # 引用中人口ID数字的位置
+    id_end: int
+
+
+def regiment_capacity(size: float) -> int:
+    """一个士兵人口可支持的团数"""
+    if size < MIN_SOLDIERS_FOR_REGIMENT:
+        return 0
+    return max(1, int(size // SOLDIERS_PER_REGIMENT))
+
+
+def build_soldier_index(content: str, index: SaveIndex) -> Dict[int, SoldierPop]:
+    """人口索引: 士兵人口ID → SoldierPop"""
+    soldiers: Dict[int, SoldierPop] = {}
+    for entry in index.section_entries(SECTION_PROVINCES):
+        spans = list(entry.child_spans())
+        header_end = spans[0][1] if spans else entry.end_pos
+        owner = _OWNER_LINE.search(content, entry.start_pos + 1, header_end)
+        for key, start, end in spans:
+            pop_type, _, pop_id = key.partition(':')
+            if pop_type != SOLDIER_POP_TYPE or not pop_id.isdigit():
+                continue
+            size = _SIZE_LINE.search(content, start, end)
+            size_value = float(size.group(1)) if size else 0.0
+            soldiers[int(pop_id)] = SoldierPop(int(pop_id), int(entry.name), owner.group(1) if owner else '',
+                                               size_value, regiment_capacity(size_value))
+    return soldiers
+
+
+def build_military_index(content: str, index: SaveIndex) -> List[RegimentReference]:
+    """军队索引: 所有国家军队中每个团的人口引用"""
+    regiments: List[RegimentReference] = []
+    for entry in index.section_entries(SECTION_COUNTRIES):
+        for key, start, end in entry.child_spans():
+            if not key.startswith('army#'):
+                continue
+            references = list(_POP_REFERENCE.finditer(content, start, end))
+            if not references:
+                continue
+            location = _LOCATION_LINE.search(content, start, references[0].start())
+            army_location = int(location.group(1)) if location else None
+            previous_end = start
+            for reference in references:
+                names = list(_NAME_LINE.finditer(content, previous_end, reference.start()))
+                name = names[-1].group(1) if names else ''
+                regiments.append(RegimentReference(entry.name, army_location, name, int(reference.group(1)),
+                                                   reference.start(1), reference.end(1)))
+                previous_end = reference.end()
+    return regiments
+
+
+def assign_soldier_pops(orphans: List[RegimentReference], soldiers: Dict[int, SoldierPop]
+                        ) -> Tuple[Dict[int, int], List[int]]:
+    """为孤立的团分配士兵人口: 返回 ({团序号: 人口ID}, [未能分配的团序号])"""
+    by_country: Dict[str, Dict[int, List[SoldierPop]]] = {}
+    for pop in soldiers.values():
+        if pop.remaining > 0:
+            by_country.setdefault(pop.country, {}).setdefault(pop.province_id, []).append(pop)
+
+    orphans_by_country: Dict[str, List[int]] = {}
+    for number, regiment in enumerate(orphans):
+        orphans_by_country.setdefault(regiment.country, []).append(number)
+
+    assignment: Dict[int, int] = {}
+    unassigned: List[int] = []
+    for country, numbers in orphans_by_country.items():
+        provinces = by_country.get(country, {})
+        for pops in provinces.values():
+            pops.sort(key=lambda pop: pop.remaining, reverse=True)
+
+        # 先在军队所在省份分配
+        remaining_numbers = []
+        for number in numbers:
+            pops = provinces.get(orphans[number].army_location)
+            pop = next((pop for pop in pops if pop.remaining > 0), None) if pops else None
+            if pop is None:
+                remaining_numbers.append(number)
+                continue
+            pop.used += 1
+            assignment[number] = pop.pop_id
+
+        # 其余的团分配给该国剩余容量最多的人口
+        heap = [(-pop.remaining, pop.pop_id, pop) for pops in provinces.values() for pop in pops if pop.remaining > 0]
+        heapq.heapify(heap)
+        for number in remaining_numbers:
+            if not heap:
+                unassigned.append(number)
+                continue
+            _, pop_id, pop = heapq.heappop(heap)
+            pop.used += 1
+            assignment[number] = pop_id
+            if pop.remaining > 0:
+                heapq.heappush(heap, (-pop.remaining, pop_id, pop))
+    return assignment, unassigned
+
+
+def plan_regiment_relink(content: str, index: Optional[SaveIndex] = None,
+                         only_pop_ids: Optional[Iterable[int]] = None) -> Dict:
+    """生成孤立团重新关联的编辑计划；only_pop_ids 限定只处理引用这些人口ID的团"""
+    if index is None:
+        index = SaveIndex().build(content)
+    soldiers = build_soldier_index(content, index)
+    regiments = build_military_index(content, index)
+    all_pop_ids = {int(key.partition(':')[2]) for entry in index.section_entries(SECTION_PROVINCES)
+                   for key, *_ in entry.children if ':' in key}
+    wanted = {int(pop_id) for pop_id in only_pop_ids} if only_pop_ids is not None else None
+
+    orphans = []
+    for regiment in regiments:
+        if regiment.pop_id in all_pop_ids:
+            pop = soldiers.get(regiment.pop_id)
+            if pop is not None:
+                pop.used += 1  # 现有的团占用容量
+        elif wanted is None or regiment.pop_id in wanted:
+            orphans.append(regiment)
+
+    assignment, unassigned = assign_soldier_pops(orphans, soldiers)
+
+    edit_plan = EditPlan('regiment_relink', content)
+    same_province = 0
+    for number, pop_id in sorted(assignment.items(), key=lambda item: orphans[item[0]].id_start):
+        regiment = orphans[number]
+        if soldiers[pop_id].province_id == regiment.army_location:
+            same_province += 1
+        edit_plan.add(regiment.id_start, regiment.id_end, str(pop_id), reason='重新关联士兵人口',
+                      block=regiment.country, expect=str(regiment.pop_id))
+
+    overloaded = sum(1 for pop in soldiers.values() if pop.used > pop.capacity)
+    report = {
+        'regiments': len(regiments),
+        'orphaned': len(orphans),
+        'relinked': len(assignment),
+        'same_province': same_province,
+        'unassigned': len(unassigned),
+        'soldier_pops': len(soldiers),
+        'overloaded_pops': overloaded,
+    }
+    return {
+        'edit_plan': edit_plan,
+        'report': report,
+        'relinked': [{'country': orphans[number].country, 'name': orphans[number].name,
+                      'old_pop_id': orphans[number].pop_id, 'new_pop_id': pop_id}
+                     for number, pop_id in assignment.items()],
+        'unassigned': [{'country': orphans[number].country, 'name': orphans[number].name,
+                        'pop_id': orphans[number].pop_id} for number in unassigned],
+    }
+
+
+def print_relink_report(report: Dict):
+    print(f"\n🪖 团总数: {report['regiments']:,}, 孤立引用: {report['orphaned']:,}")
+    print(f"   重新关联: {report['relinked']:,} (其中军队所在省份 {report['same_province']:,})")
+    if report['unassigned']:
+        print(f"⚠️ 没有可用士兵人口的团: {report['unassigned']:,} (该国士兵人口容量不足)")
+    if report['overloaded_pops']:
+        print(f"⚠️ 原本就超额的士兵人口: {report['overloaded_pops']:,}")
+
+
+def main():
+    arguments = [argument for argument in sys.argv[1:] if argument != '--apply']
+    if len(arguments) != 1:
+        print("用法: python regiment_relink.py <存档文件.v2> [--apply]")
+        print("  不加 --apply 时只预览")
+        return
+
+    from victoria2_main_modifier import Victoria2Modifier
+
+    modifier = Victoria2Modifier()
+    if not modifier.load_file(arguments[0]):
+        return
+    result = modifier.relink_orphaned_regiments(dry_run='--apply' not in sys.argv)
+    if '--apply' in sys.argv and result.get('applied'):
+        modifier.save_file(arguments[0])
+
+
+if __name__ == "__main__":
+    main()
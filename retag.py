@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 国家代码重映射 (合并/改名)
+===================================
+按映射 {旧代码: 新代码} 在一次扫描中改写存档中所有出现的国家代码:
+省份的 owner/controller/core、宗主国 overlord、外交关系键、国家块键、
+带引号的引用 (战争、同盟等) 以及列表项。
+
+扫描器用一个正则顺序匹配字符串、花括号与三字母代码，代码出现的上下文
+(作为块键、作为某个键的值、作为列表项) 由相邻字符判断，不必为每个代码、
+每种上下文各搜索一遍。映射是同时生效的 (交换 A↔B 也可以)。
+
+改写后同一个块中出现重复的代码键时:
+- 顶级国家块: 保留原本就是新代码的块 (其标量字段优先)，把被合并国家的
+  军队、舰队、将领、州与目标国家没有的外交关系移入其中，删除旧块
+- 其他块 (如国家间关系): 保留原本就是新代码的块，删除改名后重复的块
+- 国家与自身的关系块、同一省份中重复的 core 一并删除
+
+    engine = RetagEngine({'ENG': 'GBR', 'HAN': 'CHI'})
+    plan = engine.plan(content)      # EditPlan，原因为上下文名称
+    content = plan.apply(content)
+    engine.report                    # 各上下文改写次数、合并与删除的块
+
+    python retag.py <存档文件.v2> 旧代码=新代码 [旧代码=新代码 ...] [--apply]
+"""
+
+import bisect
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from edit_plan import EditPlan
+
+TAG_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+
+# 字符串 | 花括号 | 独立的三字母代码
+_TOKEN = re.compile(r'"([^"\n]*)"|([{}])|(?<![\w."])([A-Z][A-Z0-9]{2})(?![\w."])')
+_KEY_BEFORE_EQUALS = re.compile(r'(\w+)[ \t\r\n]*=[ \t\r\n]*\Z')
+_VALUE_LINE_PREFIX = re.compile(r'[ \t]*\w+[ \t]*=[ \t]*\Z')
+
+# 合并国家块时移入目标国家的子块 (可重复出现的键)
+TRANSFERRED_BLOCKS = ('army', 'navy', 'leader', 'state')
+# 同一块中不应重复的值键
+UNIQUE_VALUE_KEYS = ('core',)
+
+CONTEXT_COUNTRY_BLOCK = 'country_block'
+CONTEXT_TAG_BLOCK = 'tag_block'
+CONTEXT_TAG_KEY = 'tag_key'
+CONTEXT_LIST = 'list'
+
+
+class _Frame:
+    """扫描中的一个块"""
+    __slots__ = ('key', 'tag', 'final', 'key_start', 'open_pos', 'close_pos', 'depth',
+                 'tag_children', 'children', 'values')
+
+    def __init__(self, key: Optional[str], depth: int, key_start: int, open_pos: int):
+        self.key = key
+        self.tag: Optional[str] = None     # 块键是国家代码时的原代码
+        self.final: Optional[str] = None   # 映射后的代码
+        self.key_start = key_start
+        self.open_pos = open_pos
+        self.close_pos = -1
+        self.depth = depth
+        self.tag_children: List['_Frame'] = []
+        self.children: List['_Frame'] = []                # 仅对顶级国家块记录
+        self.values: List[Tuple[str, str, int, int]] = []  # (键, 映射后的代码, 代码起点, 代码终点)
+
+
+def _skip_spaces(content: str, position: int) -> int:
+    while position < len(content) and content[position] in ' \t\r\n':
+        position += 1
+    return position
+
+
+def _block_key(content: str, open_pos: int) -> Tuple[Optional[str], int]:
+    """'{' 之前的 "键=" ，返回 (键, 键起点)"""
+    match = _KEY_BEFORE_EQUALS.search(content, max(0, open_pos - 64), open_pos)
+    if match is None:
+        return None, open_pos
+    return match.group(1), match.start()
+
+
+def _line_span(content: str, start: int, end: int) -> Tuple[int, int]:
+    """块独占若干行时扩展为整行 (含行尾换行)，否则保持原区域"""
+    line_start = content.rfind('\n', 0, start) + 1
+    if content[line_start:start].strip():
+        return start, end
+    if end < len(content) and content[end] == '\r':
+        end += 1
+    if end < len(content) and content[end] == '\n':
+        end += 1
+    return line_start, end
+
+
+def _duplicate_value_lines(content: str, values: List[Tuple[str, str, int, int]]) -> List[Tuple[int, int, str, str]]:
+    """同一块中映射后重复的 "键=代码" 行 (只删除独占一行的)"""
+    removed = []
+    seen = set()
+    for key, final, start, end in values:
+        if (key, final) in seen:
+            line_start = content.rfind('\n', 0, start) + 1
+            if _VALUE_LINE_PREFIX.match(content, line_start, start):
+                removed.append(_line_span(content, line_start, end) + (f'duplicate_{key}', final))
+        seen.add((key, final))
+    return removed
+
+
+class RetagEngine:
+    """单次扫描的国家代码重映射"""
+
+    def __init__(self, mapping: Dict[str, str]):
+        for old_tag, new_tag in mapping.items():
+            if not TAG_PATTERN.match(old_tag) or not TAG_PATTERN.match(new_tag):
+                raise ValueError(f"无效的国家代码映射: {old_tag}={new_tag}")
+        self.mapping = {old_tag: new_tag for old_tag, new_tag in mapping.items() if old_tag != new_tag}
+        self.report: Dict = {}
+
+    def _final(self, tag: str) -> str:
+        return self.mapping.get(tag, tag)
+
+    def _classify(self, content: str, start: int, end: int, depth: int) -> Tuple[str, bool]:
+        """代码出现的上下文，以及它是否是一个块的键"""
+        after = _skip_spaces(content, end)
+        if after < len(content) and content[after] == '=':
+            opens = _skip_spaces(content, after + 1)
+            if opens < len(content) and content[opens] == '{':
+                return (CONTEXT_COUNTRY_BLOCK if depth == 0 else CONTEXT_TAG_BLOCK), True
+            return CONTEXT_TAG_KEY, False
+        before = start
+        while before > 0 and content[before - 1] in ' \t\r\n':
+            before -= 1
+        if before > 0 and content[before - 1] == '=':
+            key = _KEY_BEFORE_EQUALS.search(content, max(0, before - 64), before)
+            if key:
+                return key.group(1), False
+        return CONTEXT_LIST, False
+
+    def _scan(self, content: str, structure: bool = True):
+        """一次扫描: 返回 (代码改写列表 [(起点, 终点, 新文本, 上下文)], 含代码键子块的块 (第一个为根), 重复值行的删除区域)"""
+        mapping = self.mapping
+        rewrites: List[Tuple[int, int, str, str]] = []
+        duplicates: List[Tuple[int, int, str, str]] = []
+        root = _Frame(None, -1, 0, -1)
+        stack = [root]
+        parents = [root]
+        pending_tag: Optional[Tuple[str, int]] = None  # 下一个 '{' 所属的代码键 (原代码, 键起点)
+
+        for match in _TOKEN.finditer(content):
+            quoted, brace, bare = match.groups()
+            frame = stack[-1]
+            depth = len(stack) - 1
+            if brace == '{':
+                if pending_tag is not None:
+                    tag, key_start = pending_tag
+                    key = tag
+                    pending_tag = None
+                else:
+                    tag = None
+                    key, key_start = _block_key(content, match.start()) if structure and depth <= 1 else (None, 0)
+                child = _Frame(key, depth, key_start, match.start())
+                if tag is not None:
+                    child.tag, child.final = tag, self._final(tag)
+                    if not frame.tag_children and frame is not root:
+                        parents.append(frame)
+                    frame.tag_children.append(child)
+                if depth == 1 and frame.tag is not None:
+                    frame.children.append(child)
+                stack.append(child)
+                continue
+            if brace == '}':
+                if len(stack) > 1:
+                    closed = stack.pop()
+                    closed.close_pos = match.start()
+                    if closed.values:
+                        duplicates.extend(_duplicate_value_lines(content, closed.values))
+                continue
+
+            tag = bare if bare is not None else quoted
+            if not TAG_PATTERN.match(tag):
+                continue
+            context, is_block_key = self._classify(content, match.start(), match.end(), depth)
+            if is_block_key:
+                pending_tag = (tag, match.start())
+            elif context in UNIQUE_VALUE_KEYS and structure:
+                frame.values.append((context, self._final(tag), match.start(), match.end()))
+            new_tag = mapping.get(tag)
+            if new_tag is not None:
+                new_text = f'"{new_tag}"' if quoted is not None else new_tag
+                rewrites.append((match.start(), match.end(), new_text, context))
+        return rewrites, parents, duplicates
+
+    def _retag_text(self, text: str, contexts: Counter) -> str:
+        """改写一段文本 (合并时移入的子块) 中的代码"""
+        rewrites, _, _ = self._scan(text, structure=False)
+        parts = []
+        position = 0
+        for start, end, new_text, context in rewrites:
+            parts.append(text[position:start])
+            parts.append(new_text)
+            contexts[context] += 1
+            position = end
+        parts.append(text[position:])
+        return ''.join(parts)
+
+    def plan(self, content: str) -> EditPlan:
+        """生成改写计划；结果统计见 self.report"""
+        rewrites, parents, duplicates = self._scan(content)
+        root = parents[0]
+        plan = EditPlan('retag', content)
+        removed: List[Tuple[int, int, str, str]] = []  # (起点, 终点, 原因, 块)
+        insertions: List[Tuple[int, str, str]] = []
+        merged: List[Dict] = []
+        contexts: Counter = Counter()
+        keeper_relations: Dict[int, set] = {}
+
+        def remove(frame: _Frame, reason: str, block: str):
+            start, end = _line_span(content, frame.key_start, frame.close_pos + 1)
+            removed.append((start, end, reason, block))
+
+        def resolve(frame: _Frame):
+            groups: Dict[str, List[_Frame]] = {}
+            for child in frame.tag_children:
+                groups.setdefault(child.final, []).append(child)
+            for final, blocks in groups.items():
+                if frame.depth == 0 and frame.final == final:
+                    # 国家与自身的关系
+                    for block in blocks:
+                        remove(block, 'self_relation', frame.final)
+                    continue
+                if len(blocks) < 2:
+                    continue
+                keeper = next((block for block in blocks if block.tag == final), blocks[0])
+                for block in blocks:
+                    if block is keeper:
+                        continue
+                    if frame is root:
+                        relations = keeper_relations.setdefault(
+                            id(keeper), {child.final for child in keeper.tag_children})
+                        merged.append(self._merge(content, block, keeper, relations, insertions, contexts))
+                        remove(block, 'merged_country_block', block.tag)
+                    else:
+                        remove(block, 'duplicate_tag_block', block.tag)
+
+        for frame in parents:
+            resolve(frame)
+        removed.extend(duplicates)
+
+        # 被删除区域内的改写、嵌套在其他删除区域内的删除都不再需要
+        removed.sort()
+        spans: List[Tuple[int, int, str, str]] = []
+        for span in removed:
+            if spans and span[0] < spans[-1][1]:
+                continue
+            spans.append(span)
+        starts = [span[0] for span in spans]
+
+        def inside_removed(position: int) -> bool:
+            index = bisect.bisect_right(starts, position) - 1
+            return index >= 0 and position < spans[index][1]
+
+        for start, end, reason, block in spans:
+            plan.add(start, end, '', reason=reason, block=block)
+        for start, end, new_text, context in rewrites:
+            if not inside_removed(start):
+                plan.add(start, end, new_text, reason=context)
+                contexts[context] += 1
+        for position, text, block in insertions:
+            plan.add(position, position, text, reason='merged_content', block=block)
+
+        self.report = {
+            'mapping': dict(self.mapping),
+            'contexts': dict(contexts.most_common()),
+            'total_rewrites': sum(contexts.values()),
+            'merged_countries': merged,
+            'removed_blocks': dict(Counter(span[2] for span in spans)),
+        }
+        return plan
+
+    def _merge(self, content: str, block: _Frame, keeper: _Frame, keeper_relations: set, insertions: List,
+               contexts: Counter) -> Dict:
+        """把被合并国家块中可转移的子块插入目标国家块末尾；keeper_relations 为目标国家已有的关系"""
+        moved = Counter()
+        texts = []
+        for child in block.children:
+            if child.tag is not None:
+                if child.final in keeper_relations or child.final == keeper.final:
+                    continue
+                keeper_relations.add(child.final)
+                kind = 'relations'
+            elif child.key in TRANSFERRED_BLOCKS:
+                kind = child.key
+            else:
+                continue
+            start, end = _line_span(content, child.key_start, child.close_pos + 1)
+            texts.append(self._retag_text(content[start:end], contexts))
+            moved[kind] += 1
+        if texts:
+            position, _ = _line_span(content, keeper.close_pos, keeper.close_pos + 1)
+            insertions.append((position, ''.join(texts), keeper.final))
+        return {'from': block.tag, 'into': keeper.final, 'moved': dict(moved)}
+
+
+def count_tag_references(content: str, tags: Iterable[str]) -> Dict[str, int]:
+    """一次扫描统计各国家代码在所有上下文中的出现次数"""
+    wanted = set(tags)
+    counts = {tag: 0 for tag in wanted}
+    for match in _TOKEN.finditer(content):
+        tag = match.group(3) or match.group(1)
+        if tag in wanted:
+            counts[tag] += 1
+    return counts
+
+
+def parse_mapping(arguments: Iterable[str]) -> Dict[str, str]:
+    """['ENG=GBR', ...] → {'ENG': 'GBR', ...}"""
+    mapping = {}
+    for argument in arguments:
+        old_tag, _, new_tag = argument.partition('=')
+        mapping[old_tag.strip().upper()] = new_tag.strip().upper()
+    return mapping
+
+
+def print_retag_report(report: Dict):
+    print(f"\n🏷️ 国家代码重映射: {', '.join(f'{old}→{new}' for old, new in report['mapping'].items())}")
+    print(f"   改写 {report['total_rewrites']:,} 处")
+    for context, count in report['contexts'].items():
+        print(f"   {context:<20} {count:>8,}")
+    for merge in report['merged_countries']:
+        moved = ', '.join(f'{kind}×{count}' for kind, count in merge['moved'].items()) or '无'
+        print(f"🔀 合并国家块 {merge['from']} → {merge['into']} (移入: {moved})")
+    for reason, count in report['removed_blocks'].items():
+        print(f"🗑️ {reason}: {count}")
+
+
+def main():
+    arguments = [argument for argument in sys.argv[1:] if argument != '--apply']
+    if len(arguments) < 2:
+        print("用法: python retag.py <存档文件.v2> 旧代码=新代码 [旧代码=新代码 ...] [--apply]")
+        print("  不加 --apply 时只预览")
+        return
+
+    from victoria2_main_modifier import Victoria2Modifier
+
+    modifier = Victoria2Modifier()
+    if not modifier.load_file(arguments[0]):
+        return
+    result = modifier.retag_countries(parse_mapping(arguments[1:]), dry_run='--apply' not in sys.argv)
+    if '--apply' in sys.argv and result.get('applied'):
+        modifier.save_file(arguments[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 抽样近似分析
+===================================
+超大存档不必逐个解析所有人口: 借助块索引 (save_index.SaveIndex) 中记录的
+省份与人口块位置，可以直接跳到任意一个人口块或省份块解析 (O(1) 随机访问)。
+
+- 抽样单位: 人口块 (unit='pop') 或整个省份 (unit='province')
+- 抽样方法: 简单随机 (uniform) 或按省份所有者分层、按比例分配 (stratified)
+- 预算: 样本量 (sample_size) 和/或时间 (time_budget 秒)，先到者为准；
+  抽样顺序保证任意前缀都近似按比例分层，时间用完时得到的样本仍然有效
+- 估计: 总量 (人口、金钱)、按人口加权的均值 (斗争性、意识、识字率)、
+  文化/宗教/人口类型的人口占比，均给出置信区间 (分层估计 + 有限总体校正，
+  均值与占比为比率估计)
+
+    sampler = SaveSampler('China1840_02_06.v2')
+    result = sampler.estimate(unit='pop', method='stratified', time_budget=1.0)
+    print_sample_report(result)
+
+    python sampling.py <存档文件.v2> [--unit pop|province] [--method uniform|stratified]
+                       [--sample N] [--time 秒] [--seed N]
+"""
+
+import math
+import random
+import re
+import sys
+import time
+from statistics import NormalDist
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from save_events import VALUE, iter_text_events
+from save_index import SECTION_PROVINCES, load_or_build_index, load_save_text
+
+DEFAULT_SAMPLE_SIZE = 1000
+MIN_STRATUM_SAMPLE = 2  # 少于该样本量的层合并后再估计方差
+DEFAULT_CONFIDENCE = 0.95
+
+_OWNER_LINE = re.compile(r'^[ \t]*owner[ \t]*=[ \t]*"?(\w+)"?', re.MULTILINE)
+_NON_CULTURE_VALUES = frozenset(('yes', 'no'))
+
+# 按人口加权求均值的字段
+WEIGHTED_FIELDS = ('mil', 'con', 'literacy')
+# 直接求总量的字段
+TOTAL_FIELDS = ('size', 'money', 'bank')
+DISTRIBUTIONS = ('culture', 'religion', 'type')
+
+
+class Estimate(NamedTuple):
+    value: float
+    low: float
+    high: float
+    standard_error: float
+
+
+def detection_sample_size(population: int, defect_rate: float = 0.05, confidence: float = DEFAULT_CONFIDENCE) -> int:
+    """若至少 defect_rate 比例的单位有问题，以 confidence 的概率至少抽到一个所需的样本量 (含有限总体校正)"""
+    if population <= 0:
+        return 0
+    if defect_rate >= 1:
+        return 1
+    base = math.log(1 - confidence) / math.log(1 - defect_rate)
+    corrected = base / (1 + (base - 1) / population)
+    return min(population, math.ceil(corrected))
+
+
+def _measure_pop(content: str, pop_type: str, start: int, end: int) -> Dict[str, float]:
+    """解析一个人口块，返回可累加的量"""
+    fields: Dict[str, Any] = {}
+    culture = religion = None
+    for kind, path, key, value in iter_text_events(content[start + 1:end]):
+        if kind != VALUE or path:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            fields.setdefault(key, float(value))
+        elif culture is None and isinstance(value, str) and value not in _NON_CULTURE_VALUES:
+            culture, religion = key, value
+
+    size = fields.get('size', 0.0)
+    values = {'pops': 1.0}
+    for name in TOTAL_FIELDS:
+        values[name] = fields.get(name, 0.0)
+    for name in WEIGHTED_FIELDS:
+        values[f'{name}*size'] = fields.get(name, 0.0) * size
+    values[f'type:{pop_type}'] = size
+    if culture:
+        values[f'culture:{culture}'] = size
+        values[f'religion:{religion}'] = size
+    return values
+
+
+def _add_values(total: Dict[str, float], values: Dict[str, float]):
+    for key, value in values.items():
+        total[key] = total.get(key, 0.0) + value
+
+
+class _Estimator:
+    """分层样本的总量与比率估计"""
+
+    def __init__(self, strata_sizes: Dict[str, int], samples: Dict[str, List[Dict[str, float]]],
+                 confidence: float):
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        # 样本太少的层合并为一层 (按比例抽样时合并后近似自加权)
+        merged_size = 0
+        merged_samples: List[Dict[str, float]] = []
+        self.strata: List[Tuple[int, List[Dict[str, float]]]] = []
+        for stratum, size in strata_sizes.items():
+            units = samples.get(stratum, [])
+            if len(units) >= MIN_STRATUM_SAMPLE:
+                self.strata.append((size, units))
+            else:
+                merged_size += size
+                merged_samples.extend(units)
+        if merged_samples:
+            self.strata.append((merged_size, merged_samples))
+
+    def _combine(self, value_of: Callable[[Dict[str, float]], float]) -> Tuple[float, float]:
+        """Σ N_h·ȳ_h 及其方差 Σ N_h²(1-f_h)s²_h/n_h"""
+        total = variance = 0.0
+        for size, units in self.strata:
+            n = len(units)
+            values = [value_of(unit) for unit in units]
+            mean = sum(values) / n
+            total += size * mean
+            if n > 1:
+                sample_variance = sum((value - mean) ** 2 for value in values) / (n - 1)
+                variance += size * size * (1 - n / size) * sample_variance / n
+        return total, max(variance, 0.0)
+
+    def _interval(self, value: float, variance: float) -> Estimate:
+        error = math.sqrt(variance)
+        return Estimate(value, value - self.z * error, value + self.z * error, error)
+
+    def total(self, key: str) -> Estimate:
+        value, variance = self._combine(lambda unit: unit.get(key, 0.0))
+        return self._interval(value, variance)
+
+    def ratio(self, numerator: str, denominator: str) -> Estimate:
+        """比率估计 R = T(numerator)/T(denominator)，方差用线性化 d = y - R·x"""
+        total_numerator, _ = self._combine(lambda unit: unit.get(numerator, 0.0))
+        total_denominator, _ = self._combine(lambda unit: unit.get(denominator, 0.0))
+        if not total_denominator:
+            return Estimate(0.0, 0.0, 0.0, 0.0)
+        ratio = total_numerator / total_denominator
+        _, variance = self._combine(lambda unit: unit.get(numerator, 0.0) - ratio * unit.get(denominator, 0.0))
+        return self._interval(ratio, variance / (total_denominator * total_denominator))
+
+
+class SaveSampler:
+    """基于块索引随机访问人口/省份块的抽样器"""
+
+    def __init__(self, save_path: str, content: Optional[str] = None):
+        self.save_path = save_path
+        start = time.time()
+        self.content = content if content is not None else load_save_text(save_path)
+        self.index = load_or_build_index(save_path, self.content)
+
+        # 抽样框: 省份 (ID, 所有者, 人口块位置列表) 与人口块 (省份序号, 人口类型, '{'位置, '}'位置)
+        self.provinces: List[Tuple[str, str, List[Tuple[str, int, int]]]] = []
+        self.pops: List[Tuple[int, str, int, int]] = []
+        for entry in self.index.section_entries(SECTION_PROVINCES):
+            spans = [(key.split(':', 1)[0], child_start, child_end)
+                     for key, child_start, child_end in entry.child_spans() if ':' in key]
+            header_end = min((child_start for _, child_start, _ in spans), default=entry.end_pos)
+            owner = _OWNER_LINE.search(self.content, entry.start_pos + 1, header_end)
+            province_number = len(self.provinces)
+            self.provinces.append((entry.name, owner.group(1) if owner else '', spans))
+            self.pops.extend((province_number, pop_type, child_start, child_end)
+                             for pop_type, child_start, child_end in spans)
+        self.setup_seconds = time.time() - start
+
+    def _strata(self, unit: str) -> List[str]:
+        """每个抽样单位所属的层 (省份所有者)"""
+        if unit == 'province':
+            return [owner for _, owner, _ in self.provinces]
+        return [self.provinces[province_number][1] for province_number, _, _, _ in self.pops]
+
+    def draw_order(self, unit: str = 'pop', method: str = 'stratified', seed: Optional[int] = None) -> List[int]:
+        """抽样顺序: 简单随机为随机排列；分层时各层内随机，并按 (k+U)/N_h 交错，任意前缀都近似按比例分配"""
+        rng = random.Random(seed)
+        count = len(self.provinces) if unit == 'province' else len(self.pops)
+        if method == 'uniform':
+            order = list(range(count))
+            rng.shuffle(order)
+            return order
+        if method != 'stratified':
+            raise ValueError(f"未知抽样方法: {method} (可用: uniform, stratified)")
+
+        members: Dict[str, List[int]] = {}
+        for position, stratum in enumerate(self._strata(unit)):
+            members.setdefault(stratum, []).append(position)
+        keyed = []
+        for positions in members.values():
+            rng.shuffle(positions)
+            size = len(positions)
+            keyed.extend(((k + rng.random()) / size, position) for k, position in enumerate(positions))
+        keyed.sort()
+        return [position for _, position in keyed]
+
+    def _measure(self, unit: str, position: int) -> Dict[str, float]:
+        if unit == 'province':
+            values: Dict[str, float] = {'pops': 0.0}
+            for pop_type, start, end in self.provinces[position][2]:
+                _add_values(values, _measure_pop(self.content, pop_type, start, end))
+            return values
+        _, pop_type, start, end = self.pops[position]
+        return _measure_pop(self.content, pop_type, start, end)
+
+    def iter_sampled_pops(self, method: str = 'stratified', seed: Optional[int] = None
+                          ) -> Iterator[Tuple[str, str, str]]:
+        """按抽样顺序产生 (人口类型, 人口块文本, 省份ID)，格式同 ComprehensivePopulationAnalyzer 的人口块"""
+        for position in self.draw_order('pop', method, seed):
+            province_number, pop_type, start, end = self.pops[position]
+            yield pop_type, f"{pop_type}={self.content[start:end + 1]}", self.provinces[province_number][0]
+
+    def estimate(self, unit: str = 'pop', method: str = 'stratified', sample_size: Optional[int] = None,
+                 time_budget: Optional[float] = None, confidence: float = DEFAULT_CONFIDENCE,
+                 seed: Optional[int] = None) -> Dict[str, Any]:
+        """在样本量/时间预算内抽样，返回带置信区间的估计"""
+        if unit not in ('pop', 'province'):
+            raise ValueError(f"未知抽样单位: {unit} (可用: pop, province)")
+        if sample_size is None and time_budget is None:
+            sample_size = DEFAULT_SAMPLE_SIZE
+
+        start = time.time()
+        strata = self._strata(unit)
+        strata_sizes: Dict[str, int] = {}
+        for stratum in strata:
+            strata_sizes[stratum] = strata_sizes.get(stratum, 0) + 1
+        if method == 'uniform':
+            strata_sizes = {'': len(strata)}
+
+        samples: Dict[str, List[Dict[str, float]]] = {}
+        sampled = 0
+        deadline = start + time_budget if time_budget is not None else None
+        for position in self.draw_order(unit, method, seed):
+            if sample_size is not None and sampled >= sample_size:
+                break
+            if deadline is not None and sampled >= MIN_STRATUM_SAMPLE and time.time() >= deadline:
+                break
+            stratum = strata[position] if method == 'stratified' else ''
+            samples.setdefault(stratum, []).append(self._measure(unit, position))
+            sampled += 1
+
+        if not sampled:
+            return {'unit': unit, 'method': method, 'frame_size': len(strata), 'sample_size': 0}
+
+        estimator = _Estimator(strata_sizes, samples, confidence)
+        categories: Dict[str, set] = {name: set() for name in DISTRIBUTIONS}
+        for units in samples.values():
+            for values in units:
+                for key in values:
+                    prefix, _, name = key.partition(':')
+                    if prefix in categories and name:
+                        categories[prefix].add(name)
+
+        return {
+            'unit': unit,
+            'method': method,
+            'confidence': confidence,
+            'frame_size': len(strata),
+            'sample_size': sampled,
+            'pop_count': len(self.pops),
+            'province_count': len(self.provinces),
+            'elapsed': time.time() - start,
+            'totals': {name: estimator.total(name) for name in TOTAL_FIELDS},
+            'means': {name: estimator.ratio(f'{name}*size', 'size') for name in WEIGHTED_FIELDS},
+            'distributions': {
+                prefix: dict(sorted(((name, estimator.ratio(f'{prefix}:{name}', 'size')) for name in names),
+                                    key=lambda item: item[1].value, reverse=True))
+                for prefix, names in categories.items()
+            },
+        }
+
+
+def plain_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """把估计值转换为字典，便于保存为JSON"""
+    if isinstance(result, Estimate):
+        return result._asdict()
+    if isinstance(result, dict):
+        return {key: plain_result(value) for key, value in result.items()}
+    return result
+
+
+def print_sample_report(result: Dict[str, Any], top: int = 8):
+    """打印抽样估计摘要"""
+    if not result.get('sample_size'):
+        print("❌ 未抽到任何样本")
+        return
+    unit_name = '人口块' if result['unit'] == 'pop' else '省份'
+    print(f"\n🎲 抽样估计 ({result['method']}, {unit_name} {result['sample_size']:,}/{result['frame_size']:,}, "
+          f"{result['elapsed']:.2f}秒, {result['confidence']:.0%} 置信区间)")
+    print(f"   人口块总数: {result['pop_count']:,}  省份总数: {result['province_count']:,}")
+    print("-" * 70)
+    labels = {'size': '总人口', 'money': '总金钱', 'bank': '总存款', 'mil': '平均斗争性', 'con': '平均意识',
+              'literacy': '平均识字率'}
+    for name, estimate in result['totals'].items():
+        print(f"{labels[name]:<8} {estimate.value:>18,.0f}   [{estimate.low:,.0f}, {estimate.high:,.0f}]")
+    for name, estimate in result['means'].items():
+        print(f"{labels[name]:<8} {estimate.value:>18.3f}   [{estimate.low:.3f}, {estimate.high:.3f}]")
+    titles = {'culture': '文化', 'religion': '宗教', 'type': '人口类型'}
+    for prefix, shares in result['distributions'].items():
+        print(f"\n{titles[prefix]}人口占比:")
+        for name, estimate in list(shares.items())[:top]:
+            print(f"  {name:<20} {estimate.value:>7.2%}   [{max(estimate.low, 0):.2%}, {min(estimate.high, 1):.2%}]")
+
+
+def _pop_option(arguments: List[str], name: str) -> Optional[str]:
+    if name in arguments:
+        position = arguments.index(name)
+        value = arguments[position + 1]
+        del arguments[position:position + 2]
+        return value
+    return None
+
+
+def main():
+    arguments = sys.argv[1:]
+    if not arguments:
+        print("用法: python sampling.py <存档文件.v2> [--unit pop|province] [--method uniform|stratified] "
+              "[--sample N] [--time 秒] [--seed N]")
+        return
+
+    unit = _pop_option(arguments, '--unit') or 'pop'
+    method = _pop_option(arguments, '--method') or 'stratified'
+    sample_size = _pop_option(arguments, '--sample')
+    time_budget = _pop_option(arguments, '--time')
+    seed = _pop_option(arguments, '--seed')
+
+    sampler = SaveSampler(arguments[0])
+    print(f"📂 {arguments[0]}: {len(sampler.provinces):,} 个省份, {len(sampler.pops):,} 个人口块 "
+          f"(索引与加载 {sampler.setup_seconds:.2f}秒)")
+    result = sampler.estimate(unit, method, int(sample_size) if sample_size else None,
+                              float(time_budget) if time_budget else None, seed=int(seed) if seed else None)
+    print_sample_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档事件流 (SAX风格)
+===================================
+分块读取存档，边分词边产生事件，不在内存中构建树；
+使用方可以在常量内存下对整个存档做汇总。
+
+事件 SaveEvent(kind, path, key, value):
+    BEGIN   块开始    key=块名 (无名块为None，在内层 path 中记为 '')，path=外层块名元组
+    END     块结束    与对应的 BEGIN 相同的 path 和 key
+    VALUE   键值对    value 为带类型的标量
+    ITEM    列表项    key=None (如 "1 0.000" 中的每一项)
+
+标量按 field_schema 的类型表直接解码 (如 money → float，civilized → bool)；
+未登记的键按文本猜测: yes/no → bool，整数 → int，小数 → float，
+带引号的字符串与日期 (1836.1.1) 等 → str。键始终为 str。
+
+    for event in iter_events("save.v2"):
+        if event.kind == VALUE and event.path == ('CHI',) and event.key == 'money':
+            print(event.value)
+"""
+
+import io
+import re
+from typing import Any, Iterator, NamedTuple, Optional, TextIO, Tuple, Union
+
+from field_schema import DEFAULT_SCHEMA, FieldSchema, Scalar, guess_scalar
+
+BEGIN = 'begin'
+END = 'end'
+VALUE = 'value'
+ITEM = 'item'
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+_BARE = r'[^\s{}="]+'
+_QUOTED = r'"[^"]*"'
+_EVENT_PATTERN = re.compile(
+    rf'(?P<key>{_BARE}|{_QUOTED})[ \t\r\n]*=[ \t\r\n]*(?P<value>[{{}}]|{_QUOTED}|{_BARE})?'
+    rf'|(?P<token>[{{}}]|{_QUOTED}|{_BARE})'
+    r'|(?P<stray>["=])'
+)
+
+
+class SaveEvent(NamedTuple):
+    kind: str
+    path: Tuple[str, ...]
+    key: Optional[str]
+    value: Any = None
+
+
+def convert_scalar(token: str, key: Optional[str] = None, schema: FieldSchema = DEFAULT_SCHEMA) -> Scalar:
+    """将存档中的标量文本转换为对应类型 (按 field_schema 的类型表，未登记的键按文本猜测)"""
+    if key is None:
+        return guess_scalar(token)
+    return schema.decode(key, token)
+
+
+def _iter_matches(stream: TextIO, chunk_size: int) -> Iterator[re.Match]:
+    """分块读取并匹配；每块只处理到最后一个换行，跨块的 "key=" 与未闭合的引号留到下一块"""
+    buffer = ''
+    eof = False
+    while not eof:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+        if eof:
+            region_end = len(buffer)
+        else:
+            region_end = buffer.rfind('\n') + 1
+            if region_end == 0:
+                continue
+
+        carry = region_end
+        for match in _EVENT_PATTERN.finditer(buffer, 0, region_end):
+            if not eof and (match.end() == region_end or match.group('stray') == '"'):
+                carry = match.start()
+                break
+            yield match
+        buffer = buffer[carry:]
+
+
+def iter_events(source: Union[str, TextIO], chunk_size: int = READ_CHUNK_SIZE,
+                encoding: str = 'utf-8-sig', schema: FieldSchema = DEFAULT_SCHEMA) -> Iterator[SaveEvent]:
+    """产生存档的事件流；source 为文件路径或已打开的文本流，键值按 schema 解码"""
+    if isinstance(source, str):
+        with open(source, 'r', encoding=encoding, errors='ignore') as f:
+            yield from iter_events(f, chunk_size, schema=schema)
+        return
+
+    decode = schema.decode
+    path: Tuple[str, ...] = ()
+    open_blocks = []  # [(外层path, 块名)]
+    for match in _iter_matches(source, chunk_size):
+        key = match.group('key')
+        if key is not None:
+            if key[0] == '"':
+                key = key[1:-1]
+            value = match.group('value')
+            if value is None:
+                continue  # 文件末尾不完整的 key=
+            if value == '{':
+                yield SaveEvent(BEGIN, path, key)
+                open_blocks.append((path, key))
+                path = path + (key,)
+            elif value == '}':
+                # 格式错误的 "key=}"：忽略该键，只结束块
+                if open_blocks:
+                    path, block_key = open_blocks.pop()
+                    yield SaveEvent(END, path, block_key)
+            else:
+                yield SaveEvent(VALUE, path, key, decode(key, value))
+            continue
+
+        token = match.group('token')
+        if token is None:
+            continue  # 孤立的 '=' 或引号
+        if token == '{':
+            yield SaveEvent(BEGIN, path, None)
+            open_blocks.append((path, None))
+            path = path + ('',)
+        elif token == '}':
+            if open_blocks:
+                path, block_key = open_blocks.pop()
+                yield SaveEvent(END, path, block_key)
+        else:
+            yield SaveEvent(ITEM, path, None, guess_scalar(token))
+
+
+def iter_text_events(text: str, schema: FieldSchema = DEFAULT_SCHEMA) -> Iterator[SaveEvent]:
+    """对内存中的存档文本产生事件流"""
+    return iter_events(io.StringIO(text), schema=schema)
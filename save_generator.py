@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 合成存档生成器
+===================================
+按指定规模生成结构接近真实后期存档的 .v2 文件，用于本地压力测试与性能测量：
+
+- 省份：拥有者/控制者/核心、多个人口组（文化=宗教、意识形态与议题向量、金钱与需求）、RGO等嵌套块
+- 国家：首都、文化、科技、政党、外交关系嵌套块、军队（regiment 通过 pop={ id= type= } 引用士兵人口）
+- 已灭亡国家（无省份）、全局外交区块
+
+同一配置与种子生成的文件逐字节相同。
+
+使用方法：
+    python save_generator.py                        生成1倍规模存档 synthetic_1x.v2
+    python save_generator.py <倍数> [输出文件] [种子]   例如: python save_generator.py 20 big.v2 7
+"""
+
+import os
+import random
+import sys
+from dataclasses import dataclass, replace
+from typing import Dict, Iterator, List
+
+from population_enums import Culture, IssueType, PopType, Religion
+
+# 1倍规模大致对应一个后期存档（约2700个省份、200多个国家）
+BASE_PROVINCES = 2700
+BASE_COUNTRIES = 220
+
+SOLDIER_POP_TYPE_ID = 46   # 军队引用中的人口类型ID
+ARMY_ID_TYPE = 40
+REGIMENT_ID_TYPE = 41
+
+# 主要国家（固定存在，其余国家代码按顺序生成）
+MAJOR_TAGS = ['CHI', 'ENG', 'FRA', 'RUS', 'PRU', 'AUS', 'USA', 'JAP', 'TUR', 'SPA',
+              'ITA', 'NET', 'POR', 'SWE', 'PER', 'SIA', 'KOR', 'BRZ', 'MEX', 'EGY']
+RESERVED_TAGS = {'REB', 'NAT'}
+
+# 人口类型权重（农民和工人占绝大多数）
+POP_TYPE_WEIGHTS = {
+    PopType.FARMERS.value: 30, PopType.LABOURERS.value: 18, PopType.ARTISANS.value: 10,
+    PopType.CRAFTSMEN.value: 8, PopType.SOLDIERS.value: 8, PopType.CLERGYMEN.value: 6,
+    PopType.ARISTOCRATS.value: 5, PopType.BUREAUCRATS.value: 4, PopType.CLERKS.value: 4,
+    PopType.OFFICERS.value: 3, PopType.CAPITALISTS.value: 2, PopType.INTELLECTUALS.value: 1,
+    PopType.SLAVES.value: 1,
+}
+
+GOVERNMENTS = ['absolute_monarchy', 'prussian_constitutionalism', 'hms_government',
+               'democracy', 'presidential_dictatorship', 'theocracy']
+GOODS = ['grain', 'cattle', 'cotton', 'wool', 'tea', 'rice', 'coal', 'iron', 'timber', 'fish']
+TECHNOLOGIES = ['post_napoleonic_thought', 'flintlock_rifles', 'military_staff_system',
+                'clean_coal', 'mechanical_production', 'water_wheel_power', 'private_banks',
+                'freedom_of_trade', 'guild_based_production', 'early_railroad']
+
+
+@dataclass(frozen=True)
+class GeneratorConfig:
+    """生成参数"""
+    provinces: int = BASE_PROVINCES
+    countries: int = BASE_COUNTRIES
+    pops_per_province: int = 10         # 平均每个省份的人口组数
+    dead_countries: int = 30            # 无省份的国家数
+    armies_per_country: int = 3
+    regiments_per_army: int = 6
+    relations_per_country: int = 12
+    orphan_regiment_rate: float = 0.0   # 引用不存在人口的regiment比例
+    seed: int = 1836
+    date: str = "1880.1.1"
+    player: str = "CHI"
+
+    @classmethod
+    def for_scale(cls, scale: float, **overrides) -> 'GeneratorConfig':
+        """按倍数缩放省份与国家数量（1倍≈后期存档）"""
+        config = cls(provinces=max(1, int(BASE_PROVINCES * scale)),
+                     countries=max(2, int(BASE_COUNTRIES * scale)),
+                     dead_countries=max(0, int(30 * scale)))
+        return replace(config, **overrides)
+
+
+def generate_tags(count: int) -> List[str]:
+    """生成国家代码：主要国家在前，其余按 AAA, AAB, ... 顺序"""
+    tags = MAJOR_TAGS[:count]
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    taken = set(tags) | RESERVED_TAGS
+    for a in letters:
+        for b in letters:
+            for c in letters:
+                if len(tags) >= count:
+                    return tags
+                tag = a + b + c
+                if tag not in taken:
+                    tags.append(tag)
+    raise ValueError(f"国家数量过多: {count}")
+
+
+class SaveGenerator:
+    """合成存档生成器（流式输出文本片段，不在内存中保留整个存档）"""
+
+    def __init__(self, config: GeneratorConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.cultures = [culture.value for culture in Culture]
+        self.religions = [religion.value for religion in Religion]
+        self.issue_ids = sorted({issue.value[0] for issue in IssueType})
+        self.pop_types = list(POP_TYPE_WEIGHTS)
+        self.pop_weights = list(POP_TYPE_WEIGHTS.values())
+
+        tags = generate_tags(config.countries + config.dead_countries)
+        self.living_tags = tags[:config.countries]
+        self.dead_tags = tags[config.countries:]
+        self.countries: Dict[str, Dict] = {}
+        self.province_owner: List[str] = []
+        self.soldier_pops: Dict[str, List[int]] = {tag: [] for tag in self.living_tags}
+        self.next_id = 1
+        self._plan_world()
+
+    # ========================================
+    # 世界规划
+    # ========================================
+
+    def _plan_world(self):
+        """分配省份所有权、国家文化与首都"""
+        rng = self.rng
+        config = self.config
+
+        # 国家规模服从长尾分布，中国最大
+        weights = [1.0 / (rank + 1) ** 0.9 for rank in range(len(self.living_tags))]
+        if config.player in self.living_tags:
+            weights[self.living_tags.index(config.player)] = weights[0] * 1.5
+        total = sum(weights)
+        counts = [max(1, int(config.provinces * w / total)) for w in weights]
+        # 修正总数，使每个省份恰好有一个拥有者
+        while sum(counts) > config.provinces:
+            counts[counts.index(max(counts))] -= 1
+        index = 0
+        while sum(counts) < config.provinces:
+            counts[index % len(counts)] += 1
+            index += 1
+
+        province_id = 1
+        for tag, count in zip(self.living_tags, counts):
+            if tag == 'CHI':
+                primary_culture, religion = Culture.BEIFAREN.value, Religion.MAHAYANA.value
+            else:
+                primary_culture, religion = rng.choice(self.cultures), rng.choice(self.religions)
+            accepted = rng.sample([c for c in self.cultures if c != primary_culture], k=rng.randint(0, 2))
+            provinces = list(range(province_id, province_id + count))
+            self.countries[tag] = {
+                'primary_culture': primary_culture,
+                'accepted_cultures': accepted,
+                'religion': religion,
+                'provinces': provinces,
+                'capital': provinces[0] if provinces else 0,
+                'government': rng.choice(GOVERNMENTS),
+                'civilized': 'yes' if rng.random() < 0.6 else 'no',
+            }
+            self.province_owner.extend([tag] * count)
+            province_id += count
+
+        # 预先确定各省人口组数，人口ID按省份顺序连续分配
+        mean = config.pops_per_province
+        self.pop_counts = [max(1, int(rng.gauss(mean, mean / 4))) for _ in range(config.provinces)]
+        self.start_pop_index = sum(self.pop_counts) + 1
+
+        for tag in self.dead_tags:
+            self.countries[tag] = {
+                'primary_culture': rng.choice(self.cultures),
+                'accepted_cultures': [],
+                'religion': rng.choice(self.religions),
+                'provinces': [],
+                'capital': rng.randint(1, config.provinces),
+                'government': rng.choice(GOVERNMENTS),
+                'civilized': 'no',
+            }
+
+    def _new_id(self) -> int:
+        value = self.next_id
+        self.next_id += 1
+        return value
+
+    # ========================================
+    # 文本生成
+    # ========================================
+
+    def iter_chunks(self) -> Iterator[str]:
+        """按顺序生成存档文本片段"""
+        yield self._header()
+        for province_id in range(1, self.config.provinces + 1):
+            yield self._province_block(province_id)
+        yield self._rebel_block()
+        for tag in self.living_tags + self.dead_tags:
+            yield self._country_block(tag)
+        yield self._diplomacy_block()
+
+    def _header(self) -> str:
+        config = self.config
+        return (f'date="{config.date}"\n'
+                f'automate_trade=no\n'
+                f'automate_sliders=0\n'
+                f'player="{config.player}"\n'
+                f'government=1\n'
+                f'flags=\n{{\n\tsynthetic_save=yes\n}}\n'
+                f'gameplaysettings=\n{{\n\tsetgameplayoptions=\n\t{{\n1 0 0 0 0 0 0 0 0 0 1 \n\t}}\n}}\n'
+                f'start_date="1836.1.1"\n'
+                f'start_pop_index={self.start_pop_index}\n'
+                f'worldmarket=\n{{\n\tworldmarket_pool=\n\t{{\n'
+                + ''.join(f'\t\t{goods}={self.rng.uniform(0, 50000):.5f}\n' for goods in GOODS)
+                + '\t}\n}\n')
+
+    def _province_block(self, province_id: int) -> str:
+        rng = self.rng
+        owner = self.province_owner[province_id - 1]
+        country = self.countries[owner]
+        lines = [f'{province_id}=\n{{\n',
+                 f'\tname="Province {province_id}"\n',
+                 f'\towner="{owner}"\n',
+                 f'\tcontroller="{owner}"\n',
+                 f'\tcore="{owner}"\n']
+        if self.dead_tags and rng.random() < 0.05:
+            lines.append(f'\tcore="{rng.choice(self.dead_tags)}"\n')
+        lines.append(f'\tgarrison={rng.uniform(50, 100):.3f}\n')
+
+        for _ in range(self.pop_counts[province_id - 1]):
+            pop_type = rng.choices(self.pop_types, self.pop_weights)[0]
+            lines.append(self._pop_block(owner, country, pop_type))
+
+        lines.append(f'\trgo=\n\t{{\n\t\temployment=\n\t\t{{\n'
+                     f'\t\t\tprovince_pop_id=\n\t\t\t{{\n\t\t\t\tprovince_id={province_id}\n'
+                     f'\t\t\t\tindex=0\n\t\t\t\ttype=9\n\t\t\t}}\n'
+                     f'\t\t\tcount={rng.randint(100, 40000)}\n\t\t}}\n'
+                     f'\t\tlast_income={rng.uniform(0, 500):.5f}\n'
+                     f'\t\tgoods_type="{rng.choice(GOODS)}"\n\t}}\n')
+        lines.append(f'\tlife_rating={rng.randint(10, 40)}\n')
+        if rng.random() < 0.2:
+            lines.append(f'\tfort=\n\t{{\n\t\t{rng.randint(1, 2)}.000 {rng.randint(1, 2)}.000\n\t}}\n')
+        lines.append('}\n')
+        return ''.join(lines)
+
+    def _pop_block(self, owner: str, country: Dict, pop_type: str) -> str:
+        rng = self.rng
+        pop_id = self._new_id()
+        if pop_type == PopType.SOLDIERS.value:
+            self.soldier_pops[owner].append(pop_id)
+
+        roll = rng.random()
+        if roll < 0.75:
+            culture = country['primary_culture']
+        elif roll < 0.85 and country['accepted_cultures']:
+            culture = rng.choice(country['accepted_cultures'])
+        else:
+            culture = rng.choice(self.cultures)
+        religion = country['religion'] if rng.random() < 0.85 else rng.choice(self.religions)
+
+        ideology = self._vector(range(1, 8))
+        issues = self._vector(rng.sample(self.issue_ids, k=rng.randint(4, len(self.issue_ids))))
+        return (f'\t{pop_type}=\n\t{{\n'
+                f'\t\tid={pop_id}\n'
+                f'\t\tsize={rng.randint(1000, 60000)}\n'
+                f'\t\t{culture}={religion}\n'
+                f'\t\tmoney={rng.uniform(0, 5000):.5f}\n'
+                f'\t\tideology=\n\t\t{{\n{ideology}\t\t}}\n'
+                f'\t\tissues=\n\t\t{{\n{issues}\t\t}}\n'
+                f'\t\tcon={rng.uniform(0, 10):.5f}\n'
+                f'\t\tliteracy={rng.uniform(0, 1):.5f}\n'
+                f'\t\tmil={rng.uniform(0, 10):.5f}\n'
+                f'\t\teveryday_needs={rng.uniform(0, 1):.5f}\n'
+                f'\t\tluxury_needs={rng.uniform(0, 1):.5f}\n'
+                f'\t}}\n')
+
+    def _vector(self, keys) -> str:
+        """百分比向量（总和为100），每行 id=值"""
+        keys = sorted(keys)
+        raw = [self.rng.random() for _ in keys]
+        total = sum(raw) or 1.0
+        return ''.join(f'{key}={value * 100 / total:.5f}\n' for key, value in zip(keys, raw))
+
+    def _rebel_block(self) -> str:
+        return 'REB=\n{\n\tflags=\n\t{\n\t}\n\tcivilized=yes\n\tmoney=0.00000\n}\n'
+
+    def _country_block(self, tag: str) -> str:
+        rng = self.rng
+        config = self.config
+        country = self.countries[tag]
+        lines = [f'{tag}=\n{{\n']
+        if tag == config.player:
+            lines.append('\thuman=yes\n')
+        lines.append(f'\ttax_base={rng.uniform(0, 2000):.5f}\n')
+        lines.append('\tflags=\n\t{\n')
+        for flag in rng.sample(['has_reformed', 'opium_war', 'taiping', 'meiji', 'abolition'], k=rng.randint(0, 3)):
+            lines.append(f'\t\t{flag}=yes\n')
+        lines.append('\t}\n')
+        lines.append(f'\tcapital={country["capital"]}\n')
+        lines.append('\ttechnology=\n\t{\n')
+        for tech in rng.sample(TECHNOLOGIES, k=rng.randint(2, len(TECHNOLOGIES))):
+            lines.append(f'\t\t{tech}={{1 0.000}}\n')
+        lines.append('\t}\n')
+        lines.append(f'\tlast_election="{rng.randint(1860, 1879)}.{rng.randint(1, 12)}.{rng.randint(1, 28)}"\n')
+        lines.append(f'\truling_party={rng.randint(1, 400)}\n')
+        lines.append('\tupper_house=\n\t{\n')
+        for ideology, share in zip(['conservative', 'liberal', 'reactionary'], self._shares(3)):
+            lines.append(f'\t\t{ideology}={share:.5f}\n')
+        lines.append('\t}\n')
+
+        # 外交关系（嵌套块）
+        others = [other for other in self.living_tags if other != tag]
+        for other in rng.sample(others, k=min(config.relations_per_country, len(others))):
+            lines.append(f'\t{other}=\n\t{{\n\t\tvalue={rng.randint(-200, 200)}\n')
+            if rng.random() < 0.3:
+                lines.append(f'\t\tlevel={rng.randint(0, 5)}\n\t\tinfluence_value={rng.uniform(0, 100):.3f}\n')
+            if rng.random() < 0.1:
+                lines.append('\t\tmilitary_access=yes\n')
+            lines.append('\t}\n')
+
+        lines.append(f'\tprimary_culture="{country["primary_culture"]}"\n')
+        lines.append('\tculture=\n\t{\n')
+        for culture in country['accepted_cultures']:
+            lines.append(f'\t\t"{culture}"\n')
+        lines.append('\t}\n')
+        lines.append(f'\treligion="{country["religion"]}"\n')
+        lines.append(f'\tgovernment={country["government"]}\n')
+        lines.append(f'\tplurality={rng.uniform(0, 100):.5f}\n')
+        lines.append(f'\trevanchism={rng.uniform(0, 1):.5f}\n')
+
+        if country['provinces']:
+            lines.extend(self._army_blocks(tag, country))
+
+        lines.append(f'\tcivilized={country["civilized"]}\n')
+        lines.append(f'\tprestige={rng.uniform(0, 300):.3f}\n')
+        lines.append(f'\tbadboy={rng.uniform(0, 30):.3f}\n')
+        lines.append(f'\tmoney={rng.uniform(0, 200000):.5f}\n')
+        lines.append(f'\tbank=\n\t{{\n\t\tmoney={rng.uniform(0, 50000):.5f}\n\t\tmoney_lent=0.00000\n\t}}\n')
+        lines.append(f'\tdiplomatic_points={rng.uniform(0, 8):.3f}\n')
+        lines.append(f'\tcolonial_points={rng.randint(0, 200)}\n')
+        lines.append('}\n')
+        return ''.join(lines)
+
+    def _army_blocks(self, tag: str, country: Dict) -> List[str]:
+        rng = self.rng
+        config = self.config
+        soldiers = self.soldier_pops[tag]
+        blocks = []
+        for army_index in range(config.armies_per_country):
+            location = rng.choice(country['provinces'])
+            blocks.append(f'\tarmy=\n\t{{\n\t\tid=\n\t\t{{\n\t\t\tid={self._new_id()}\n\t\t\ttype={ARMY_ID_TYPE}\n\t\t}}\n'
+                          f'\t\tname="{army_index + 1}. Army"\n'
+                          f'\t\tlocation={location}\n')
+            for regiment_index in range(config.regiments_per_army):
+                if soldiers and rng.random() >= config.orphan_regiment_rate:
+                    pop_id = rng.choice(soldiers)
+                else:
+                    pop_id = self._new_id()  # 不存在的人口（孤立引用）
+                blocks.append(f'\t\tregiment=\n\t\t{{\n'
+                              f'\t\t\tid=\n\t\t\t{{\n\t\t\t\tid={self._new_id()}\n\t\t\t\ttype={REGIMENT_ID_TYPE}\n\t\t\t}}\n'
+                              f'\t\t\tname="{regiment_index + 1}. Infantry"\n'
+                              f'\t\t\tpop=\n\t\t\t{{\n\t\t\t\tid={pop_id}\n\t\t\t\ttype={SOLDIER_POP_TYPE_ID}\n\t\t\t}}\n'
+                              f'\t\t\torganisation={rng.uniform(10, 60):.3f}\n'
+                              f'\t\t\tstrength={rng.uniform(0.5, 3):.3f}\n'
+                              f'\t\t\texperience={rng.uniform(0, 20):.3f}\n'
+                              f'\t\t\tcount=1\n'
+                              f'\t\t\ttype=infantry\n'
+                              f'\t\t}}\n')
+            blocks.append('\t}\n')
+        return blocks
+
+    def _shares(self, count: int) -> List[float]:
+        raw = [self.rng.random() for _ in range(count)]
+        total = sum(raw) or 1.0
+        return [value / total for value in raw]
+
+    def _diplomacy_block(self) -> str:
+        rng = self.rng
+        lines = ['diplomacy=\n{\n']
+        tags = self.living_tags
+        for relation in ('alliance', 'vassal', 'casus_belli'):
+            for _ in range(max(1, len(tags) // 10)):
+                first, second = rng.sample(tags, k=2) if len(tags) > 1 else (tags[0], tags[0])
+                lines.append(f'\t{relation}=\n\t{{\n\t\tfirst="{first}"\n\t\tsecond="{second}"\n'
+                             f'\t\tstart_date="{rng.randint(1836, 1879)}.1.1"\n\t}}\n')
+        lines.append('}\n')
+        return ''.join(lines)
+
+
+def write_save(path: str, config: GeneratorConfig) -> int:
+    """生成存档并写入文件，返回写入的字节数"""
+    written = 0
+    with open(path, 'w', encoding='latin1', newline='\n') as f:
+        for chunk in SaveGenerator(config).iter_chunks():
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def generate_scaled_saves(directory: str = ".", scales=(1, 5, 20), seed: int = 1836) -> Dict[float, str]:
+    """生成多个规模的存档 (synthetic_<倍数>x.v2)，返回 {倍数: 路径}"""
+    paths = {}
+    for scale in scales:
+        path = os.path.join(directory, f"synthetic_{scale}x.v2")
+        size = write_save(path, GeneratorConfig.for_scale(scale, seed=seed))
+        print(f"✅ {path}: {size / 1024 / 1024:.1f} MB")
+        paths[scale] = path
+    return paths
+
+
+def main():
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    output = sys.argv[2] if len(sys.argv) > 2 else f"synthetic_{sys.argv[1] if len(sys.argv) > 1 else 1}x.v2"
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 1836
+
+    config = GeneratorConfig.for_scale(scale, seed=seed)
+    print(f"🏭 生成合成存档: {config.provinces} 个省份, {config.countries} 个国家 "
+          f"(另有 {config.dead_countries} 个已灭亡国家), 种子 {seed}")
+    size = write_save(output, config)
+    print(f"✅ 已写入 {output}: {size / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
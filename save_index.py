@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档块索引 (Merkle块哈希)
+===================================
+为存档建立块级内容哈希，按Merkle树组织：
+
+    根 → 顶级分区(header/provinces/countries/sections) → 省份/国家/其他块 → 子块(人口等)
+
+索引保存在存档旁的索引文件 (<存档>.index.json) 中。新的自动存档到来时，
+只重新解析哈希发生变化的块：未变化的块只需一次哈希校验即可复用其子块哈希，
+并可以快速回答"哪些省份/国家/人口发生了变化"。
+
+块的定位与命名规则与 bracket_parser.Victoria2BracketParser 一致，
+block_tree() 可以为任意条目生成完整的 BracketBlock 子树。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bracket_parser import BracketBlock, Victoria2BracketParser
+from population_enums import PopType
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".index.json"
+
+# 分区名称
+SECTION_HEADER = "header"
+SECTION_PROVINCES = "provinces"
+SECTION_COUNTRIES = "countries"
+SECTION_OTHER = "sections"
+
+POP_TYPE_NAMES = frozenset(pop_type.value for pop_type in PopType)
+
+_BRACE_PATTERN = re.compile(r'[{}]')
+_NAME_PATTERN = re.compile(r'(\w+)\s*=?\s*$')
+_POP_ID_PATTERN = re.compile(r'\s*id\s*=\s*(\d+)')
+_COUNTRY_TAG_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+
+
+def block_digest(text: str) -> str:
+    """计算文本的内容哈希"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def merkle_digest(items: List[Tuple[str, str]]) -> str:
+    """由有序的 (键, 哈希) 列表计算父节点哈希"""
+    hasher = hashlib.blake2b(digest_size=16)
+    for key, digest in items:
+        hasher.update(f"{key}:{digest}\n".encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def index_sidecar_path(save_path: str) -> str:
+    """获取存档对应的索引文件路径"""
+    return save_path + INDEX_SUFFIX
+
+
+def load_save_text(save_path: str) -> str:
+    """按主修改器的方式读取存档文本，保证位置与 Victoria2Modifier.content 一致"""
+    with open(save_path, 'r', encoding='utf-8-sig', errors='ignore') as f:
+        return f.read()
+
+
+def extract_block_name(content: str, brace_pos: int) -> str:
+    """提取块名称（name={ 或 name{ 形式），规则同 Victoria2BracketParser"""
+    match = _NAME_PATTERN.search(content, max(0, brace_pos - 64), brace_pos)
+    if match:
+        return match.group(1)
+    return f"block_{brace_pos}"
+
+
+def classify_section(name: str) -> str:
+    """根据顶级块名称判断所属分区"""
+    if name.isdigit():
+        return SECTION_PROVINCES
+    if _COUNTRY_TAG_PATTERN.match(name):
+        return SECTION_COUNTRIES
+    return SECTION_OTHER
+
+
+def scan_blocks(content: str, start: int = 0, end: Optional[int] = None) -> List[Tuple[str, int, int]]:
+    """扫描 [start, end) 范围内的直接子块
+
+    Returns:
+        (块名称, '{'位置, '}'位置) 列表，位置为content中的绝对位置
+    """
+    if end is None:
+        end = len(content)
+
+    blocks = []
+    depth = 0
+    open_pos = -1
+    for match in _BRACE_PATTERN.finditer(content, start, end):
+        pos = match.start()
+        if match.group() == '{':
+            if depth == 0:
+                open_pos = pos
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                blocks.append((extract_block_name(content, open_pos), open_pos, pos))
+        # depth == 0 时的多余闭括号直接忽略（存档末尾常见）
+
+    return blocks
+
+
+def scan_next_block(content: str, start: int) -> Optional[Tuple[str, int, int]]:
+    """从start开始查找下一个完整的块"""
+    depth = 0
+    open_pos = -1
+    for match in _BRACE_PATTERN.finditer(content, start):
+        pos = match.start()
+        if match.group() == '{':
+            if depth == 0:
+                open_pos = pos
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                return extract_block_name(content, open_pos), open_pos, pos
+    return None
+
+
+@dataclass
+class BlockEntry:
+    """顶级块索引条目"""
+    key: str                # 唯一键（重名块追加 #序号）
+    name: str               # 块名称，如 "1234", "CHI", "worldmarket"
+    section: str            # 所属分区
+    start_pos: int          # '{' 位置
+    end_pos: int            # '}' 位置
+    digest: str             # 整个块文本的哈希
+    gap_digest: str         # 块之前的顶级文本（标量与键名）的哈希
+    gap_length: int
+    # 子块: (键, 哈希, 相对'{'的起点, 相对'{'的终点)
+    children: List[Tuple[str, str, int, int]] = field(default_factory=list)
+
+    def child_digests(self) -> Dict[str, str]:
+        """子块键到哈希的映射"""
+        return {child[0]: child[1] for child in self.children}
+
+    def child_spans(self) -> Iterator[Tuple[str, int, int]]:
+        """子块的绝对位置"""
+        for key, _, rel_start, rel_end in self.children:
+            yield key, self.start_pos + rel_start, self.start_pos + rel_end
+
+
+class SaveIndex:
+    """存档块索引（Merkle块哈希 + 块位置）"""
+
+    def __init__(self):
+        self.entries: List[BlockEntry] = []
+        self.trailing_digest = ""
+        self.source_path = ""
+        self.source_size = 0
+        self.source_mtime = 0.0
+        self.stats = {'reused': 0, 'reparsed': 0, 'elapsed': 0.0}
+        self._by_key: Dict[str, BlockEntry] = {}
+        self._section_cache: Optional[Dict[str, str]] = None
+
+    # ========================================
+    # 构建与增量更新
+    # ========================================
+
+    def build(self, content: str) -> 'SaveIndex':
+        """完整构建索引"""
+        self.entries = []
+        return self.update(content)
+
+    def update(self, content: str) -> 'SaveIndex':
+        """根据新内容增量更新索引
+
+        依次假设下一个旧块及其前导文本没有变化，在预期位置做一次哈希校验；
+        校验通过则直接复用旧条目（只平移位置），否则用花括号匹配扫描该块
+        并重新计算其子块哈希。
+        """
+        start_time = time.time()
+        old_entries = self.entries
+        old_positions = {entry.key: i for i, entry in enumerate(old_entries)}
+        new_entries: List[BlockEntry] = []
+        name_counts: Dict[str, int] = {}
+        reused = reparsed = 0
+
+        pos = 0
+        cursor = 0
+        length = len(content)
+        while True:
+            if cursor < len(old_entries):
+                old = old_entries[cursor]
+                block_start = pos + old.gap_length
+                block_end = block_start + (old.end_pos - old.start_pos)
+                if (block_end < length and content[block_start] == '{' and content[block_end] == '}'
+                        and block_digest(content[block_start:block_end + 1]) == old.digest
+                        and block_digest(content[pos:block_start]) == old.gap_digest):
+                    name_counts[old.name] = name_counts.get(old.name, 0) + 1
+                    new_entries.append(BlockEntry(old.key, old.name, old.section, block_start, block_end,
+                                                  old.digest, old.gap_digest, old.gap_length, old.children))
+                    pos = block_end + 1
+                    cursor += 1
+                    reused += 1
+                    continue
+
+            found = scan_next_block(content, pos)
+            if found is None:
+                break
+
+            name, block_start, block_end = found
+            count = name_counts.get(name, 0)
+            name_counts[name] = count + 1
+            key = name if count == 0 else f"{name}#{count}"
+
+            new_entries.append(self._make_entry(content, key, name, pos, block_start, block_end))
+            reparsed += 1
+            if key in old_positions:
+                cursor = old_positions[key] + 1
+            pos = block_end + 1
+
+        self.entries = new_entries
+        self.trailing_digest = block_digest(content[pos:])
+        self._by_key = {entry.key: entry for entry in new_entries}
+        self._section_cache = None
+        self.stats = {'reused': reused, 'reparsed': reparsed, 'elapsed': time.time() - start_time}
+        return self
+
+    def _make_entry(self, content: str, key: str, name: str, gap_start: int,
+                    block_start: int, block_end: int) -> BlockEntry:
+        """解析单个顶级块并计算其子块哈希"""
+        section = classify_section(name)
+        entry = BlockEntry(
+            key=key,
+            name=name,
+            section=section,
+            start_pos=block_start,
+            end_pos=block_end,
+            digest=block_digest(content[block_start:block_end + 1]),
+            gap_digest=block_digest(content[gap_start:block_start]),
+            gap_length=block_start - gap_start,
+        )
+
+        child_counts: Dict[str, int] = {}
+        for child_name, child_start, child_end in scan_blocks(content, block_start + 1, block_end):
+            child_key = None
+            if child_name in POP_TYPE_NAMES:
+                id_match = _POP_ID_PATTERN.match(content, child_start + 1)
+                if id_match:
+                    child_key = f"{child_name}:{id_match.group(1)}"
+            if child_key is None:
+                count = child_counts.get(child_name, 0)
+                child_counts[child_name] = count + 1
+                child_key = f"{child_name}#{count}"
+            entry.children.append((child_key, block_digest(content[child_start:child_end + 1]),
+                                   child_start - block_start, child_end - block_start))
+        return entry
+
+    # ========================================
+    # Merkle 哈希
+    # ========================================
+
+    def section_digests(self) -> Dict[str, str]:
+        """各分区的Merkle哈希"""
+        if self._section_cache is None:
+            grouped: Dict[str, List[Tuple[str, str]]] = {
+                SECTION_PROVINCES: [], SECTION_COUNTRIES: [], SECTION_OTHER: []
+            }
+            header_items = []
+            for entry in self.entries:
+                grouped[entry.section].append((entry.key, entry.digest))
+                header_items.append((entry.key, entry.gap_digest))
+            header_items.append(("<trailing>", self.trailing_digest))
+
+            self._section_cache = {SECTION_HEADER: merkle_digest(header_items)}
+            for section, items in grouped.items():
+                self._section_cache[section] = merkle_digest(items)
+        return self._section_cache
+
+    def root_digest(self) -> str:
+        """根哈希"""
+        return merkle_digest(sorted(self.section_digests().items()))
+
+    # ========================================
+    # 查询
+    # ========================================
+
+    def entry(self, key: str) -> Optional[BlockEntry]:
+        """按键查找顶级块条目"""
+        return self._by_key.get(key)
+
+    def section_entries(self, section: str) -> List[BlockEntry]:
+        """获取某个分区的所有条目"""
+        return [entry for entry in self.entries if entry.section == section]
+
+    def block_tree(self, content: str, key: str) -> Optional[BracketBlock]:
+        """为指定条目生成完整的 BracketBlock 子树"""
+        entry = self.entry(key)
+        if entry is None:
+            return None
+        parser = Victoria2BracketParser()
+        parser.load_content(content)
+        return parser.parse_block(entry.start_pos)
+
+    def diff(self, newer: 'SaveIndex') -> Dict:
+        """比较两个索引，返回新增/删除/变化的块以及变化块中的子块差异
+
+        利用Merkle哈希逐层剪枝：分区哈希相同则整个分区跳过，
+        只有哈希变化的条目才比较子块。
+        """
+        old_sections = self.section_digests()
+        new_sections = newer.section_digests()
+        result = {
+            'root_changed': self.root_digest() != newer.root_digest(),
+            'header_changed': old_sections[SECTION_HEADER] != new_sections[SECTION_HEADER],
+            'sections': {},
+            'children': {},
+        }
+        if not result['root_changed']:
+            return result
+
+        for section in (SECTION_PROVINCES, SECTION_COUNTRIES, SECTION_OTHER):
+            if old_sections[section] == new_sections[section]:
+                continue
+
+            old_items = {entry.key: entry for entry in self.entries if entry.section == section}
+            new_items = {entry.key: entry for entry in newer.entries if entry.section == section}
+            changed = [key for key, entry in new_items.items()
+                       if key in old_items and old_items[key].digest != entry.digest]
+            result['sections'][section] = {
+                'added': [key for key in new_items if key not in old_items],
+                'removed': [key for key in old_items if key not in new_items],
+                'changed': changed,
+            }
+
+            for key in changed:
+                old_children = old_items[key].child_digests()
+                new_children = new_items[key].child_digests()
+                result['children'][key] = {
+                    'added': [c for c in new_children if c not in old_children],
+                    'removed': [c for c in old_children if c not in new_children],
+                    'changed': [c for c, d in new_children.items()
+                                if c in old_children and old_children[c] != d],
+                }
+
+        return result
+
+    # ========================================
+    # 索引文件读写
+    # ========================================
+
+    def save(self, path: str):
+        """保存索引文件"""
+        data = {
+            'version': INDEX_VERSION,
+            'source': {'path': self.source_path, 'size': self.source_size, 'mtime': self.source_mtime},
+            'root': self.root_digest(),
+            'sections': self.section_digests(),
+            'trailing': self.trailing_digest,
+            'entries': [
+                [e.key, e.name, e.section, e.start_pos, e.end_pos, e.digest, e.gap_digest, e.gap_length,
+                 [list(child) for child in e.children]]
+                for e in self.entries
+            ],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> Optional['SaveIndex']:
+        """读取索引文件，版本不符时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != INDEX_VERSION:
+            return None
+
+        index = cls()
+        source = data.get('source', {})
+        index.source_path = source.get('path', '')
+        index.source_size = source.get('size', 0)
+        index.source_mtime = source.get('mtime', 0.0)
+        index.trailing_digest = data.get('trailing', '')
+        index.entries = [
+            BlockEntry(key, name, section, start, end, digest, gap_digest, gap_length,
+                       [tuple(child) for child in children])
+            for key, name, section, start, end, digest, gap_digest, gap_length, children in data['entries']
+        ]
+        index._by_key = {entry.key: entry for entry in index.entries}
+        return index
+
+    def matches_source(self, save_path: str) -> bool:
+        """索引是否与存档文件当前状态一致（按大小和修改时间判断）"""
+        try:
+            stat = os.stat(save_path)
+        except OSError:
+            return False
+        return stat.st_size == self.source_size and stat.st_mtime == self.source_mtime
+
+    def _record_source(self, save_path: str):
+        stat = os.stat(save_path)
+        self.source_path = os.path.abspath(save_path)
+        self.source_size = stat.st_size
+        self.source_mtime = stat.st_mtime
+
+
+def load_or_build_index(save_path: str, content: Optional[str] = None,
+                        base_index_path: Optional[str] = None, save_sidecar: bool = True) -> SaveIndex:
+    """加载或构建存档索引
+
+    - 索引文件存在且与存档一致：直接读取
+    - 索引文件存在但已过期，或指定了base_index_path（如上一个自动存档的索引）：增量更新
+    - 否则完整构建
+    """
+    sidecar = index_sidecar_path(save_path)
+    index = SaveIndex.load(sidecar) if os.path.exists(sidecar) else None
+    if index is not None and index.matches_source(save_path):
+        return index
+
+    if index is None and base_index_path:
+        index = SaveIndex.load(base_index_path)
+    if index is None:
+        index = SaveIndex()
+
+    if content is None:
+        content = load_save_text(save_path)
+    index.update(content)
+    index._record_source(save_path)
+    if save_sidecar:
+        index.save(sidecar)
+    return index
+
+
+def print_diff_summary(diff: Dict, limit: int = 10):
+    """打印索引差异摘要"""
+    if not diff['root_changed']:
+        print("✅ 两个存档内容完全一致")
+        return
+
+    print(f"📋 顶级标量: {'有变化' if diff['header_changed'] else '无变化'}")
+    for section, changes in diff['sections'].items():
+        print(f"📂 {section}: 新增 {len(changes['added'])}, 删除 {len(changes['removed'])}, "
+              f"变化 {len(changes['changed'])}")
+        for label in ('added', 'removed'):
+            if changes[label]:
+                print(f"   {label}: {', '.join(changes[label][:limit])}")
+
+    pop_added = sum(1 for c in diff['children'].values() for k in c['added'] if ':' in k)
+    pop_removed = sum(1 for c in diff['children'].values() for k in c['removed'] if ':' in k)
+    pop_changed = sum(1 for c in diff['children'].values() for k in c['changed'] if ':' in k)
+    print(f"👥 人口: 新增 {pop_added}, 删除 {pop_removed}, 变化 {pop_changed}")
+
+
+def main():
+    """命令行入口
+
+    python save_index.py <存档>                 构建/更新索引
+    python save_index.py <存档> <旧存档>         以旧存档索引为基础增量构建，并显示变化
+    """
+    if len(sys.argv) < 2:
+        print("用法: python save_index.py <存档文件> [旧存档文件]")
+        return
+
+    save_path = sys.argv[1]
+    base_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    base_index = None
+    if base_path:
+        base_index = load_or_build_index(base_path)
+
+    base_sidecar = index_sidecar_path(base_path) if base_path else None
+    index = load_or_build_index(save_path, base_index_path=base_sidecar)
+    print(f"📊 索引: {len(index.entries)} 个顶级块, 根哈希 {index.root_digest()}")
+    print(f"   复用 {index.stats['reused']} 个块, 重新解析 {index.stats['reparsed']} 个块, "
+          f"耗时 {index.stats['elapsed']:.2f}秒")
+
+    if base_index is not None:
+        print_diff_summary(base_index.diff(index))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档 → SQLite 导出与增量同步
+===================================
+单次遍历存档事件流 (save_events)，把国家、省份、核心、人口、军队、团和外交关系
+写入本地 SQLite 数据库，建立常用索引；所有写入在一个事务内用 executemany 批量完成。
+
+每行保存内容哈希 row_hash；再次导出较新的自动存档时，只写入新增或变化的行，
+并删除存档中已不存在的行。之后的临时问题直接用SQL查询即可:
+
+    python save_sqlite.py autosave.v2                    导出/同步到 victoria2_save.db
+    python save_sqlite.py autosave.v2 china.db           指定数据库
+    python save_sqlite.py --query china.db "SELECT tag, money FROM countries ORDER BY money DESC LIMIT 10"
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from population_enums import PopType
+from save_events import BEGIN, END, VALUE, iter_events
+from victoria2_parser import COUNTRY_TAG_PATTERN
+
+DEFAULT_DATABASE = "victoria2_save.db"
+BATCH_SIZE = 5000
+
+POP_TYPE_NAMES = {pop_type.value for pop_type in PopType}
+UNIT_BLOCKS = {'army': 'regiment', 'navy': 'ship'}
+
+
+@dataclass
+class TableSpec:
+    """一张导出表：列 (名称, SQL类型)、主键列与索引列"""
+    name: str
+    columns: List[Tuple[str, str]]
+    key: Tuple[str, ...]
+    indexes: Tuple[str, ...] = ()
+
+    @property
+    def column_names(self) -> List[str]:
+        return [name for name, _ in self.columns]
+
+    def key_of(self, row: tuple) -> tuple:
+        return tuple(row[index] for index in self._key_indexes)
+
+    def __post_init__(self):
+        names = self.column_names
+        self._key_indexes = [names.index(column) for column in self.key]
+
+    def create_sql(self) -> List[str]:
+        columns = ', '.join(f"{name} {sql_type}" for name, sql_type in self.columns)
+        statements = [f"CREATE TABLE IF NOT EXISTS {self.name} ({columns}, row_hash INTEGER NOT NULL, "
+                      f"PRIMARY KEY ({', '.join(self.key)}))"]
+        for column in self.indexes:
+            statements.append(f"CREATE INDEX IF NOT EXISTS idx_{self.name}_{column} ON {self.name} ({column})")
+        return statements
+
+    def upsert_sql(self) -> str:
+        names = self.column_names + ['row_hash']
+        return (f"INSERT OR REPLACE INTO {self.name} ({', '.join(names)}) "
+                f"VALUES ({', '.join('?' for _ in names)})")
+
+    def delete_sql(self) -> str:
+        return f"DELETE FROM {self.name} WHERE {' AND '.join(f'{column} = ?' for column in self.key)}"
+
+
+# 国家块中的 bank={ money= money_lent= } 是子块，展开为 bank_money / bank_money_lent 两列
+COUNTRY_BANK_FIELDS = ('money', 'money_lent')
+COUNTRY_COLUMNS = ['primary_culture', 'religion', 'government', 'civilized', 'human', 'capital', 'prestige',
+                   'money', 'bank_money', 'bank_money_lent', 'badboy', 'tax_base', 'research_points', 'literacy', 'plurality',
+                   'ruling_party', 'last_election']
+POP_COLUMNS = ['size', 'money', 'bank', 'literacy', 'con', 'mil', 'life_needs', 'everyday_needs', 'luxury_needs']
+RELATION_COLUMNS = ['value', 'level', 'influence_value', 'military_access']
+REGIMENT_COLUMNS = ['name', 'type', 'strength', 'organisation', 'experience']
+
+TABLES: Dict[str, TableSpec] = {spec.name: spec for spec in [
+    TableSpec('countries', [('tag', 'TEXT')] + [(column, 'NUMERIC') for column in COUNTRY_COLUMNS]
+              + [('attributes', 'TEXT')], ('tag',), ('primary_culture', 'religion')),
+    TableSpec('provinces', [('id', 'INTEGER'), ('name', 'TEXT'), ('owner', 'TEXT'), ('controller', 'TEXT'),
+                            ('life_rating', 'INTEGER'), ('attributes', 'TEXT')], ('id',), ('owner', 'controller')),
+    TableSpec('cores', [('province_id', 'INTEGER'), ('tag', 'TEXT')], ('province_id', 'tag'), ('tag',)),
+    TableSpec('pops', [('id', 'INTEGER'), ('province_id', 'INTEGER'), ('type', 'TEXT'), ('culture', 'TEXT'),
+                       ('religion', 'TEXT')] + [(column, 'NUMERIC') for column in POP_COLUMNS],
+              ('id',), ('province_id', 'type', 'culture', 'religion')),
+    TableSpec('armies', [('id', 'INTEGER'), ('country', 'TEXT'), ('kind', 'TEXT'), ('name', 'TEXT'),
+                         ('location', 'INTEGER'), ('unit_count', 'INTEGER')], ('id',), ('country', 'location')),
+    TableSpec('regiments', [('id', 'INTEGER'), ('army_id', 'INTEGER'), ('country', 'TEXT'), ('pop_id', 'INTEGER')]
+              + [(column, 'NUMERIC') for column in REGIMENT_COLUMNS], ('id',), ('army_id', 'pop_id')),
+    TableSpec('relations', [('country', 'TEXT'), ('target', 'TEXT')] + [(column, 'NUMERIC') for column in RELATION_COLUMNS],
+              ('country', 'target'), ('target',)),
+]}
+
+
+def row_hash(row: tuple) -> int:
+    """行内容的稳定哈希 (有符号64位，可直接存入 INTEGER 列)"""
+    digest = hashlib.blake2b(repr(row).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _add_attribute(attributes: Dict[str, Any], key: str, value: Any):
+    """记录其余标量字段；重复出现的键转为列表"""
+    if key in attributes:
+        if not isinstance(attributes[key], list):
+            attributes[key] = [attributes[key]]
+        attributes[key].append(value)
+    else:
+        attributes[key] = value
+
+
+def _attributes_json(attributes: Dict[str, Any]) -> Optional[str]:
+    return json.dumps(attributes, ensure_ascii=False) if attributes else None
+
+
+def iter_save_rows(save_path: str, info: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, tuple]]:
+    """单次遍历存档，产生 (表名, 行)；顶级简单键值 (date、player 等) 写入 info"""
+    country = province = pop = relation = army = regiment = None
+    province_cores: List[str] = []
+
+    for kind, path, key, value in iter_events(save_path):
+        depth = len(path)
+
+        if kind == VALUE:
+            if depth == 0:
+                if info is not None:
+                    info[key] = value
+            elif depth == 1:
+                if country is not None:
+                    if key in country:
+                        if country[key] is None:
+                            country[key] = value
+                    else:
+                        _add_attribute(country['attributes'], key, value)
+                elif province is not None:
+                    if key == 'core':
+                        if value not in province_cores:
+                            province_cores.append(value)
+                    elif key in ('name', 'owner', 'controller', 'life_rating'):
+                        province[key] = value
+                    else:
+                        _add_attribute(province['attributes'], key, value)
+            elif depth == 2:
+                if pop is not None:
+                    if key in pop:
+                        pop[key] = value
+                    elif pop['culture'] is None and isinstance(value, str):
+                        # "文化=宗教" 行
+                        pop['culture'], pop['religion'] = key, value
+                elif relation is not None and key in relation:
+                    relation[key] = value
+                elif army is not None and key in ('name', 'location'):
+                    army[key] = value
+                elif country is not None and path[1] == 'bank' and key in COUNTRY_BANK_FIELDS:
+                    country[f'bank_{key}'] = value
+            elif depth == 3:
+                if regiment is not None and key in regiment:
+                    regiment[key] = value
+                elif army is not None and path[2] == 'id' and key == 'id':
+                    army['id'] = value
+            elif depth == 4 and regiment is not None and key == 'id':
+                if path[3] == 'id':
+                    regiment['id'] = value
+                elif path[3] == 'pop':
+                    regiment['pop_id'] = value
+
+        elif kind == BEGIN:
+            if depth == 0:
+                if key and COUNTRY_TAG_PATTERN.match(key):
+                    country = dict.fromkeys(COUNTRY_COLUMNS)
+                    country['attributes'] = {}
+                elif key and key.isdigit():
+                    province = {'name': None, 'owner': None, 'controller': None, 'life_rating': None, 'attributes': {}}
+                    province_cores = []
+            elif depth == 1:
+                if country is not None:
+                    if key in UNIT_BLOCKS:
+                        army = {'id': None, 'kind': key, 'name': None, 'location': None, 'unit_count': 0}
+                    elif key and COUNTRY_TAG_PATTERN.match(key):
+                        relation = dict.fromkeys(RELATION_COLUMNS)
+                elif province is not None and key in POP_TYPE_NAMES:
+                    pop = dict.fromkeys(['id', 'culture', 'religion'] + POP_COLUMNS)
+            elif depth == 2 and army is not None and key == UNIT_BLOCKS[army['kind']]:
+                army['unit_count'] += 1
+                if key == 'regiment':
+                    regiment = dict.fromkeys(['id', 'pop_id'] + REGIMENT_COLUMNS)
+
+        elif kind == END:
+            if depth == 0:
+                if country is not None:
+                    yield 'countries', (key, *(country[column] for column in COUNTRY_COLUMNS),
+                                        _attributes_json(country['attributes']))
+                elif province is not None:
+                    province_id = int(key)
+                    yield 'provinces', (province_id, province['name'], province['owner'], province['controller'],
+                                        province['life_rating'], _attributes_json(province['attributes']))
+                    for tag in province_cores:
+                        yield 'cores', (province_id, tag)
+                country = province = None
+            elif depth == 1:
+                if pop is not None:
+                    if pop['id'] is not None:
+                        yield 'pops', (pop['id'], int(path[0]), key, pop['culture'], pop['religion'],
+                                       *(pop[column] for column in POP_COLUMNS))
+                    pop = None
+                elif relation is not None:
+                    yield 'relations', (path[0], key, *(relation[column] for column in RELATION_COLUMNS))
+                    relation = None
+                elif army is not None:
+                    if army['id'] is not None:
+                        yield 'armies', (army['id'], path[0], army['kind'], army['name'], army['location'],
+                                         army['unit_count'])
+                    army = None
+            elif depth == 2 and regiment is not None and key == 'regiment':
+                if regiment['id'] is not None:
+                    yield 'regiments', (regiment['id'], army['id'], path[0], regiment['pop_id'],
+                                        *(regiment[column] for column in REGIMENT_COLUMNS))
+                regiment = None
+
+
+class SaveDatabase:
+    """存档内容的 SQLite 数据库"""
+
+    def __init__(self, database: str = DEFAULT_DATABASE):
+        self.database = database
+        self.connection = sqlite3.connect(database)
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            for spec in TABLES.values():
+                # 旧版本建立的表列不同时删除重建 (数据库只是存档的导出，重新同步即可恢复)
+                existing = [row[1] for row in self.connection.execute(f"PRAGMA table_info({spec.name})")]
+                if existing and existing != spec.column_names + ['row_hash']:
+                    self.connection.execute(f"DROP TABLE {spec.name}")
+                for statement in spec.create_sql():
+                    self.connection.execute(statement)
+
+    def _existing_hashes(self, spec: TableSpec) -> Dict[tuple, int]:
+        cursor = self.connection.execute(f"SELECT {', '.join(spec.key)}, row_hash FROM {spec.name}")
+        return {row[:-1]: row[-1] for row in cursor}
+
+    def sync(self, save_path: str) -> Dict[str, Dict[str, int]]:
+        """导出/同步存档：只写入新增或变化的行，删除已不存在的行。返回每张表的统计"""
+        start = time.time()
+        existing = {name: self._existing_hashes(spec) for name, spec in TABLES.items()}
+        stats = {name: {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0} for name in TABLES}
+        seen = defaultdict(set)
+        pending = defaultdict(list)
+        info: Dict[str, Any] = {}
+
+        def flush(name: str):
+            if pending[name]:
+                self.connection.executemany(TABLES[name].upsert_sql(), pending[name])
+                pending[name] = []
+
+        with self.connection:
+            for name, row in iter_save_rows(save_path, info):
+                spec = TABLES[name]
+                key = spec.key_of(row)
+                if key in seen[name]:
+                    continue  # 重复的主键以第一次出现为准
+                seen[name].add(key)
+                digest = row_hash(row)
+                previous = existing[name].get(key)
+                if previous == digest:
+                    stats[name]['unchanged'] += 1
+                    continue
+                stats[name]['updated' if previous is not None else 'inserted'] += 1
+                pending[name].append(row + (digest,))
+                if len(pending[name]) >= BATCH_SIZE:
+                    flush(name)
+
+            for name, spec in TABLES.items():
+                flush(name)
+                removed = [key for key in existing[name] if key not in seen[name]]
+                if removed:
+                    self.connection.executemany(spec.delete_sql(), removed)
+                stats[name]['deleted'] = len(removed)
+
+            meta = {key: json.dumps(value, ensure_ascii=False) for key, value in info.items()}
+            meta['source_file'] = json.dumps(os.path.abspath(save_path), ensure_ascii=False)
+            meta['synced_at'] = json.dumps(datetime.now().isoformat())
+            self.connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items())
+
+        stats['elapsed'] = {'seconds': round(time.time() - start, 3)}
+        return stats
+
+    def query(self, sql: str, params: tuple = ()) -> Tuple[List[str], List[tuple]]:
+        """执行查询，返回 (列名, 行)"""
+        cursor = self.connection.execute(sql, params)
+        columns = [description[0] for description in cursor.description or ()]
+        return columns, cursor.fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+def print_sync_stats(stats: Dict[str, Dict[str, int]]):
+    print(f"{'表':<12} {'新增':>8} {'更新':>8} {'删除':>8} {'未变':>8}")
+    print("-" * 48)
+    for name in TABLES:
+        entry = stats[name]
+        print(f"{name:<12} {entry['inserted']:>8} {entry['updated']:>8} {entry['deleted']:>8} {entry['unchanged']:>8}")
+    print(f"⏱️ 耗时: {stats['elapsed']['seconds']:.2f} 秒")
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print("用法:")
+        print("  python save_sqlite.py <存档.v2> [数据库.db]")
+        print('  python save_sqlite.py --query <数据库.db> "SELECT ..."')
+        return
+
+    if args[0] == '--query':
+        database = SaveDatabase(args[1])
+        columns, rows = database.query(args[2])
+        print(" | ".join(columns))
+        for row in rows:
+            print(" | ".join("" if value is None else str(value) for value in row))
+        print(f"({len(rows)} 行)")
+        database.close()
+        return
+
+    save_path = args[0]
+    database_path = args[1] if len(args) > 1 else DEFAULT_DATABASE
+    print(f"🗄️ 同步 {save_path} → {database_path}")
+    database = SaveDatabase(database_path)
+    stats = database.sync(save_path)
+    database.close()
+    print_sync_stats(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 存档共享扫描框架
+===================================
+逐行流式读取存档一次，把顶级键、省份、人口、国家、军队事件分发给所有注册的分析器，
+每个分析器生成自己的报告。原来各分析器各自读取并扫描整个存档，
+现在夜间报告只需一次遍历。
+
+事件及回调参数:
+    top_level(key, value, is_block)       每个顶级键 (块的 value 为花括号内的内容)
+    province(province_id, content)        顶级数字块
+    pop(province_id, pop_type, content)   省份中的人口块
+    country(tag, content)                 顶级国家块
+    army(tag, content)                    国家块中的军队
+
+    scan = SharedScan()
+    scan.on('province', callback)               # 直接注册回调
+    scan.add_visitor(PopulationParserVisitor()) # 或注册分析器 (重写的 on_* 方法)
+    scan.scan_file("save.v2")
+    reports = scan.reports()
+
+内置分析器对应 country_extractor、population_parser、comprehensive_population_analyzer、
+country_analyzer 与 simple_parser；country_fields_summary 只输出固定的总结文本，不读取存档。
+
+使用方法:
+    python shared_scan.py <存档文件> [输出文件]
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bracket_parser import BracketBlock
+from comprehensive_population_analyzer import ComprehensivePopulationAnalyzer
+from country_analyzer import Victoria2CountryAnalyzer
+from country_extractor import Victoria2CountryExtractor
+from population_enums import PopulationEnumerator
+from population_parser import CountryPopulation, PopulationParser
+from simple_parser import SimpleVictoria2Parser
+
+EVENTS = ('top_level', 'province', 'pop', 'country', 'army')
+
+POP_TYPES = frozenset(PopulationEnumerator.get_all_pop_types())
+COUNTRY_TAG_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+OWNER_PATTERN = re.compile(r'owner="?([A-Z]{2,3})"?')
+
+_CHILD_TOKEN = re.compile(r'(\w+)[ \t]*=[ \t\r\n]*\{|[{}]')
+
+
+# ========================================
+# 流式遍历
+# ========================================
+
+def _block_body(text: str) -> str:
+    return text[text.index('{') + 1:text.rindex('}')]
+
+
+def iter_top_level(lines: Iterable[str]) -> Iterator[Tuple[str, str, bool]]:
+    """逐行读取存档，依次产生顶级条目 (键, 值, 是否为块)；同一时间只保留一个顶级块"""
+    key = None
+    depth = 0
+    parts: List[str] = []
+    for line in lines:
+        if depth:
+            parts.append(line)
+            depth += line.count('{') - line.count('}')
+            if depth <= 0:
+                yield key or '', _block_body(''.join(parts)), True
+                key, depth, parts = None, 0, []
+            continue
+
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith('{'):
+            opened = stripped
+        else:
+            name, sep, rest = stripped.partition('=')
+            if not sep:
+                continue
+            key = name.strip()
+            rest = rest.strip()
+            if not rest:
+                continue  # 块在下一行开始
+            if not rest.startswith('{'):
+                yield key, rest, False
+                key = None
+                continue
+            opened = rest
+
+        depth = opened.count('{') - opened.count('}')
+        parts = [opened + '\n']
+        if depth <= 0:
+            yield key or '', _block_body(opened), True
+            key, depth, parts = None, 0, []
+
+
+def iter_child_blocks(content: str) -> Iterator[Tuple[Optional[str], str]]:
+    """产生块内容中的直接子块 (名称, 花括号内的内容)；无名子块的名称为None"""
+    depth = 0
+    name = None
+    start = 0
+    for match in _CHILD_TOKEN.finditer(content):
+        if match.group(0) == '}':
+            depth -= 1
+            if depth == 0:
+                yield name, content[start:match.start()]
+                name = None
+        else:
+            if depth == 0:
+                name = match.group(1)
+                start = match.end()
+            depth += 1
+
+
+# ========================================
+# 扫描器
+# ========================================
+
+class ScanVisitor:
+    """分析器基类：重写需要的 on_* 方法，report() 返回该分析器的报告"""
+    name = "visitor"
+
+    def on_top_level(self, key: str, value: str, is_block: bool):
+        pass
+
+    def on_province(self, province_id: int, content: str):
+        pass
+
+    def on_pop(self, province_id: int, pop_type: str, content: str):
+        pass
+
+    def on_country(self, tag: str, content: str):
+        pass
+
+    def on_army(self, tag: str, content: str):
+        pass
+
+    def report(self) -> Dict:
+        return {}
+
+
+class SharedScan:
+    """一次遍历，把事件分发给所有注册的回调"""
+
+    def __init__(self):
+        self.callbacks: Dict[str, List[Callable]] = {event: [] for event in EVENTS}
+        self.visitors: List[ScanVisitor] = []
+        self.stats: Dict = {}
+
+    def on(self, event: str, callback: Callable):
+        """注册事件回调"""
+        if event not in self.callbacks:
+            raise ValueError(f"未知事件: {event} (可用: {', '.join(EVENTS)})")
+        self.callbacks[event].append(callback)
+
+    def add_visitor(self, visitor: ScanVisitor) -> ScanVisitor:
+        """注册分析器：只订阅它重写过的事件，未订阅的事件不做额外解析"""
+        for event in EVENTS:
+            method_name = f"on_{event}"
+            if getattr(type(visitor), method_name) is not getattr(ScanVisitor, method_name):
+                self.on(event, getattr(visitor, method_name))
+        self.visitors.append(visitor)
+        return visitor
+
+    def scan_file(self, filename: str, encoding: str = 'utf-8-sig') -> Dict:
+        """流式扫描存档文件，返回扫描统计"""
+        with open(filename, 'r', encoding=encoding, errors='ignore') as f:
+            return self.scan_lines(f)
+
+    def scan_content(self, content: str) -> Dict:
+        return self.scan_lines(content.splitlines(keepends=True))
+
+    def scan_lines(self, lines: Iterable[str]) -> Dict:
+        counts = {event: 0 for event in EVENTS}
+        start = time.perf_counter()
+        for key, value, is_block in iter_top_level(lines):
+            counts['top_level'] += 1
+            self._dispatch(key, value, is_block, counts)
+        self.stats = {'events': counts, 'elapsed': round(time.perf_counter() - start, 3)}
+        return self.stats
+
+    def _dispatch(self, key: str, value: str, is_block: bool, counts: Dict[str, int]):
+        for callback in self.callbacks['top_level']:
+            callback(key, value, is_block)
+        if not is_block:
+            return
+
+        if key.isdigit():
+            province_id = int(key)
+            counts['province'] += 1
+            for callback in self.callbacks['province']:
+                callback(province_id, value)
+            if self.callbacks['pop']:
+                for name, content in iter_child_blocks(value):
+                    if name in POP_TYPES:
+                        counts['pop'] += 1
+                        for callback in self.callbacks['pop']:
+                            callback(province_id, name, content)
+
+        elif COUNTRY_TAG_PATTERN.match(key):
+            counts['country'] += 1
+            for callback in self.callbacks['country']:
+                callback(key, value)
+            if self.callbacks['army']:
+                for name, content in iter_child_blocks(value):
+                    if name == 'army':
+                        counts['army'] += 1
+                        for callback in self.callbacks['army']:
+                            callback(key, content)
+
+    def reports(self) -> Dict[str, Dict]:
+        """收集所有分析器的报告"""
+        return {visitor.name: visitor.report() for visitor in self.visitors}
+
+
+# ========================================
+# 内置分析器
+# ========================================
+
+class CountryExtractorVisitor(ScanVisitor):
+    """country_extractor: 国家基本信息与活跃/灭亡国家"""
+    name = "countries"
+
+    def __init__(self, file_path: str = ""):
+        self.extractor = Victoria2CountryExtractor(file_path)
+        self.countries_data: Dict[str, Dict] = {}
+        self.owners = set()
+
+    def on_country(self, tag: str, content: str):
+        country_info = self.extractor.parse_country_block(tag, content)
+        if country_info:
+            self.countries_data[tag] = country_info
+
+    def on_province(self, province_id: int, content: str):
+        owner_match = OWNER_PATTERN.search(content)
+        if owner_match:
+            self.owners.add(owner_match.group(1))
+
+    def report(self) -> Dict:
+        active_countries = [tag for tag in self.countries_data if tag in self.owners]
+        return self.extractor.generate_report(self.countries_data, active_countries)
+
+
+class PopulationParserVisitor(ScanVisitor):
+    """population_parser: 各国人口按文化/宗教/职业统计"""
+    name = "population"
+
+    def __init__(self):
+        self.parser = PopulationParser()
+        self.provinces_data = {}
+        self.province_owners: Dict[int, str] = {}
+        self.country_info: Dict[str, CountryPopulation] = {}
+
+    def on_province(self, province_id: int, content: str):
+        province_pop = self.parser._parse_province_population(province_id, content)
+        if province_pop.owner:
+            self.province_owners[province_id] = province_pop.owner
+        if province_pop.total_population > 0:
+            self.provinces_data[province_id] = province_pop
+
+    def on_country(self, tag: str, content: str):
+        info = CountryPopulation(tag=tag)
+        self.parser._parse_country_basic_info(info, content)
+        self.country_info[tag] = info
+
+    def report(self) -> Dict:
+        countries_population = self.parser._aggregate_population_by_country(self.provinces_data, self.province_owners)
+        for tag, country_pop in countries_population.items():
+            info = self.country_info.get(tag)
+            if info is not None:
+                country_pop.research_points = info.research_points
+                country_pop.tax_base = info.tax_base
+        return self.parser.serialize_population_data(countries_population)
+
+
+class PopulationAttributeVisitor(ScanVisitor):
+    """comprehensive_population_analyzer: 人口属性分布"""
+    name = "population_attributes"
+
+    def __init__(self, file_path: str = ""):
+        self.analyzer = ComprehensivePopulationAnalyzer(file_path, load=False)
+        self.known_pop_types = set(self.analyzer.known_pop_types)
+        self.population_blocks: List[Tuple[str, str, str]] = []
+
+    def on_pop(self, province_id: int, pop_type: str, content: str):
+        if pop_type in self.known_pop_types:
+            self.population_blocks.append((pop_type, f"{pop_type}={{{content}}}", str(province_id)))
+
+    def report(self) -> Dict:
+        return self.analyzer.analyze_population_blocks(self.population_blocks)
+
+
+class CountryFieldsVisitor(ScanVisitor):
+    """country_analyzer: 国家块字段覆盖率与取值"""
+    name = "country_fields"
+
+    def __init__(self):
+        self.analyzer = Victoria2CountryAnalyzer()
+
+    def on_country(self, tag: str, content: str):
+        block = BracketBlock(tag, 0, len(content), content, 1)
+        if self.analyzer._is_country_definition_block(block):
+            self.analyzer.country_blocks.append(block)
+            self.analyzer.country_tags.add(tag)
+
+    def report(self) -> Dict:
+        if not self.analyzer.country_blocks:
+            return {}
+        return self.analyzer.analyze_country_fields()
+
+
+class SimpleSummaryVisitor(ScanVisitor):
+    """simple_parser: 基本信息、标志、国家、世界市场与省份摘要"""
+    name = "summary"
+    SAMPLE_PROVINCES = 10
+
+    def __init__(self):
+        self.parser = SimpleVictoria2Parser()
+        self.header: List[str] = []
+        self.countries: Dict[str, Dict] = {}
+        self.worldmarket: Dict = {}
+        self.province_count = 0
+        self.sample_provinces: List[Dict] = []
+
+    def on_top_level(self, key: str, value: str, is_block: bool):
+        if not is_block:
+            self.header.append(f"{key}={value}\n")
+        elif key == 'flags':
+            self.header.append(f"flags=\n{{{value}}}\n")
+        elif key == 'worldmarket':
+            self.worldmarket = self.parser._summarize_worldmarket(value)
+
+    def on_country(self, tag: str, content: str):
+        self.countries[tag] = self.parser._parse_country_content(content)
+
+    def on_province(self, province_id: int, content: str):
+        self.province_count += 1
+        if len(self.sample_provinces) < self.SAMPLE_PROVINCES:
+            self.sample_provinces.append(self.parser._parse_province_detail(province_id, content))
+
+    def report(self) -> Dict:
+        # 基本信息和标志只在顶级键中查找
+        self.parser.content = ''.join(self.header)
+        flags = self.parser.extract_flags()
+        return {
+            'basic_info': self.parser.extract_basic_info(),
+            'flags': flags,
+            'flag_count': len(flags),
+            'countries': self.countries,
+            'country_count': len(self.countries),
+            'worldmarket': self.worldmarket,
+            'provinces': {
+                'total_provinces': self.province_count,
+                'sample_provinces': self.sample_provinces,
+            },
+        }
+
+
+def nightly_visitors(file_path: str = "") -> List[ScanVisitor]:
+    """夜间报告使用的全部分析器"""
+    return [
+        CountryExtractorVisitor(file_path),
+        PopulationParserVisitor(),
+        PopulationAttributeVisitor(file_path),
+        CountryFieldsVisitor(),
+        SimpleSummaryVisitor(),
+    ]
+
+
+def run_shared_scan(file_path: str, visitors: List[ScanVisitor] = None) -> Dict:
+    """对存档执行一次共享扫描，返回 {分析器名称: 报告} 以及扫描统计"""
+    scan = SharedScan()
+    for visitor in visitors if visitors is not None else nightly_visitors(file_path):
+        scan.add_visitor(visitor)
+
+    print(f"🔍 共享扫描: {file_path} ({len(scan.visitors)} 个分析器)")
+    stats = scan.scan_file(file_path)
+    events = stats['events']
+    print(f"✅ 扫描完成 ({stats['elapsed']:.2f} 秒): {events['top_level']} 个顶级键, "
+          f"{events['province']} 个省份, {events['pop']} 个人口, {events['country']} 个国家, {events['army']} 支军队")
+
+    start = time.perf_counter()
+    reports = scan.reports()
+    print(f"📊 报告生成完成 ({time.perf_counter() - start:.2f} 秒)")
+    return {
+        'metadata': {
+            'source_file': os.path.basename(file_path),
+            'scan_time': datetime.now().isoformat(),
+            'scan': stats,
+        },
+        'reports': reports,
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python shared_scan.py <存档文件> [输出文件]")
+        return
+
+    file_path = sys.argv[1]
+    if not os.path.exists(file_path):
+        print(f"❌ 文件不存在: {file_path}")
+        return
+
+    result = run_shared_scan(file_path)
+
+    if len(sys.argv) > 2:
+        output_file = sys.argv[2]
+    else:
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        output_file = f"shared_scan_{base_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 报告已保存到: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
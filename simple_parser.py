@@ -159,22 +159,28 @@ class SimpleVictoria2Parser:
         # 查找worldmarket块
         wm_match = re.search(r'worldmarket=\s*\{(.*?)\}(?=\s*[a-zA-Z_]+=)', self.content, re.DOTALL)
         if wm_match:
-            wm_content = wm_match.group(1)
-            
-            # 提取商品池
-            pools = ['worldmarket_pool', 'price_pool', 'supply_pool']
-            for pool_name in pools:
-                pool_pattern = f'{pool_name}=\\s*\\{{([^}}]+)\\}}'
-                pool_match = re.search(pool_pattern, wm_content)
-                if pool_match:
-                    pool_content = pool_match.group(1)
-                    # 计算商品数量
-                    commodity_count = len(re.findall(r'\w+=([\d.]+)', pool_content))
-                    worldmarket[f'{pool_name}_commodities'] = commodity_count
-                    
-                    # 提取前几个商品作为示例
-                    commodities = re.findall(r'(\w+)=([\d.]+)', pool_content)[:5]
-                    worldmarket[f'{pool_name}_sample'] = {name: float(value) for name, value in commodities}
+            worldmarket = self._summarize_worldmarket(wm_match.group(1))
+        
+        return worldmarket
+    
+    def _summarize_worldmarket(self, wm_content: str) -> Dict[str, Any]:
+        """统计世界市场块中的商品池"""
+        worldmarket = {}
+        
+        # 提取商品池
+        pools = ['worldmarket_pool', 'price_pool', 'supply_pool']
+        for pool_name in pools:
+            pool_pattern = f'{pool_name}=\\s*\\{{([^}}]+)\\}}'
+            pool_match = re.search(pool_pattern, wm_content)
+            if pool_match:
+                pool_content = pool_match.group(1)
+                # 计算商品数量
+                commodity_count = len(re.findall(r'\w+=([\d.]+)', pool_content))
+                worldmarket[f'{pool_name}_commodities'] = commodity_count
+                
+                # 提取前几个商品作为示例
+                commodities = re.findall(r'(\w+)=([\d.]+)', pool_content)[:5]
+                worldmarket[f'{pool_name}_sample'] = {name: float(value) for name, value in commodities}
         
         return worldmarket
     
@@ -196,24 +202,24 @@ class SimpleVictoria2Parser:
             prov_pattern = f'^\\s*{province_id}=\\s*\\{{(.*?)^\\s*\\}}'
             prov_match = re.search(prov_pattern, self.content, re.MULTILINE | re.DOTALL)
             if prov_match:
-                prov_content = prov_match.group(1)
-                
-                # 提取基本信息
-                name_match = re.search(r'name="([^"]+)"', prov_content)
-                owner_match = re.search(r'owner="([^"]+)"', prov_content)
-                controller_match = re.search(r'controller="([^"]+)"', prov_content)
-                
-                province_detail = {
-                    'id': province_id,
-                    'name': name_match.group(1) if name_match else 'Unknown',
-                    'owner': owner_match.group(1) if owner_match else 'Unknown',
-                    'controller': controller_match.group(1) if controller_match else 'Unknown'
-                }
-                province_details.append(province_detail)
+                province_details.append(self._parse_province_detail(province_id, prov_match.group(1)))
         
         province_info['sample_provinces'] = province_details
         return province_info
     
+    def _parse_province_detail(self, province_id: int, prov_content: str) -> Dict[str, Any]:
+        """提取省份的名称、所有者和控制者"""
+        name_match = re.search(r'name="([^"]+)"', prov_content)
+        owner_match = re.search(r'owner="([^"]+)"', prov_content)
+        controller_match = re.search(r'controller="([^"]+)"', prov_content)
+        
+        return {
+            'id': province_id,
+            'name': name_match.group(1) if name_match else 'Unknown',
+            'owner': owner_match.group(1) if owner_match else 'Unknown',
+            'controller': controller_match.group(1) if controller_match else 'Unknown'
+        }
+    
     def generate_summary(self) -> Dict[str, Any]:
         """生成完整的存档摘要"""
         print("开始分析存档文件...")
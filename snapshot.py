@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 分析结果二进制快照
+===================================
+把解析/提取得到的大JSON文档 (victoria2_analysis.json、simple_countries_*.json 等)
+保存为紧凑的快照文件 (.v2snap)，之后打开只需几毫秒:
+
+- 记录表 (国家字典、省份列表等) 按列存储: 数值列为 array 的原始字节 ('q'/'d'，
+  整数与浮点数混合的列另存逐行的整数标记)，
+  布尔列为 'b'，字符串列为分类编码 ('H'/'I')，类别表放在JSON文件头中；
+- 其余的小型数据 (基本信息、标志列表等) 原样放在文件头中；
+- 打开时只读取文件头并 mmap 数据区，读取某一列时才创建该列的零拷贝视图。
+
+load_document 打开的文档与 json.load 的结果用法相同 (字典/列表接口)。
+对JSON文件调用时，若旁边有不旧于它的快照则直接打开快照，否则读取JSON并顺便生成快照。
+
+    python snapshot.py victoria2_analysis.json           生成 victoria2_analysis.v2snap
+    data = load_document('victoria2_analysis.json')
+    data['countries']['CHI'].get('tax_base', 0)          # 只读取 tax_base 一列
+
+文件格式: MAGIC | 文件头长度 (uint32 小端) | 文件头JSON | 按8字节对齐的列数据。
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:  # numpy 为可选依赖
+    numpy = None
+
+SNAPSHOT_SUFFIX = '.v2snap'
+MAGIC = b'V2SNAP1\n'
+FORMAT_VERSION = 1
+MIN_TABLE_ROWS = 8
+TABLE_MARKER = '$table'
+
+# 行状态: 0=有值 1=null 2=该记录没有这个字段
+PRESENT, NULL, ABSENT = 0, 1, 2
+
+_SCALARS = (str, int, float, bool, type(None))
+_INT64_RANGE = (-(1 << 63), (1 << 63) - 1)
+_FLOAT_EXACT_INT = 1 << 53     # 绝对值不超过它的整数可以无损存为 'd'
+
+
+# ========================================
+# 写入
+# ========================================
+
+def _is_record(value: Any) -> bool:
+    return isinstance(value, dict)
+
+
+def _state(record: Dict, name: str) -> int:
+    if name not in record:
+        return ABSENT
+    return NULL if record[name] is None else PRESENT
+
+
+def _column_kind(values: List[Any]) -> str:
+    """按列中实际出现的值决定存储方式"""
+    present = [value for value in values if value is not None]
+    if not present:
+        return 'null'
+    if all(isinstance(value, bool) for value in present):
+        return 'bool'
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        if all(_INT64_RANGE[0] <= value <= _INT64_RANGE[1] for value in present):
+            return 'int'
+        return 'json'
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        if any(isinstance(value, int) and abs(value) > _FLOAT_EXACT_INT for value in present):
+            return 'json'
+        return 'float'
+    if all(isinstance(value, str) for value in present):
+        return 'category'
+    return 'json'
+
+
+class _SnapshotWriter:
+    def __init__(self, min_table_rows: int):
+        self.min_table_rows = min_table_rows
+        self.tables: Dict[str, Dict] = {}
+        self.blocks: List[bytes] = []
+        self.offset = 0
+
+    def _add_block(self, data: bytes) -> Tuple[int, int]:
+        padding = -self.offset % 8
+        if padding:
+            self.blocks.append(b'\0' * padding)
+            self.offset += padding
+        start = self.offset
+        self.blocks.append(data)
+        self.offset += len(data)
+        return start, len(data)
+
+    def _add_array(self, values: array) -> Tuple[int, int]:
+        if sys.byteorder != 'little':
+            values = array(values.typecode, values)
+            values.byteswap()
+        return self._add_block(values.tobytes())
+
+    def _is_table(self, value: Any) -> bool:
+        if isinstance(value, dict):
+            return len(value) >= self.min_table_rows and all(_is_record(item) for item in value.values())
+        if isinstance(value, list):
+            return len(value) >= self.min_table_rows and all(_is_record(item) for item in value)
+        return False
+
+    def skeleton(self, value: Any, path: str = '') -> Any:
+        """把文档中的记录表替换为占位符，其余保持原样"""
+        if self._is_table(value):
+            self.tables[path] = self._write_table(value)
+            return {TABLE_MARKER: path}
+        if isinstance(value, dict):
+            return {key: self.skeleton(item, f"{path}/{key}") for key, item in value.items()}
+        return value
+
+    def _write_table(self, table: Any) -> Dict:
+        if isinstance(table, dict):
+            keys = list(table)
+            records = list(table.values())
+        else:
+            keys = None
+            records = table
+
+        names: Dict[str, None] = {}
+        for record in records:
+            for name in record:
+                names.setdefault(name, None)
+
+        columns = {}
+        for name in names:
+            values = [record.get(name) for record in records]
+            states = array('B', [_state(record, name) for record in records])
+            columns[name] = self._write_column(values, states)
+        # 行键单独存放，打开快照时不必解析
+        if keys is not None:
+            keys = self._add_block(json.dumps(keys, ensure_ascii=False).encode('utf-8'))
+        return {'keys': keys, 'rows': len(records), 'columns': columns}
+
+    def _write_column(self, values: List[Any], states: array) -> Dict:
+        kind = _column_kind(values)
+        column: Dict[str, Any] = {'kind': kind}
+        if any(states):
+            column['states'] = self._add_array(states)
+
+        if kind == 'int':
+            column['data'] = self._add_array(array('q', (value or 0 for value in values)))
+        elif kind == 'float':
+            column['data'] = self._add_array(array('d', (float(value or 0) for value in values)))
+            # 整数与浮点数混合的列逐行记录哪些是整数，读取时还原为 int
+            int_rows = array('b', (isinstance(value, int) for value in values))
+            if any(int_rows):
+                column['int_rows'] = self._add_array(int_rows)
+        elif kind == 'bool':
+            column['data'] = self._add_array(array('b', (bool(value) for value in values)))
+        elif kind == 'category':
+            categories: Dict[str, int] = {}
+            codes = [categories.setdefault(value, len(categories)) if value is not None else 0 for value in values]
+            column['categories'] = list(categories)
+            column['typecode'] = 'H' if len(categories) <= 0xFFFF else 'I'
+            column['data'] = self._add_array(array(column['typecode'], codes))
+        elif kind == 'json':
+            column['data'] = self._add_block(json.dumps(values, ensure_ascii=False).encode('utf-8'))
+        return column
+
+
+def save_snapshot(document: Any, path: str, min_table_rows: int = MIN_TABLE_ROWS) -> str:
+    """把JSON文档保存为快照文件，返回路径"""
+    writer = _SnapshotWriter(min_table_rows)
+    header = {
+        'version': FORMAT_VERSION,
+        'document': writer.skeleton(document),
+        'tables': writer.tables,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = len(MAGIC) + 4 + len(header_bytes)
+    header_padding = -data_start % 8
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * header_padding)
+        for block in writer.blocks:
+            f.write(block)
+    os.replace(temp_path, path)
+    return path
+
+
+# ========================================
+# 读取
+# ========================================
+
+class _Column:
+    """一列的惰性视图"""
+
+    def __init__(self, snapshot: 'Snapshot', spec: Dict):
+        self.kind = spec['kind']
+        self.states = snapshot._view(spec['states'], 'B') if 'states' in spec else None
+        self.categories = spec.get('categories')
+        self.int_rows = snapshot._view(spec['int_rows'], 'b') if 'int_rows' in spec else None
+        if self.kind == 'int':
+            self.data = snapshot._view(spec['data'], 'q')
+        elif self.kind == 'float':
+            self.data = snapshot._view(spec['data'], 'd')
+        elif self.kind == 'bool':
+            self.data = snapshot._view(spec['data'], 'b')
+        elif self.kind == 'category':
+            self.data = snapshot._view(spec['data'], spec['typecode'])
+        elif self.kind == 'json':
+            self.data = snapshot._json_block(spec['data'])
+        else:
+            self.data = None
+
+    def state(self, row: int) -> int:
+        return self.states[row] if self.states is not None else PRESENT
+
+    def value(self, row: int) -> Any:
+        if self.states is not None and self.states[row] != PRESENT:
+            return None
+        if self.kind == 'category':
+            return self.categories[self.data[row]]
+        if self.kind == 'bool':
+            return bool(self.data[row])
+        if self.kind == 'null':
+            return None
+        if self.int_rows is not None and self.int_rows[row]:
+            return int(self.data[row])
+        return self.data[row]
+
+
+class SnapshotRecord(Mapping):
+    """表中的一行；读取字段时才加载对应的列"""
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table: 'SnapshotTable', row: int):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, name: str) -> Any:
+        column = self._table.column(name)
+        if column is None or column.state(self._row) == ABSENT:
+            raise KeyError(name)
+        return column.value(self._row)
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self._table.column_names:
+            if self._table.column(name).state(self._row) != ABSENT:
+                yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"SnapshotRecord({dict(self)!r})"
+
+
+class SnapshotTable:
+    """列存储的记录表；有键时表现为字典，否则表现为列表"""
+
+    def __init__(self, snapshot: 'Snapshot', spec: Dict):
+        self._snapshot = snapshot
+        self._spec = spec
+        self._columns: Dict[str, _Column] = {}
+        self._index: Optional[Dict[str, int]] = None
+        self._keys: Optional[List[str]] = None
+        self.rows: int = spec['rows']
+        self.column_names: List[str] = list(spec['columns'])
+
+    @property
+    def keys_list(self) -> Optional[List[str]]:
+        if self._keys is None and self._spec['keys'] is not None:
+            self._keys = self._snapshot._json_block(self._spec['keys'])
+        return self._keys
+
+    def column(self, name: str) -> Optional[_Column]:
+        column = self._columns.get(name)
+        if column is None:
+            spec = self._spec['columns'].get(name)
+            if spec is None:
+                return None
+            column = self._columns[name] = _Column(self._snapshot, spec)
+        return column
+
+    def column_values(self, name: str) -> List[Any]:
+        """整列的值 (缺失为None)"""
+        column = self.column(name)
+        if column is None:
+            return [None] * self.rows
+        return [column.value(row) for row in range(self.rows)]
+
+    def to_numpy(self, name: str):
+        """数值/布尔/分类编码列的 numpy 零拷贝视图 (需要安装 numpy)"""
+        if numpy is None:
+            raise ImportError("to_numpy 需要 numpy: pip install numpy")
+        column = self.column(name)
+        if column is None or column.kind not in ('int', 'float', 'bool', 'category'):
+            raise ValueError(f"列 {name} 不是数组列")
+        return numpy.asarray(column.data)
+
+    def record(self, row: int) -> SnapshotRecord:
+        return SnapshotRecord(self, row)
+
+    def row_of(self, key: str) -> Optional[int]:
+        if self._index is None:
+            self._index = {item: row for row, item in enumerate(self.keys_list or ())}
+        return self._index.get(key)
+
+
+class SnapshotDict(SnapshotTable, Mapping):
+    def __getitem__(self, key: str) -> SnapshotRecord:
+        row = self.row_of(key)
+        if row is None:
+            raise KeyError(key)
+        return SnapshotRecord(self, row)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_list)
+
+    def __len__(self) -> int:
+        return self.rows
+
+
+class SnapshotList(SnapshotTable, Sequence):
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [SnapshotRecord(self, row) for row in range(self.rows)[index]]
+        if index < 0:
+            index += self.rows
+        if not 0 <= index < self.rows:
+            raise IndexError(index)
+        return SnapshotRecord(self, index)
+
+    def __len__(self) -> int:
+        return self.rows
+
+
+class SnapshotNode(Mapping):
+    """文档中的普通字典；其中的记录表在访问时才打开"""
+
+    def __init__(self, snapshot: 'Snapshot', node: Dict):
+        self._snapshot = snapshot
+        self._node = node
+
+    def __getitem__(self, key: str) -> Any:
+        return self._snapshot._wrap(self._node[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._node)
+
+    def __len__(self) -> int:
+        return len(self._node)
+
+
+class Snapshot:
+    """打开的快照文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是快照文件: {path}")
+            header_length, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_length).decode('utf-8'))
+            if header.get('version') != FORMAT_VERSION:
+                raise ValueError(f"不支持的快照版本: {header.get('version')}")
+            data_start = len(MAGIC) + 4 + header_length
+            data_start += -data_start % 8
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else None
+        self._buffer = memoryview(self._mmap)[data_start:] if self._mmap is not None else memoryview(b'')
+        self._header = header
+        self._tables: Dict[str, SnapshotTable] = {}
+        self.document = self._wrap(header['document'])
+
+    def _view(self, block: Tuple[int, int], typecode: str):
+        start, length = block
+        view = self._buffer[start:start + length]
+        if sys.byteorder != 'little':
+            values = array(typecode, bytes(view))
+            values.byteswap()
+            return values
+        return view.cast(typecode)
+
+    def _json_block(self, block: Tuple[int, int]) -> Any:
+        start, length = block
+        return json.loads(bytes(self._buffer[start:start + length]).decode('utf-8'))
+
+    def table(self, path: str) -> SnapshotTable:
+        table = self._tables.get(path)
+        if table is None:
+            spec = self._header['tables'][path]
+            cls = SnapshotDict if spec['keys'] is not None else SnapshotList
+            table = self._tables[path] = cls(self, spec)
+        return table
+
+    def _wrap(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            if TABLE_MARKER in value and len(value) == 1:
+                return self.table(value[TABLE_MARKER])
+            return SnapshotNode(self, value)
+        return value
+
+
+def to_plain(value: Any) -> Any:
+    """把快照文档 (或其中一部分) 转换为普通的字典/列表"""
+    if isinstance(value, Mapping):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, SnapshotList)):
+        return [to_plain(item) for item in value]
+    return value
+
+
+def snapshot_path_for(json_file: str) -> str:
+    return os.path.splitext(json_file)[0] + SNAPSHOT_SUFFIX
+
+
+def load_document(path: str, create_snapshot: bool = True) -> Any:
+    """打开快照或JSON文档；JSON文件旁有不旧于它的快照时改为打开快照，否则读取JSON并生成快照"""
+    if path.endswith(SNAPSHOT_SUFFIX):
+        return Snapshot(path).document
+
+    snapshot_file = snapshot_path_for(path)
+    if os.path.exists(snapshot_file) and os.path.getmtime(snapshot_file) >= os.path.getmtime(path):
+        try:
+            return Snapshot(snapshot_file).document
+        except (ValueError, OSError):
+            pass  # 损坏或旧版本的快照，重新生成
+
+    with open(path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    if create_snapshot:
+        try:
+            save_snapshot(document, snapshot_file)
+        except OSError:
+            pass  # 目录不可写时只使用JSON
+    return document
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python snapshot.py <结果.json> [更多.json ...]")
+        return
+    for json_file in sys.argv[1:]:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            document = json.load(f)
+        output = save_snapshot(document, snapshot_path_for(json_file))
+        print(f"📦 {json_file} ({os.path.getsize(json_file):,} 字节) → {output} ({os.path.getsize(output):,} 字节)")
+
+
+if __name__ == "__main__":
+    main()
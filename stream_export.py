@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 分析结果流式导出
+===================================
+大型分析结果不再先拼成完整的字典再 json.dump，而是边遍历边写入:
+
+- NDJSONWriter: 每行一条记录 (每个国家、省份或人口)，定期刷新，
+  下游工具可以在导出结束前就开始读取 (iter_ndjson)。
+- dump_json_stream: 逐条写出单个JSON文档，输出与 json.dump(indent=2) 完全相同；
+  StreamedObject / StreamedArray 包装的生成器在写出时才逐条产生内容。
+
+    with NDJSONWriter('provinces.ndjson') as writer:
+        for province in provinces:
+            writer.write(province)
+
+    with open('result.json', 'w', encoding='utf-8') as f:
+        dump_json_stream({'info': info, 'countries': StreamedObject(iter_countries())}, f)
+"""
+
+import json
+import os
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_FLUSH_EVERY = 1000
+
+
+class StreamedObject:
+    """写出时逐条产生的JSON对象；items 产生 (键, 值)"""
+
+    def __init__(self, items: Iterable[Tuple[Any, Any]]):
+        self.items = items
+
+
+class StreamedArray:
+    """写出时逐条产生的JSON数组"""
+
+    def __init__(self, items: Iterable[Any]):
+        self.items = items
+
+
+def _json_key(key: Any) -> str:
+    """与 json 模块相同的键转换规则"""
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, (int, float)):
+        return json.dumps(key)
+    raise TypeError(f"JSON对象的键不能是 {type(key).__name__}")
+
+
+class _JSONStreamer:
+    """按 json.dump 的格式逐条写出；stream_depth 以内的字典和列表逐项写出，更深的整体序列化"""
+
+    def __init__(self, f: IO[str], indent: Optional[int], stream_depth: int, flush_every: int,
+                 default: Callable[[Any], Any]):
+        self.f = f
+        self.indent = indent
+        self.stream_depth = stream_depth
+        self.flush_every = flush_every
+        self.default = default
+        self.written = 0
+        if indent is None:
+            self.item_separator, self.key_separator = ', ', ': '
+        else:
+            self.item_separator, self.key_separator = ',', ': '
+
+    def _newline(self, level: int) -> str:
+        if self.indent is None:
+            return ''
+        return '\n' + ' ' * (self.indent * level)
+
+    def _tick(self):
+        self.written += 1
+        if self.written % self.flush_every == 0:
+            self.f.flush()
+
+    def write(self, value: Any, level: int = 0):
+        if isinstance(value, StreamedObject) or (isinstance(value, dict) and level < self.stream_depth):
+            items = value.items if isinstance(value, StreamedObject) else value.items()
+            self._write_container('{', '}', ((key, item) for key, item in items), level, True)
+        elif isinstance(value, StreamedArray) or (isinstance(value, (list, tuple)) and level < self.stream_depth):
+            items = value.items if isinstance(value, StreamedArray) else value
+            self._write_container('[', ']', ((None, item) for item in items), level, False)
+        else:
+            text = json.dumps(value, indent=self.indent, ensure_ascii=False, default=self.default)
+            if self.indent is not None and level:
+                text = text.replace('\n', self._newline(level))
+            self.f.write(text)
+
+    def _write_container(self, open_mark: str, close_mark: str, entries: Iterator, level: int, is_object: bool):
+        self.f.write(open_mark)
+        empty = True
+        for key, item in entries:
+            if not empty:
+                self.f.write(self.item_separator)
+            empty = False
+            self.f.write(self._newline(level + 1))
+            if is_object:
+                self.f.write(json.dumps(_json_key(key), ensure_ascii=False) + self.key_separator)
+            self.write(item, level + 1)
+            if level == 0:
+                self._tick()
+        if not empty:
+            self.f.write(self._newline(level))
+        self.f.write(close_mark)
+
+
+def dump_json_stream(data: Any, f: IO[str], indent: Optional[int] = 2, stream_depth: int = 2,
+                     flush_every: int = DEFAULT_FLUSH_EVERY, default: Callable[[Any], Any] = str):
+    """逐条写出JSON文档；普通字典/列表的输出与 json.dump(data, f, indent=indent, ensure_ascii=False) 相同"""
+    _JSONStreamer(f, indent, stream_depth, flush_every, default).write(data)
+
+
+def save_json_stream(data: Any, path: str, **options):
+    """dump_json_stream 写入文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        dump_json_stream(data, f, **options)
+
+
+class NDJSONWriter:
+    """每行一条JSON记录；每 flush_every 条刷新一次，便于下游边写边读"""
+
+    def __init__(self, path: str, flush_every: int = DEFAULT_FLUSH_EVERY, default: Callable[[Any], Any] = str):
+        self.path = path
+        self.flush_every = flush_every
+        self.default = default
+        self.count = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.f = open(path, 'w', encoding='utf-8')
+
+    def write(self, record: Any):
+        self.f.write(json.dumps(record, ensure_ascii=False, default=self.default))
+        self.f.write('\n')
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.f.flush()
+
+    def write_all(self, records: Iterable[Any]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+
+    def __enter__(self) -> 'NDJSONWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_ndjson(path: str) -> Iterator[Dict]:
+    """逐行读取NDJSON记录；文件仍在写入时，忽略末尾未写完的行"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            if line.strip():
+                yield json.loads(line)
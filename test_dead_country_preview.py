@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+已灭亡国家清理的预览复用测试 (基于 save_generator 生成的存档)
+"""
+
+import os
+import tempfile
+
+from save_generator import GeneratorConfig, write_save
+from victoria2_main_modifier import Victoria2Modifier
+
+
+def _load_generated(directory, **overrides):
+    path = os.path.join(directory, 'generated.v2')
+    write_save(path, GeneratorConfig.for_scale(0.05, seed=7, **overrides))
+    modifier = Victoria2Modifier()
+    assert modifier.load_file(path)
+    return modifier
+
+
+def test_preview_without_dead_countries():
+    """没有已灭亡国家时，预览结果也能作为 preview 传回执行"""
+    with tempfile.TemporaryDirectory() as directory:
+        modifier = _load_generated(directory, dead_countries=0)
+        original = modifier.content
+
+        preview = modifier.remove_dead_country_blocks(dry_run=True)
+        assert preview['removed_countries'] == []
+        assert 'edit_plan' in preview and 'analysis' in preview
+
+        result = modifier.remove_dead_country_blocks(dry_run=False, preview=preview)
+        assert result['removed_countries'] == []
+        assert modifier.content == original
+
+
+def test_preview_is_reused_when_content_unchanged():
+    """有已灭亡国家时按预览删除；内容变化后的旧预览被忽略并重新分析"""
+    with tempfile.TemporaryDirectory() as directory:
+        modifier = _load_generated(directory, dead_countries=3)
+
+        preview = modifier.remove_dead_country_blocks(dry_run=True)
+        assert len(preview['removed_countries']) == 3
+
+        result = modifier.remove_dead_country_blocks(dry_run=False, preview=preview)
+        assert sorted(result['removed_countries']) == sorted(preview['removed_countries'])
+
+        # 旧预览的编辑计划已与内容不一致，不能再执行
+        again = modifier.remove_dead_country_blocks(dry_run=False, preview=preview)
+        assert again['removed_countries'] == []
+
+
+def test_preview_without_plan_is_ignored():
+    """不含编辑计划的 preview (例如旧版本的返回值) 不会引发 KeyError"""
+    with tempfile.TemporaryDirectory() as directory:
+        modifier = _load_generated(directory, dead_countries=2)
+        result = modifier.remove_dead_country_blocks(dry_run=True, preview={'removed_countries': [], 'references': {}})
+        assert len(result['removed_countries']) == 2
+
+
+if __name__ == "__main__":
+    test_preview_without_dead_countries()
+    test_preview_is_reused_when_content_unchanged()
+    test_preview_without_plan_is_ignored()
+    print("✅ 全部通过")
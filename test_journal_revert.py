@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编辑日志撤销与回退测试 (基于 save_generator 生成的存档)
+"""
+
+import os
+import tempfile
+
+from edit_journal import EditJournal
+from save_generator import GeneratorConfig, write_save
+from victoria2_main_modifier import Victoria2Modifier
+
+
+def _load_generated(directory):
+    path = os.path.join(directory, 'generated.v2')
+    write_save(path, GeneratorConfig.for_scale(0.05, seed=11))
+    modifier = Victoria2Modifier()
+    assert modifier.load_file(path)
+    return modifier
+
+
+def test_revert_past_undo_restores_undone_flag():
+    """回退到补偿操作之前时，被撤销的操作恢复为未撤销，可再次撤销"""
+    with tempfile.TemporaryDirectory() as directory:
+        modifier = _load_generated(directory)
+        original = modifier.content
+
+        assert modifier.modify_militancy(china_militancy=0.0, other_militancy=10.0)
+        after_militancy = modifier.content
+        assert modifier.modify_game_date("1840.1.1")
+        assert modifier.undo('militancy')
+        assert [g.operation for g in modifier.journal.groups] == ['militancy', 'date', 'undo:militancy']
+
+        assert modifier.revert_to(1)
+        assert modifier.content == after_militancy
+        assert [g.operation for g in modifier.journal.groups] == ['militancy']
+        assert not modifier.journal.groups[0].undone
+        assert "(已撤销)" not in modifier.journal.summary()[0]
+
+        assert modifier.undo('militancy')
+        assert modifier.content == original
+
+
+def test_undone_flag_survives_reload():
+    """补偿操作记录的 undoes 写入日志文件，重新读取后回退结果相同"""
+    with tempfile.TemporaryDirectory() as directory:
+        modifier = _load_generated(directory)
+        assert modifier.modify_militancy(china_militancy=0.0, other_militancy=10.0)
+        assert modifier.modify_game_date("1840.1.1")
+        assert modifier.undo('militancy')
+        assert modifier.save_file(modifier.file_path)
+
+        journal = EditJournal.for_save(modifier.file_path)
+        assert journal.groups[-1].undoes == 1
+        journal.revert_to(modifier.content, 1)
+        assert not journal.groups[0].undone
+
+
+if __name__ == "__main__":
+    test_revert_past_undo_restores_undone_flag()
+    test_undone_flag_survives_reload()
+    print("✅ 全部通过")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+人口ID压缩测试 (基于 save_generator 生成的存档)
+"""
+
+import os
+import re
+import tempfile
+
+from pop_compaction import POP_TYPE_NAMES, plan_pop_id_compaction, scan_pop_ids
+from save_generator import GeneratorConfig, write_save
+from save_index import load_save_text
+
+_POP_BLOCK = re.compile(r'^\t(?:' + '|'.join(POP_TYPE_NAMES) + r')=\n\t\{\n\t\tid=(\d+)\n.*?\n\t\}\n',
+                        re.MULTILINE | re.DOTALL)
+
+
+def _generated_content_with_deleted_pops():
+    """生成存档并删除约四分之一的人口 (包括被团引用的士兵人口)"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'generated.v2')
+        write_save(path, GeneratorConfig.for_scale(0.05, seed=31))
+        content = load_save_text(path)
+    remaining = _POP_BLOCK.sub(lambda match: '' if int(match.group(1)) % 4 == 0 else match.group(0), content)
+    assert len(scan_pop_ids(remaining)[0]) < len(scan_pop_ids(content)[0])
+    return remaining
+
+
+def test_compaction_renumbers_densely_and_keeps_references():
+    content = _generated_content_with_deleted_pops()
+    definitions, references, _ = scan_pop_ids(content)
+    position_of = {pop_id: position for position, (_, _, pop_id) in enumerate(definitions)}
+    assert any(pop_id not in position_of for _, _, pop_id in references)
+
+    result = plan_pop_id_compaction(content)
+    compacted = result['edit_plan'].apply(content)
+    new_definitions, new_references, start_indexes = scan_pop_ids(compacted)
+    pop_count = len(new_definitions)
+
+    # 人口ID为连续的 1..N，顺序不变
+    assert [pop_id for _, _, pop_id in new_definitions] == list(range(1, pop_count + 1))
+    assert pop_count == len(definitions)
+
+    # 有效引用仍指向同一个人口，孤立引用编号到 N 之后且互不冲突
+    assert len(new_references) == len(references)
+    dangling = {}
+    for (_, _, old_id), (_, _, new_id) in zip(references, new_references):
+        if old_id in position_of:
+            assert new_id - 1 == position_of[old_id]
+        else:
+            assert new_id > pop_count
+            assert dangling.setdefault(old_id, new_id) == new_id
+    assert len(set(dangling.values())) == len(dangling)
+
+    # start_pop_index 为下一个可用ID
+    next_id = pop_count + len(dangling) + 1
+    assert [value for _, _, value in start_indexes] == [next_id]
+    assert result['report']['start_pop_index'] == next_id
+
+
+if __name__ == "__main__":
+    test_compaction_renumbers_densely_and_keeps_references()
+    print("✅ 全部通过")
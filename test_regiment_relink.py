@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+孤立团重新关联测试 (基于 save_generator 生成的存档)
+"""
+
+import os
+import re
+import tempfile
+from collections import Counter
+
+from regiment_relink import SOLDIERS_PER_REGIMENT, build_military_index, build_soldier_index, plan_regiment_relink
+from save_generator import GeneratorConfig, write_save
+from save_index import SaveIndex, load_save_text
+
+_PROVINCE_BLOCK = re.compile(r'^\d+=\n\{\n.*?^\}\n', re.MULTILINE | re.DOTALL)
+_SOLDIER_BLOCK = re.compile(r'^\tsoldiers=\n\t\{\n\t\tid=(\d+)\n.*?\n\t\}\n', re.MULTILINE | re.DOTALL)
+
+
+def _generated_content_with_deleted_soldiers():
+    """生成没有孤立团的存档，每个省份只保留第一个士兵人口，并把它扩充到足以容纳所有团"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'generated.v2')
+        write_save(path, GeneratorConfig.for_scale(0.05, seed=43, orphan_regiment_rate=0.0))
+        content = load_save_text(path)
+
+    def edit_province(province):
+        kept = []
+
+        def edit_soldiers(match):
+            if kept:
+                return ''
+            kept.append(match.group(1))
+            return re.sub(r'size=\d+', f'size={SOLDIERS_PER_REGIMENT * 50}', match.group(0), count=1)
+        return _SOLDIER_BLOCK.sub(edit_soldiers, province.group(0))
+    return _PROVINCE_BLOCK.sub(edit_province, content)
+
+
+def test_relink_assigns_same_country_pops_within_capacity():
+    content = _generated_content_with_deleted_soldiers()
+    result = plan_regiment_relink(content)
+    assert result['report']['orphaned'] > 0
+    assert result['report']['unassigned'] == 0
+
+    relinked = result['edit_plan'].apply(content)
+    index = SaveIndex().build(relinked)
+    soldiers = build_soldier_index(relinked, index)
+    regiments = build_military_index(relinked, index)
+
+    # 不再有孤立的团
+    assert plan_regiment_relink(relinked, index)['report']['orphaned'] == 0
+
+    # 新关联的人口属于同一国家
+    for item in result['relinked']:
+        assert soldiers[item['new_pop_id']].country == item['country']
+
+    # 接收新团的人口没有超额
+    usage = Counter(regiment.pop_id for regiment in regiments)
+    for pop_id in {item['new_pop_id'] for item in result['relinked']}:
+        assert usage[pop_id] <= soldiers[pop_id].capacity
+
+    # 分配到其他省份的团，其军队所在省份中同国的士兵人口已经用满
+    before = build_military_index(content, SaveIndex().build(content))
+    assert len(before) == len(regiments)
+    for old, regiment in zip(before, regiments):
+        if old.pop_id == regiment.pop_id or soldiers[regiment.pop_id].province_id == regiment.army_location:
+            continue
+        for pop in soldiers.values():
+            if pop.country == regiment.country and pop.province_id == regiment.army_location:
+                assert usage[pop.pop_id] >= pop.capacity
+    assert result['report']['same_province'] > 0
+
+
+if __name__ == "__main__":
+    test_relink_assigns_same_country_pops_within_capacity()
+    print("✅ 全部通过")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+国家代码重映射测试 (基于 save_generator 生成的存档)
+"""
+
+import os
+import tempfile
+
+from retag import RetagEngine, TAG_PATTERN, count_tag_references
+from save_generator import GeneratorConfig, write_save
+from save_index import SECTION_COUNTRIES, SaveIndex, load_save_text
+
+
+def _generated_content():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'generated.v2')
+        write_save(path, GeneratorConfig.for_scale(0.05, seed=23))
+        return load_save_text(path)
+
+
+def _country_children(content):
+    """{国家代码: [子块键 (去掉 #序号), ...]}，同一代码出现多次时键为 代码@序号"""
+    countries = {}
+    for entry in SaveIndex().build(content).section_entries(SECTION_COUNTRIES):
+        name = entry.name if entry.name not in countries else f"{entry.name}@{len(countries)}"
+        countries[name] = [key.partition('#')[0] for key, *_ in entry.child_spans()]
+    return countries
+
+
+def _relations(children):
+    return {key for key in children if TAG_PATTERN.match(key)}
+
+
+def _brackets_balanced(content):
+    depth = 0
+    for char in content:
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def _retag(content, mapping):
+    return RetagEngine(mapping).plan(content).apply(content)
+
+
+def test_swap_twice_restores_content():
+    """交换 A↔B 两次得到完全相同的内容"""
+    content = _generated_content()
+    first, second = list(_country_children(content))[2:4]
+    swapped = _retag(content, {first: second, second: first})
+    assert swapped != content
+    assert _retag(swapped, {first: second, second: first}) == content
+
+
+def test_merge_moves_armies_and_relations():
+    """合并后只剩目标国家块，军队和关系移入其中，没有残留的旧代码"""
+    content = _generated_content()
+    countries = _country_children(content)
+    old_tag, new_tag = list(countries)[2:4]
+    old_children, new_children = countries[old_tag], countries[new_tag]
+
+    merged = _retag(content, {old_tag: new_tag})
+    after = _country_children(merged)
+    assert old_tag not in after
+    assert [name for name in after if name.partition('@')[0] == new_tag] == [new_tag]
+
+    assert after[new_tag].count('army') == old_children.count('army') + new_children.count('army')
+    expected_relations = (_relations(old_children) | _relations(new_children)) - {old_tag, new_tag}
+    assert _relations(after[new_tag]) == expected_relations
+    assert count_tag_references(merged, [old_tag])[old_tag] == 0
+
+
+def test_merge_keeps_brackets_balanced():
+    """合并后的存档花括号平衡"""
+    content = _generated_content()
+    old_tag, new_tag = list(_country_children(content))[2:4]
+    assert _brackets_balanced(content)
+    assert _brackets_balanced(_retag(content, {old_tag: new_tag}))
+
+
+if __name__ == "__main__":
+    test_swap_twice_restores_content()
+    test_merge_moves_armies_and_relations()
+    test_merge_keeps_brackets_balanced()
+    print("✅ 全部通过")
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Victoria II 多存档时间序列仓库
+===================================
+从一系列存档 (China1838_12_26.v2、China1840_02_06.v2 ...) 中提取每个国家、省份的指标，
+追加写入列式时间序列仓库；之后的趋势查询直接读取列文件，不再重新解析旧存档。
+
+- 指标: 国家的 money/prestige/badboy、人口、省份数、平均斗争性 (按人口加权)；
+  各国按文化的人口；各省份的人口、所有者与平均斗争性
+- 存储: 每张表一个目录，每列一个只追加的二进制文件 (array 原始字节)，
+  字符串列存编码，取值表 (<列>.values) 每行一个值、同样只追加；
+  manifest.json 记录已导入的存档 (内容哈希) 和每张表的有效行数，
+  写到一半中断时多出的字节会在下次追加前截掉
+- 导入: 新存档在多个进程中并行解析，已导入的存档 (路径/大小/修改时间或内容哈希相同) 直接跳过
+
+    python timeseries_store.py ingest <存档或目录 ...> [--store 目录] [--workers N]
+    python timeseries_store.py trend CHI [population|money|prestige|badboy|provinces|militancy] [--yearly]
+    python timeseries_store.py cultures CHI [--store 目录]
+    python timeseries_store.py saves
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backup_store import atomic_write_bytes
+
+DEFAULT_STORE = "v2_timeseries"
+MANIFEST_NAME = "manifest.json"
+STORE_VERSION = 1
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# 表结构: 列名 → 类型 ('q' 整数, 'd' 浮点, 'str' 字符串编码)
+TABLES: Dict[str, Dict[str, str]] = {
+    'countries': {'date': 'q', 'save': 'q', 'tag': 'str', 'money': 'd', 'prestige': 'd', 'badboy': 'd',
+                  'population': 'd', 'provinces': 'q', 'militancy': 'd', 'pops': 'q'},
+    'cultures': {'date': 'q', 'save': 'q', 'tag': 'str', 'culture': 'str', 'population': 'd'},
+    'provinces': {'date': 'q', 'save': 'q', 'province': 'q', 'owner': 'str', 'population': 'd', 'militancy': 'd'},
+}
+CODE_TYPECODE = 'q'
+
+
+def date_ordinal(date: Any) -> int:
+    """'1840.2.6' → 18400206，便于排序与比较"""
+    parts = [int(part) for part in str(date).strip('"').split('.')[:3]]
+    while len(parts) < 3:
+        parts.append(1)
+    year, month, day = parts
+    return year * 10000 + month * 100 + day
+
+
+def format_date(ordinal: int) -> str:
+    return f"{ordinal // 10000}.{ordinal // 100 % 100}.{ordinal % 100}"
+
+
+def file_digest(path: str) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+
+# ========================================
+# 指标提取 (在工作进程中运行)
+# ========================================
+
+def extract_save_metrics(save_path: str) -> Dict[str, Any]:
+    """单次遍历存档，返回 {'date', 'rows': {表名: [行元组(不含date/save)]}}"""
+    from pop_query import LoadedSave  # 只在工作进程中需要完整的解析依赖
+
+    save = LoadedSave(save_path)
+    pops = save.pops
+    owners = pops.categorical['owner']
+    cultures = pops.categorical['culture']
+    sizes = pops.numeric['size']
+    militancy = pops.numeric['mil']
+
+    country_population: Dict[str, float] = {}
+    country_mil: Dict[str, Tuple[float, float]] = {}
+    country_pops: Dict[str, int] = {}
+    culture_population: Dict[Tuple[str, str], float] = {}
+    province_population: Dict[int, float] = {}
+    province_mil: Dict[int, Tuple[float, float]] = {}
+
+    for row in range(len(pops)):
+        owner = owners[row]
+        size = sizes[row] if sizes[row] == sizes[row] else 0.0
+        province_id = pops.provinces[row]
+        country_population[owner] = country_population.get(owner, 0.0) + size
+        country_pops[owner] = country_pops.get(owner, 0) + 1
+        culture_key = (owner, cultures[row])
+        culture_population[culture_key] = culture_population.get(culture_key, 0.0) + size
+        province_population[province_id] = province_population.get(province_id, 0.0) + size
+        mil = militancy[row]
+        if mil == mil:
+            total, weight = country_mil.get(owner, (0.0, 0.0))
+            country_mil[owner] = (total + mil * size, weight + size)
+            total, weight = province_mil.get(province_id, (0.0, 0.0))
+            province_mil[province_id] = (total + mil * size, weight + size)
+
+    def weighted(totals: Dict, key) -> float:
+        total, weight = totals.get(key, (0.0, 0.0))
+        return total / weight if weight else 0.0
+
+    province_counts: Dict[str, int] = {}
+    for province in save.provinces.values():
+        owner = province.get('owner')
+        if owner:
+            province_counts[str(owner)] = province_counts.get(str(owner), 0) + 1
+
+    rows = {
+        'countries': [(tag, _number(country.get('money')), _number(country.get('prestige')),
+                       _number(country.get('badboy')), country_population.get(tag, 0.0),
+                       province_counts.get(tag, 0), weighted(country_mil, tag), country_pops.get(tag, 0))
+                      for tag, country in save.countries.items()],
+        'cultures': [(tag, culture, population) for (tag, culture), population in culture_population.items()
+                     if tag and culture],
+        'provinces': [(province_id, str(province.get('owner') or ''), province_population.get(province_id, 0.0),
+                       weighted(province_mil, province_id)) for province_id, province in save.provinces.items()],
+    }
+    return {'date': save.info.get('date'), 'rows': rows}
+
+
+# ========================================
+# 仓库
+# ========================================
+
+class _Table:
+    """一张只追加的列式表"""
+
+    def __init__(self, root: str, name: str, rows: int):
+        self.directory = os.path.join(root, name)
+        self.columns = TABLES[name]
+        self.rows = rows
+        self._values: Dict[str, List[str]] = {}
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self._cache: Dict[str, array] = {}
+
+    def _column_path(self, column: str) -> str:
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def _values_path(self, column: str) -> str:
+        return os.path.join(self.directory, f"{column}.values")
+
+    def values(self, column: str) -> List[str]:
+        """字符串列的取值表 (编码 → 值)"""
+        if column not in self._values:
+            values = []
+            path = self._values_path(column)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    values = [line.rstrip('\n') for line in f]
+            self._values[column] = values
+            self._codes[column] = {value: code for code, value in enumerate(values)}
+        return self._values[column]
+
+    def column(self, column: str) -> array:
+        """整列数据 (只读取有效行)"""
+        data = self._cache.get(column)
+        if data is None:
+            typecode = CODE_TYPECODE if self.columns[column] == 'str' else self.columns[column]
+            data = array(typecode)
+            if self.rows:
+                with open(self._column_path(column), 'rb') as f:
+                    data.frombytes(f.read(self.rows * data.itemsize))
+                if sys.byteorder != 'little':
+                    data.byteswap()
+            self._cache[column] = data
+        return data
+
+    def append(self, rows: List[tuple]):
+        os.makedirs(self.directory, exist_ok=True)
+        names = list(self.columns)
+        for position, column in enumerate(names):
+            column_type = self.columns[column]
+            if column_type == 'str':
+                values = self.values(column)
+                codes = self._codes[column]
+                new_values = []
+                data = array(CODE_TYPECODE)
+                for row in rows:
+                    value = row[position]
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = len(values)
+                        values.append(value)
+                        new_values.append(value)
+                    data.append(code)
+                if new_values:
+                    with open(self._values_path(column), 'a', encoding='utf-8') as f:
+                        f.writelines(value + '\n' for value in new_values)
+            else:
+                data = array(column_type, (row[position] for row in rows))
+
+            path = self._column_path(column)
+            with open(path, 'ab') as f:
+                # 丢弃上次中断时写了一半的数据
+                f.truncate(self.rows * data.itemsize)
+                if sys.byteorder != 'little':
+                    data.byteswap()
+                f.write(data.tobytes())
+        self.rows += len(rows)
+        self._cache.clear()
+
+    def select(self, value: str, **filters) -> List[Tuple[int, float]]:
+        """满足等值条件的 (date, value) 行"""
+        masks = []
+        for column, wanted in filters.items():
+            if self.columns[column] == 'str':
+                self.values(column)
+                code = self._codes[column].get(wanted)
+                if code is None:
+                    return []
+                masks.append((self.column(column), code))
+            else:
+                masks.append((self.column(column), wanted))
+        dates = self.column('date')
+        values = self.column(value)
+        return [(dates[row], values[row]) for row in range(self.rows)
+                if all(data[row] == wanted for data, wanted in masks)]
+
+
+class TimeSeriesStore:
+    """多存档时间序列仓库"""
+
+    def __init__(self, root: str = DEFAULT_STORE):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        os.makedirs(root, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'version': STORE_VERSION, 'saves': {}, 'tables': {name: 0 for name in TABLES}}
+        self.tables = {name: _Table(root, name, self.manifest['tables'].get(name, 0)) for name in TABLES}
+
+    def _save_manifest(self):
+        self.manifest['tables'] = {name: table.rows for name, table in self.tables.items()}
+        data = json.dumps(self.manifest, ensure_ascii=False, indent=2).encode('utf-8')
+        atomic_write_bytes(self.manifest_path, data)
+
+    # ---------- 导入 ----------
+
+    def is_ingested(self, save_path: str) -> bool:
+        """路径、大小、修改时间都相同时不必计算哈希"""
+        stat = os.stat(save_path)
+        path = os.path.abspath(save_path)
+        return any(entry['path'] == path and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+                   for entry in self.manifest['saves'].values())
+
+    def add_save(self, save_path: str, digest: str, metrics: Dict[str, Any]):
+        """追加一个存档的指标行，随后更新清单"""
+        ordinal = date_ordinal(metrics['date'])
+        save_number = len(self.manifest['saves'])
+        for name, rows in metrics['rows'].items():
+            if rows:
+                self.tables[name].append([(ordinal, save_number) + tuple(row) for row in rows])
+        stat = os.stat(save_path)
+        self.manifest['saves'][digest] = {
+            'number': save_number,
+            'path': os.path.abspath(save_path),
+            'file': os.path.basename(save_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'date': format_date(ordinal),
+            'ingested_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._save_manifest()
+
+    def ingest(self, save_paths: Iterable[str], workers: Optional[int] = None) -> Dict[str, Any]:
+        """并行解析尚未导入的存档并追加到仓库"""
+        pending = []
+        skipped = 0
+        known_digests = set(self.manifest['saves'])
+        for save_path in save_paths:
+            if self.is_ingested(save_path):
+                skipped += 1
+                continue
+            digest = file_digest(save_path)
+            if digest in known_digests:
+                skipped += 1  # 内容相同的存档 (改名或复制)
+                continue
+            known_digests.add(digest)
+            pending.append((save_path, digest))
+
+        ingested = []
+        failed = []
+        if pending:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(extract_save_metrics, save_path): (save_path, digest)
+                           for save_path, digest in pending}
+                for future in as_completed(futures):
+                    save_path, digest = futures[future]
+                    try:
+                        metrics = future.result()
+                    except Exception as e:
+                        print(f"❌ {save_path}: {e}")
+                        failed.append(save_path)
+                        continue
+                    self.add_save(save_path, digest, metrics)
+                    ingested.append(save_path)
+                    print(f"✅ 已导入 {os.path.basename(save_path)} ({metrics['date']})")
+        return {'ingested': ingested, 'skipped': skipped, 'failed': failed}
+
+    # ---------- 查询 ----------
+
+    def series(self, table: str, value: str, **filters) -> List[Tuple[str, float]]:
+        """按日期排序的 (日期, 值)；同一日期有多个存档时取最后导入的"""
+        by_date: Dict[int, float] = {}
+        for ordinal, item in self.tables[table].select(value, **filters):
+            by_date[ordinal] = item
+        return [(format_date(ordinal), by_date[ordinal]) for ordinal in sorted(by_date)]
+
+    def country_trend(self, tag: str, metric: str = 'population') -> List[Tuple[str, float]]:
+        return self.series('countries', metric, tag=tag)
+
+    def culture_trends(self, tag: str) -> Dict[str, List[Tuple[str, float]]]:
+        """某国各文化人口随时间的变化"""
+        table = self.tables['cultures']
+        return {culture: self.series('cultures', 'population', tag=tag, culture=culture)
+                for culture in table.values('culture')}
+
+    def province_trend(self, province_id: int, metric: str = 'population') -> List[Tuple[str, float]]:
+        return self.series('provinces', metric, province=province_id)
+
+    def saves(self) -> List[Dict[str, Any]]:
+        return sorted(self.manifest['saves'].values(), key=lambda entry: date_ordinal(entry['date']))
+
+
+def yearly(series: List[Tuple[str, float]]) -> List[Tuple[int, float]]:
+    """每年取最后一个数据点"""
+    by_year: Dict[int, float] = {}
+    for date, value in series:
+        by_year[int(date.split('.')[0])] = value
+    return sorted(by_year.items())
+
+
+def _expand_saves(arguments: List[str]) -> List[str]:
+    """目录展开为其中的 .v2 存档"""
+    saves = []
+    for argument in arguments:
+        if os.path.isdir(argument):
+            saves.extend(sorted(glob.glob(os.path.join(argument, '*.v2'))))
+        else:
+            saves.extend(sorted(glob.glob(argument)) or [argument])
+    return saves
+
+
+def _pop_option(arguments: List[str], name: str, default: Optional[str] = None) -> Optional[str]:
+    if name in arguments:
+        position = arguments.index(name)
+        value = arguments[position + 1]
+        del arguments[position:position + 2]
+        return value
+    return default
+
+
+def main():
+    arguments = sys.argv[1:]
+    if not arguments:
+        print(__doc__)
+        return
+
+    store = TimeSeriesStore(_pop_option(arguments, '--store', DEFAULT_STORE))
+    command = arguments.pop(0)
+
+    if command == 'ingest':
+        workers = _pop_option(arguments, '--workers')
+        saves = _expand_saves(arguments or ['.'])
+        start = time.time()
+        result = store.ingest(saves, workers=int(workers) if workers else None)
+        print(f"\n📈 导入 {len(result['ingested'])} 个存档，跳过 {result['skipped']} 个已导入的存档 "
+              f"({time.time() - start:.1f}秒)")
+        if result['failed']:
+            print(f"⚠️ {len(result['failed'])} 个存档导入失败")
+    elif command == 'trend':
+        yearly_only = '--yearly' in arguments
+        arguments = [argument for argument in arguments if argument != '--yearly']
+        tag = arguments[0].upper()
+        metric = arguments[1] if len(arguments) > 1 else 'population'
+        series = store.country_trend(tag, metric)
+        points = yearly(series) if yearly_only else series
+        print(f"\n📈 {tag} {metric} ({len(points)} 个数据点):")
+        for date, value in points:
+            print(f"  {date:<12} {value:>18,.2f}")
+    elif command == 'cultures':
+        tag = arguments[0].upper()
+        print(f"\n📈 {tag} 各文化人口:")
+        for culture, series in sorted(store.culture_trends(tag).items()):
+            if series:
+                print(f"  {culture:<16} " + "  ".join(f"{date}: {value:,.0f}" for date, value in series))
+    elif command == 'saves':
+        for entry in store.saves():
+            print(f"  {entry['date']:<12} {entry['file']:<40} 导入于 {entry['ingested_at']}")
+    else:
+        print(f"❌ 未知命令: {command}")
+
+
+if __name__ == "__main__":
+    main()
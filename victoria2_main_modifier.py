@@ -14,14 +14,32 @@ Victoria II 主修改器 (victoria2_modifier.py)
 最新更新: 2025年1月28日 - 完全集成确认的意识形态映射功能
 """
 
+import codecs
+import itertools
+import random
 import re
-import shutil
 import sys
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
 # 导入花括号解析器
 from bracket_parser import Victoria2BracketParser, BracketBlock
+from backup_store import (BackgroundBackup, atomic_write_chunks, backup_save,
+                          start_background_backup, wait_for_pending_backup)
+from edit_journal import EditJournal, journal_path, journaled
+from edit_plan import EditPlan, json_default, reusable_preview
+from instrumentation import Instrumentation, counter_property, instrumented, print_progress
+from pop_compaction import plan_pop_id_compaction, print_compaction_report
+from presence_index import CHINESE_CULTURES, PresenceIndex
+from regiment_relink import plan_regiment_relink, print_relink_report
+from retag import RetagEngine, count_tag_references, print_retag_report
+from sampling import detection_sample_size
+from save_events import iter_text_events
+from stream_export import save_json_stream
+
+# 修改后抽样验证: 能以该置信度发现的最小未修改省份比例
+VERIFY_DEFECT_RATE = 0.05
+VERIFY_CONFIDENCE = 0.95
 
 class Victoria2Modifier:
     def _modify_all_population_ideology_and_religion_global(self, max_provinces: int = None) -> bool:
@@ -56,10 +74,9 @@ class Victoria2Modifier:
                 self.population_count += pop_count
             # 替换内容
             if new_province_content != province_content:
-                self.content = self.content[:start_pos] + new_province_content + self.content[end_pos:]
+                self.apply_edit(start_pos, end_pos, new_province_content)
             # 进度显示
-            if (len(province_matches) - i) % 500 == 0:
-                print(f"已处理 {len(province_matches) - i}/{provinces_to_process} 个省份...")
+            self.metrics.progress("宗教和意识形态", provinces_to_process - i, provinces_to_process)
         print(f"✅ 全局人口宗教和意识形态修改完成:")
         print(f"宗教修改: {self.religion_changes} 处")
         print(f"意识形态修改: {self.ideology_changes} 处")
@@ -117,12 +134,33 @@ class Victoria2Modifier:
         return modified_block, changes_religion, changes_ideology
     """Victoria II 主修改器 - 统一入口工具"""
     
-    def __init__(self, file_path: str = None, debug_mode: bool = False):
+    SAVE_CHUNK_SIZE = 1024 * 1024  # 保存时每次编码写入的字符数
+    
+    # 统计计数器 (存放在 self.metrics 中，报告按区间记录变化量)
+    militancy_changes = counter_property('militancy_changes')
+    culture_changes = counter_property('culture_changes')
+    infamy_changes = counter_property('infamy_changes')
+    religion_changes = counter_property('religion_changes')
+    ideology_changes = counter_property('ideology_changes')
+    population_count = counter_property('population_count')
+    date_changes = counter_property('date_changes')
+    money_changes = counter_property('money_changes')
+    civilized_changes = counter_property('civilized_changes')
+    
+    def __init__(self, file_path: str = None, debug_mode: bool = False,
+                 metrics: Instrumentation = None, progress_callback=print_progress):
         self.content = ""
         self.file_path = file_path
         self.parser = Victoria2BracketParser()  # 花括号解析器
         self.structure = None  # 花括号结构
+        self._presence = None  # 省份人口存在索引 (首次使用时建立，内容替换后失效)
         self.debug_mode = debug_mode  # 调试模式
+        self.journal = None  # 编辑日志 (加载文件后创建)
+        
+        # 性能度量 (重新初始化时保留已记录的区间)
+        if metrics is None:
+            metrics = getattr(self, 'metrics', None) or Instrumentation(progress_callback=progress_callback)
+        self.metrics = metrics
         
         # 统计计数器
         self.militancy_changes = 0
@@ -154,18 +192,38 @@ class Victoria2Modifier:
         if file_path:
             self.load_file(file_path)
     
+    @property
+    def content(self) -> str:
+        return self._content
+    
+    @content.setter
+    def content(self, value: str):
+        # 内容被替换后省份人口存在索引不再可靠，下次使用时重建
+        self._content = value
+        self._presence = None
+    
+    @property
+    def presence(self) -> PresenceIndex:
+        """省份人口存在索引 (首次使用时建立)"""
+        if self._presence is None:
+            self.build_presence_index()
+        return self._presence
+    
+    def build_presence_index(self) -> PresenceIndex:
+        """建立省份人口存在索引；结构仍对应当前内容时由花括号结构建立，否则由事件流建立"""
+        with self.metrics.span('presence_index'):
+            if self.structure is not None and self.structure.content is self.content:
+                self._presence = PresenceIndex.from_blocks(self.content, self.structure.children)
+            else:
+                self._presence = PresenceIndex.from_events(iter_text_events(self.content))
+        return self._presence
+    
+    @instrumented('backup')
     def create_backup(self, source_file: str, operation: str = "unified") -> str:
-        """创建备份文件"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"{source_file.replace('.v2', '')}_{operation}_backup_{timestamp}.v2"
-        print(f"创建备份文件: {backup_filename}")
-        try:
-            shutil.copy2(source_file, backup_filename)
-            return backup_filename
-        except Exception as e:
-            print(f"❌ 备份失败: {e}")
-            return None
+        """创建备份（存入去重压缩的备份仓库），返回备份ID"""
+        return backup_save(source_file, operation)
     
+    @instrumented('load')
     def load_file(self, filename: str) -> bool:
         """加载存档文件并初始化解析器"""
         try:
@@ -180,17 +238,25 @@ class Victoria2Modifier:
                     print(f"文件读取完成 (编码: {encoding})，大小: {len(self.content):,} 字符")
                     
                     # 初始化花括号解析器
-                    self.parser.load_content(self.content)
                     print("🔍 正在解析文件结构...")
-                    blocks = self.parser.parse_all_blocks()
+                    with self.metrics.span('parse'):
+                        self.parser.load_content(self.content)
+                        blocks = self.parser.parse_all_blocks()
                     
                     # 创建一个假的根结构来容纳所有块
                     from bracket_parser import BracketBlock
                     self.structure = BracketBlock("root", 0, len(self.content), self.content, 0)
                     self.structure.children = blocks
                     
+                    # 记录各省份出现的文化/宗教/人口类型，按条件选省份时不再搜索文本
+                    self.build_presence_index()
+                    
                     print(f"📊 解析完成: 找到 {len(blocks)} 个顶级块")
                     
+                    # 绑定存档旁的编辑日志
+                    self.journal = EditJournal.for_save(filename)
+                    self.journal.attach(self.content)
+                    
                     return True
                 except UnicodeDecodeError:
                     continue
@@ -201,17 +267,127 @@ class Victoria2Modifier:
             print(f"❌ 文件读取失败: {e}")
             return False
     
+    @instrumented('backup')
+    def start_background_backup(self, source_file: str, operation: str = "unified") -> BackgroundBackup:
+        """在后台线程中创建备份，与后续的内存修改并行进行
+
+        save_file 覆盖该文件前会等待备份完成。
+        """
+        print(f"🛡️ 后台创建备份: {source_file} ({operation})")
+        return start_background_backup(source_file, operation)
+    
+    @instrumented('save')
     def save_file(self, filename: str) -> bool:
-        """保存修改后的文件"""
+        """保存修改后的文件
+
+        内容分块写入同目录下的临时文件，fsync后原子替换原文件，
+        写入中途中断不会损坏原存档。
+        """
         try:
-            with open(filename, 'w', encoding='utf-8-sig') as f:
-                f.write(self.content)
+            with self.metrics.span('backup_wait'):
+                job = wait_for_pending_backup(filename)
+            if job is not None and job.error is not None:
+                print(f"⚠️ 后台备份失败: {job.error}，继续保存...")
+            
+            content = self.content
+            chunk_size = self.SAVE_CHUNK_SIZE
+            chunks = (content[i:i + chunk_size].encode('utf-8') for i in range(0, len(content), chunk_size))
+            atomic_write_chunks(filename, itertools.chain((codecs.BOM_UTF8,), chunks))
+            if self.journal is not None:
+                self.journal.flush(journal_path(filename))
             print(f"文件保存完成: {filename}")
             return True
         except Exception as e:
             print(f"❌ 文件保存失败: {e}")
             return False
     
+    def apply_edit(self, start: int, end: int, new_text: str):
+        """将 self.content[start:end] 替换为 new_text，并记录到编辑日志"""
+        old_text = self.content[start:end]
+        self.content = self.content[:start] + new_text + self.content[end:]
+        if self.journal is not None:
+            self.journal.record(start, old_text, new_text)
+    
+    def replace_matches(self, pattern, repl) -> int:
+        """对全文执行正则替换 (同 re.sub)，逐处记录到编辑日志，返回实际改变的匹配数"""
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        
+        pieces = []
+        edits = []
+        pos = 0
+        for match in pattern.finditer(self.content):
+            new_text = repl(match) if callable(repl) else match.expand(repl)
+            if new_text == match.group(0):
+                continue
+            pieces.append(self.content[pos:match.start()])
+            pieces.append(new_text)
+            edits.append((match.start(), match.group(0), new_text))
+            pos = match.end()
+        
+        if not edits:
+            return 0
+        pieces.append(self.content[pos:])
+        self.content = ''.join(pieces)
+        
+        # 按从后往前的顺序记录，位置即为原内容坐标
+        if self.journal is not None:
+            for start, old_text, new_text in reversed(edits):
+                self.journal.record(start, old_text, new_text)
+        return len(edits)
+    
+    def apply_plan(self, plan: EditPlan) -> int:
+        """执行编辑计划（一次拼接），逐处记录到编辑日志，返回实际应用的编辑数"""
+        old_content = self.content
+        self.content = plan.apply(old_content)
+        if self.journal is not None:
+            skipped = {id(edit) for edit in plan.skipped}
+            for edit in reversed(plan.edits):
+                if id(edit) not in skipped:
+                    self.journal.record(edit.start, old_content[edit.start:edit.end], edit.new_text)
+        return plan.applied_count
+    
+    @instrumented('redistribution')
+    @journaled('redistribution')
+    def apply_redistribution_plan(self, plan: EditPlan) -> int:
+        """执行省份重分配的编辑计划 (redistribute_provinces.py 生成)，作为一个可撤销的操作记录"""
+        return self.apply_plan(plan)
+    
+    def undo(self, operation: str) -> bool:
+        """撤销最近一次指定的修改操作 (例如 'militancy'、'date')，不需要备份文件"""
+        if self.journal is None:
+            print("❌ 未加载文件，没有编辑日志")
+            return False
+        try:
+            self.content = self.journal.undo(self.content, operation)
+            print(f"↩️ 已撤销操作: {operation}")
+            return True
+        except ValueError as e:
+            print(f"❌ 撤销失败: {e}")
+            return False
+    
+    def revert_to(self, step: int) -> bool:
+        """回退到编辑日志中第step个操作完成时的状态 (0 表示日志开始前)"""
+        if self.journal is None:
+            print("❌ 未加载文件，没有编辑日志")
+            return False
+        try:
+            self.content = self.journal.revert_to(self.content, step)
+            print(f"⏪ 已回退到第 {step} 步")
+            return True
+        except ValueError as e:
+            print(f"❌ 回退失败: {e}")
+            return False
+    
+    def show_journal(self):
+        """显示编辑日志"""
+        if self.journal is None or not self.journal.groups:
+            print("📜 编辑日志为空")
+            return
+        print(f"📜 编辑日志 ({self.journal.path}):")
+        for line in self.journal.summary():
+            print(f"  {line}")
+    
     def find_chinese_provinces(self) -> List[int]:
         """查找中国拥有的省份"""
         chinese_provinces = []
@@ -322,8 +498,7 @@ class Victoria2Modifier:
                 })
             
             # 显示进度
-            if (i + 1) % 500 == 0:
-                print(f"  处理进度: {i + 1}/{len(province_matches)} ({(i + 1)/len(province_matches)*100:.1f}%)")
+            self.metrics.progress("省份分析", i + 1, len(province_matches))
         
         # 排序国家（按省份数量降序）
         sorted_countries = dict(sorted(countries_provinces.items(), 
@@ -372,9 +547,7 @@ class Victoria2Modifier:
         
         # 保存到JSON文件
         try:
-            import json
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, ensure_ascii=False, indent=2)
+            save_json_stream(output_data, filename)
             
             print(f"✅ 分析结果已保存到: {filename}")
             
@@ -416,6 +589,7 @@ class Victoria2Modifier:
             print(f"❌ 花括号检查失败: {e}")
             return False
 
+    @instrumented('find_dead_countries')
     def find_dead_countries(self) -> Dict[str, Dict]:
         """查找已灭亡的国家（存在但无省份的国家）"""
         print("🔍 查找已灭亡国家...")
@@ -508,93 +682,31 @@ class Victoria2Modifier:
         """统计国家代码在存档中的出现次数"""
         print(f"📊 统计 {len(country_tags)} 个国家代码的引用次数...")
         
-        reference_counts = {}
-        
-        for tag in country_tags:
-            count = 0
-            # 使用多种模式搜索国家代码
-            patterns = [
-                f'"{tag}"',           # 带引号
-                f'={tag}',            # 赋值
-                f' {tag} ',           # 空格包围
-                f'\\n{tag}=',         # 行开头赋值
-                f'core="{tag}"',      # 核心声明
-                f'owner="{tag}"',     # 拥有者
-                f'controller="{tag}"', # 控制者
-                f'overlord="{tag}"',  # 宗主国
-                f'{tag}={{',          # 国家块开始
-            ]
-            
-            for pattern in patterns:
-                matches = re.findall(re.escape(pattern), self.content)
-                count += len(matches)
-            
-            # 额外搜索不带引号的情况
-            unquoted_patterns = [
-                f'owner={tag}\\s',
-                f'controller={tag}\\s',
-                f'overlord={tag}\\s',
-                f'core={tag}\\s',
-            ]
-            
-            for pattern in unquoted_patterns:
-                matches = re.findall(pattern, self.content)
-                count += len(matches)
-            
-            reference_counts[tag] = count
-            
-            # 显示进度
-            if len(reference_counts) % 20 == 0:
-                print(f"  处理进度: {len(reference_counts)}/{len(country_tags)}")
+        # 一次扫描统计所有上下文 (带引号、赋值、块键、列表项) 中的出现次数
+        reference_counts = count_tag_references(self.content, country_tags)
+        self.metrics.progress("引用统计", len(reference_counts), len(country_tags))
         
         return reference_counts
 
-    def remove_dead_country_blocks(self, dry_run: bool = True) -> Dict:
-        """移除已灭亡国家的数据块"""
-        print("🗑️ 开始清理已灭亡国家数据块...")
-        
+    def plan_dead_country_removal(self) -> Dict:
+        """规划已灭亡国家数据块的删除，返回包含编辑计划的分析结果（不修改内容）"""
         # 查找已灭亡国家
         dead_countries = self.find_dead_countries()
         
+        edit_plan = EditPlan('dead_countries', self.content)
+        planned_blocks = []
         if not dead_countries:
-            print("✅ 未找到需要清理的已灭亡国家")
-            return {'removed_countries': [], 'references': {}}
+            return {'dead_countries': dead_countries, 'references': {},
+                    'planned_blocks': planned_blocks, 'edit_plan': edit_plan}
         
         # 统计引用次数
         dead_tags = list(dead_countries.keys())
         reference_counts = self.count_country_references(dead_tags)
         
-        # 显示统计信息
-        print(f"\\n📊 已灭亡国家统计:")
-        print(f"   总数: {len(dead_countries)}")
-        print(f"\\n🔗 引用次数统计:")
-        sorted_refs = sorted(reference_counts.items(), key=lambda x: x[1], reverse=True)
-        for i, (tag, count) in enumerate(sorted_refs[:20], 1):
-            country_info = dead_countries.get(tag, {})
-            capital = country_info.get('capital', 0)
-            print(f"   {i:2d}. {tag}: {count:3d} 次引用 (首都:{capital})")
-        
-        if len(sorted_refs) > 20:
-            print(f"   ... 还有 {len(sorted_refs) - 20} 个国家")
-        
-        if dry_run:
-            print(f"\\n🔍 这是预览模式，未实际删除数据")
-            return {
-                'removed_countries': list(dead_countries.keys()),
-                'references': reference_counts,
-                'dead_countries_info': dead_countries
-            }
-        
-        # 实际删除操作
-        print(f"\\n⚠️ 开始实际删除操作...")
-        
-        removed_blocks = []
-        content_modified = self.content
-        
-        # 查找并删除国家块
+        # 查找要删除的国家块
         for tag in dead_countries.keys():
             pattern = re.compile(f'^{tag}=\\s*{{', re.MULTILINE)
-            match = pattern.search(content_modified)
+            match = pattern.search(self.content)
             
             if match:
                 # 找到国家块的开始位置
@@ -606,8 +718,8 @@ class Victoria2Modifier:
                     # 从国家块开始解析
                     brace_count = 0
                     pos = block_start
-                    while pos < len(content_modified):
-                        char = content_modified[pos]
+                    while pos < len(self.content):
+                        char = self.content[pos]
                         if char == '{':
                             brace_count += 1
                         elif char == '}':
@@ -621,7 +733,7 @@ class Victoria2Modifier:
                         continue
                     
                     # 提取要删除的块
-                    block_content = content_modified[start_pos:end_pos]
+                    block_content = self.content[start_pos:end_pos]
                     
                     # 检查块的完整性
                     open_braces = block_content.count('{')
@@ -631,33 +743,88 @@ class Victoria2Modifier:
                         # 删除块（包括前后的换行符）
                         # 查找前面的换行符
                         actual_start = start_pos
-                        if start_pos > 0 and content_modified[start_pos-1] == '\\n':
+                        if start_pos > 0 and self.content[start_pos-1] == '\\n':
                             actual_start = start_pos - 1
                         
                         # 查找后面的换行符
                         actual_end = end_pos
-                        if end_pos < len(content_modified) and content_modified[end_pos] == '\\n':
+                        if end_pos < len(self.content) and self.content[end_pos] == '\\n':
                             actual_end = end_pos + 1
                         
-                        # 执行删除
-                        content_modified = content_modified[:actual_start] + content_modified[actual_end:]
-                        
-                        removed_blocks.append({
+                        edit_plan.add(actual_start, actual_end, '', reason='删除已灭亡国家块', block=tag)
+                        planned_blocks.append({
                             'tag': tag,
                             'size': actual_end - actual_start,
                             'open_braces': open_braces,
                             'close_braces': close_braces
                         })
-                        
-                        print(f"✅ 删除 {tag} 块 ({actual_end - actual_start} 字符, {open_braces}个花括号对)")
                     else:
                         print(f"⚠️ {tag} 块花括号不平衡 (开:{open_braces}, 闭:{close_braces})")
                         
                 except Exception as e:
                     print(f"❌ 处理 {tag} 时出错: {e}")
         
-        # 更新内容
-        self.content = content_modified
+        return {
+            'dead_countries': dead_countries,
+            'references': reference_counts,
+            'planned_blocks': planned_blocks,
+            'edit_plan': edit_plan
+        }
+    
+    @instrumented('dead_countries')
+    @journaled('dead_countries')
+    def remove_dead_country_blocks(self, dry_run: bool = True, preview: Dict = None) -> Dict:
+        """移除已灭亡国家的数据块
+        
+        preview 为之前 dry_run=True 的返回值时，直接执行其中的编辑计划，不再重新分析。
+        """
+        print("🗑️ 开始清理已灭亡国家数据块...")
+        
+        preview = reusable_preview(preview, self.content)
+        if preview is not None and 'analysis' in preview:
+            analysis = preview['analysis']
+        else:
+            analysis = self.plan_dead_country_removal()
+        dead_countries = analysis['dead_countries']
+        reference_counts = analysis['references']
+        edit_plan = analysis['edit_plan']
+        
+        if not dead_countries:
+            print("✅ 未找到需要清理的已灭亡国家")
+            return {'removed_countries': [], 'references': {}, 'dead_countries_info': {},
+                    'edit_plan': edit_plan, 'analysis': analysis}
+        
+        # 显示统计信息
+        print(f"\\n📊 已灭亡国家统计:")
+        print(f"   总数: {len(dead_countries)}")
+        print(f"\\n🔗 引用次数统计:")
+        sorted_refs = sorted(reference_counts.items(), key=lambda x: x[1], reverse=True)
+        for i, (tag, count) in enumerate(sorted_refs[:20], 1):
+            country_info = dead_countries.get(tag, {})
+            capital = country_info.get('capital', 0)
+            print(f"   {i:2d}. {tag}: {count:3d} 次引用 (首都:{capital})")
+        
+        if len(sorted_refs) > 20:
+            print(f"   ... 还有 {len(sorted_refs) - 20} 个国家")
+        
+        if dry_run:
+            edit_plan.preview()
+            print(f"\\n🔍 这是预览模式，未实际删除数据")
+            return {
+                'removed_countries': list(dead_countries.keys()),
+                'references': reference_counts,
+                'dead_countries_info': dead_countries,
+                'edit_plan': edit_plan,
+                'analysis': analysis
+            }
+        
+        # 实际删除操作
+        print(f"\\n⚠️ 开始实际删除操作...")
+        
+        self.apply_plan(edit_plan)
+        removed_blocks = analysis['planned_blocks']
+        for block in removed_blocks:
+            print(f"✅ 删除 {block['tag']} 块 ({block['size']} 字符, {block['open_braces']}个花括号对)")
         
         print(f"\\n✅ 清理完成:")
         print(f"   删除国家块: {len(removed_blocks)}")
@@ -670,6 +837,81 @@ class Victoria2Modifier:
             'dead_countries_info': dead_countries
         }
 
+    @instrumented('retag')
+    @journaled('retag')
+    def retag_countries(self, mapping: Dict[str, str], dry_run: bool = True, preview: Dict = None) -> Dict:
+        """按 {旧代码: 新代码} 一次改写所有国家代码引用，冲突的国家块合并到新代码的块中
+        
+        preview 为之前以相同映射 dry_run=True 的返回值时，直接执行其中的编辑计划，不再重新扫描。
+        """
+        print(f"🏷️ 开始国家代码重映射 ({len(mapping)} 个)...")
+        
+        engine = RetagEngine(mapping)
+        preview = reusable_preview(preview, self.content)
+        if preview is not None and preview['report'].get('mapping') == engine.mapping:
+            edit_plan, report = preview['edit_plan'], preview['report']
+        else:
+            edit_plan = engine.plan(self.content)
+            report = engine.report
+        print_retag_report(report)
+        
+        if dry_run:
+            edit_plan.preview()
+            print(f"\n🔍 这是预览模式，未实际修改数据")
+            return {'report': report, 'edit_plan': edit_plan, 'applied': 0}
+        
+        applied = self.apply_plan(edit_plan)
+        print(f"✅ 重映射完成: 应用 {applied} 处编辑")
+        return {'report': report, 'applied': applied}
+
+    @instrumented('pop_ids')
+    @journaled('pop_ids')
+    def compact_pop_ids(self, dry_run: bool = True, preview: Dict = None) -> Dict:
+        """把人口ID重新编号为连续的 1..N，同时改写军队中的人口引用与 start_pop_index
+        
+        preview 为之前 dry_run=True 的返回值时，直接执行其中的编辑计划，不再重新扫描。
+        """
+        print("🔢 开始人口ID压缩...")
+        
+        result = reusable_preview(preview, self.content)
+        if result is None:
+            result = plan_pop_id_compaction(self.content)
+        edit_plan = result['edit_plan']
+        print_compaction_report(result['report'])
+        
+        if dry_run:
+            edit_plan.preview()
+            print(f"\n🔍 这是预览模式，未实际修改数据")
+            return dict(result, applied=0)
+        
+        applied = self.apply_plan(edit_plan)
+        print(f"✅ 人口ID压缩完成: 应用 {applied} 处编辑")
+        return {'report': result['report'], 'mapping': result['mapping'], 'applied': applied}
+
+    @instrumented('regiment_relink')
+    @journaled('regiment_relink')
+    def relink_orphaned_regiments(self, dry_run: bool = True, preview: Dict = None) -> Dict:
+        """为引用已删除人口的团重新关联同一国家的士兵人口 (不删除军队)
+        
+        preview 为之前 dry_run=True 的返回值时，直接执行其中的编辑计划，不再重新分析。
+        """
+        print("🪖 开始重新关联孤立的团...")
+        
+        result = reusable_preview(preview, self.content)
+        if result is None:
+            result = plan_regiment_relink(self.content)
+        edit_plan = result['edit_plan']
+        print_relink_report(result['report'])
+        
+        if dry_run:
+            edit_plan.preview()
+            print(f"\n🔍 这是预览模式，未实际修改数据")
+            return dict(result, applied=0)
+        
+        applied = self.apply_plan(edit_plan)
+        print(f"✅ 重新关联完成: 应用 {applied} 处编辑")
+        return {'report': result['report'], 'unassigned': result['unassigned'], 'applied': applied}
+
     def clean_dead_countries_with_backup(self, backup_suffix: str = None) -> str:
         """安全清理已灭亡国家（自动备份）"""
         if backup_suffix is None:
@@ -700,15 +942,15 @@ class Victoria2Modifier:
         
         # 执行实际清理
         print("\\n2️⃣ 执行实际清理...")
-        result = self.remove_dead_country_blocks(dry_run=False)
+        result = self.remove_dead_country_blocks(dry_run=False, preview=preview_result)
         
         # 检查花括号平衡
         print("\\n3️⃣ 检查文件完整性...")
         if self.check_bracket_balance():
             # 保存修改后的文件
             try:
-                with open(self.file_path, 'w', encoding='utf-8-sig') as f:
-                    f.write(self.content)
+                if not self.save_file(self.file_path):
+                    return None
                 
                 print(f"✅ 清理完成并保存到原文件")
                 
@@ -717,7 +959,7 @@ class Victoria2Modifier:
                 try:
                     import json
                     with open(report_filename, 'w', encoding='utf-8') as f:
-                        json.dump(result, f, ensure_ascii=False, indent=2)
+                        json.dump(result, f, ensure_ascii=False, indent=2, default=json_default)
                     print(f"📋 清理报告已保存: {report_filename}")
                 except:
                     pass
@@ -814,9 +1056,7 @@ class Victoria2Modifier:
                 
                 if new_block_content != block_content:
                     # 直接替换块内容，不改变结构
-                    self.content = (self.content[:block_start] + 
-                                  new_block_content + 
-                                  self.content[block_end:])
+                    self.apply_edit(block_start, block_end, new_block_content)
                     changes_made = True
                     print(f"  🔄 修改现有字段: {key}={value}")
                     
@@ -831,9 +1071,7 @@ class Victoria2Modifier:
                     new_field = f'\n\t{key}={value}'
                     
                     # 在指定位置插入新字段
-                    self.content = (self.content[:insertion_point] + 
-                                  new_field + 
-                                  self.content[insertion_point:])
+                    self.apply_edit(insertion_point, insertion_point, new_field)
                     changes_made = True
                     print(f"  ➕ 添加新字段: {key}={value}")
                     
@@ -874,9 +1112,7 @@ class Victoria2Modifier:
             while name_start > 0 and self.content[name_start-1:name_start] != '\n':
                 name_start -= 1
             
-            self.content = (self.content[:name_start] + 
-                          new_block_content + 
-                          self.content[block_end:])
+            self.apply_edit(name_start, block_end, new_block_content)
             
             # 重新解析
             self.parser.load_content(self.content)
@@ -888,9 +1124,7 @@ class Victoria2Modifier:
             
             # 在父块内容的开头插入
             parent_start = parent_block.start_pos + 1  # 跳过开始的{
-            self.content = (self.content[:parent_start] + 
-                          new_block_content + 
-                          self.content[parent_start:])
+            self.apply_edit(parent_start, parent_start, new_block_content)
             
             # 重新解析
             self.parser.load_content(self.content)
@@ -900,6 +1134,8 @@ class Victoria2Modifier:
     # 功能1: 人口斗争性修改
     # ========================================
     
+    @instrumented('militancy')
+    @journaled('militancy')
     def modify_militancy(self, china_militancy: float = 0.0, other_militancy: float = 10.0) -> bool:
         """修改人口斗争性 - 中国人口斗争性设为0，其他国家设为10"""
         print(f"\n⚔️ 开始修改人口斗争性 (中国: {china_militancy}, 其他: {other_militancy})")
@@ -959,9 +1195,7 @@ class Victoria2Modifier:
             
             if changes > 0:
                 # 替换省份内容
-                self.content = (self.content[:start_pos] + 
-                              new_province_content + 
-                              self.content[end_pos:])
+                self.apply_edit(start_pos, end_pos, new_province_content)
                 
                 if owner == "CHI":
                     china_changes += changes
@@ -969,8 +1203,7 @@ class Victoria2Modifier:
                     other_changes += changes
             
             # 进度显示
-            if (len(province_matches) - i) % 500 == 0:
-                print(f"已处理 {len(province_matches) - i}/{len(province_matches)} 个省份...")
+            self.metrics.progress("斗争性", len(province_matches) - i, len(province_matches))
         
         print(f"✅ 中国人口斗争性修改: {china_changes} 个人口组")
         print(f"✅ 其他国家人口斗争性修改: {other_changes} 个人口组")
@@ -979,6 +1212,7 @@ class Victoria2Modifier:
         print(f"✅ 斗争性修改完成: {self.militancy_changes} 处修改")
         return True
     
+    @instrumented('index')
     def _build_province_owner_mapping(self) -> Dict[int, str]:
         """构建省份ID到所有者国家的映射"""
         province_owners = {}
@@ -1007,8 +1241,7 @@ class Victoria2Modifier:
                 province_owners[province_id] = owner_match.group(1)
             
             # 进度显示
-            if (i + 1) % 500 == 0:
-                print(f"已处理 {i + 1}/{len(province_matches)} 个省份映射...")
+            self.metrics.progress("省份映射", i + 1, len(province_matches))
         
         return province_owners
     
@@ -1050,6 +1283,8 @@ class Victoria2Modifier:
     # 功能2: 文化修改
     # ========================================
     
+    @instrumented('culture')
+    @journaled('culture')
     def modify_china_culture(self, primary_culture: str = "beifaren", 
                            accepted_cultures: List[str] = None) -> bool:
         """修改中国的文化设置 - 基于花括号结构的安全版本"""
@@ -1159,6 +1394,8 @@ class Victoria2Modifier:
     # 功能3: 恶名度修改
     # ========================================
     
+    @instrumented('infamy')
+    @journaled('infamy')
     def modify_china_infamy(self, target_infamy: float = 0.0) -> bool:
         """修改中国的恶名度 - 基于花括号结构的安全版本"""
         print(f"\n😈 开始修改中国恶名度 (目标值: {target_infamy})")
@@ -1211,6 +1448,8 @@ class Victoria2Modifier:
     # 功能5: 游戏日期修改
     # ========================================
     
+    @instrumented('date')
+    @journaled('date')
     def modify_game_date(self, target_date: str = "1836.1.1") -> bool:
         """修改游戏中的所有日期为指定日期 - 优化版本"""
         print(f"\n📅 开始修改游戏日期 (目标日期: {target_date})")
@@ -1278,18 +1517,17 @@ class Victoria2Modifier:
         
         # 单次正则替换 - O(n) 时间复杂度
         start_time = __import__('time').time()
-        modified_content = re.sub(date_pattern, replace_date, self.content)
+        self.replace_matches(date_pattern, replace_date)
         end_time = __import__('time').time()
         
-        # 更新内容
-        self.content = modified_content
-        
         print(f"✅ 日期修改完成: {self.date_changes} 处修改")
         print(f"⚡ 处理时间: {end_time - start_time:.2f} 秒")
         print(f"🎯 所有日期已修改为: {target_date}")
         
         return True
     
+    @instrumented('date')
+    @journaled('date')
     def modify_game_date_selective(self, target_date: str = "1836.1.1", 
                                  date_types: List[str] = None) -> bool:
         """选择性修改特定类型的日期"""
@@ -1372,7 +1610,7 @@ class Victoria2Modifier:
                     return target_date
                 return match.group(0)
             
-            self.content = re.sub(date_pattern, replace_func, self.content)
+            self.replace_matches(date_pattern, replace_func)
         
         print(f"✅ 选择性日期修改完成: {self.date_changes} 处修改")
         print(f"🎯 符合条件的日期已修改为: {target_date}")
@@ -1383,6 +1621,8 @@ class Victoria2Modifier:
     # 功能4: 中国人口属性修改 (核心功能)
     # ========================================
     
+    @instrumented('population')
+    @journaled('population')
     def modify_chinese_population(self, max_provinces: int = None) -> bool:
         """修改中国人口的宗教和意识形态属性 - 增强版：处理全球所有省份"""
         print(f"\n🙏 开始修改全球中国人口属性 (宗教→mahayana, 意识形态→温和派)")
@@ -1416,8 +1656,7 @@ class Victoria2Modifier:
             self._modify_province_populations_traditional(province_id)
             
             # 进度显示
-            if (i + 1) % 10 == 0 or i == len(provinces_to_process) - 1:
-                print(f"已处理 {i + 1}/{len(provinces_to_process)} 个中国省份...")
+            self.metrics.progress("中国人口属性", i + 1, len(provinces_to_process))
         
         print(f"✅ 中国人口属性修改完成:")
         print(f"宗教修改: {self.religion_changes} 处")
@@ -1457,7 +1696,7 @@ class Victoria2Modifier:
         
         # 替换省份内容
         if new_province_content != province_content:
-            self.content = self.content[:start_pos] + new_province_content + self.content[current_pos-1:]
+            self.apply_edit(start_pos, current_pos - 1, new_province_content)
     
     def _modify_population_groups_traditional(self, province_content: str) -> str:
         """传统方法修改省份中的人口组"""
@@ -1589,14 +1828,10 @@ class Victoria2Modifier:
             
             if new_province_content != province_content:
                 # 替换省份内容
-                self.content = (self.content[:start_pos] + 
-                              new_province_content + 
-                              self.content[end_pos:])
+                self.apply_edit(start_pos, end_pos, new_province_content)
             
             # 进度显示
-            processed = provinces_to_process - i
-            if processed % 100 == 0 or processed == provinces_to_process:
-                print(f"已处理 {processed}/{provinces_to_process} 个省份...")
+            self.metrics.progress("意识形态", provinces_to_process - i, provinces_to_process)
         
         print(f"✅ 全局人口意识形态修改完成:")
         print(f"宗教修改: {self.religion_changes} 处")
@@ -1676,36 +1911,11 @@ class Victoria2Modifier:
         return modified_block
 
     def find_chinese_provinces_structured(self) -> List[BracketBlock]:
-        """基于花括号结构查找中国省份"""
-        chinese_provinces = []
-        
-        # 已知的中国省份ID范围和特定ID
-        chinese_province_ranges = [
-            (1496, 1616),  # 主要中国省份
-            (2562, 2648),  # 其他中国区域
-        ]
-        specific_chinese_provinces = [1609, 1612, 1498, 1499]
-        
-        # 在结构中查找省份块
-        for block in self.structure.children:
-            # 检查是否为数字开头的块（可能是省份）
-            if re.match(r'^\d+$', block.name.strip()):
-                province_id = int(block.name.strip())
-                
-                # 检查是否为中国省份ID范围
-                is_chinese = False
-                for start, end in chinese_province_ranges:
-                    if start <= province_id <= end:
-                        is_chinese = True
-                        break
-                
-                if not is_chinese and province_id in specific_chinese_provinces:
-                    is_chinese = True
-                
-                if is_chinese:
-                    # 进一步检查是否包含owner=CHI
-                    if 'owner="CHI"' in block.content or 'owner=CHI' in block.content:
-                        chinese_provinces.append(block)
+        """基于花括号结构查找中国省份 (CHI所有、含中国文化人口的省份)"""
+        chinese_province_ids = set(self.presence.select(cultures=CHINESE_CULTURES, owners=['CHI']))
+        chinese_provinces = [block for block in self.structure.children
+                             if re.match(r'^\d+$', block.name.strip())
+                             and int(block.name.strip()) in chinese_province_ids]
         
         print(f"📍 找到 {len(chinese_provinces)} 个中国省份 (结构化方法)")
         return chinese_provinces
@@ -1747,9 +1957,7 @@ class Victoria2Modifier:
         
         # 安全地进行替换（只替换内部内容，保留外层花括号）
         for mod in modifications:
-            self.content = (self.content[:mod['start_pos']] + 
-                           mod['new_content'] + 
-                           self.content[mod['end_pos'] + 1:])
+            self.apply_edit(mod['start_pos'], mod['end_pos'] + 1, mod['new_content'])
             self.population_count += 1
     
     def _modify_single_population_structured(self, pop_block: str) -> str:
@@ -1937,6 +2145,8 @@ class Victoria2Modifier:
     # 功能6: 中国人口金钱和需求修改
     # ========================================
     
+    @instrumented('money')
+    @journaled('money')
     def modify_chinese_population_money(self, chinese_money: float = 9999999.0, non_chinese_money: float = 0.0,
                                       chinese_needs: float = 1.0, non_chinese_needs: float = 0.0) -> bool:
         """修改所有人口的金钱数量和需求满足度：中国人口设为指定金额和满足度，非中国人口清零"""
@@ -2005,17 +2215,11 @@ class Victoria2Modifier:
                 
                 if changes > 0:
                     # 替换省份内容
-                    self.content = (self.content[:start_pos] + 
-                                  new_province_content + 
-                                  self.content[end_pos:])
+                    self.apply_edit(start_pos, end_pos, new_province_content)
                     
                     chinese_money_changes += changes
                 
                 chinese_provinces_processed += 1
-                
-                # 进度显示
-                if chinese_provinces_processed % 50 == 0:
-                    print(f"已处理 {chinese_provinces_processed}/{chinese_province_count} 个中国省份...")
             
             elif owner and owner != "CHI":
                 # 非中国省份：金钱和需求清零
@@ -2025,17 +2229,14 @@ class Victoria2Modifier:
                 
                 if changes > 0:
                     # 替换省份内容
-                    self.content = (self.content[:start_pos] + 
-                                  new_province_content + 
-                                  self.content[end_pos:])
+                    self.apply_edit(start_pos, end_pos, new_province_content)
                     
                     non_chinese_money_changes += changes
                 
                 non_chinese_provinces_processed += 1
-                
-                # 进度显示（减少频率以避免刷屏）
-                if non_chinese_provinces_processed % 100 == 0:
-                    print(f"已处理 {non_chinese_provinces_processed} 个非中国省份...")
+            
+            # 进度显示
+            self.metrics.progress("金钱和需求", len(province_matches) - i, len(province_matches))
         
         print(f"✅ 人口金钱和需求满足度修改完成:")
         print(f"  🇨🇳 中国人口: {chinese_money_changes} 个人口组")
@@ -2117,6 +2318,8 @@ class Victoria2Modifier:
     # 功能7: 所有国家文明化状态修改
     # ========================================
     
+    @instrumented('civilized')
+    @journaled('civilized')
     def modify_all_countries_civilized(self, target_civilized: str = "no", exclude_china: bool = True) -> bool:
         """修改所有国家的文明化状态为指定值
         
@@ -2205,6 +2408,8 @@ class Victoria2Modifier:
             print(f"ℹ️ 无需修改或修改失败")
             return False
 
+    @instrumented('china_civilized')
+    @journaled('china_civilized')
     def modify_china_civilized(self, target_civilized: str = "yes") -> bool:
         """修改中国的文明化状态为指定值
         
@@ -2277,6 +2482,7 @@ class Victoria2Modifier:
     # 验证和总结功能
     # ========================================
     
+    @instrumented('verify')
     def verify_modifications(self, filename: str):
         """验证修改结果"""
         print("\n🔍 验证修改结果...")
@@ -2288,15 +2494,18 @@ class Victoria2Modifier:
             print(f"❌ 验证时文件读取失败: {e}")
             return
         
-        # 验证中国人口宗教
+        # 验证中国人口宗教: 随机抽取足够多的省份，若有 5% 以上的省份未修改成功，以 95% 的概率能发现
         chinese_provinces = self.find_chinese_provinces()
+        sample_size = detection_sample_size(len(chinese_provinces), VERIFY_DEFECT_RATE, VERIFY_CONFIDENCE)
+        sampled_provinces = random.sample(chinese_provinces, sample_size)
         mahayana_count = 0
         ideology_conversion_count = 0
+        failed_provinces = []
         
-        print(f"📊 验证样本：检查前5个中国省份...")
+        print(f"📊 验证样本：随机检查 {sample_size}/{len(chinese_provinces)} 个中国省份 "
+              f"(缺陷率≥{VERIFY_DEFECT_RATE:.0%} 时有 {VERIFY_CONFIDENCE:.0%} 概率发现)...")
         
-        for i, province_id in enumerate(chinese_provinces[:5]):  # 检查前5个省份
-            print(f"  检查省份 {province_id}...")
+        for province_id in sampled_provinces:
             province_pattern = f'^{province_id}=\\s*{{'
             province_match = re.search(province_pattern, content, re.MULTILINE)
             if province_match:
@@ -2320,6 +2529,7 @@ class Victoria2Modifier:
                 
                 # 验证意识形态修改
                 ideology_blocks = re.findall(r'ideology=\s*\{([^}]*)\}', province_content, re.DOTALL)
+                province_failed = False
                 for ideology_block in ideology_blocks:
                     # 检查是否有Conservative(3)和Liberal(6)的值大于0
                     conservative_match = re.search(r'3=([\d.]+)', ideology_block)
@@ -2327,22 +2537,26 @@ class Victoria2Modifier:
                     
                     if conservative_match and float(conservative_match.group(1)) > 0:
                         ideology_conversion_count += 1
-                        print(f"    ✅ 发现Conservative(3): {conservative_match.group(1)}")
                     if liberal_match and float(liberal_match.group(1)) > 0:
                         ideology_conversion_count += 1
-                        print(f"    ✅ 发现Liberal(6): {liberal_match.group(1)}")
                     
                     # 检查旧意识形态是否已清零
                     for old_id in [1, 2, 4, 5, 7]:  # Reactionary, Fascist, Socialist, Anarcho-Liberal, Communist
                         old_match = re.search(f'{old_id}=([\\d.]+)', ideology_block)
                         if old_match and float(old_match.group(1)) > 0:
-                            print(f"    ⚠️ 警告：意识形态{old_id}仍有值: {old_match.group(1)}")
+                            province_failed = True
+                if province_failed:
+                    failed_provinces.append(province_id)
         
         print(f"\n📈 验证结果:")
         print(f"✅ mahayana宗教人口组: {mahayana_count} 个")
         print(f"✅ 意识形态转换成功: {ideology_conversion_count} 处")
+        if failed_provinces:
+            print(f"⚠️ 警告：{len(failed_provinces)}/{sample_size} 个抽样省份仍有旧意识形态: "
+                  f"{', '.join(map(str, failed_provinces[:10]))}")
         print("验证完成!")
     
+    @instrumented('verify')
     def verify_ideology_modifications(self, filename: str):
         """专门验证意识形态修改结果"""
         print("\n🎭 专门验证意识形态修改...")
@@ -2460,7 +2674,7 @@ class Victoria2Modifier:
         
         # 创建备份
         operation_type = "selective" if selected_count < 6 else "unified"
-        backup_filename = self.create_backup(filename, operation_type)
+        backup_job = self.start_background_backup(filename, operation_type)
         
         success_count = 0
         step = 1
@@ -2621,7 +2835,8 @@ class Victoria2Modifier:
         print(f"每个功能都独立执行，确保数据安全")
         print(f"{'='*70}")
         
-        print(f"\n📁 备份文件已创建: {backup_filename}")
+        backup_filename = backup_job.wait()
+        print(f"\n📁 备份已创建: {backup_filename}")
         
         if success_count == selected_count:
             print("🎉 所有选择的修改操作成功完成!")
@@ -2653,7 +2868,7 @@ class Victoria2Modifier:
         print(f"{'='*70}")
         
         # 创建总备份
-        backup_filename = self.create_backup(filename, "unified")
+        backup_job = self.start_background_backup(filename, "unified")
         
         success_count = 0
         
@@ -2795,7 +3010,8 @@ class Victoria2Modifier:
         print(f"每个功能都独立执行，确保数据安全")
         print(f"{'='*70}")
         
-        print(f"\n📁 总备份文件: {backup_filename}")
+        backup_filename = backup_job.wait()
+        print(f"\n📁 总备份: {backup_filename}")
         
         if success_count == 6:
             print("🎉 所有修改操作成功完成!")
@@ -2809,6 +3025,7 @@ class Victoria2Modifier:
     # 花括号类型分析功能
     # ========================================
     
+    @instrumented('index')
     def find_blocks_by_function_type(self, function_type: str) -> List[BracketBlock]:
         """根据功能类型找到对应的目标块
         
@@ -2892,11 +3109,12 @@ class Victoria2Modifier:
             # 人口属性修改需要包含中国人口的省份块
             print("  📍 查找目标: 包含中国人口的省份块")
             chinese_province_count = 0
+            chinese_province_ids = set(self.presence.select(cultures=CHINESE_CULTURES))
             for block in all_blocks:
                 block_type = self._classify_block_type(block)
                 if block_type == "省份" and block.level <= 2:
-                    # 检查是否包含中国文化人口
-                    if any(culture in block.content.lower() for culture in ['beifaren', 'nanfaren', 'manchu', 'yankee', 'dixie', 'zhuang']):
+                    # 检查是否包含中国文化人口 (存在索引)
+                    if int(block.name.strip()) in chinese_province_ids:
                         target_blocks.append(block)
                         chinese_province_count += 1
             print(f"  ✅ 找到 {len(target_blocks)} 个省份块 (包含中国人口: {chinese_province_count})")
@@ -2913,11 +3131,12 @@ class Victoria2Modifier:
             # 人口金钱和需求修改需要包含中国人口的省份块
             print("  📍 查找目标: 包含中国人口的省份块")
             chinese_province_count = 0
+            chinese_province_ids = set(self.presence.select(cultures=CHINESE_CULTURES))
             for block in all_blocks:
                 block_type = self._classify_block_type(block)
                 if block_type == "省份" and block.level <= 2:
-                    # 检查是否包含中国文化人口
-                    if any(culture in block.content.lower() for culture in ['beifaren', 'nanfaren', 'manchu', 'yankee', 'dixie', 'zhuang']):
+                    # 检查是否包含中国文化人口 (存在索引)
+                    if int(block.name.strip()) in chinese_province_ids:
                         target_blocks.append(block)
                         chinese_province_count += 1
             print(f"  ✅ 找到 {len(target_blocks)} 个省份块 (包含中国人口: {chinese_province_count})")
@@ -3273,6 +3492,8 @@ def main():
             print("\n选项:")
             print("--debug, -d      启用调试模式，显示详细的修改过程")
             print("--analyze, -a    仅分析括号类型，不执行修改")
+            print("--metrics        记录各阶段耗时与峰值内存，保存JSON报告")
+            print("--profile=操作   对指定操作采集cProfile (如 --profile=militancy,money)")
             print("\n功能说明:")
             print("1. 人口斗争性: 中国=0, 其他=10")
             print("2. 中国文化: 主文化=beifaren, 接受=nanfaren+manchu+yankee+dixie+zhuang")
@@ -3443,8 +3664,16 @@ def main():
     if debug_mode:
         print("🐛 调试模式已启用 - 将显示详细的修改过程")
     
+    # 性能度量选项
+    record_metrics = '--metrics' in sys.argv
+    metrics = Instrumentation(trace_memory=record_metrics)
+    for arg in sys.argv[1:]:
+        if arg.startswith('--profile='):
+            metrics.profile(*arg.split('=', 1)[1].split(','))
+            record_metrics = True
+    
     # 创建修改器并执行
-    modifier = Victoria2Modifier(debug_mode=debug_mode)
+    modifier = Victoria2Modifier(debug_mode=debug_mode, metrics=metrics)
     
     # 根据选择执行相应的修改
     modification_options = {k: v for k, v in options.items() if k != 'analyze_only'}
@@ -3454,6 +3683,10 @@ def main():
     else:
         # 选择性修改
         modifier.execute_selective_modifications(filename, options)
+    
+    if record_metrics:
+        metrics.print_summary()
+        print(f"📋 性能报告已保存: {metrics.save_report()}")
 
 if __name__ == "__main__":
     main()
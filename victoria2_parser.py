@@ -3,32 +3,46 @@
 """
 Victoria II 存档文件解析器
 解析 .v2 存档文件格式并转换为Python对象
+
+支持投影（只解析需要的部分）:
+    parser.parse_file(path, include={
+        'countries': ['CHI', 'ENG'],     # 指定国家 (True 表示全部)
+        'provinces': 'owner,cores',      # 所有省份，只解析 owner 和 core 字段
+        'worldmarket': True,
+    })
+每一项可以是 True (全部)、ID列表、逗号分隔的字段名，
+或 {'ids': [...], 'fields': 'a,b'}；未包含的块只做花括号匹配跳过，不分词也不创建对象。
+顶级简单键值 (date、player 等) 总会解析。
 """
 
 import re
-import json
-from typing import Dict, List, Any, Union, Optional
-from dataclasses import dataclass, field
+from typing import Dict, List, Any, Iterator, Tuple, Union, Optional
+from dataclasses import field, fields
 from decimal import Decimal
 
+from categorical import TAGS
+from compact_model import JsonRecord, slotted_dataclass, to_json_data
+from field_schema import DEFAULT_SCHEMA, FieldSchema
+from stream_export import NDJSONWriter, StreamedObject, save_json_stream
+
 
-@dataclass
-class Flag:
+@slotted_dataclass
+class Flag(JsonRecord):
     """游戏标志"""
     name: str
     value: Union[bool, str, int, float] = True
 
 
-@dataclass
-class Technology:
+@slotted_dataclass
+class Technology(JsonRecord):
     """科技数据"""
     name: str
     level: int
     progress: float
 
 
-@dataclass
-class PopGroup:
+@slotted_dataclass
+class PopGroup(JsonRecord):
     """人口群体数据"""
     id: int
     size: int
@@ -46,22 +60,22 @@ class PopGroup:
     luxury_needs: float = 0.0
 
 
-@dataclass
-class Building:
+@slotted_dataclass
+class Building(JsonRecord):
     """建筑数据"""
     type: str
     level: float
 
 
-@dataclass
-class Modifier:
+@slotted_dataclass
+class Modifier(JsonRecord):
     """省份修正"""
     modifier: str
     date: str
 
 
-@dataclass
-class Province:
+@slotted_dataclass
+class Province(JsonRecord):
     """省份数据"""
     id: int
     name: str
@@ -74,8 +88,8 @@ class Province:
     pops: List[PopGroup] = field(default_factory=list)
 
 
-@dataclass
-class Country:
+@slotted_dataclass
+class Country(JsonRecord):
     """国家数据"""
     tag: str
     tax_base: float = 0.0
@@ -87,8 +101,8 @@ class Country:
     provinces: List[int] = field(default_factory=list)
 
 
-@dataclass
-class WorldMarket:
+@slotted_dataclass
+class WorldMarket(JsonRecord):
     """世界市场数据"""
     worldmarket_pool: Dict[str, float] = field(default_factory=dict)
     price_pool: Dict[str, float] = field(default_factory=dict)
@@ -97,8 +111,8 @@ class WorldMarket:
     last_supply_pool: Dict[str, float] = field(default_factory=dict)
 
 
-@dataclass
-class GameData:
+@slotted_dataclass
+class GameData(JsonRecord):
     """游戏存档主数据"""
     date: str
     player: str
@@ -116,113 +130,225 @@ class GameData:
     provinces: Dict[int, Province] = field(default_factory=dict)
 
 
+# 投影的各部分
+PROJECTION_SECTIONS = ('countries', 'provinces', 'worldmarket', 'flags')
+
+COUNTRY_TAG_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+ENTRY_KEY_PATTERN = re.compile(r'\s*([^\s={}]+)[ \t]*=[ \t\r\n]*')
+BRACE_PATTERN = re.compile(r'[{}]')
+
+
 class Victoria2Parser:
     """Victoria II 存档文件解析器"""
     
-    def __init__(self):
+    def __init__(self, schema: FieldSchema = DEFAULT_SCHEMA):
+        self.schema = schema
         self.data = None
         self.current_line = 0
         self.lines = []
     
-    def parse_file(self, filename: str) -> GameData:
-        """解析存档文件"""
+    def parse_file(self, filename: str, include: Dict[str, Any] = None) -> GameData:
+        """解析存档文件
+        
+        Args:
+            filename: 存档文件路径
+            include: 投影，只解析列出的部分 (见模块说明)；None 表示解析全部
+        """
         print(f"开始解析文件: {filename}")
+        projection = self._normalize_projection(include)
         
         with open(filename, 'r', encoding='utf-8-sig', errors='ignore') as f:
             content = f.read()
         
-        # 分割行并清理
-        self.lines = [line.strip() for line in content.split('\n')]
-        self.current_line = 0
-        
         # 创建主游戏数据对象
         game_data = GameData(
             date="", player="", government=0, automate_trade=False,
             automate_sliders=0, rebel=0, unit=0, state=0, start_date="", start_pop_index=0
         )
         
-        # 解析顶级数据
-        while self.current_line < len(self.lines):
-            line = self.lines[self.current_line]
+        for section, key, value in self._iter_records(content, projection):
+            if section == 'info':
+                self._set_game_data_field(game_data, key, value)
+            elif section == 'flags':
+                game_data.flags = value
+            elif section == 'worldmarket':
+                game_data.worldmarket = value
+            elif section == 'countries':
+                game_data.countries[key] = value
+            else:
+                game_data.provinces[key] = value
+        
+        print(f"解析完成! 找到 {len(game_data.countries)} 个国家, {len(game_data.provinces)} 个省份")
+        return game_data
+    
+    def export_ndjson(self, filename: str, output_file: str, include: Dict[str, Any] = None) -> int:
+        """边解析边导出NDJSON，每行一条记录 {"section", "key", "data"}；不保留解析结果，返回记录数"""
+        print(f"开始导出: {filename} → {output_file}")
+        projection = self._normalize_projection(include)
+        
+        with open(filename, 'r', encoding='utf-8-sig', errors='ignore') as f:
+            content = f.read()
+        
+        with NDJSONWriter(output_file) as writer:
+            for section, key, value in self._iter_records(content, projection):
+                writer.write({'section': section, 'key': key, 'data': to_json_data(value)})
+        
+        print(f"导出完成! 共 {writer.count} 条记录")
+        return writer.count
+    
+    def _iter_records(self, content: str, projection: Dict[str, Optional[Tuple]]) -> Iterator[Tuple[str, Any, Any]]:
+        """遍历顶级条目，产生 (部分, 键, 解析结果)；部分为 info (顶级简单键值)、flags、worldmarket、countries 或 provinces"""
+        # 不在投影中的块直接跳过
+        for key, start, end, is_block in self._iter_entries(content, 0, len(content)):
+            if not is_block:
+                key, value = self._parse_key_value(content[start:end].strip())
+                if key:
+                    yield 'info', key, value
+                continue
             
-            if not line or line.startswith('#'):
-                self.current_line += 1
+            if key == 'flags':
+                section, entry_id = 'flags', None
+            elif key == 'worldmarket':
+                section, entry_id = 'worldmarket', None
+            elif COUNTRY_TAG_PATTERN.match(key):
+                section, entry_id = 'countries', key
+            elif key.isdigit():
+                section, entry_id = 'provinces', key
+            else:
                 continue
             
-            # 解析键值对
-            if '=' in line and not line.endswith('='):
-                key, value = self._parse_key_value(line)
-                self._set_game_data_field(game_data, key, value)
+            selection = projection[section]
+            if selection is None:
+                continue
+            ids, fields = selection
+            if ids is not None and entry_id not in ids:
+                continue
             
-            # 解析复杂块
-            elif line.endswith('='):
-                key = line[:-1]
-                self.current_line += 1
-                block_data = self._parse_block()
-                
-                if key == 'flags':
-                    game_data.flags = self._parse_flags(block_data)
-                elif key == 'worldmarket':
-                    game_data.worldmarket = self._parse_worldmarket(block_data)
-                elif key in ['REB', 'ENG', 'FRA', 'RUS', 'PRU', 'GER', 'AUS', 'CHI', 'USA', 'JAP']:
-                    # 国家数据
-                    country = self._parse_country(key, block_data)
-                    game_data.countries[key] = country
-                elif key.isdigit():
-                    # 省份数据
-                    province_id = int(key)
-                    province = self._parse_province(province_id, block_data)
-                    game_data.provinces[province_id] = province
+            block_data = self._parse_block_text(content, start, end, fields)
+            if section == 'flags':
+                yield section, key, self._parse_flags(block_data)
+            elif section == 'worldmarket':
+                yield section, key, self._parse_worldmarket(block_data)
+            elif section == 'countries':
+                # 国家数据
+                yield section, key, self._parse_country(key, block_data)
             else:
-                self.current_line += 1
+                # 省份数据
+                province_id = int(key)
+                yield section, province_id, self._parse_province(province_id, block_data)
+    
+    def _normalize_projection(self, include: Optional[Dict[str, Any]]) -> Dict[str, Optional[Tuple]]:
+        """将投影规范化为 {部分: None (不解析) 或 (ID集合或None, 字段集合或None)}"""
+        if include is None:
+            return {section: (None, None) for section in PROJECTION_SECTIONS}
         
-        print(f"解析完成! 找到 {len(game_data.countries)} 个国家, {len(game_data.provinces)} 个省份")
-        return game_data
+        unknown = set(include) - set(PROJECTION_SECTIONS)
+        if unknown:
+            raise ValueError(f"未知的投影部分: {', '.join(sorted(unknown))} (可用: {', '.join(PROJECTION_SECTIONS)})")
+        
+        def to_set(values) -> Optional[set]:
+            if values is None or values is True:
+                return None
+            if isinstance(values, str):
+                values = values.split(',')
+            return {str(value).strip() for value in values if str(value).strip()}
+        
+        projection = {}
+        for section in PROJECTION_SECTIONS:
+            spec = include.get(section)
+            if spec is None or spec is False:
+                projection[section] = None
+            elif spec is True:
+                projection[section] = (None, None)
+            elif isinstance(spec, str):
+                projection[section] = (None, to_set(spec))
+            elif isinstance(spec, dict):
+                projection[section] = (to_set(spec.get('ids')), to_set(spec.get('fields')))
+            else:
+                projection[section] = (to_set(spec), None)
+        
+        # 省份字段 core 也可以写成 cores
+        provinces = projection['provinces']
+        if provinces is not None and provinces[1] is not None and 'cores' in provinces[1]:
+            provinces[1].add('core')
+        return projection
+    
+    def _find_block_end(self, content: str, open_pos: int) -> int:
+        """返回与 content[open_pos] 处 '{' 匹配的 '}' 的位置，只匹配花括号不分词"""
+        depth = 0
+        for match in BRACE_PATTERN.finditer(content, open_pos):
+            if match.group(0) == '{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return match.start()
+        return len(content) - 1
+    
+    def _iter_entries(self, content: str, start: int, end: int) -> Iterator[Tuple[str, int, int, bool]]:
+        """遍历 content[start:end] 中同一层的条目，产生 (键, 起点, 终点, 是否为块)
+        
+        块的范围是包含外层花括号的值，嵌套块只做花括号匹配跳过；
+        简单值的范围是整行 key=value。
+        """
+        pos = start
+        while pos < end:
+            match = ENTRY_KEY_PATTERN.match(content, pos, end)
+            if not match or match.end() >= end:
+                # 不是键值对 (列表项等)，跳到下一行
+                newline = content.find('\n', pos, end)
+                if newline == -1:
+                    break
+                pos = newline + 1
+                continue
+            
+            key = match.group(1)
+            value_start = match.end()
+            if content[value_start] == '{':
+                value_end = self._find_block_end(content, value_start) + 1
+                yield key, value_start, value_end, True
+            else:
+                value_end = content.find('\n', value_start, end)
+                if value_end == -1:
+                    value_end = end
+                yield key, match.start(), value_end, False
+            pos = value_end
+    
+    def _parse_block_text(self, content: str, start: int, end: int, fields: Optional[set] = None) -> Dict[str, Any]:
+        """解析 content[start:end] 处的块 (含外层花括号)；指定 fields 时只解析这些字段"""
+        if fields is None:
+            self.lines = [line.strip() for line in content[start:end].split('\n')]
+            self.current_line = 0
+            return self._parse_block()
+        
+        block_data = {}
+        for key, value_start, value_end, is_block in self._iter_entries(content, start + 1, end - 1):
+            if key not in fields:
+                continue
+            if is_block:
+                value = self._parse_block_text(content, value_start, value_end)
+            else:
+                key, value = self._parse_key_value(content[value_start:value_end].strip())
+            if key in block_data:
+                if not isinstance(block_data[key], list):
+                    block_data[key] = [block_data[key]]
+                block_data[key].append(value)
+            else:
+                block_data[key] = value
+        return block_data
     
     def _parse_key_value(self, line: str) -> tuple:
-        """解析键值对"""
+        """解析键值对；值按字段类型表直接解码"""
         if '=' not in line:
             return None, None
         
         key, value = line.split('=', 1)
         key = key.strip().strip('"')
-        value = value.strip().strip('"')
-        
-        # 转换值类型
-        if value.lower() == 'yes':
-            value = True
-        elif value.lower() == 'no':
-            value = False
-        elif self._is_numeric(value):
-            if '.' in value and not self._is_date_format(value):
-                value = float(value)
-            elif value.isdigit() or (value.startswith('-') and value[1:].isdigit()):
-                value = int(value)
-        # 其他情况保持字符串格式（包括日期）
-        
-        return key, value
-    
-    def _is_numeric(self, value: str) -> bool:
-        """检查字符串是否为数字"""
-        try:
-            float(value)
-            return not self._is_date_format(value)  # 排除日期格式
-        except ValueError:
-            return False
-    
-    def _is_date_format(self, value: str) -> bool:
-        """检查是否为日期格式 (如 2245.4.6)"""
-        parts = value.split('.')
-        if len(parts) == 3:
-            try:
-                # 检查是否为年.月.日格式
-                year, month, day = parts
-                return (len(year) >= 3 and year.isdigit() and 
-                        len(month) <= 2 and month.isdigit() and
-                        len(day) <= 2 and day.isdigit())
-            except:
-                return False
-        return False
+        value = value.strip()
+        if not value:
+            return key, value
+        
+        return key, self.schema.decode(key, value)
     
     def _parse_block(self) -> Dict[str, Any]:
         """解析代码块"""
@@ -266,7 +392,8 @@ class Victoria2Parser:
                     block_data[key].append(nested_block)
                 else:
                     block_data[key] = nested_block
-            
+                continue  # _parse_block 已跳过结束的 '}'
+
             # 列表项
             else:
                 if 'items' not in block_data:
@@ -311,7 +438,7 @@ class Victoria2Parser:
     
     def _parse_country(self, tag: str, block_data: Dict) -> Country:
         """解析国家数据"""
-        country = Country(tag=tag)
+        country = Country(tag=TAGS.intern(tag))
         
         for key, value in block_data.items():
             if key == 'tax_base':
@@ -347,14 +474,12 @@ class Victoria2Parser:
             if key == 'name':
                 province.name = str(value)
             elif key == 'owner':
-                province.owner = str(value)
+                province.owner = TAGS.intern(str(value))
             elif key == 'controller':
-                province.controller = str(value)
+                province.controller = TAGS.intern(str(value))
             elif key == 'core':
-                if isinstance(value, list):
-                    province.cores = value
-                else:
-                    province.cores = [value]
+                cores = value if isinstance(value, list) else [value]
+                province.cores = [TAGS.intern(str(core)) for core in cores]
             elif key == 'garrison':
                 province.garrison = float(value)
             elif key in ['fort', 'naval_base', 'railroad'] and isinstance(value, dict):
@@ -377,16 +502,16 @@ class Victoria2Parser:
     
     def save_to_json(self, game_data: GameData, output_file: str):
         """保存数据到JSON文件"""
-        
-        def default_serializer(obj):
-            """自定义JSON序列化器"""
-            if hasattr(obj, '__dict__'):
-                return obj.__dict__
-            return str(obj)
-        
         print(f"保存数据到 {output_file}")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(game_data, f, default=default_serializer, indent=2, ensure_ascii=False)
+        # 国家和省份逐个序列化写出，不生成完整的字典
+        document = {}
+        for data_field in fields(game_data):
+            value = getattr(game_data, data_field.name)
+            if data_field.name in ('countries', 'provinces'):
+                document[data_field.name] = StreamedObject((key, item.to_json()) for key, item in value.items())
+            else:
+                document[data_field.name] = to_json_data(value)
+        save_json_stream(document, output_file)
         print("保存完成!")
     
     def print_summary(self, game_data: GameData):